@@ -95,6 +95,51 @@ class Config(object):
     def as_dict(self):
         return self.config
     
+def _enum_cache(cls):
+    """
+    Return the cached (values, dict, hashable value set, any unhashable) of an
+    enum class, collecting them on first use.
+    """
+    cache = cls.__dict__.get('__enum_cache__')
+    if cache is None:
+        items = [(attr, getattr(cls, attr)) for attr in dir(cls)
+                 if not attr.startswith('__')]
+        items = [(attr, value) for (attr, value) in items if not callable(value)]
+        values = [value for (attr, value) in items]
+        hashable = set()
+        unhashable = False
+        for value in values:
+            try:
+                hashable.add(value)
+            except TypeError:
+                unhashable = True
+        cache = (values, dict(items), frozenset(hashable), unhashable)
+        type.__setattr__(cls, '__enum_cache__', cache)
+    return cache
+
+def _clear_enum_cache(cls):
+    """
+    Drop the cached values of an enum class and of its subclasses, which
+    inherit its attributes.
+    """
+    if '__enum_cache__' in cls.__dict__:
+        type.__delattr__(cls, '__enum_cache__')
+    for subclass in cls.__subclasses__():
+        _clear_enum_cache(subclass)
+
+class BaseEnumMeta(type):
+    """
+    Metaclass for BaseEnum. Changing a class attribute of an enum after
+    it is defined invalidates the cached values.
+    """
+    def __setattr__(cls, name, value):
+        type.__setattr__(cls, name, value)
+        _clear_enum_cache(cls)
+
+    def __delattr__(cls, name):
+        type.__delattr__(cls, name)
+        _clear_enum_cache(cls)
+
 class BaseEnum(object):
     """Base class for enums.
     
@@ -114,21 +159,18 @@ class BaseEnum(object):
     are quicker to execute and more compartmentalized so that code can be
     re-used more easily outside of a capability container as needed.
     """
-    
+
+    __metaclass__ = BaseEnumMeta
+
     @classmethod
     def list(cls):
         """List the values of this enum."""
-        return [getattr(cls,attr) for attr in dir(cls) if\
-                not callable(getattr(cls,attr)) and not attr.startswith('__')]
+        return list(_enum_cache(cls)[0])
 
     @classmethod
     def dict(cls):
         """Return a dict representation of this enum."""
-        result = {}
-        for attr in dir(cls):
-            if not callable(getattr(cls,attr)) and not attr.startswith('__'):
-                result[attr] = getattr(cls,attr)
-        return result
+        return dict(_enum_cache(cls)[1])
 
     @classmethod
     def has(cls, item):
@@ -143,7 +185,13 @@ class BaseEnum(object):
         @retval True if one of the class attributes has value item, false
         otherwise.
         """
-        return item in cls.list()
+        (values, items, value_set, unhashable) = _enum_cache(cls)
+        try:
+            if item in value_set:
+                return True
+        except TypeError:
+            return item in values
+        return unhashable and item in values
 
 class EventKey(BaseEnum):
     """Keys to the event dictionary fields as used by the InstrumentProtocol
@@ -5,8 +5,9 @@
 @file mi/core/driver_scheduler.py
 @author Bill French
 @brief Provides task/event scheduling for drivers
-uses the PolledScheduler and provides a common, simplified interface
-for instrument and platform drivers.
+uses the TimerScheduler and provides a common, simplified interface
+for instrument and platform drivers.  Jobs of every driver in a process
+are timers on one shared event loop.
 
 The scheduler is configured by passing a configuration dictionary
 to the constructor or my calling add_config.  Calling add_config
@@ -127,7 +128,7 @@ import inspect
 from mi.core.log import get_logger; log = get_logger()
 
 from mi.core.common import BaseEnum
-from mi.core.scheduler import PolledScheduler
+from mi.core.scheduler import TimerScheduler
 from mi.core.exceptions import SchedulerException
 
 class TriggerType(BaseEnum):
@@ -187,7 +188,7 @@ class DriverScheduler(object):
         }
         @param config: job configuration structure.
         """
-        self._scheduler = PolledScheduler()
+        self._scheduler = TimerScheduler()
         if(config):
             self.add_config(config)
 
@@ -232,6 +233,12 @@ class DriverScheduler(object):
 
     def remove_job(self, callback):
         self._scheduler.unschedule_func(callback)
+
+    def shutdown(self):
+        """
+        Cancel every job.  Jobs already running are left to finish.
+        """
+        self._scheduler.shutdown()
     
     def _add_job(self, name, config):
         """
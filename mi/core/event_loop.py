@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.event_loop
+@file mi/core/event_loop.py
+@brief Single threaded loop multiplexing sockets and timers.
+
+Sockets, ZMQ or plain, are watched with one zmq.Poller and their
+callbacks run on the loop thread, as do timers and calls handed in from
+other threads:
+
+    loop = EventLoop()
+    loop.start()
+    loop.add_reader(sock, on_readable)
+    timer = loop.call_later(5, on_timeout)
+    loop.call_soon(do_something, arg)
+    timer.reset(5)
+
+Callbacks should not block; anything slow belongs on another thread,
+which can hand its result back with call_soon.  An exception raised by a
+callback is logged and the loop carries on.
+
+get_event_loop returns a loop shared by everything in the process that
+only needs timers, such as heartbeat watchdogs and scheduled jobs.
+"""
+
+# mi.core.time would shadow the standard time module
+from __future__ import absolute_import
+
+__license__ = 'Apache 2.0'
+
+import os
+import sys
+import time
+import heapq
+import thread
+import itertools
+import threading
+from collections import deque
+
+import zmq
+
+from mi.core.log import get_logger ; log = get_logger()
+
+# Longest the loop sleeps in poll, in seconds, so stop is noticed even if
+# the wake up is lost.
+MAX_POLL_TIMEOUT = 1.0
+
+class LoopTimer(object):
+    """
+    Handle for a call scheduled with call_later.  A timer can be reset,
+    before or after it has fired, to call again at a new time.
+    """
+    __slots__ = ('loop', 'deadline', 'callback', 'args', 'cancelled', 'queued')
+
+    def __init__(self, loop, deadline, callback, args):
+        self.loop = loop
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        # deadline of the timer's entry in the loop's heap, None if it has none
+        self.queued = None
+
+    def cancel(self):
+        """
+        Stop the call from happening, if it hasn't already.  Cancelled
+        timers are discarded when they come due.
+        """
+        self.cancelled = True
+
+    def reset(self, delay):
+        """
+        Call in delay seconds from now instead, even if cancelled or
+        already called.  Moving a timer later only changes its deadline;
+        the loop moves it along the heap when the old deadline comes up, so
+        a watchdog reset on every packet costs next to nothing.
+        """
+        self.loop._reset_timer(self, time.time() + delay)
+
+class EventLoop(object):
+    """
+    Poll loop for sockets and timers.  The loop runs in one thread, started
+    with start or by calling run.  call_soon, call_later and the reader
+    methods can be used from any thread; changes made from other threads
+    are applied by the loop in the order they were made.
+    """
+
+    def __init__(self):
+        self._poller = self._new_poller()
+        self._readers = {}
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self._thread_id = None
+        self._thread = None
+        self._stopped = False
+        self._woken = False
+        (self._wake_read, self._wake_write) = os.pipe()
+        self._poller.register(self._wake_read, zmq.POLLIN)
+
+    @staticmethod
+    def _new_poller():
+        """
+        A zmq.Poller, or a zmq.green one if gevent has patched threads: then
+        threads are greenlets and a blocking poll would stall them all.
+        gevent can only have patched threads if gevent.monkey is loaded, so
+        it isn't imported here.
+        """
+        monkey = sys.modules.get('gevent.monkey')
+        if monkey is not None and monkey.is_module_patched('thread'):
+            import zmq.green as zmq_green
+            return zmq_green.Poller()
+        return zmq.Poller()
+
+    @property
+    def running(self):
+        # a started thread counts before it gets to run(), so calls made
+        # meanwhile are queued for it rather than made on the caller's thread
+        return self._thread_id is not None or bool(self._thread and self._thread.is_alive())
+
+    def in_loop_thread(self):
+        """
+        @retval True if called from the thread running the loop.
+        """
+        return self._thread_id == thread.get_ident()
+
+    def call_soon(self, callback, *args):
+        """
+        Call callback(*args) on the loop thread, after anything already
+        waiting.  Safe to use from any thread.
+        """
+        with self._lock:
+            self._calls.append((callback, args))
+            wake = not self._woken
+            self._woken = True
+        if wake:
+            os.write(self._wake_write, 'x')
+
+    def call_in_loop(self, callback, *args):
+        """
+        Call callback(*args) now if on the loop thread or the loop isn't
+        running, otherwise as call_soon does.
+        """
+        if self.in_loop_thread() or not self.running:
+            callback(*args)
+        else:
+            self.call_soon(callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        """
+        Call callback(*args) on the loop thread in delay seconds.  Safe to
+        use from any thread.
+        @retval a LoopTimer, which can be cancelled or reset.
+        """
+        timer = LoopTimer(self, None, callback, args)
+        self._reset_timer(timer, time.time() + delay)
+        return timer
+
+    def add_reader(self, sock, callback):
+        """
+        Call callback() on the loop thread whenever sock is readable.
+        @param sock a zmq socket, or an object with a fileno method or a file
+        descriptor.
+        """
+        self.call_in_loop(self._add_reader, self._poll_key(sock), callback)
+
+    def remove_reader(self, sock):
+        """
+        Stop watching sock.  A socket must be removed before it is closed;
+        close_socket does both in the right order.  From another thread the
+        callback can still run once before the loop gets to the removal.
+        """
+        self.call_in_loop(self._remove_reader, self._poll_key(sock))
+
+    def close_socket(self, sock):
+        """
+        Stop watching sock if it is watched, then close it.
+        """
+        self.call_in_loop(self._close_socket, self._poll_key(sock), sock)
+
+    def start(self):
+        """
+        Run the loop in a new daemon thread.
+        @retval the thread.
+        """
+        self._thread = threading.Thread(target=self.run, name='EventLoop')
+        self._thread.daemon = True
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """
+        End the loop once the calls already handed to it have run.
+        """
+        self.call_soon(self._stop)
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run(self):
+        """
+        Run callbacks until stop is called.
+        """
+        self._stopped = False
+        self._thread_id = thread.get_ident()
+        log.info('Event loop started')
+        try:
+            while not self._stopped:
+                self._run_once()
+        finally:
+            self._thread_id = None
+            log.info('Event loop stopped')
+
+    def _run_once(self):
+        timeout = MAX_POLL_TIMEOUT
+        if self._timers:
+            timeout = min(timeout, max(0, self._timers[0][0] - time.time()))
+
+        for (sock, event) in self._poller.poll(timeout * 1000):
+            if sock == self._wake_read:
+                os.read(self._wake_read, 4096)
+                continue
+            callback = self._readers.get(sock)
+            if callback:
+                self._run(callback, ())
+
+        with self._lock:
+            calls = self._calls
+            self._calls = deque()
+            self._woken = False
+        for (callback, args) in calls:
+            self._run(callback, args)
+
+        now = time.time()
+        while self._timers and self._timers[0][0] <= now:
+            with self._lock:
+                (deadline, seq, timer) = heapq.heappop(self._timers)
+                if deadline != timer.queued:
+                    # left behind when the timer was reset earlier
+                    continue
+                timer.queued = None
+                if timer.cancelled:
+                    continue
+                if timer.deadline > now:
+                    self._push_timer(timer)
+                    continue
+            self._run(timer.callback, timer.args)
+
+    def _run(self, callback, args):
+        try:
+            callback(*args)
+        except Exception:
+            log.error('Event loop callback %r raised', callback, exc_info=True)
+
+    @staticmethod
+    def _poll_key(sock):
+        """
+        The poller reports zmq sockets as themselves and anything else by
+        file descriptor.  Keys are taken when a call is made, while the
+        socket is certainly open.
+        """
+        if isinstance(sock, (zmq.Socket, int)):
+            return sock
+        return sock.fileno()
+
+    def _add_reader(self, key, callback):
+        self._readers[key] = callback
+        self._poller.register(key, zmq.POLLIN)
+
+    def _remove_reader(self, key):
+        if self._readers.pop(key, None) is not None:
+            self._poller.unregister(key)
+
+    def _close_socket(self, key, sock):
+        self._remove_reader(key)
+        sock.close()
+
+    def _reset_timer(self, timer, deadline):
+        with self._lock:
+            timer.deadline = deadline
+            timer.cancelled = False
+            if timer.queued is not None and timer.queued <= deadline:
+                return
+            self._push_timer(timer)
+        if not self.in_loop_thread():
+            # the loop may be sleeping past the new deadline
+            self.call_soon(self._no_op)
+
+    def _push_timer(self, timer):
+        """
+        Add a heap entry for the timer's deadline.  Called with the lock
+        held.
+        """
+        timer.queued = timer.deadline
+        heapq.heappush(self._timers, (timer.deadline, self._timer_seq.next(), timer))
+
+    def _stop(self):
+        self._stopped = True
+
+    def _no_op(self):
+        pass
+
+_event_loop = None
+_event_loop_pid = None
+_event_loop_lock = threading.Lock()
+
+def get_event_loop():
+    """
+    @retval the process wide EventLoop, started on first use.  A forked
+    child gets a loop of its own, since the parent's thread isn't copied.
+    """
+    global _event_loop, _event_loop_pid
+    with _event_loop_lock:
+        if _event_loop is None or _event_loop_pid != os.getpid():
+            _event_loop = EventLoop()
+            _event_loop_pid = os.getpid()
+            _event_loop.start()
+        return _event_loop
@@ -11,9 +11,17 @@
 __author__ = 'Steve Foley'
 __license__ = 'Apache 2.0'
 
+import re
+import time
+import heapq
+import struct
+from collections import deque
+
 from mi.core.log import get_logger ; log = get_logger()
+from mi.core.metrics import get_metrics ; metrics = get_metrics()
 
 from mi.core.exceptions import SampleException
+from mi.core.util import required_literals
 
 class Chunker(object):
     """
@@ -133,7 +141,13 @@ class Chunker(object):
         """
         log.debug("Generating data lists with start index %s", start_index)
         return_list = {'data_chunk_list':[], 'non_data_chunk_list':[]}
+        timed = metrics.enabled
+        if timed:
+            start = time.time()
         result = self.sieve(self.buffer[start_index:])
+        if timed:
+            metrics.observe('chunker.sieve_time', time.time() - start)
+            metrics.observe('chunker.depth', len(self.buffer))
         # assert no overlap!
         if (self.overlaps(result)):
             raise SampleException("Overlapping blocks in sieve list: %s" % result)
@@ -437,7 +451,242 @@ class Chunker(object):
     
         return return_list
 
-    
+
+class LengthPrefixedFramer(object):
+    """
+    Sieve for binary records that start with a sync word and carry their own
+    length, like PD0 ensembles, Nortek structures and AC-S packets.
+
+    The buffer is walked once. At each sync word the length field is read in
+    place, the record size worked out from it and the record checksum
+    verified. A good record is returned and the walk continues after it; a
+    bad length, bad checksum or incomplete record resynchronizes on the next
+    sync word. An instance is a sieve function, pass it straight to a
+    chunker.
+    """
+    def __init__(self, sync, length_offset, length_format='<H',
+                 length_scale=1, length_extra=0, checksum=None,
+                 min_size=None, max_size=None):
+        """
+        @param sync the string every record starts with.
+        @param length_offset byte offset of the length field in the record.
+        @param length_format struct format of the length field.
+        @param length_scale record size = length * length_scale + length_extra
+        @param length_extra see length_scale
+        @param checksum function(raw_data, start, end) returning True if the
+            record in raw_data[start:end] is valid, or None to skip the check.
+        @param min_size smallest valid record size, at least the header.
+        @param max_size largest valid record size, or None for no limit.
+        """
+        self.sync = sync
+        self.length_offset = length_offset
+        self.length_scale = length_scale
+        self.length_extra = length_extra
+        self.checksum = checksum
+        self._length = struct.Struct(length_format)
+        self.header_size = max(length_offset + self._length.size, len(sync))
+        self.min_size = max(min_size or 0, self.header_size)
+        self.max_size = max_size
+
+    def __call__(self, raw_data):
+        return self.sieve(raw_data)
+
+    def sieve(self, raw_data):
+        """
+        @param raw_data string or bytearray to search.
+        @retval list of (start, end) tuples for each valid record, in order
+            and without overlap.
+        """
+        return_list = []
+        data_length = len(raw_data)
+        unpack_from = self._length.unpack_from
+
+        start = raw_data.find(self.sync)
+        while start >= 0:
+            # a truncated header here means every later one is truncated too
+            if start + self.header_size > data_length:
+                break
+
+            size = unpack_from(raw_data, start + self.length_offset)[0] * self.length_scale + self.length_extra
+            end = start + size
+            if (size >= self.min_size and (self.max_size is None or size <= self.max_size) and
+                    end <= data_length and
+                    (self.checksum is None or self.checksum(raw_data, start, end))):
+                return_list.append((start, end))
+                start = raw_data.find(self.sync, end)
+            else:
+                start = raw_data.find(self.sync, start + 1)
+
+        return return_list
+
+
+class SyncWordFramer(object):
+    """
+    Sieve for fixed length binary records that are told apart by their sync
+    string, like Nortek structures.
+
+    One pass over the buffer finds every occurrence of every sync string. A
+    record that has fully arrived and passes its checksum is returned and the
+    walk continues after it, anything else resynchronizes on the next sync
+    string. The sieve is re-run over the unconsumed buffer each time data
+    arrives, so checksum results are cached by record contents and a record
+    is only summed once. An instance is a sieve function.
+    """
+    def __init__(self, structures, checksum=None, cache_size=1000):
+        """
+        @param structures list of (sync string, record length) pairs.
+        @param checksum function(raw_data, start, end) returning True if the
+            record in raw_data[start:end] is valid, or None to skip the check.
+        @param cache_size number of checksum results kept, 0 for no cache.
+        """
+        # longest sync first so a sync that is a prefix of another loses
+        self.structures = sorted([(sync, length) for (sync, length) in structures],
+                                 key=lambda structure: -len(structure[0]))
+        self.checksum = checksum
+        self.cache_size = cache_size
+        self._matcher = re.compile('|'.join([re.escape(sync) for (sync, length) in self.structures]),
+                                   re.DOTALL)
+        self._checked = {}
+
+    def __call__(self, raw_data):
+        return self.sieve(raw_data)
+
+    def _valid(self, raw_data, start, end):
+        if self.checksum is None:
+            return True
+        if not self.cache_size:
+            return self.checksum(raw_data, start, end)
+
+        record = str(raw_data[start:end])
+        valid = self._checked.get(record)
+        if valid is None:
+            valid = self.checksum(raw_data, start, end)
+            if len(self._checked) >= self.cache_size:
+                self._checked.clear()
+            self._checked[record] = valid
+        return valid
+
+    def sieve(self, raw_data):
+        """
+        @param raw_data string or bytearray to search.
+        @retval list of (start, end) tuples for each valid record, in order
+            and without overlap.
+        """
+        return_list = []
+        data_length = len(raw_data)
+        search = self._matcher.search
+
+        match = search(raw_data)
+        while match:
+            start = match.start()
+            resume = start + 1
+            for (sync, length) in self.structures:
+                end = start + length
+                if (end <= data_length and raw_data.startswith(sync, start) and
+                        self._valid(raw_data, start, end)):
+                    return_list.append((start, end))
+                    resume = end
+                    break
+            match = search(raw_data, resume)
+
+        return return_list
+
+
+class RegexSieve(object):
+    """
+    Sieve for text protocols that recognize several kinds of record by
+    regex, a replacement for running each regex of a list over the buffer
+    in turn.
+
+    The matches of all the regexes are merged in one walk along the buffer:
+    the earliest match is taken, the regex earlier in the list winning a
+    tie, and the walk continues after it. A match that overlaps an earlier
+    one is logged and dropped rather than handed to the chunker as an
+    overlap; regexes that can overlap should be fixed.
+
+    Each regex keeps its own search so the regex engine can still skip
+    ahead on the literal the pattern starts with. Before searching, the
+    literals the pattern cannot match without are looked for with
+    str.find; if one is missing from the rest of the buffer the regex is
+    skipped for the rest of the walk. This is what keeps patterns like
+    'IRIS,(.*?),\\*APPLIED.*?' with DOTALL, which otherwise scan to the end of
+    the buffer from every line, linear when no status is in the buffer.
+
+    An instance is a sieve function and keeps no state between calls, so
+    protocols can share one as a class attribute. To keep from rescanning
+    the unmatched tail each time data arrives, give the RingBufferChunker
+    using the sieve a lookback.
+    """
+    def __init__(self, regex_list):
+        """
+        @param regex_list list of compiled regexes, or pattern strings, in
+            order of preference.
+        """
+        self.regex_list = [re.compile(regex) if isinstance(regex, basestring) else regex
+                           for regex in regex_list]
+        self._literals = [required_literals(regex) for regex in self.regex_list]
+
+    def __call__(self, raw_data):
+        return self.sieve(raw_data)
+
+    def _search(self, index, raw_data, pos):
+        """
+        Search for the next match of one regex, or None if there is none.
+        """
+        find = raw_data.find
+        literal_pos = pos
+        for literal in self._literals[index]:
+            literal_pos = find(literal, literal_pos)
+            if literal_pos < 0:
+                return None
+            literal_pos += len(literal)
+        return self.regex_list[index].search(raw_data, pos)
+
+    def sieve(self, raw_data):
+        """
+        @param raw_data string to search.
+        @retval list of (start, end) tuples for each match, in order and
+            without overlap.
+        """
+        pos = 0
+        return_list = []
+        heap = []
+        for index in range(len(self.regex_list)):
+            match = self._search(index, raw_data, pos)
+            if match:
+                heap.append((match.start(), index, match))
+        heapq.heapify(heap)
+
+        while heap:
+            if len(heap) == 1:
+                # only one regex left to match, let it run to the end
+                (start, index, match) = heap[0]
+                return_list.append(match.span())
+                pos = max(match.end(), start + 1)
+                return_list.extend([match.span() for match in
+                                    self.regex_list[index].finditer(raw_data, pos)])
+                break
+
+            (start, index, match) = heapq.heappop(heap)
+            end = match.end()
+            return_list.append((start, end))
+            # an empty match can't move the walk on
+            pos = max(end, start + 1)
+
+            match = self._search(index, raw_data, pos)
+            if match:
+                heapq.heappush(heap, (match.start(), index, match))
+            while heap and heap[0][0] < pos:
+                (start, index, match) = heapq.heappop(heap)
+                log.warning("Dropping match %s of %r, it overlaps %s",
+                            match.span(), self.regex_list[index].pattern, return_list[-1])
+                match = self._search(index, raw_data, pos)
+                if match:
+                    heapq.heappush(heap, (match.start(), index, match))
+
+        return return_list
+
+
 class StringChunker(Chunker):
     """
     A version of the chunker that handles a string buffer. Methods are tuned
@@ -456,4 +705,347 @@ class BinaryChunker(Chunker):
     def __init__(self, data_sieve_fn):
         Chunker.__init__(self, data_sieve_fn)
         self.buffer = []
-    
\ No newline at end of file
+    
+
+class RingBufferChunker(Chunker):
+    """
+    A chunker with the same interface as the StringChunker and BinaryChunker
+    that is built for high rate streams and large backlogs.
+
+    Incoming data is appended to a bytearray. All chunk indices are kept in
+    absolute stream coordinates (bytes since the chunker was created), so
+    consuming data never rewrites the index lists; it just moves the base
+    offset forward. The consumed prefix of the bytearray is only released
+    when it makes up more than half of the storage, which keeps the amortized
+    cost of a consume O(1) instead of re-slicing the whole buffer each time.
+
+    The data, non-data and raw index lists are deques. Everything after the
+    end of the last data block is kept as an open "tail" which is the only
+    part of the buffer handed back to the sieve. As with the original
+    chunker the tail is reported as non-data when the last sieve pass over it
+    found nothing. If the largest record the
+    sieve can find is known, pass it as lookback and each byte of the tail is
+    only rescanned while a record starting at it could still be incomplete.
+
+    Indices returned from the public interface (get_next_*_with_index and the
+    *_chunk_list properties) are relative to the start of the unconsumed
+    buffer, just like the original Chunker.
+    """
+    # Don't bother releasing consumed storage below this size
+    COMPACT_THRESHOLD = 4096
+
+    def __init__(self, data_sieve_fn, lookback=None):
+        """
+        @param data_sieve_fn The sieve function, see Chunker.__init__
+        @param lookback The length of the longest record the sieve can
+            identify, or None to always re-sieve the full unmatched tail.
+        """
+        Chunker.__init__(self, data_sieve_fn)
+        self.lookback = lookback
+
+        self._storage = bytearray()
+        # absolute index of self._storage[0]
+        self._storage_offset = 0
+        # absolute index of the first unconsumed byte
+        self._base = 0
+        # absolute index of the end of the stream
+        self._end = 0
+        # absolute index after the last data block, start of the open tail
+        self._tail_start = 0
+        # absolute index the sieve has already scanned up to
+        self._sieve_cursor = 0
+        # like the original chunker, the tail only counts as non-data when
+        # the last sieve pass found no data in it
+        self._tail_is_nondata = False
+
+        self._raw = deque()
+        self._data = deque()
+        self._nondata = deque()
+
+    ########################################################################
+    # Compatibility views
+    ########################################################################
+    def _relative(self, chunk_list):
+        base = self._base
+        return [(s - base, e - base, t) for (s, e, t) in chunk_list]
+
+    def _get_buffer(self):
+        return self._to_block(self._storage[self._base - self._storage_offset:])
+
+    def _set_buffer(self, value):
+        # Chunker.__init__ initializes the buffer attribute; ignore it
+        pass
+
+    buffer = property(_get_buffer, _set_buffer)
+
+    @property
+    def raw_chunk_list(self):
+        return self._relative(self._raw)
+
+    @property
+    def data_chunk_list(self):
+        return self._relative(self._data)
+
+    @property
+    def nondata_chunk_list(self):
+        return self._relative(self._nondata_with_tail())
+
+    @raw_chunk_list.setter
+    def raw_chunk_list(self, value):
+        pass
+
+    @data_chunk_list.setter
+    def data_chunk_list(self, value):
+        pass
+
+    @nondata_chunk_list.setter
+    def nondata_chunk_list(self, value):
+        pass
+
+    def _to_block(self, data):
+        """
+        Convert a slice of the internal bytearray into the type handed to
+        the sieve and returned to the caller. Overridden by subclasses.
+        """
+        return data
+
+    ########################################################################
+    # Ingest
+    ########################################################################
+    def add_chunk(self, raw_data, timestamp):
+        """
+        Append a chunk of data to the buffer and sieve out any new data blocks.
+
+        @param raw_data The raw data as a string or bytearray
+        @param timestamp The time (in NTP4 float format) that the data was
+            collected at the port agent
+        """
+        assert isinstance(timestamp, float)
+
+        start = self._end
+        self._storage.extend(raw_data)
+        self._end = start + len(raw_data)
+        self._raw.append((start, self._end, timestamp))
+
+        sieve_start = self._tail_start
+        if self.lookback is not None:
+            sieve_start = max(sieve_start, self._sieve_cursor - self.lookback)
+        self._sieve_cursor = self._end
+
+        offset = self._storage_offset
+        timed = metrics.enabled
+        if timed:
+            begin = time.time()
+        result = self.sieve(self._to_block(self._storage[sieve_start - offset:]))
+        if timed:
+            metrics.observe('chunker.sieve_time', time.time() - begin)
+            metrics.observe('chunker.depth', len(self._storage))
+
+        if self.overlaps(result):
+            raise SampleException("Overlapping blocks in sieve list: %s" % result)
+        result.sort()
+
+        for (s, e) in result:
+            s += sieve_start
+            e += sieve_start
+            if s < self._tail_start or e > self._end:
+                raise SampleException("Sieve block out of range: %s" % ((s, e),))
+
+            if s > self._tail_start:
+                self._add_nondata(self._tail_start, s)
+            self._data.append((s, e, self._timestamp_at(s)))
+            self._tail_start = e
+
+        self._tail_is_nondata = not result
+
+        # absolute indices, formatted lazily so this stays cheap
+        log.trace("Added chunk, data: %s, nondata: %s", self._data, self._nondata)
+
+    def _timestamp_at(self, index):
+        """
+        Find the timestamp of the raw chunk containing an absolute index.
+        New blocks are almost always in the last few raw chunks so walk the
+        raw list backwards.
+        """
+        for (s, e, t) in reversed(self._raw):
+            if s <= index:
+                return t
+        return self._raw[0][2]
+
+    def _add_nondata(self, start, end):
+        """
+        Close a non-data block, merging it with the previous non-data block
+        if the two are adjacent.
+        """
+        if self._nondata and self._nondata[-1][1] == start:
+            (s, e, t) = self._nondata.pop()
+            self._nondata.append((s, end, t))
+        else:
+            self._nondata.append((start, end, self._timestamp_at(start)))
+
+    def _nondata_with_tail(self):
+        """
+        The closed non-data blocks plus the open tail, if there is one.
+        """
+        if self._tail_start >= self._end or not self._tail_is_nondata:
+            return self._nondata
+
+        result = list(self._nondata)
+        tail_start = max(self._tail_start, self._base)
+        if result and result[-1][1] == tail_start:
+            (s, e, t) = result.pop()
+            result.append((s, self._end, t))
+        else:
+            result.append((tail_start, self._end, self._timestamp_at(tail_start)))
+        return result
+
+    ########################################################################
+    # Consume
+    ########################################################################
+    def _consume(self, index):
+        """
+        Release everything before an absolute index and trim the index lists
+        to match. A data block cut by the index is torn up.
+        """
+        if index <= self._base:
+            return
+
+        torn = None
+        while self._data and self._data[0][0] < index:
+            (s, e, t) = self._data.popleft()
+            if e > index:
+                torn = (index, e, t)
+
+        self._base = index
+        self._tail_start = max(self._tail_start, index)
+        self._sieve_cursor = max(self._sieve_cursor, index)
+
+        for chunk_list in (self._raw, self._nondata):
+            while chunk_list and chunk_list[0][1] <= index:
+                chunk_list.popleft()
+            if chunk_list and chunk_list[0][0] < index:
+                (s, e, t) = chunk_list.popleft()
+                chunk_list.appendleft((index, e, t))
+
+        # only once the consumed non-data is gone, so the remains go first
+        if torn:
+            self._tear_data(*torn)
+
+        self._compact()
+
+    def _compact(self):
+        """
+        Drop the consumed prefix of the storage once it dominates the buffer
+        """
+        dead = self._base - self._storage_offset
+        if dead > self.COMPACT_THRESHOLD and dead * 2 > len(self._storage):
+            del self._storage[:dead]
+            self._storage_offset = self._base
+
+    def _clean_buffer(self, end_index):
+        """
+        Consume the buffer up to an index relative to the unconsumed buffer
+        @param end_index the last index used...clean up to here
+        """
+        self._consume(min(self._base + end_index, self._end))
+
+    def _block(self, start, end):
+        offset = self._storage_offset
+        return self._to_block(self._storage[start - offset:end - offset])
+
+    def get_next_data_with_index(self, clean=True):
+        """
+        Get the next chunk of data from the buffer. By default, it clears all
+        that comes before it.
+
+        @param clean If set to false, do not clear the buffer when fetching the
+            data, but simply return the data block and make no further changes.
+        @return A tuple of (timestamp, data_chunk, start_index, end_index),
+            indices relative to the unconsumed buffer. If no data, returns
+            (None, None, None, None)
+        """
+        if not self._data:
+            return (None, None, None, None)
+
+        (start, end, timestamp) = self._data[0]
+        block = self._block(start, end)
+        result = (timestamp, block, start - self._base, end - self._base)
+
+        if clean:
+            self._data.popleft()
+            self._consume(end)
+
+        return result
+
+    def get_next_non_data_with_index(self, clean=True):
+        """
+        Get the next chunk of non-data from the buffer, clearing all that comes
+        before it.
+
+        @param clean Remove the buffer contents before and including this data
+        @return A tuple of (timestamp, data_chunk, next_start, next_end),
+            indices relative to the unconsumed buffer. If no non-data returns
+            (None, None, None, None)
+        """
+        nondata = self._nondata_with_tail()
+        if not nondata:
+            return (None, None, None, None)
+
+        (start, end, timestamp) = nondata[0]
+        block = self._block(start, end)
+        result = (timestamp, block, start - self._base, end - self._base)
+
+        if clean:
+            self._consume(end)
+
+        return result
+
+    def get_next_raw(self, clean=True):
+        """
+        Get the next chunk of raw characters from the buffer, clearing all
+        that comes before it. A data block that is cut by this is torn up and
+        what is left of it becomes non-data.
+
+        @param clean Remove the buffer contents before and including this data
+        @return A tuple of (timestamp, data_chunk), (None, None) if empty list
+        """
+        if not self._raw:
+            return (None, None)
+
+        (start, end, timestamp) = self._raw[0]
+        block = self._block(start, end)
+
+        if clean:
+            self._clean_buffer(end - self._base)
+
+        return (timestamp, block)
+
+    def _tear_data(self, index, end, timestamp):
+        """
+        Turn the unconsumed remains of a data block, which start at the
+        consume index, into non-data.  Like the StringChunker, the remains
+        are a block of their own, not merged with the non-data after them.
+        """
+        if not self._data:
+            # it was the last data block so just reopen the tail
+            self._tail_start = index
+            self._tail_is_nondata = True
+        else:
+            self._nondata.appendleft((index, end, timestamp))
+
+
+class StringRingChunker(RingBufferChunker):
+    """
+    Drop in replacement for the StringChunker built on a RingBufferChunker.
+    The sieve is handed strings and blocks are returned as strings.
+    """
+    def _to_block(self, data):
+        return str(data)
+
+
+class BinaryRingChunker(RingBufferChunker):
+    """
+    Drop in replacement for the BinaryChunker built on a RingBufferChunker.
+    The sieve is handed a bytearray and blocks are returned as bytearrays.
+    """
+    pass
@@ -15,6 +15,7 @@ import time
 import copy
 import ntplib
 import base64
+import binascii
 import logging
 from warnings import warn
 try:
@@ -26,6 +27,7 @@ except ImportError:
 from mi.core.common import BaseEnum
 from mi.core.exceptions import SampleException, ReadOnlyException, NotImplementedException, InstrumentParameterException
 from mi.core.log import get_logger ; log = get_logger()
+from mi.core.metrics import get_metrics ; metrics = get_metrics()
 
 class CommonDataParticleType(BaseEnum):
     """
@@ -58,6 +60,68 @@ class DataParticleValue(BaseEnum):
     INVALID = "invalid"
     QUESTIONABLE = "questionable"
     
+class DataParticleEncoder(object):
+    """
+    Serializes data particles to JSON. The JSON encoder is built once and
+    reused for every particle instead of going through json.dumps, which sets
+    up the encoder on each call. When the standard library json module is in
+    use the C level encoder is called directly. The output is identical to
+    json.dumps(particle.generate_dict(), sort_keys=sort_keys).
+    """
+    def __init__(self, sort_keys=False):
+        """
+        @param sort_keys Sort the keys in the JSON objects
+        """
+        encoder = json.JSONEncoder(sort_keys=sort_keys)
+        self._encode = encoder.encode
+
+        # Same conditions the json module uses to pick its C encoder
+        c_make_encoder = getattr(json.encoder, 'c_make_encoder', None)
+        if json.__name__ == 'json' and c_make_encoder is not None and not sort_keys:
+            c_encoder = c_make_encoder(None, encoder.default,
+                                       json.encoder.encode_basestring_ascii,
+                                       encoder.indent, encoder.key_separator,
+                                       encoder.item_separator, encoder.sort_keys,
+                                       encoder.skipkeys, encoder.allow_nan)
+            join = ''.join
+            self._encode = lambda obj: join(c_encoder(obj, 0))
+
+    def encode(self, particle):
+        """
+        Serialize a single particle
+        @param particle The DataParticle to serialize
+        @return The JSON string for the particle
+        """
+        if not metrics.enabled:
+            return self._encode(particle.generate_dict())
+
+        start = time.time()
+        particle_dict = particle.generate_dict()
+        built = time.time()
+        result = self._encode(particle_dict)
+        metrics.observe('particle.build_time', built - start)
+        metrics.observe('particle.serialize_time', time.time() - built)
+        return result
+
+    def encode_batch(self, particles):
+        """
+        Serialize a list of particles in one pass.
+        @param particles An iterable of DataParticles
+        @return A list of JSON strings, one per particle, in the same order
+        """
+        if metrics.enabled:
+            return [self.encode(particle) for particle in particles]
+
+        encode = self._encode
+        return [encode(particle.generate_dict()) for particle in particles]
+
+
+_ENCODERS = {
+    False: DataParticleEncoder(sort_keys=False),
+    True: DataParticleEncoder(sort_keys=True),
+}
+
+
 class DataParticle(object):
     """
     This class is responsible for storing and ultimately generating data
@@ -75,6 +139,15 @@ class DataParticle(object):
     # data_particle_type()
     _data_particle_type = None
 
+    # The header values are kept in slots rather than a per-instance contents
+    # dictionary, we can have a lot of these queued up.  The contents
+    # dictionary is only built if something asks for it, and from then on it
+    # holds the header.  __dict__ is kept so subclasses and callers can still
+    # add attributes; it is only allocated when they do.
+    __slots__ = ('raw_data', '_contents', '_port_timestamp', '_internal_timestamp',
+                 '_driver_timestamp', '_preferred_timestamp', '_quality_flag',
+                 '_new_sequence', '__dict__', '__weakref__')
+
     def __init__(self, raw_data,
                  port_timestamp=None,
                  internal_timestamp=None,
@@ -88,20 +161,52 @@ class DataParticle(object):
         if new_sequence is not None and not isinstance(new_sequence, bool):
             raise TypeError("new_sequence is not a bool")
 
-        self.contents = {
+        self._contents = None
+        self._port_timestamp = port_timestamp
+        self._internal_timestamp = internal_timestamp
+        self._driver_timestamp = ntplib.system_to_ntp_time(time.time())
+        self._preferred_timestamp = preferred_timestamp
+        self._quality_flag = quality_flag
+        self._new_sequence = new_sequence
+
+        self.raw_data = raw_data
+
+    def _header_dict(self):
+        """
+        Build the particle header dictionary from the slot values
+        @return A new dictionary with the header values
+        """
+        result = {
             DataParticleKey.PKT_FORMAT_ID: DataParticleValue.JSON_DATA,
             DataParticleKey.PKT_VERSION: 1,
-            DataParticleKey.PORT_TIMESTAMP: port_timestamp,
-            DataParticleKey.INTERNAL_TIMESTAMP: internal_timestamp,
-            DataParticleKey.DRIVER_TIMESTAMP: ntplib.system_to_ntp_time(time.time()),
-            DataParticleKey.PREFERRED_TIMESTAMP: preferred_timestamp,
-            DataParticleKey.QUALITY_FLAG: quality_flag,
+            DataParticleKey.PORT_TIMESTAMP: self._port_timestamp,
+            DataParticleKey.INTERNAL_TIMESTAMP: self._internal_timestamp,
+            DataParticleKey.DRIVER_TIMESTAMP: self._driver_timestamp,
+            DataParticleKey.PREFERRED_TIMESTAMP: self._preferred_timestamp,
+            DataParticleKey.QUALITY_FLAG: self._quality_flag,
         }
 
-        if new_sequence is not None:
-            self.contents[DataParticleKey.NEW_SEQUENCE] = new_sequence
+        if self._new_sequence is not None:
+            result[DataParticleKey.NEW_SEQUENCE] = self._new_sequence
 
-        self.raw_data = raw_data
+        return result
+
+    def _get_contents(self):
+        if self._contents is None:
+            self._contents = self._header_dict()
+        return self._contents
+
+    def _set_contents(self, contents):
+        self._contents = contents
+
+    contents = property(_get_contents, _set_contents,
+                        doc="The particle header as a dictionary")
+
+    def _set_internal_timestamp_value(self, timestamp):
+        if self._contents is None:
+            self._internal_timestamp = timestamp
+        else:
+            self._contents[DataParticleKey.INTERNAL_TIMESTAMP] = timestamp
 
     @classmethod
     def type(cls):
@@ -128,7 +233,7 @@ class DataParticle(object):
         #if(not self._check_timestamp(timestamp)):
         #    raise InstrumentParameterException("invalid timestamp")
 
-        self.contents[DataParticleKey.INTERNAL_TIMESTAMP] = float(timestamp)
+        self._set_internal_timestamp_value(float(timestamp))
 
     def set_value(self, id, value):
         """
@@ -139,7 +244,7 @@ class DataParticle(object):
         @raises ReadOnlyException If the parameter cannot be set
         """
         if (id == DataParticleKey.INTERNAL_TIMESTAMP) and (self._check_timestamp(value)):
-            self.contents[DataParticleKey.INTERNAL_TIMESTAMP] = value
+            self._set_internal_timestamp_value(value)
         else:
             raise ReadOnlyException("Parameter %s not able to be set to %s after object creation!" %
                                     (id, value))
@@ -151,7 +256,9 @@ class DataParticle(object):
         @raises NotImplementedException If there is an invalid id
         """
         if DataParticleKey.has(id):
-            return self.contents[id]
+            if self._contents is None:
+                return self._header_dict()[id]
+            return self._contents[id]
         else:
             raise NotImplementedException("Value %s not available in particle!", id)
         
@@ -208,9 +315,20 @@ class DataParticle(object):
            and driver timestamp
         @throws InstrumentDriverException If there is a problem with the inputs
         """
-        result = self.generate_dict()
-        json_result = json.dumps(result, sort_keys=sorted)
-        return json_result
+        return _ENCODERS[bool(sorted)].encode(self)
+
+    @staticmethod
+    def generate_batch(particles, sorted=False):
+        """
+        Generate JSON_parsed packets for a list of particles in one pass. The
+        result for each particle is the same as calling generate() on it.
+
+        @param particles The list of DataParticles to serialize
+        @param sorted Return sorted json dicts
+        @return A list of JSON strings in the same order as the particles
+        @throws InstrumentDriverException If there is a problem with the inputs
+        """
+        return _ENCODERS[bool(sorted)].encode_batch(particles)
         
     def _build_parsed_values(self):
         """
@@ -231,11 +349,14 @@ class DataParticle(object):
         
         @return A fresh copy of a core structure to be exported
         """
-        result = dict(self.contents)
+        if self._contents is None:
+            result = self._header_dict()
+        else:
+            result = dict(self._contents)
         # clean out optional fields that were missing
-        if not self.contents[DataParticleKey.PORT_TIMESTAMP]:
+        if not result[DataParticleKey.PORT_TIMESTAMP]:
             del result[DataParticleKey.PORT_TIMESTAMP]
-        if not self.contents[DataParticleKey.INTERNAL_TIMESTAMP]:
+        if not result[DataParticleKey.INTERNAL_TIMESTAMP]:
             del result[DataParticleKey.INTERNAL_TIMESTAMP]
         return result
     
@@ -266,9 +387,14 @@ class DataParticle(object):
         @throws SampleException When there is a problem with the preferred
             timestamp in the sample.
         """        
-        if self.contents[DataParticleKey.PREFERRED_TIMESTAMP] == None:
+        if self._contents is None:
+            preferred = self._preferred_timestamp
+        else:
+            preferred = self._contents[DataParticleKey.PREFERRED_TIMESTAMP]
+
+        if preferred == None:
             raise SampleException("Missing preferred timestamp, %s, in particle" %
-                                  self.contents[DataParticleKey.PREFERRED_TIMESTAMP])
+                                  preferred)
 
         # This should be handled downstream.  Don't want to not publish data because
         # the port agent stopped putting out timestamps
@@ -315,8 +441,9 @@ class RawDataParticle(DataParticle):
         checksum = None
 
         # Attempt to convert values
+        # Same as base64.b64encode without the extra call overhead
         try: 
-            payload = base64.b64encode(port_agent_packet.get("raw"))
+            payload = binascii.b2a_base64(port_agent_packet.get("raw"))[:-1]
         except TypeError:
             pass
 
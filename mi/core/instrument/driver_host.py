@@ -0,0 +1,602 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.driver_host
+@file mi/core/instrument/driver_host.py
+@brief Many instrument drivers in one process, sharing one event loop and
+one pair of ZMQ sockets.
+
+A ZmqDriverProcess runs one driver with a listener thread per port agent
+connection, a thread per heartbeat timer and two messaging threads.  A
+DriverHost runs any number of drivers:
+- port agent sockets, heartbeat timers and the command socket are all
+  watched by the process wide event loop thread, which only reads them;
+- each driver has a data thread that handles what its port agent sends,
+  chunking and building particles, so a slow driver can't hold up the
+  loop or the other drivers;
+- commands carry a driver_id and run on that driver's command thread,
+  one at a time, since driver commands block waiting for the instrument;
+- events go out on one PUB socket with the driver_id as the first frame,
+  so each client subscribes to its own driver.
+
+Messages without a driver_id are for the host: add_driver, remove_driver,
+list_drivers, stop_driver_process and process_echo.
+
+    (proc, cmd_port, evt_port) = DriverHost.launch_process()
+    host = DriverHostClient('localhost', cmd_port, evt_port)
+    host.start_messaging()
+    host.add_driver('ctd_1', 'mi.instrument.seabird.sbe37smb.ooicore.driver',
+                    'SBE37Driver')
+    client = ZmqDriverClient('localhost', cmd_port, evt_port, driver_id='ctd_1')
+"""
+
+__license__ = 'Apache 2.0'
+
+import os
+import time
+import uuid
+import signal
+import threading
+import functools
+import Queue
+
+import zmq
+
+from mi.core.exceptions import InstrumentCommandException
+from mi.core.exceptions import InstrumentParameterException
+from mi.core.event_loop import get_event_loop
+from mi.core.instrument.driver_process import DriverProcess
+from mi.core.instrument.zmq_driver_client import ZmqDriverClient
+from mi.core.instrument.port_agent_client import PortAgentClient
+from mi.core.instrument.port_agent_client import LoopPortAgentClient
+from mi.core.instrument import zmq_transport
+from mi.core.instrument.zmq_transport import EventEncoding
+from mi.core.instrument.zmq_transport import EVENT_BATCH_SIZE
+from mi.core.instrument.zmq_transport import SEND_RETRY_DELAY
+from mi.core.instrument.zmq_transport import SEND_RETRY_MAX_DELAY
+from mi.core.metrics import Metrics
+from mi.core.metrics import bound_metrics
+from mi.core.log import get_logger ; log = get_logger()
+
+class DriverWorker(object):
+    """
+    A thread running the calls handed to it one at a time, in order, with
+    a driver's metrics bound.
+    """
+
+    def __init__(self, name, metrics=None):
+        """
+        @param name Name of the thread.
+        @param metrics Metrics registry to record into, None for the
+            process wide one.
+        """
+        self.name = name
+        self.metrics = metrics
+        self._queue = Queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, callback, *args):
+        """
+        Queue a call, from any thread.
+        """
+        self._queue.put((callback, args))
+
+    def stop(self, discard=False):
+        """
+        Stop once the calls already queued are done.
+        @param discard True to drop the queued calls instead.
+        """
+        if discard:
+            with self._queue.mutex:
+                self._queue.queue.clear()
+        self._queue.put(None)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def in_worker_thread(self):
+        return threading.current_thread() is self._thread
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        with bound_metrics(self.metrics):
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                (callback, args) = item
+                try:
+                    callback(*args)
+                except Exception:
+                    log.error('%s: %s raised', self.name, callback, exc_info=True)
+
+class HostedDriver(DriverProcess):
+    """
+    One driver in a DriverHost.  The DriverProcess command handling and
+    event queue are used as they are; messaging belongs to the host.
+    """
+
+    def __init__(self, host, driver_id, driver_module, driver_class):
+        DriverProcess.__init__(self, driver_module, driver_class, None)
+        self.host = host
+        self.driver_id = driver_id
+        self.event_encoding = EventEncoding.PICKLE
+        self.metrics = Metrics()
+        self.retry_delay = SEND_RETRY_DELAY
+        self.retry_at = 0
+        self.command_worker = DriverWorker('%s-command' % driver_id, self.metrics)
+        self.data_worker = DriverWorker('%s-data' % driver_id, self.metrics)
+        self.messaging_started = True
+
+    def construct_driver(self):
+        """
+        Construct the driver and give it port agent clients that read on
+        the host event loop and handle data on the driver's data thread.
+        """
+        if not DriverProcess.construct_driver(self):
+            return False
+        if hasattr(self.driver, 'port_agent_factory'):
+            self.driver.port_agent_factory = functools.partial(LoopPortAgentClient,
+                                                               self.host.loop,
+                                                               metrics=self.metrics,
+                                                               worker=self.data_worker)
+        self.command_worker.start()
+        self.data_worker.start()
+        return True
+
+    def cmd_driver(self, msg):
+        """
+        As DriverProcess.cmd_driver, plus 'negotiate_event_encoding' to
+        pick the serialization of this driver's events.
+        """
+        if msg.get('cmd', None) == 'negotiate_event_encoding':
+            offered = msg.get('kwargs', {}).get('encodings', None)
+            self.event_encoding = zmq_transport.choose_encoding(offered)
+            return self.event_encoding
+
+        return DriverProcess.cmd_driver(self, msg)
+
+    def send_event(self, evt):
+        """
+        Queue an event for the host to publish.  The driver's threads wait
+        when the queue is full; the loop thread is the one that empties it,
+        so it never waits.
+        """
+        loop = self.host.loop
+        self.events.put(evt, lambda: self.messaging_started and not loop.in_loop_thread())
+        self.host.events_ready(self)
+
+    def stop_messaging(self):
+        """
+        'stop_driver_process' sent to a hosted driver removes it from the
+        host.
+        """
+        self.messaging_started = False
+        self.events.wake()
+        self.host.loop.call_soon(self.host.remove_driver, self.driver_id)
+
+    def shutdown(self):
+        """
+        Stop the driver's threads, dropping work they haven't started, cancel
+        its scheduled jobs and close its port agent connection, if it has one.
+        """
+        self.command_worker.stop(discard=True)
+        self.data_worker.stop(discard=True)
+        scheduler = getattr(getattr(self.driver, '_protocol', None), '_scheduler', None)
+        if scheduler:
+            scheduler.shutdown()
+        connection = getattr(self.driver, '_connection', None)
+        if isinstance(connection, PortAgentClient) and connection.sock:
+            try:
+                connection.stop_comms()
+            except Exception as e:
+                log.error('Driver %s failed to stop comms: %s', self.driver_id, e)
+        DriverProcess.shutdown(self)
+
+class DriverHost(object):
+    """
+    Process hosting many drivers; see the module documentation.
+    """
+
+    @classmethod
+    def launch_process(cls, workdir='/tmp/', ppid=None):
+        """
+        Launch a DriverHost as a separate OS process.
+        @param workdir The work directory the port files are written to.
+        @param ppid ID of the parent process; the host exits when it goes.
+        @retval Tuple containing (Popen object for the process, cmd port,
+            evt_port)
+        """
+        tag = str(uuid.uuid4())
+        cmd_port_fname = '%sdvr_host_cmd_port_%s.txt' % (workdir, tag)
+        evt_port_fname = '%sdvr_host_evt_port_%s.txt' % (workdir, tag)
+        cmd_str = 'from %s import %s; host = %s("%s", "%s", %s); host.run()' \
+            % (__name__, cls.__name__, cls.__name__, cmd_port_fname,
+               evt_port_fname, str(ppid))
+
+        host_proc = DriverProcess.launch_process(cmd_str)
+        return (host_proc, _read_port_file(cmd_port_fname), _read_port_file(evt_port_fname))
+
+    def __init__(self, cmd_port_fname=None, evt_port_fname=None, ppid=None,
+                 host_string='tcp://*'):
+        """
+        @param cmd_port_fname File to write the command port to, or None.
+        @param evt_port_fname File to write the event port to, or None.
+        @param ppid ID of the parent process; the host exits when it goes.
+        @param host_string Address the sockets bind to.
+        """
+        self.cmd_port_fname = cmd_port_fname
+        self.evt_port_fname = evt_port_fname
+        self.ppid = ppid
+        self.host_string = host_string
+        self.cmd_port = None
+        self.evt_port = None
+        self.loop = get_event_loop()
+        self.drivers = {}
+        self.messaging_started = False
+        # host commands record into the process wide metrics
+        self.command_worker = DriverWorker('DriverHostCommand')
+        self._context = None
+        self._cmd_sock = None
+        self._evt_sock = None
+        self._lock = threading.Lock()
+        self._ready = set()
+        self._publish_pending = False
+        self._stop_requested = False
+
+    ########################################################################
+    # Drivers.
+    ########################################################################
+
+    def add_driver(self, driver_id, driver_module, driver_class):
+        """
+        Import and construct a driver.
+        @retval driver_id
+        @raises InstrumentParameterException if the id is in use or the
+        driver can't be constructed.
+        """
+        if not isinstance(driver_id, basestring) or not driver_id:
+            raise InstrumentParameterException('Driver id must be a non empty string.')
+
+        hosted = HostedDriver(self, driver_id, driver_module, driver_class)
+        with self._lock:
+            if driver_id in self.drivers:
+                raise InstrumentParameterException('Driver id %s is in use.' % driver_id)
+            self.drivers[driver_id] = None
+
+        try:
+            constructed = hosted.construct_driver()
+        except Exception as e:
+            log.error('Driver %s raised constructing %s.%s', driver_id, driver_module,
+                      driver_class, exc_info=True)
+            constructed = False
+
+        with self._lock:
+            if not constructed:
+                del self.drivers[driver_id]
+                raise InstrumentParameterException('Could not construct driver %s.%s.' %
+                                                   (driver_module, driver_class))
+            self.drivers[driver_id] = hosted
+
+        log.info('Driver host added %s: %s.%s', driver_id, driver_module, driver_class)
+        return driver_id
+
+    def remove_driver(self, driver_id):
+        """
+        Shut down a driver and forget it.  Commands it hasn't started are
+        dropped.
+        @retval driver_id
+        @raises InstrumentParameterException for an unknown id.
+        """
+        with self._lock:
+            hosted = self.drivers.get(driver_id)
+            if hosted is None:
+                raise InstrumentParameterException('Unknown driver id %s.' % driver_id)
+            del self.drivers[driver_id]
+            self._ready.discard(hosted)
+
+        hosted.messaging_started = False
+        hosted.events.wake()
+        hosted.shutdown()
+        log.info('Driver host removed %s', driver_id)
+        return driver_id
+
+    def list_drivers(self):
+        """
+        @retval dict of driver id : (driver module, driver class).
+        """
+        with self._lock:
+            return dict([(driver_id, (hosted.driver_module, hosted.driver_class))
+                         for (driver_id, hosted) in self.drivers.items() if hosted])
+
+    def cmd_driver(self, msg):
+        """
+        Process a host command message.
+        @param msg A command message without a driver_id.
+        @retval The command result.
+        """
+        cmd = msg.get('cmd', None)
+        args = msg.get('args', None) or ()
+        kwargs = msg.get('kwargs', None) or {}
+        try:
+            if cmd == 'add_driver':
+                return self.add_driver(*args, **kwargs)
+            elif cmd == 'remove_driver':
+                return self.remove_driver(*args, **kwargs)
+            elif cmd == 'list_drivers':
+                return self.list_drivers()
+            elif cmd == 'stop_driver_process':
+                # stopped by the command thread once the reply is on its way
+                self._stop_requested = True
+                return 'stop_driver_process'
+            elif cmd == 'process_echo':
+                return 'ping from driver host ppid:%s, drivers:%s' % (
+                    str(self.ppid), sorted(self.list_drivers().keys()))
+        except TypeError as e:
+            return InstrumentParameterException('Bad %s arguments: %s' % (cmd, e))
+        except Exception as e:
+            return e
+
+        return InstrumentCommandException('Unknown driver host command.')
+
+    ########################################################################
+    # Messaging.
+    ########################################################################
+
+    def start_messaging(self):
+        """
+        Bind the command and event sockets, watch the command socket on the
+        event loop and start the host command thread.
+        """
+        self._context = zmq.Context()
+        self._cmd_sock = self._context.socket(zmq.ROUTER)
+        self.cmd_port = self._cmd_sock.bind_to_random_port(self.host_string)
+        self._evt_sock = self._context.socket(zmq.PUB)
+        self.evt_port = self._evt_sock.bind_to_random_port(self.host_string)
+        log.info('Driver host cmd socket bound to %i, event socket to %i',
+                 self.cmd_port, self.evt_port)
+
+        self.loop.add_reader(self._cmd_sock, self._recv_commands)
+        self.command_worker.start()
+        self.messaging_started = True
+
+        if self.cmd_port_fname:
+            file(self.cmd_port_fname, 'w+').write(str(self.cmd_port) + '\n')
+        if self.evt_port_fname:
+            file(self.evt_port_fname, 'w+').write(str(self.evt_port) + '\n')
+
+    def stop_messaging(self):
+        """
+        Remove every driver, stop the host command thread and close the
+        sockets.  The event loop is the process wide one and keeps running.
+        """
+        if not self.messaging_started:
+            return
+        self.messaging_started = False
+
+        for driver_id in self.drivers.keys():
+            try:
+                self.remove_driver(driver_id)
+            except Exception as e:
+                log.error('Driver host failed to remove %s: %s', driver_id, e)
+
+        self.command_worker.stop(discard=True)
+
+        closed = threading.Event()
+        self.loop.call_in_loop(self._close_sockets, closed)
+        if not self.loop.in_loop_thread():
+            closed.wait()
+        log.info('Driver host messaging stopped.')
+
+    def _close_sockets(self, closed):
+        try:
+            self.loop.remove_reader(self._cmd_sock)
+            self._cmd_sock.close(linger=0)
+            self._evt_sock.close(linger=0)
+            self._context.term()
+        finally:
+            closed.set()
+
+    def _recv_commands(self):
+        """
+        Loop callback for the command socket: hand every waiting request to
+        the command thread of its driver.
+        """
+        while True:
+            try:
+                frames = self._cmd_sock.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.ZMQError:
+                return
+
+            try:
+                (envelope, request_id, msg) = zmq_transport.split_request(frames)
+            except Exception as e:
+                log.error('Dropping malformed command message: %s', e)
+                continue
+
+            driver_id = msg.get('driver_id', None)
+            with self._lock:
+                if driver_id is None:
+                    target = self
+                else:
+                    target = self.drivers.get(driver_id)
+
+            if target is None:
+                self._send_reply(envelope, request_id,
+                                 InstrumentCommandException('Unknown driver id %s.' % driver_id))
+            else:
+                target.command_worker.submit(self._run_command, target,
+                                             envelope, request_id, msg)
+
+    def _run_command(self, target, envelope, request_id, msg):
+        """
+        Command thread: run a command for the host or one driver and send
+        the reply from the loop.
+        """
+        log.trace('Processing message %s', msg)
+        try:
+            reply = target.cmd_driver(msg)
+        except Exception as e:
+            log.error('Driver host command %s raised', msg.get('cmd'), exc_info=True)
+            reply = e
+        self.loop.call_soon(self._send_reply, envelope, request_id, reply)
+        if self._stop_requested:
+            self.loop.call_soon(self.stop_messaging)
+
+    def _send_reply(self, envelope, request_id, reply):
+        if isinstance(reply, Exception):
+            reply = zmq_transport.encode_exception(reply)
+        try:
+            self._cmd_sock.send_multipart(zmq_transport.reply_frames(envelope, request_id, reply))
+        except zmq.ZMQError as e:
+            log.error('Failed to send reply: %s', e)
+
+    def events_ready(self, hosted):
+        """
+        Called by a hosted driver that has queued events, from any thread.
+        """
+        with self._lock:
+            self._ready.add(hosted)
+            if self._publish_pending:
+                return
+            self._publish_pending = True
+        self.loop.call_soon(self._publish_events)
+
+    def _publish_events(self):
+        """
+        Loop callback publishing a batch of events from each driver with
+        events queued.  Drivers with more left are done again on the next
+        pass, so a busy driver can't hold up the others.
+        """
+        with self._lock:
+            ready = self._ready
+            self._ready = set()
+            self._publish_pending = False
+
+        never_wait = lambda: True
+        for hosted in ready:
+            if hosted.retry_at > time.time():
+                # a failed send is waiting to be retried
+                continue
+            evts = hosted.events.get(EVENT_BATCH_SIZE, never_wait)
+            if not evts:
+                continue
+
+            frames = [hosted.driver_id]
+            for evt in evts:
+                if isinstance(evt, Exception):
+                    evt = zmq_transport.encode_exception(evt)
+                frames.append(zmq_transport.encode(evt, hosted.event_encoding))
+
+            metrics = hosted.metrics
+            timed = metrics.enabled
+            if timed:
+                start = time.time()
+            try:
+                self._evt_sock.send_multipart(frames)
+            except zmq.ZMQError as e:
+                # Put the batch back and try this driver again after a
+                # pause, without holding up the others.
+                log.error('Driver host failed to send %d events for %s, retrying in %.1f s: %s',
+                          len(evts), hosted.driver_id, hosted.retry_delay, e)
+                hosted.events.requeue(evts)
+                if metrics.enabled:
+                    metrics.increment('driver_host.send_failures')
+                hosted.retry_at = time.time() + hosted.retry_delay
+                self.loop.call_later(hosted.retry_delay, self.events_ready, hosted)
+                hosted.retry_delay = min(hosted.retry_delay * 2, SEND_RETRY_MAX_DELAY)
+                continue
+
+            hosted.retry_delay = SEND_RETRY_DELAY
+            if timed:
+                metrics.observe('driver_host.send_time', time.time() - start)
+                metrics.increment('driver_host.events_sent', len(evts))
+
+            if len(hosted.events):
+                self.events_ready(hosted)
+
+    ########################################################################
+    # Process.
+    ########################################################################
+
+    def check_parent(self):
+        """
+        Test for existence of original parent process, if ppid specified.
+        """
+        if self.ppid:
+            try:
+                os.kill(self.ppid, 0)
+            except OSError:
+                log.info('Driver host COULD NOT DETECT PARENT.')
+                return False
+
+        return True
+
+    def run(self):
+        """
+        Process entry point.  Start messaging and wait until stopped or the
+        parent process goes away.
+        """
+        from mi.core.log import LoggerManager
+        LoggerManager()
+
+        log.info('Driver host started.')
+
+        def shand(signum, frame):
+            log.info('Driver host got SIGINT and is ignoring it...')
+        signal.signal(signal.SIGINT, shand)
+
+        self.start_messaging()
+        while self.messaging_started:
+            if self.check_parent():
+                time.sleep(2)
+            else:
+                self.stop_messaging()
+                break
+
+        time.sleep(1)
+        os._exit(0)
+
+class DriverHostClient(ZmqDriverClient):
+    """
+    Client for the host commands of a DriverHost.  Drivers in the host are
+    commanded with a ZmqDriverClient given their driver_id.
+    """
+
+    def start_messaging(self, evt_callback=None, encodings=None):
+        """
+        Connect the command socket.  The host itself has no events.
+        """
+        self._connect_cmd_socket()
+
+    def add_driver(self, driver_id, driver_module, driver_class):
+        return self.cmd_dvr('add_driver', driver_id, driver_module, driver_class)
+
+    def remove_driver(self, driver_id):
+        return self.cmd_dvr('remove_driver', driver_id)
+
+    def list_drivers(self):
+        return self.cmd_dvr('list_drivers')
+
+    def stop_host(self):
+        return self.cmd_dvr('stop_driver_process')
+
+def _read_port_file(fname):
+    """
+    Wait for a launched process to write its port number to fname.
+    """
+    while True:
+        try:
+            port_file = file(fname, 'r')
+            port = int(port_file.read().strip())
+            port_file.close()
+            os.remove(fname)
+            return port
+        except (IOError, ValueError):
+            time.sleep(.1)
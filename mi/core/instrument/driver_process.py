@@ -21,9 +21,13 @@ import time
 import traceback
 from mi.core.exceptions import InstrumentException, InstrumentCommandException
 from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.event_queue import EventQueue
+from mi.core.metrics import get_metrics
 
 from ooi.logging import log
 
+metrics = get_metrics()
+
 class DriverProcess(object):
     """
     Base class for messaging enabled OS-level driver processes. Provides
@@ -56,7 +60,7 @@ class DriverProcess(object):
         self.driver_class = driver_class
         self.ppid = ppid
         self.driver = None
-        self.events = []
+        self.events = EventQueue()
         self.messaging_started = False
         
     def construct_driver(self):
@@ -129,6 +133,8 @@ class DriverProcess(object):
         not forwarded to the driver are:
         'stop_driver_process' - signal to close messaging and terminate.
         'test_events' - populate event queue with test data.
+        'configure_event_queue' - set the event queue max_size and policies.
+        'get_event_queue_stats' - event queue size, drop and coalesce counts.
         'process_echo' - echos the message back.
         If the command is not found in the driver, an echo message is
         replied to the client.
@@ -145,8 +151,17 @@ class DriverProcess(object):
             return'stop_driver_process'
         elif cmd == 'test_events':
             events = kwargs['events']
-            self.events += events
+            for evt in events:
+                self.send_event(evt)
             reply = 'test_events'
+        elif cmd == 'configure_event_queue':
+            try:
+                self.events.configure(**kwargs)
+                reply = self.events.stats()
+            except (TypeError, ValueError) as e:
+                reply = InstrumentCommandException('Bad event queue configuration: %s' % e)
+        elif cmd == 'get_event_queue_stats':
+            reply = self.events.stats()
         elif cmd == 'process_echo':
             reply = 'ping from resource ppid:%s, resource:%s' % (str(self.ppid), str(self.driver))
             #try:
@@ -155,6 +170,9 @@ class DriverProcess(object):
             #    msg = 'no message to echo'
             # reply = 'process_echo: %s' % msg
         elif cmd_func:
+            timed = metrics.enabled
+            if timed:
+                start = time.time()
             try:
                 reply = cmd_func(*args, **kwargs)
             except Exception as e:
@@ -170,6 +188,8 @@ class DriverProcess(object):
                 if not isinstance(e, InstrumentException):
                     trace = traceback.format_exc()
                     log.critical("Python error, Trace follows: \n%s" %trace)
+            if timed:
+                metrics.observe('driver_process.command_time.%s' % cmd, time.time() - start)
                 
                 
         else:
@@ -187,9 +207,40 @@ class DriverProcess(object):
             
     def send_event(self, evt):
         """
-        Append an event to the list to be sent by the event threaed.
+        Append an event to the queue to be sent by the event thread. When
+        the queue is full the event queue policies decide whether the event
+        replaces a pending one, sheds raw data, is dropped or waits for the
+        event thread; waiting only happens while messaging is running.
+        """
+        self.events.put(evt, lambda: self.messaging_started)
+
+    def get_events(self, max_count, stopped=None):
+        """
+        Block until events are queued, then remove and return up to
+        max_count of them in order.
+        @param max_count Largest number of events to return.
+        @param stopped Optional callable checked under the queue lock; when
+        it returns True the wait ends and an empty list may be returned.
+        Messaging implementations call wake_event_waiters after setting
+        their stop flag.
+        @retval list of events.
+        """
+        return self.events.get(max_count, stopped)
+
+    def requeue_events(self, evts):
+        """
+        Put events taken with get_events back at the front of the queue
+        after the messaging implementation failed to send them.
+        @param evts list of events in the order get_events returned them.
+        """
+        self.events.requeue(evts)
+
+    def wake_event_waiters(self):
+        """
+        Release threads blocked in get_events or send_event so they can see
+        a stop flag.
         """
-        self.events.append(evt)
+        self.events.wake()
             
     def run(self):
         """
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.event_queue
+@file mi/core/instrument/event_queue.py
+@brief Bounded queue for driver process events with per type overflow
+policies.
+"""
+
+__license__ = 'Apache 2.0'
+
+import re
+from collections import deque
+from threading import Lock
+from threading import Condition
+
+from mi.core.common import BaseEnum
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.data_particle import CommonDataParticleType
+from mi.core.metrics import get_metrics
+from mi.core.log import get_logger ; log = get_logger()
+
+metrics = get_metrics()
+
+DEFAULT_MAX_EVENTS = 10000
+
+# How long a blocked producer sleeps before checking whether the consumer
+# is still running.
+BLOCK_POLL_TIMEOUT = 1.0
+
+# Event kind for SAMPLE events carrying raw data particles, so they can be
+# given a different policy from science samples.
+RAW_SAMPLE = 'RAW_SAMPLE'
+
+RAW_STREAM_REGEX = re.compile(r'"stream_name":\s*"%s"' % CommonDataParticleType.RAW)
+
+class EventQueuePolicy(BaseEnum):
+    """
+    What to do with an event when the queue is full.
+    BLOCK - wait for the consumer to make room.
+    DROP_OLDEST - discard the oldest queued event of the same kind, or the
+        new event if none is queued.
+    COALESCE - replace the most recent queued event of the same kind.
+    """
+    BLOCK = 'BLOCK'
+    DROP_OLDEST = 'DROP_OLDEST'
+    COALESCE = 'COALESCE'
+
+DEFAULT_EVENT_POLICIES = {
+    RAW_SAMPLE: EventQueuePolicy.DROP_OLDEST,
+    DriverAsyncEvent.STATE_CHANGE: EventQueuePolicy.COALESCE,
+    DriverAsyncEvent.CONFIG_CHANGE: EventQueuePolicy.COALESCE,
+}
+
+def event_kind(evt):
+    """
+    Classify an event for the queue policies.
+    @param evt a driver event, usually a dict with type and value.
+    @retval RAW_SAMPLE for raw data particles, otherwise the event type,
+    or None for events that are not dicts.
+    """
+    if not isinstance(evt, dict):
+        return None
+
+    type = evt.get('type')
+    if type == DriverAsyncEvent.SAMPLE:
+        value = evt.get('value')
+        if isinstance(value, basestring):
+            if RAW_STREAM_REGEX.search(value):
+                return RAW_SAMPLE
+        elif isinstance(value, dict):
+            if value.get('stream_name') == CommonDataParticleType.RAW:
+                return RAW_SAMPLE
+    return type
+
+class _Entry(object):
+    __slots__ = ('event', 'kind', 'seq', 'live')
+
+    def __init__(self, event, kind, seq):
+        self.event = event
+        self.kind = kind
+        self.seq = seq
+        self.live = True
+
+class EventQueue(object):
+    """
+    FIFO of driver events between the driver and the messaging thread that
+    publishes them.  Below max_size every event is queued in order.  Once
+    the queue is full an incoming event is handled according to the policy
+    for its kind:
+    - COALESCE kinds replace the pending event of the same kind, which
+      only loses a value that was already out of date.
+    - otherwise the oldest queued event of a DROP_OLDEST kind is shed,
+      so raw data goes before anything else.
+    - if nothing could be shed a DROP_OLDEST event is dropped and any
+      other event waits for the consumer, pushing back on the port agent.
+
+    Dropped and replaced events are marked dead in place rather than
+    removed from the middle of the deque, and each kind with a DROP_OLDEST
+    or COALESCE policy keeps its own deque of queued entries, so finding
+    the event to drop is O(1).  Dead entries are skipped by get and
+    compacted away if they pile up.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_EVENTS, policies=None):
+        """
+        @param max_size maximum number of queued events, None for no limit.
+        @param policies dict of event kind : EventQueuePolicy, kinds not
+        listed BLOCK.  Defaults to DEFAULT_EVENT_POLICIES.
+        """
+        lock = Lock()
+        self._ready = Condition(lock)
+        self._space = Condition(lock)
+        self._entries = deque()
+        self._by_kind = {}
+        self._count = 0
+        self._seq = 0
+        self._requeue_seq = 0
+        self.max_size = max_size
+        self.policies = {}
+        self.configure(policies=DEFAULT_EVENT_POLICIES if policies is None else policies)
+        self.dropped = {}
+        self.coalesced = {}
+        self.blocked = {}
+
+    def __len__(self):
+        return self._count
+
+    def configure(self, max_size=None, policies=None):
+        """
+        Change the size limit and policies of a running queue.
+        @param max_size new maximum number of events, None to keep the
+        current limit.
+        @param policies dict of event kind : EventQueuePolicy to add or
+        change.
+        @raises ValueError for an unknown policy.
+        """
+        policies = policies or {}
+        for policy in policies.values():
+            if not EventQueuePolicy.has(policy):
+                raise ValueError("Unknown event queue policy: %s" % policy)
+
+        with self._space:
+            if max_size is not None:
+                self.max_size = max_size
+            for (kind, policy) in policies.items():
+                self.policies[kind] = policy
+                if policy == EventQueuePolicy.BLOCK:
+                    self._by_kind.pop(kind, None)
+                elif kind not in self._by_kind:
+                    self._by_kind[kind] = deque(
+                        [e for e in self._entries if e.live and e.kind == kind])
+            self._space.notify_all()
+
+    def stats(self):
+        """
+        @retval dict with the queue size, limit and the dropped, coalesced
+        and blocked counts by event kind.
+        """
+        with self._ready:
+            return {'size': self._count,
+                    'max_size': self.max_size,
+                    'dropped': dict(self.dropped),
+                    'coalesced': dict(self.coalesced),
+                    'blocked': dict(self.blocked)}
+
+    def put(self, evt, can_block=None):
+        """
+        Queue an event, applying the overflow policy if the queue is full.
+        @param evt the event.
+        @param can_block optional callable, while it returns True a BLOCK
+        event waits for room.  Without it the queue goes over its limit
+        rather than block.
+        @retval True if the event was queued, False if it was dropped.
+        """
+        kind = event_kind(evt)
+        with self._space:
+            if self._full():
+                policy = self.policies.get(kind, EventQueuePolicy.BLOCK)
+                made_room = (policy == EventQueuePolicy.COALESCE and self._coalesce(kind)) \
+                    or self._shed()
+                if made_room:
+                    pass
+                elif policy == EventQueuePolicy.DROP_OLDEST:
+                    self._count_event(self.dropped, 'dropped', kind)
+                    return False
+                elif can_block is not None:
+                    self._count_event(self.blocked, 'blocked', kind)
+                    while self._full() and can_block():
+                        self._space.wait(BLOCK_POLL_TIMEOUT)
+
+            self._seq += 1
+            entry = _Entry(evt, kind, self._seq)
+            self._entries.append(entry)
+            queued = self._by_kind.get(kind)
+            if queued is not None:
+                queued.append(entry)
+            self._count += 1
+            self._ready.notify()
+
+            if metrics.enabled:
+                metrics.observe('driver_process.queue_depth', self._count)
+        return True
+
+    def get(self, max_count, stopped=None):
+        """
+        Block until events are queued, then remove and return up to
+        max_count of them in order.
+        @param max_count Largest number of events to return.
+        @param stopped Optional callable checked under the queue lock; when
+        it returns True the wait ends and an empty list may be returned.
+        @retval list of events.
+        """
+        with self._ready:
+            while not self._count and not (stopped and stopped()):
+                self._ready.wait()
+
+            result = []
+            entries = self._entries
+            while entries and len(result) < max_count:
+                entry = entries.popleft()
+                if not entry.live:
+                    continue
+                if entry.kind in self._by_kind:
+                    self._by_kind[entry.kind].popleft()
+                result.append(entry.event)
+
+            self._count -= len(result)
+            if result:
+                self._space.notify_all()
+            return result
+
+    def requeue(self, evts):
+        """
+        Put events taken with get back at the front of the queue, ahead of
+        anything queued since.  They were already admitted so no overflow
+        policy applies; the queue can go over its limit until they are sent.
+        @param evts list of events in the order get returned them.
+        """
+        with self._ready:
+            for evt in reversed(evts):
+                kind = event_kind(evt)
+                self._requeue_seq -= 1
+                entry = _Entry(evt, kind, self._requeue_seq)
+                self._entries.appendleft(entry)
+                queued = self._by_kind.get(kind)
+                if queued is not None:
+                    queued.appendleft(entry)
+                self._count += 1
+            if evts:
+                self._ready.notify()
+
+    def wake(self):
+        """
+        Release threads blocked in get or put so they can see a stop flag.
+        """
+        with self._ready:
+            self._ready.notify_all()
+            self._space.notify_all()
+
+    def _full(self):
+        return self.max_size is not None and self._count >= self.max_size
+
+    def _kill(self, entry):
+        entry.live = False
+        entry.event = None
+        self._count -= 1
+        if len(self._entries) > 2 * max(self._count, self.max_size or 0, 1):
+            self._entries = deque([e for e in self._entries if e.live])
+
+    def _coalesce(self, kind):
+        """
+        Drop the most recent queued event of a kind.
+        @retval True if there was one.
+        """
+        queued = self._by_kind.get(kind)
+        if not queued:
+            return False
+        self._kill(queued.pop())
+        self._count_event(self.coalesced, 'coalesced', kind)
+        return True
+
+    def _shed(self):
+        """
+        Drop the oldest queued event of any DROP_OLDEST kind.
+        @retval True if one was dropped.
+        """
+        oldest = None
+        for (kind, queued) in self._by_kind.items():
+            if queued and self.policies.get(kind) == EventQueuePolicy.DROP_OLDEST:
+                if oldest is None or queued[0].seq < oldest.seq:
+                    oldest = queued[0]
+        if oldest is None:
+            return False
+
+        self._by_kind[oldest.kind].popleft()
+        self._kill(oldest)
+        self._count_event(self.dropped, 'dropped', oldest.kind)
+        return True
+
+    def _count_event(self, counts, name, kind):
+        counts[kind] = counts.get(kind, 0) + 1
+        if metrics.enabled:
+            metrics.increment('driver_process.%s.%s' % (name, kind))
+        log.trace("Event queue full, %s %s event", name, kind)
@@ -24,6 +24,8 @@ from mi.core.exceptions import InstrumentParameterException
 from mi.core.exceptions import InstrumentConnectionException
 from mi.core.instrument.instrument_fsm import InstrumentFSM, ThreadSafeFSM
 from mi.core.instrument.port_agent_client import PortAgentClient
+from mi.core.metrics import get_metrics
+from mi.core.metrics import current_metrics
 
 from mi.core.log import get_logger,LoggerManager
 log = get_logger()
@@ -355,6 +357,10 @@ class InstrumentDriver(object):
             'value' : None,
             'time' : time.time()
         }
+        metrics = get_metrics()
+        if metrics.enabled:
+            metrics.increment('driver.event.%s' % type)
+
         if type == DriverAsyncEvent.STATE_CHANGE:
             state = self.get_resource_state()
             event['value'] = state
@@ -386,6 +392,35 @@ class InstrumentDriver(object):
             self._send_event(event)
 
 
+    ########################################################################
+    # Metrics interface.
+    ########################################################################
+
+    def get_metrics(self, reset=False, *args, **kwargs):
+        """
+        Return the counters and histograms recorded for the driver, see
+        mi.core.metrics.  A hosted driver has a registry of its own, a
+        driver process shares the process wide one.
+        @param reset if true, zero the metrics after reading them.
+        @retval dict of metric snapshots.
+        """
+        metrics = current_metrics()
+        result = metrics.snapshot()
+        if reset:
+            metrics.reset()
+        return result
+
+    def enable_metrics(self, enabled=True, *args, **kwargs):
+        """
+        Turn metrics recording on or off for the driver.
+        @param enabled True to record metrics.
+        @retval the new enabled flag.
+        """
+        metrics = current_metrics()
+        metrics.enable(enabled)
+        log.info("Driver metrics %s", "enabled" if metrics.enabled else "disabled")
+        return metrics.enabled
+
     ########################################################################
     # Test interface.
     ########################################################################
@@ -426,6 +461,10 @@ class SingleConnectionInstrumentDriver(InstrumentDriver):
         # Exists in the connected state.
         self._connection = None
 
+        # Makes the port agent client from (addr, port, cmd_port).  A
+        # driver host replaces it to put the connection on its event loop.
+        self.port_agent_factory = PortAgentClient
+
         # The one and only instrument protocol.
         self._protocol = None
         
@@ -1051,7 +1090,7 @@ class SingleConnectionInstrumentDriver(InstrumentDriver):
             cmd_port = config.get('cmd_port')
 
             if isinstance(addr, str) and isinstance(port, int) and len(addr)>0:
-                return PortAgentClient(addr, port, cmd_port)
+                return self.port_agent_factory(addr, port, cmd_port)
             else:
                 raise InstrumentParameterException('Invalid comms config dict.')
 
@@ -10,6 +10,7 @@
 __author__ = 'Edward Hunter'
 __license__ = 'Apache 2.0'
 
+import time
 from threading import RLock
 
 from mi.core.exceptions import InstrumentStateException
@@ -20,6 +21,13 @@ log = get_logger()
 class InstrumentFSM(object):
     """
     Simple state mahcine for driver and agent classes.
+
+    State and event membership is checked against frozensets taken from
+    the enums, handlers are found in a per state transition table and the
+    events handled in each state are cached until a handler is added, so
+    dispatching an event costs a few dict lookups. The number of times each
+    event is handled and the time spent in its handlers are counted, see
+    get_event_stats.
     """
 
     def __init__(self, states, events, enter_event, exit_event):
@@ -40,6 +48,31 @@ class InstrumentFSM(object):
         self.enter_event = enter_event
         self.exit_event = exit_event
 
+        # state : {event : handler}
+        self._transitions = {}
+        # state : events handled, None until asked for
+        self._capabilities = {}
+        # event : [count, total seconds, max seconds]
+        self._event_stats = {}
+
+    def _get_states(self):
+        return self._states
+
+    def _set_states(self, states):
+        self._states = states
+        self._state_set = frozenset(states.list())
+
+    def _get_events(self):
+        return self._events
+
+    def _set_events(self, events):
+        self._events = events
+        self._event_set = frozenset(events.list())
+
+    # the enums can be replaced, keep the membership sets in step
+    states = property(_get_states, _set_states)
+    events = property(_get_events, _set_events)
+
     def get_current_state(self):
         """
         Return current state.
@@ -56,13 +89,15 @@ class InstrumentFSM(object):
         @retval True if successful, False otherwise.
         """
 
-        if not self.states.has(state):
+        if state not in self._state_set:
             return False
         
-        if not self.events.has(event):
+        if event not in self._event_set:
             return False
 
         self.state_handlers[(state,event)] = handler
+        self._transitions.setdefault(state, {})[event] = handler
+        self._capabilities = {}
         return True
         
     def start(self, state, *args, **kwargs):
@@ -76,11 +111,11 @@ class InstrumentFSM(object):
         @raises Any exception raised by the enter handler.
         """
 
-        if not self.states.has(state):
+        if state not in self._state_set:
             return False
                 
         self.current_state = state
-        handler = self.state_handlers.get((state, self.enter_event), None)
+        handler = self._transitions.get(state, {}).get(self.enter_event)
         if handler:
             handler(*args, **kwargs)
         return True
@@ -97,22 +132,31 @@ class InstrumentFSM(object):
         @raises Any exception raised by the handlers.
         """
 
-        next_state = None
-        result = None
+        if event not in self._event_set:
+            raise InstrumentStateException(str(event) + " was not handled by InstrumentFSM.on_event()")
+
+        handler = self._transitions.get(self.current_state, {}).get(event)
+        if not handler:
+            raise InstrumentStateException('Command (%s) not handled in current state (%s).' % (event, self.current_state))
 
-        if self.events.has(event):
-            handler = self.state_handlers.get((self.current_state, event), None)
-            if handler:
-                (next_state, result) = handler(*args, **kwargs)
+        start = time.time()
+        try:
+            (next_state, result) = handler(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            stats = self._event_stats.get(event)
+            if stats is None:
+                self._event_stats[event] = [1, elapsed, elapsed]
             else:
-                raise InstrumentStateException('Command (%s) not handled in current state (%s).' % (event, self.current_state))
-        else:
-            raise InstrumentStateException(str(event) + " was not handled by InstrumentFSM.on_event()")
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
 
-        if self.states.has(next_state):
+        if next_state in self._state_set:
             self._on_transition(next_state, *args, **kwargs)
         else:
-            log.debug("No next state'" + repr(next_state) + "', remaining in current_state.")
+            log.debug("No next state'%r', remaining in current_state.", next_state)
                 
         return result
             
@@ -126,12 +170,12 @@ class InstrumentFSM(object):
         @raises Any exception raised by the handlers.
         """
 
-        handler = self.state_handlers.get((self.current_state, self.exit_event), None)
+        handler = self._transitions.get(self.current_state, {}).get(self.exit_event)
         if handler:
             handler(*args, **kwargs)
         self.previous_state = self.current_state
         self.current_state = next_state
-        handler = self.state_handlers.get((self.current_state, self.enter_event), None)
+        handler = self._transitions.get(self.current_state, {}).get(self.enter_event)
         if handler:
             handler(*args, **kwargs)
 
@@ -141,25 +185,48 @@ class InstrumentFSM(object):
         @param current_state if true, return events handled in the current state only.
         @retval list of events handled.
         """
-        events = []
-        for (key, handler) in self.state_handlers.iteritems():
-            state = key[0]
-            event = key[1]
-            if not ((event == self.enter_event) or (event == self.exit_event)):
-                if current_state:
-                    if (self.current_state==state):
+        if current_state:
+            key = ('state', self.current_state)
+        else:
+            key = 'all'
+        events = self._capabilities.get(key)
+        if events is None:
+            events = []
+            if current_state:
+                handlers = [self._transitions.get(self.current_state, {})]
+            else:
+                handlers = self._transitions.values()
+            for state_handlers in handlers:
+                for event in state_handlers:
+                    if not ((event == self.enter_event) or (event == self.exit_event)):
                         if event not in events:
                             events.append(event)
-                else:
-                    if event not in events:
-                        events.append(event)
-        return events
+            self._capabilities[key] = events
+        return list(events)
+
+    def get_event_stats(self):
+        """
+        Return how often each event has been handled and the time spent in
+        its handlers, not counting state enter and exit handlers.
+        @retval dict of event : (count, total seconds, max seconds).
+        """
+        return dict([(event, tuple(stats)) for (event, stats) in self._event_stats.items()])
+
+    def reset_event_stats(self):
+        """
+        Clear the event counters.
+        """
+        self._event_stats = {}
 
 
 class ThreadSafeFSM(InstrumentFSM):
     """
     A FSM class that provides thread locking in on_event to
     prevent simultaneous thread reentry.
+
+    Handlers are still run one at a time, they share the protocol state.
+    An event that isn't one of the FSM events is rejected without taking
+    the lock, so it can't wait behind a long running handler.
     """
     
     def __init__(self, states, events, enter_event, exit_event):
@@ -172,21 +239,8 @@ class ThreadSafeFSM(InstrumentFSM):
     def on_event(self, event, *args, **kwargs):
         """
         """
-        
-        self._lock.acquire(True)
-        ex = None
-        
-        try:
-            result = super(ThreadSafeFSM, self).on_event(event, *args, **kwargs)
-        
-        except Exception as ex:
-            pass
-        
-        finally:
-            self._lock.release()
-        
-        if ex:
-            raise ex
-        
-        return result
-    
+        if event not in self._event_set:
+            raise InstrumentStateException(str(event) + " was not handled by InstrumentFSM.on_event()")
+
+        with self._lock:
+            return super(ThreadSafeFSM, self).on_event(event, *args, **kwargs)
@@ -19,8 +19,10 @@ import json
 from functools import partial
 
 from mi.core.log import get_logger ; log = get_logger()
+from mi.core.metrics import get_metrics ; metrics = get_metrics()
 
 from threading import Thread
+from threading import Condition
 
 from mi.core.instrument.protocol_param_dict import ParameterDictVisibility
 from mi.core.common import BaseEnum, InstErrorCode
@@ -38,6 +40,8 @@ from mi.core.instrument.instrument_driver import ResourceAgentEvent
 from mi.core.instrument.protocol_param_dict import ProtocolParameterDict
 from mi.core.instrument.protocol_cmd_dict import ProtocolCommandDict
 from mi.core.instrument.driver_dict import DriverDict
+from mi.core.instrument.response_buffer import ResponseBuffer
+from mi.core.instrument.response_buffer import DEFAULT_MAX_SIZE
 from mi.core.exceptions import InstrumentTimeoutException
 from mi.core.exceptions import InstrumentProtocolException
 from mi.core.exceptions import InstrumentParameterException
@@ -46,6 +50,7 @@ from mi.core.exceptions import InstrumentParameterExpirationException
 
 DEFAULT_CMD_TIMEOUT=20
 DEFAULT_WRITE_DELAY=0
+BUFFER_WAIT_INTERVAL=.1
 RE_PATTERN = type(re.compile(""))
 
 class InterfaceType(BaseEnum):
@@ -770,13 +775,15 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
     Base class for text-based command-response instruments.
     """
     
-    def __init__(self, prompts, newline, driver_event):
+    def __init__(self, prompts, newline, driver_event, buffer_size=DEFAULT_MAX_SIZE):
         """
         Constructor.
         @param prompts Enum class containing possible device prompts used for
         command response logic.
         @param newline The device newline.
         @driver_event The callback for asynchronous driver events.
+        @param buffer_size Maximum number of bytes held in the line and prompt
+        buffers, older data is dropped once the cap is reached.
         """
         
         # Construct superclass.
@@ -789,15 +796,19 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
         self._prompts = prompts
     
         # Line buffer for input from device.
-        self._linebuf = ''
-        
+        self._line_buffer = ResponseBuffer(buffer_size)
+
         # Short buffer to look for prompts from device in command-response
         # mode.
-        self._promptbuf = ''
-        
+        self._prompt_buffer = ResponseBuffer(buffer_size)
+
         # Lines of data awaiting further processing.
         self._datalines = []
 
+        # Signalled by add_to_buffer when new bytes arrive so response
+        # waiters block instead of polling the buffers.
+        self._buffer_condition = Condition()
+
         # Handlers to build commands.
         self._build_handlers = {}
 
@@ -806,6 +817,23 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
 
         self._last_data_receive_timestamp = None
 
+    def _get_linebuf(self):
+        return self._line_buffer.value
+
+    def _set_linebuf(self, value):
+        self._line_buffer.reset(value)
+
+    # Drivers read and assign the buffers as plain strings.
+    _linebuf = property(_get_linebuf, _set_linebuf)
+
+    def _get_promptbuf(self):
+        return self._prompt_buffer.value
+
+    def _set_promptbuf(self, value):
+        self._prompt_buffer.reset(value)
+
+    _promptbuf = property(_get_promptbuf, _set_promptbuf)
+
     def _get_prompts(self):
         """
         Return a list of prompts order from longest to shortest.  The
@@ -865,25 +893,17 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
                 prompt_list = expected_prompt
 
         log.debug('_get_response: timeout=%s, prompt_list=%s, expected_prompt=%s, response_regex=%s, promptbuf=%s',
-                  timeout, prompt_list, expected_prompt, response_regex, self._promptbuf)
-        while True:
-            if response_regex:
-                match = response_regex.search(self._linebuf)
-                if match:
-                    return match.groups()
-                else:
-                    time.sleep(.1)
-            else:
-                for item in prompt_list:
-                    index = self._promptbuf.find(item)
-                    if index >= 0:
-                        result = self._promptbuf[0:index+len(item)]
-                        return (item, result)
-                    else:
-                        time.sleep(.1)
+                  timeout, prompt_list, expected_prompt, response_regex, self._prompt_buffer)
+        if response_regex:
+            match = self._regex_matcher(response_regex)
+        else:
+            match = self._prompt_matcher(prompt_list)
 
-            if time.time() > starttime + timeout:
-                raise InstrumentTimeoutException("in InstrumentProtocol._get_response()")
+        result = self._wait_for_buffer(match, starttime + timeout)
+        if result is None:
+            raise InstrumentTimeoutException("in InstrumentProtocol._get_response()")
+
+        return result
 
     def _get_raw_response(self, timeout=10, expected_prompt=None):
         """
@@ -907,15 +927,26 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
             else:
                 prompt_list = expected_prompt
 
-        while True:
+        # Only the end of the buffer matters, fall back to the whole buffer
+        # if the window is all whitespace.
+        window_size = max([len(item) for item in prompt_list] or [0]) + 64
+
+        def match():
+            window = self._prompt_buffer.get(self._prompt_buffer.end - window_size)
+            tail = window.rstrip(strip_chars)
+            if not tail and len(window) == window_size:
+                tail = self._promptbuf.rstrip(strip_chars)
+
             for item in prompt_list:
-                if self._promptbuf.rstrip(strip_chars).endswith(item.rstrip(strip_chars)):
+                if tail.endswith(item.rstrip(strip_chars)):
                     return (item, self._linebuf)
-                else:
-                    time.sleep(.1)
+            return None
 
-            if time.time() > starttime + timeout:
-                raise InstrumentTimeoutException("in InstrumentProtocol._get_raw_response()")
+        result = self._wait_for_buffer(match, starttime + timeout)
+        if result is None:
+            raise InstrumentTimeoutException("in InstrumentProtocol._get_raw_response()")
+
+        return result
 
     def _do_cmd_resp(self, cmd, *args, **kwargs):
         """
@@ -965,8 +996,8 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
         prompt = self._wakeup(timeout)
         
         # Clear line and prompt buffers for result.
-        self._linebuf = ''
-        self._promptbuf = ''
+        self._line_buffer.consume()
+        self._prompt_buffer.consume()
 
         # Send command.
         log.debug('_do_cmd_resp: %s, timeout=%s, write_delay=%s, expected_prompt=%s, response_regex=%s',
@@ -1023,9 +1054,8 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
         prompt = self._wakeup(timeout)
 
         # Clear line and prompt buffers for result.
-
-        self._linebuf = ''
-        self._promptbuf = ''
+        self._line_buffer.consume()
+        self._prompt_buffer.consume()
 
         # Send command.
         log.debug('_do_cmd_no_resp: %s, timeout=%s' % (repr(cmd_line), timeout))
@@ -1076,7 +1106,13 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
             self._chunker.add_chunk(data, timestamp)
             (timestamp, chunk) = self._chunker.get_next_data()
             while(chunk):
+                timed = metrics.enabled
+                if timed:
+                    start = time.time()
                 self._got_chunk(chunk, timestamp)
+                if timed:
+                    metrics.increment('protocol.chunks')
+                    metrics.observe('protocol.chunk_time', time.time() - start)
                 (timestamp, chunk) = self._chunker.get_next_data()
 
     ########################################################################
@@ -1105,13 +1141,97 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
         Add a chunk of data to the internal data buffers
         @param data: bytes to add to the buffer
         '''
-        # Update the line and prompt buffers.
-        self._linebuf += data
-        self._promptbuf += data
-        self._last_data_timestamp = time.time()
+        # Update the line and prompt buffers and wake any response waiters.
+        with self._buffer_condition:
+            self._line_buffer.append(data)
+            self._prompt_buffer.append(data)
+            self._last_data_timestamp = time.time()
+            self._buffer_condition.notify_all()
+
+        log.debug("LINE BUF: %s", self._line_buffer)
+        log.debug("PROMPT BUF: %s", self._prompt_buffer)
+
+    def _wait_for_buffer(self, match, deadline):
+        """
+        Block until match finds what it is looking for in the line or
+        prompt buffer, or the deadline passes.  match is evaluated again
+        each time add_to_buffer signals new data, and at least every
+        BUFFER_WAIT_INTERVAL seconds for subclasses that fill the buffers
+        without going through add_to_buffer.
+        @param match callable returning None until the wait is satisfied.
+        @param deadline absolute time (time.time()) to give up at.
+        @retval the first value match returns that is not None, or None if
+        the deadline passed first.
+        """
+        with self._buffer_condition:
+            while True:
+                result = match()
+                if result is not None:
+                    return result
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+
+                self._buffer_condition.wait(min(remaining, BUFFER_WAIT_INTERVAL))
+
+    def _prompt_matcher(self, prompt_list):
+        """
+        Build a match callable for _wait_for_buffer that looks for any of
+        the prompts in the prompt buffer.  Each call resumes from where the
+        previous one stopped, backed up far enough to catch a prompt split
+        across two reads, so a wait costs O(new bytes).  Prompts are tried
+        in list order so the first prompt in the list wins when several are
+        present.
+        @param prompt_list prompts to look for.
+        @retval callable returning (prompt, response up to and including
+        the prompt) or None.
+        """
+        buf = self._prompt_buffer
+        overlap = max([len(item) for item in prompt_list] or [1]) - 1
+        cursor = [buf.generation, buf.start]
+
+        def match():
+            if cursor[0] != buf.generation:
+                # Buffer was replaced underneath us, start over.
+                cursor[0] = buf.generation
+                cursor[1] = buf.start
+            start = cursor[1] - overlap
+
+            for item in prompt_list:
+                index = buf.find(item, start)
+                if index >= 0:
+                    return (item, buf.get(None, index+len(item)))
+
+            cursor[1] = buf.end
+            return None
 
-        log.debug("LINE BUF: %s", self._linebuf)
-        log.debug("PROMPT BUF: %s", self._promptbuf)
+        return match
+
+    def _regex_matcher(self, response_regex):
+        """
+        Build a match callable for _wait_for_buffer that searches the line
+        buffer with a compiled regex.  Response regexes are often DOTALL and
+        may match across anything in the buffer, so each search covers the
+        whole (capped) buffer, but it is skipped when nothing has been added
+        since the last search.
+        @param response_regex compiled regex to search for.
+        @retval callable returning the match groups or None.
+        """
+        buf = self._line_buffer
+        searched = [None, None]
+
+        def match():
+            if searched == [buf.generation, buf.end]:
+                return None
+            searched[:] = [buf.generation, buf.end]
+
+            result = buf.search(response_regex)
+            if result:
+                return result.groups()
+            return None
+
+        return match
 
     ########################################################################
     # Wakeup helpers.
@@ -1132,29 +1252,26 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
         @throw InstrumentTimeoutException if the device could not be woken.
         """
         # Clear the prompt buffer.
-        log.debug("clearing promptbuf: %s", self._promptbuf)
-        self._promptbuf = ''
+        log.debug("clearing promptbuf: %s", self._prompt_buffer)
+        self._prompt_buffer.consume()
         
         # Grab time for timeout.
         starttime = time.time()
-        
+
+        prompts = self._get_prompts()
+        log.debug("Prompts: %s", prompts)
+        match = self._prompt_matcher(prompts)
+
         while True:
-            # Send a line return and wait a sec.
+            # Send a line return and wait up to a sec for a prompt.
             log.trace('Sending wakeup. timeout=%s', timeout)
             self._send_wakeup()
-            time.sleep(delay)
-
-            log.debug("Prompts: %s", self._get_prompts())
 
-            for item in self._get_prompts():
-                log.debug("buffer: %s", self._promptbuf)
-                log.debug("find prompt: %s", item)
-                index = self._promptbuf.find(item)
-                log.debug("Got prompt (index: %s): %s ", index, repr(self._promptbuf))
-                if index >= 0:
-                    log.trace('wakeup got prompt: %s', repr(item))
-                    return item
-            log.debug("Searched for all prompts")
+            result = self._wait_for_buffer(match, time.time() + delay)
+            if result is not None:
+                log.trace('wakeup got prompt: %s', repr(result[0]))
+                return result[0]
+            log.debug("Searched for all prompts, buffer: %s", self._prompt_buffer)
 
             if time.time() > starttime + timeout:
                 raise InstrumentTimeoutException("in _wakeup()")
@@ -1300,11 +1417,13 @@ class MenuInstrumentProtocol(CommandResponseInstrumentProtocol):
         @param driver_event The callback for asynchronous driver events.
         @param read_delay optional kwarg specifying amount of time to delay before
                attempting to read response from instrument (in _get_response).
+        @param buffer_size optional kwarg capping the line and prompt buffers.
 
         """
         
         # Construct superclass.
-        CommandResponseInstrumentProtocol.__init__(self, prompts, newline, driver_event)
+        CommandResponseInstrumentProtocol.__init__(self, prompts, newline, driver_event,
+                                                   kwargs.get('buffer_size', DEFAULT_MAX_SIZE))
         self._menu = menu
 
         # The end of line delimiter.                
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.pd0
+@file mi/core/instrument/pd0.py
+@brief Numpy decoding shared by the Teledyne PD0 ensemble particles, used by
+    both the workhorse drivers and the ADCPA dataset parser.
+"""
+
+__license__ = 'Apache 2.0'
+
+from struct import unpack_from
+
+import numpy as np
+
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.exceptions import SampleException
+from mi.core.instrument.chunker import LengthPrefixedFramer
+
+# Number of beams in each row of a per cell data type.
+BEAMS = 4
+
+# Every ensemble starts with the header id and data source id.
+SYNC = '\x7f\x7f'
+
+# The header is the sync word, the length, a spare byte and the number of
+# data types; the length covers everything but the trailing checksum.
+HEADER_SIZE = 6
+CHECKSUM_SIZE = 2
+
+_BYTE_ORDERS = {'<': '<', '>': '>', '!': '>'}
+
+_FIELD_TYPES = {
+    'b': 'i1', 'B': 'u1',
+    'h': 'i2', 'H': 'u2',
+    'i': 'i4', 'I': 'u4',
+    'l': 'i4', 'L': 'u4',
+    'q': 'i8', 'Q': 'u8',
+}
+
+def record_dtype(fmt, names):
+    """
+    Build a packed structured dtype laid out like a struct format string, so
+    a leader can be read in one call with named fields.
+    @param fmt struct format with an explicit byte order and one character
+    per field, i.e. '<HHBB'.
+    @param names field names, one per format character.
+    @retval numpy dtype
+    @raise ValueError if the format cannot be represented.
+    """
+    order = _BYTE_ORDERS.get(fmt[:1])
+    if order is None:
+        raise ValueError("format %r needs an explicit byte order" % fmt)
+
+    codes = fmt[1:]
+    if len(codes) != len(names):
+        raise ValueError("format %r has %d fields, %d names given" % (fmt, len(codes), len(names)))
+
+    fields = []
+    for (code, name) in zip(codes, names):
+        if code not in _FIELD_TYPES:
+            raise ValueError("unsupported format character %r in %r" % (code, fmt))
+        fields.append((name, order + _FIELD_TYPES[code]))
+
+    return np.dtype(fields)
+
+def unpack_record(dtype, data, offset=0):
+    """
+    Read one record of a structured dtype.
+    @param dtype dtype from record_dtype.
+    @param data string holding the record.
+    @param offset byte offset of the record in data.
+    @retval tuple of python values in field order, like struct.unpack.
+    @raise SampleException if data is too short.
+    """
+    if len(data) < offset + dtype.itemsize:
+        raise SampleException("%d bytes is too short for a %d byte record" %
+                              (len(data) - offset, dtype.itemsize))
+    return np.frombuffer(data, dtype, count=1, offset=offset)[0].item()
+
+def checksum(data, length, offset=0):
+    """
+    PD0 checksum, the sum of the first length bytes modulo 65536.
+    @param data ensemble string.
+    @param length number of bytes covered, the ensemble length field.
+    @param offset byte offset of the ensemble in data.
+    @retval checksum as an int.
+    @raise SampleException if data is shorter than length.
+    """
+    if len(data) < offset + length:
+        raise SampleException("ensemble has %d bytes, expected %d" % (len(data) - offset, length))
+    return int(np.frombuffer(data, np.uint8, count=length, offset=offset).sum()) & 0xFFFF
+
+def valid_ensemble(data, start, end):
+    """
+    Framer checksum test for the ensemble in data[start:end].
+    """
+    length = end - start - CHECKSUM_SIZE
+    return checksum(data, length, start) == unpack_from('<H', data, start + length)[0]
+
+# Sieve for whole, checksummed ensembles in a stream.
+ENSEMBLE_FRAMER = LengthPrefixedFramer(SYNC, 2, '<H', length_extra=CHECKSUM_SIZE,
+                                       checksum=valid_ensemble,
+                                       min_size=HEADER_SIZE + CHECKSUM_SIZE)
+
+def cell_array(chunk, dtype, rows, offset=2):
+    """
+    Decode the per cell values of a velocity, correlation, echo intensity or
+    percent good data type.
+    @param chunk data type string.
+    @param dtype dtype of each value, i.e. '<i2' or 'u1'.
+    @param rows number of cells to decode.
+    @param offset byte offset of the first cell, after the data type id.
+    @retval list of BEAMS lists, one per beam, each with a value per cell.
+    """
+    if rows <= 0:
+        return [[] for beam in range(BEAMS)]
+
+    values = np.frombuffer(chunk, dtype, count=rows * BEAMS, offset=offset)
+    return values.reshape(rows, BEAMS).T.tolist()
+
+# Leader layouts of the ensembles the workhorse instruments send, in the
+# order the driver particles unpack the fields.
+FIXED_LEADER = record_dtype('!HBBHbBBBHHHBBBBHBBBBhhBBHHBBBBHQHBBIB', [
+    'fixed_leader_id', 'firmware_version', 'firmware_revision', 'sysconfig_frequency',
+    'data_flag', 'lag_length', 'num_beams', 'num_cells', 'pings_per_ensemble',
+    'depth_cell_length', 'blank_after_transmit', 'signal_processing_mode',
+    'low_corr_threshold', 'num_code_repetitions', 'percent_good_min',
+    'error_vel_threshold', 'time_per_ping_minutes', 'time_per_ping_seconds',
+    'time_per_ping_hundredths', 'coord_transform_type', 'heading_alignment',
+    'heading_bias', 'sensor_source', 'sensor_available', 'bin_1_distance',
+    'transmit_pulse_length', 'reference_layer_start', 'reference_layer_stop',
+    'false_target_threshold', 'low_latency_trigger', 'transmit_lag_distance',
+    'cpu_board_serial_number', 'system_bandwidth', 'system_power', 'spare',
+    'serial_number', 'beam_angle'])
+
+VARIABLE_LEADER = record_dtype('<HHBBBBBBBBBBHHHhhHhBBBBBBBBBBBBBBBBBBBBLBLBBBBBBBB', [
+    'variable_leader_id', 'ensemble_number', 'rtc_year', 'rtc_month', 'rtc_day',
+    'rtc_hour', 'rtc_minute', 'rtc_second', 'rtc_hundredths',
+    'ensemble_number_increment', 'error_bit_field', 'reserved_error_bit_field',
+    'speed_of_sound', 'transducer_depth', 'heading', 'pitch', 'roll', 'salinity',
+    'temperature', 'mpt_minutes', 'mpt_seconds_component', 'mpt_hundredths_component',
+    'heading_stdev', 'pitch_stdev', 'roll_stdev', 'adc_transmit_current',
+    'adc_transmit_voltage', 'adc_ambient_temp', 'adc_pressure_plus',
+    'adc_pressure_minus', 'adc_attitude_temp', 'adc_attitiude',
+    'adc_contamination_sensor', 'error_status_word_1', 'error_status_word_2',
+    'error_status_word_3', 'error_status_word_4', 'reserved1', 'reserved2',
+    'pressure', 'reserved3', 'pressure_variance', 'rtc2k_century', 'rtc2k_year',
+    'rtc2k_month', 'rtc2k_day', 'rtc2k_hour', 'rtc2k_minute', 'rtc2k_second',
+    'rtc2k_hundredths'])
+
+# Cell values are read as big endian unsigned shorts.
+CELL_DTYPE = '>u2'
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.port_agent_batch
+@file mi/core/instrument/port_agent_batch.py
+@brief Regenerate particles from archived port agent logs, in parallel.
+
+Log files are split into shards at record boundaries and each shard is run
+through its own copy of the driver protocol in a process pool.  The
+particles are merged back into timestamp order:
+
+    batch = PortAgentBatch('mi.instrument.seabird.sbe37smb.ooicore.driver')
+    result = batch.run(['port_agent_4001.20140101.data'], 'particles.json')
+
+A shard starts its protocol overlap bytes early so a chunk that spans the
+shard boundary is already in the chunker when the shard proper begins.
+Chunks completed during that lead in belong to the previous shard and are
+discarded.  The result matches a serial replay as long as no chunk spans
+more than overlap bytes of log.
+"""
+
+__license__ = 'Apache 2.0'
+
+import os
+import sys
+import time
+import heapq
+import shutil
+import tempfile
+import importlib
+import multiprocessing
+
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.instrument_driver import DriverProtocolState
+from mi.core.instrument.port_agent_replay import PortAgentReplay
+from mi.core.instrument.port_agent_replay import PortAgentLogReader
+from mi.core.instrument.port_agent_replay import find_packet_boundary
+from mi.core.instrument.port_agent_replay import packet_time
+from mi.core.log import get_logger ; log = get_logger()
+
+# Bytes of log each shard replays before its start to rebuild the
+# chunker state, larger than any chunk an instrument is likely to send.
+DEFAULT_OVERLAP = 256 * 1024
+
+# Shards are sized to give each process several, so a slow shard doesn't
+# hold up the run, but not smaller than this.
+MIN_SHARD_SIZE = 1024 * 1024
+SHARDS_PER_PROCESS = 4
+
+def _threads_patched():
+    """
+    @retval True if gevent has patched threads.  That needs gevent.monkey
+    loaded, so it isn't imported here.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('thread')
+
+class Shard(object):
+    """
+    A byte range of a log file for one worker.  Records starting in
+    [lead_start, start) prime the protocol, records starting in [start,
+    end) produce particles.
+    """
+
+    def __init__(self, index, filename, lead_start, start, end):
+        self.index = index
+        self.filename = filename
+        self.lead_start = lead_start
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return "Shard(%d, %r, %d, %d, %r)" % (self.index, self.filename,
+                                             self.lead_start, self.start, self.end)
+
+def plan_shards(filenames, shard_size, overlap=DEFAULT_OVERLAP):
+    """
+    Split log files into shards of about shard_size bytes, starting each
+    on a record boundary.
+    @param filenames port agent log files, in order.
+    @param shard_size bytes per shard.
+    @param overlap bytes of lead in before each shard.
+    @retval list of Shard, in file order.
+    """
+    shards = []
+    for filename in filenames:
+        size = os.path.getsize(filename)
+        count = max(1, (size + shard_size - 1) // shard_size)
+        with open(filename, 'rb') as log_file:
+            starts = [0]
+            for i in xrange(1, count):
+                boundary = find_packet_boundary(log_file, max(i * size // count, starts[-1] + 1))
+                if boundary is None:
+                    break
+                starts.append(boundary)
+
+            for (i, start) in enumerate(starts):
+                end = starts[i + 1] if i + 1 < len(starts) else None
+                lead_start = start
+                if start and overlap:
+                    lead_start = find_packet_boundary(log_file, max(0, start - overlap))
+                shards.append(Shard(len(shards), filename, lead_start, start, end))
+    return shards
+
+def process_shard(driver_module, driver_class, protocol_state, raw, shard, output):
+    """
+    Replay a shard through a new driver and write its particles to a file,
+    one per line as "time<TAB>particle", time being the recorded time of
+    the packet that completed the particle.
+    @retval dict of packet, byte, particle, event and error counts.
+    """
+    module = importlib.import_module(driver_module)
+    replay = PortAgentReplay(getattr(module, driver_class), protocol_state, raw)
+    port_agent = replay.port_agent
+    result = {'packets': 0, 'lead_packets': 0, 'bytes': 0, 'particles': 0,
+              'events': 0, 'errors': 0}
+
+    def deliver(packet):
+        try:
+            port_agent.deliver(packet, raw)
+        except Exception as e:
+            result['errors'] += 1
+            log.error("Shard %d packet at %.6f raised %s: %s", shard.index,
+                      packet_time(packet), e.__class__.__name__, e)
+
+    start = time.time()
+    for packet in PortAgentLogReader(shard.filename, start=shard.lead_start, end=shard.start):
+        result['lead_packets'] += 1
+        deliver(packet)
+
+    replay.keep_events = True
+    with open(output, 'wb') as out:
+        for packet in PortAgentLogReader(shard.filename, start=shard.start, end=shard.end):
+            result['packets'] += 1
+            result['bytes'] += packet.get_data_length()
+            del replay.events[:]
+            deliver(packet)
+            if not replay.events:
+                continue
+
+            recorded = repr(packet_time(packet))
+            for evt in replay.events:
+                result['events'] += 1
+                if evt.get('type') == DriverAsyncEvent.SAMPLE:
+                    result['particles'] += 1
+                    out.write("%s\t%s\n" % (recorded, evt['value']))
+
+    result['elapsed'] = time.time() - start
+    return result
+
+def _process_shard(args):
+    """
+    Pool entry point, unpacking process_shard arguments.
+    """
+    return process_shard(*args)
+
+def _read_particles(shard_index, filename):
+    """
+    Generate the sort keys and particles from a shard output file.
+    """
+    with open(filename, 'rb') as particles:
+        for (seq, line) in enumerate(particles):
+            (recorded, particle) = line.rstrip('\n').split('\t', 1)
+            yield (float(recorded), shard_index, seq, particle)
+
+class PortAgentBatch(object):
+    """
+    Regenerate particles from port agent logs using a process pool.  The
+    driver is named by module and class so the workers can import it.
+    """
+
+    def __init__(self, driver_module, driver_class='InstrumentDriver',
+                 protocol_state=DriverProtocolState.AUTOSAMPLE, raw=False,
+                 processes=None, shard_size=None, overlap=DEFAULT_OVERLAP):
+        """
+        @param driver_module driver module name.
+        @param driver_class driver class in the module.
+        @param protocol_state the state to force each protocol into.
+        @param raw produce raw particles as well.
+        @param processes size of the pool, default the number of cores.
+        One process runs the shards in this process.
+        @param shard_size bytes per shard, by default the logs are split into
+        SHARDS_PER_PROCESS shards per process.
+        @param overlap bytes of lead in before each shard.
+        """
+        self.driver_module = driver_module
+        self.driver_class = driver_class
+        self.protocol_state = protocol_state
+        self.raw = raw
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shard_size = shard_size
+        self.overlap = overlap
+
+    def shards(self, filenames):
+        """
+        @retval the shards the files will be split into.
+        """
+        shard_size = self.shard_size
+        if not shard_size:
+            total = sum([os.path.getsize(f) for f in filenames])
+            shard_size = max(MIN_SHARD_SIZE, total // (self.processes * SHARDS_PER_PROCESS) + 1)
+        return plan_shards(filenames, shard_size, self.overlap)
+
+    def run(self, filenames, output, work_dir=None):
+        """
+        Regenerate the particles in the log files.
+        @param filenames port agent log files.
+        @param output file name or file object the particles are written
+        to, one JSON particle per line in timestamp order.
+        @param work_dir directory for the intermediate shard files.
+        @retval dict with the totals of the shard results, the number of
+        shards, whether they ran in a process pool and the elapsed time.
+        """
+        start = time.time()
+        shards = self.shards(filenames)
+        temp_dir = tempfile.mkdtemp(prefix='port_agent_batch', dir=work_dir)
+        try:
+            tasks = [(self.driver_module, self.driver_class, self.protocol_state, self.raw,
+                      shard, os.path.join(temp_dir, 'shard_%d' % shard.index))
+                     for shard in shards]
+
+            parallel = self.processes > 1 and len(tasks) > 1
+            if parallel and _threads_patched():
+                # the pool's result handler threads deadlock as greenlets
+                log.warning('Threads are patched by gevent; running shards in this process')
+                parallel = False
+
+            if parallel:
+                pool = multiprocessing.Pool(min(self.processes, len(tasks)))
+                try:
+                    results = pool.map(_process_shard, tasks, chunksize=1)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                results = [_process_shard(task) for task in tasks]
+            process_time = time.time() - start
+
+            merged = heapq.merge(*[_read_particles(shard.index, task[-1])
+                                   for (shard, task) in zip(shards, tasks)])
+            if isinstance(output, basestring):
+                with open(output, 'wb') as out:
+                    self._write(merged, out)
+            else:
+                self._write(merged, output)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        totals = {'shards': len(shards), 'parallel': parallel,
+                  'process_time': process_time, 'elapsed': time.time() - start}
+        for result in results:
+            for (name, value) in result.items():
+                if name != 'elapsed':
+                    totals[name] = totals.get(name, 0) + value
+        totals['shard_time'] = sum([r['elapsed'] for r in results])
+        return totals
+
+    def _write(self, merged, out):
+        for (recorded, shard_index, seq, particle) in merged:
+            out.write(particle)
+            out.write('\n')
@@ -12,6 +12,7 @@ __author__ = 'David Everett'
 __license__ = 'Apache 2.0'
 
 import socket
+import select
 import errno
 import threading
 import time
@@ -20,9 +21,17 @@ import struct
 import array
 import binascii
 import ctypes
+import operator
 import subprocess
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from mi.core.log import get_logger ; log = get_logger()
+from mi.core.metrics import get_metrics ; metrics = get_metrics()
+from mi.core.metrics import bound_metrics
+from mi.core.event_loop import get_event_loop
 from mi.core.exceptions import InstrumentConnectionException
 
 HEADER_SIZE = 16 # BBBBHHLL = 1 + 1 + 1 + 1 + 2 + 2 + 4 + 4 = 16
@@ -30,6 +39,7 @@ HEADER_SIZE = 16 # BBBBHHLL = 1 + 1 + 1 + 1 + 2 + 2 + 4 + 4 = 16
 
 OFFSET_P_CHECKSUM_LOW = 6
 OFFSET_P_CHECKSUM_HIGH = 7
+LENGTH_OFFSET = 4 # byte offset of the packet size in the header
 
 """
 Offsets into the unpacked header fields
@@ -62,12 +72,47 @@ MAX_SEND_ATTEMPTS = 15              # Max number of times we can get EAGAIN
 class SocketClosed(Exception): pass
 
 
-class PortAgentPacket():
+def xor_checksum(data):
+    """
+    XOR all of the bytes in a block of data together.  The bulk of the data
+    is folded 8 bytes at a time, with numpy when it is available and a
+    single struct unpack when it is not; only the last few bytes are handled
+    one at a time.
+    @param data a string or anything else supporting the buffer interface
+    @retval the 8 bit checksum
+    """
+    length = len(data)
+    words = length // 8
+    checksum = 0
+
+    if words:
+        if np is not None:
+            word = int(np.bitwise_xor.reduce(np.frombuffer(data, dtype=np.uint64, count=words)))
+        else:
+            word = reduce(operator.xor, struct.unpack_from('<%dQ' % words, data), 0)
+        word ^= word >> 32
+        word ^= word >> 16
+        word ^= word >> 8
+        checksum = word & 0xff
+
+    for byte in bytearray(data[words * 8:]):
+        checksum ^= byte
+
+    return checksum
+
+
+
+class PortAgentPacket(object):
     """
     An object that encapsulates the details packets that are sent to and
     received from the port agent.
     https://confluence.oceanobservatories.org/display/syseng/CIAD+MI+Port+Agent+Design
     """
+
+    # Packets can pile up in queues at high data rates, so don't give each
+    # one an instance dictionary.
+    __slots__ = ('__header', '__data', '__type', '__length', '__port_agent_timestamp',
+                 '__recv_checksum', '__checksum', '__isValid', '__verified')
     
     """
     Port Agent Packet Types
@@ -91,9 +136,11 @@ class PortAgentPacket():
         self.__recv_checksum  = None
         self.__checksum = None
         self.__isValid = False
+        self.__verified = False
 
     def unpack_header(self, header):
         self.__header = header
+        self.__verified = False
         #@TODO may want to switch from big endian to network order '!' instead of '>' note network order is big endian.
         # B = unsigned char size 1 bytes
         # H = unsigned short size 2 bytes
@@ -141,6 +188,7 @@ class PortAgentPacket():
             temp_header = ctypes.create_string_buffer(size)
             struct.pack_into(format, temp_header, 0, *variable_tuple)
             self.__header = temp_header.raw
+            self.__verified = False
             #print "here it is: ", binascii.hexlify(self.__header)
             
             """
@@ -163,32 +211,41 @@ class PortAgentPacket():
 
     def attach_data(self, data):
         self.__data = data
+        self.__verified = False
 
     def calculate_checksum(self):
+        """
+        XOR of the header, skipping the checksum field, and the data.
+        """
         checksum = 0
-        for i in range(HEADER_SIZE):
-            if i < OFFSET_P_CHECKSUM_LOW or i > OFFSET_P_CHECKSUM_HIGH:
-                checksum ^= struct.unpack_from('B', str(self.__header[i]))[0]
-                
-        for i in range(self.__length):
-            checksum ^= struct.unpack_from('B', str(self.__data[i]))[0]
-            
-        return checksum
-            
-                                
+        for byte in bytearray(self.__header[0:OFFSET_P_CHECKSUM_LOW]):
+            checksum ^= byte
+        for byte in bytearray(self.__header[OFFSET_P_CHECKSUM_HIGH + 1:HEADER_SIZE]):
+            checksum ^= byte
+
+        data = self.__data
+        if len(data) != self.__length:
+            data = data[0:self.__length]
+
+        return checksum ^ xor_checksum(data)
+
     def verify_checksum(self):
-        checksum = 0
-        for i in range(HEADER_SIZE):
-            if i < OFFSET_P_CHECKSUM_LOW or i > OFFSET_P_CHECKSUM_HIGH:
-                checksum ^= struct.unpack_from('B', self.__header[i])[0]
-                
-        for i in range(self.__length):
-            checksum ^= struct.unpack_from('B', self.__data[i])[0]
+        """
+        Compare the calculated checksum to the one in the header.  The result
+        is cached, so a packet handed to both the raw and data callbacks is
+        only checked once.
+        """
+        if self.__verified:
+            return
+
+        checksum = self.calculate_checksum()
             
         if checksum == self.__recv_checksum:
             self.__isValid = True
         else:
             self.__isValid = False
+
+        self.__verified = True
             
         #log.debug('checksum: %i.' %(checksum))
 
@@ -202,6 +259,7 @@ class PortAgentPacket():
         this is one of the hoops we jump through to do that.
         """
         self.__header = header
+        self.__verified = False
 
     def get_data(self):
         return self.__data
@@ -220,6 +278,7 @@ class PortAgentPacket():
 
     def set_data_length(self, length):
         self.__length = length
+        self.__verified = False
 
     def get_header_type(self):
         return self.__type
@@ -302,15 +361,7 @@ class PortAgentClient(object):
             # start the listener thread if instructed to
             ###
             if self.start_listener:
-                self.listener_thread = Listener(self.sock,  
-                                                self.recovery_attempts,
-                                                self.delim, self.heartbeat, 
-                                                self.max_missed_heartbeats, 
-                                                self.callback_data,
-                                                self.callback_raw,
-                                                self.listener_callback_error,
-                                                self.callback_error,
-                                                self.user_callback_error)
+                self.listener_thread = self._create_listener()
                 self.listener_thread.start()
 
             ###
@@ -348,6 +399,22 @@ class PortAgentClient(object):
             
             return returnCode
 
+    def _create_listener(self, listener_class = None):
+        """
+        @param listener_class Listener or a subclass.
+        @retval a listener for the current socket, not yet started.
+        """
+        listener_class = listener_class or Listener
+        return listener_class(self.sock,
+                              self.recovery_attempts,
+                              self.delim, self.heartbeat,
+                              self.max_missed_heartbeats,
+                              self.callback_data,
+                              self.callback_raw,
+                              self.listener_callback_error,
+                              self.callback_error,
+                              self.user_callback_error)
+
     def _create_connection(self):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.connect((self.host, self.port))
@@ -582,6 +649,8 @@ class Listener(threading.Thread):
     MAX_HEARTBEAT_INTERVAL = 20 # Max, for range checking parameter
     MAX_MISSED_HEARTBEATS = 5   # Max number we can miss 
     HEARTBEAT_FUDGE = 1         # Fudge factor to account for delayed heartbeat
+    RECV_BUFFER_SIZE = 65536    # Initial size of the receive buffer
+    SELECT_TIMEOUT = .5         # How often to check for shutdown when idle
 
     """
     A listener thread to monitor the client socket data incoming from
@@ -614,6 +683,7 @@ class Listener(threading.Thread):
         self.sock = sock
         self.recovery_attempt = recovery_attempt
         self._done = False
+        self._init_receive_buffer()
         self.linebuf = ''
         self.delim = delim
         self.heartbeat_timer = None
@@ -718,25 +788,47 @@ class Listener(threading.Thread):
         
     def start_heartbeat_timer(self):
         """
-        Note: the threading timer here is only run once.  The cancel
-        only applies if the function has yet run.  You can't reset
-        it and start it again, you have to instantiate a new one.
-        I don't like this; we need to implement a tread timer that 
-        stays up and can be reset and started many times.
+        Start the heartbeat watchdog, or push it back a full interval if
+        it is already running.  The watchdog is a LoopTimer that is reset
+        in place, so a heartbeat doesn't start a thread.
         """
+        if self._done:
+            return
         if self.heartbeat_timer:
-            self.heartbeat_timer.cancel()
+            self.heartbeat_timer.reset(self.heartbeat)
+        else:
+            self.heartbeat_timer = self._timer_loop().call_later(self.heartbeat,
+                                                                 self._heartbeat_missed)
+
+    def _timer_loop(self):
+        """
+        @retval the EventLoop running the heartbeat watchdog.
+        """
+        return get_event_loop()
+
+    def _heartbeat_missed(self):
+        """
+        Watchdog callback, on the shared event loop.  The last allowed miss
+        starts recovery, which can reconnect, so that goes to a thread of
+        its own rather than holding up every other timer.
+        """
+        if self._done:
+            return
+        if self.heartbeat_missed_count > 1:
+            self.heartbeat_timeout()
+        else:
+            recovery = threading.Thread(target=self.heartbeat_timeout)
+            recovery.daemon = True
+            recovery.start()
 
-        self.heartbeat_timer = threading.Timer(self.heartbeat, 
-                                            self.heartbeat_timeout)
-        self.heartbeat_timer.start()
-        
     def done(self):
         """
         Signal to the listener thread to end its processing loop and
         conclude.
         """
         self._done = True
+        if self.heartbeat_timer:
+            self.heartbeat_timer.cancel()
 
     def handle_packet(self, paPacket):
         packet_type = paPacket.get_header_type()
@@ -773,10 +865,8 @@ class Listener(threading.Thread):
 
     def run(self):
         """
-        Listener thread processing loop. Block on receive from port agent.
-        Receive HEADER_SIZE bytes to receive the entire header.  From that,
-        get the length of the whole packet (including header); compute the
-        length of the remaining data and read that.  
+        Listener thread processing loop. Block in select until the port agent
+        socket is readable, then read and hand off what has arrived.
         """
         self.thread_name = str(threading.current_thread().name)
         log.info('PortAgentClient listener thread: %s started.', self.thread_name)
@@ -785,90 +875,160 @@ class Listener(threading.Thread):
             self.start_heartbeat_timer()
 
         while not self._done:
-            try:
-                log.debug('RX NEW PACKET')
-                header = bytearray(HEADER_SIZE)
-                headerview = memoryview(header)
-                bytes_left = HEADER_SIZE
-                while bytes_left and not self._done:
-                    try:
-                        bytesrx = self.sock.recv_into(headerview[HEADER_SIZE - bytes_left:], bytes_left)
-                        log.debug('RX HEADER BYTES %d LEFT %d SOCK %r' % (
-                                                    bytesrx, bytes_left, self.sock,))
-                        if bytesrx <= 0:
-                            raise SocketClosed()
-                        bytes_left -= bytesrx
-                    except socket.error as e:
-                        if e.errno == errno.EWOULDBLOCK:
-                            time.sleep(.1)
-                        else:
-                            raise
-
-                """
-                Only do this if we've received the whole header, otherwise (ex. during shutdown)
-                we can have a completely invalid header, resulting in negative count exceptions.
-                """
-                if (bytes_left == 0):
-                    paPacket = PortAgentPacket()
-                    paPacket.unpack_header(str(header))
-                    data_size = paPacket.get_data_length()
-                    bytes_left = data_size
-                    data = bytearray(data_size)
-                    dataview = memoryview(data)
-                    log.debug('Expecting DATA BYTES %d' % data_size)
-                    
-                while bytes_left and not self._done:
-                    try:
-                        bytesrx = self.sock.recv_into(dataview[data_size - bytes_left:], bytes_left)
-                        log.debug('RX DATA BYTES %d LEFT %d SOCK %r' % (
-                                                    bytesrx, bytes_left, self.sock,))
-                        if bytesrx <= 0:
-                            raise SocketClosed()
-                        bytes_left -= bytesrx
-                    except socket.error as e:
-                        if e.errno == errno.EWOULDBLOCK:
-                            time.sleep(.1)
-                        else:
-                            raise
-
-                if not self._done:
-                    """
-                    Should have complete port agent packet.
-                    """
-                    paPacket.attach_data(str(data))
-                    log.debug("HANDLE PACKET")
+            self.read_available(self.SELECT_TIMEOUT)
+
+        log.info('Port_agent_client thread done listening; going away.')
+
+    def read_available(self, timeout = None):
+        """
+        Read as much as is available into a single reusable receive buffer
+        and hand off every complete packet in it.  Partial packets stay in
+        the buffer until the rest arrives.  A closed socket or socket error
+        is passed to the error callbacks and ends the listener.
+        @param timeout seconds to wait in select for the socket to become
+        readable, None if it is known to be readable.
+        """
+        try:
+            if not self._receive(timeout):
+                return
+
+            paPacket = self._next_packet()
+            while paPacket and not self._done:
+                timed = metrics.enabled
+                if timed:
+                    start = time.time()
+                try:
                     self.handle_packet(paPacket)
+                except Exception as e:
+                    self.default_callback_error(e)
+                if timed:
+                    metrics.increment('port_agent.packets')
+                    metrics.observe('port_agent.packet_time', time.time() - start)
+                paPacket = self._next_packet()
+
+        except SocketClosed:
+            errorString = 'Listener thread: %s SocketClosed exception from port_agent socket' \
+                % (self.thread_name) 
+            log.error(errorString)
+            self._invoke_error_callback(self.recovery_attempt, errorString)
+            """
+            This next statement causes the thread to exit.  This 
+            thread is done regardless of which condition exists 
+            above; it is the job of the callbacks to restart the
+            thread
+            """
+            self._done = True
 
-            except SocketClosed:
-                errorString = 'Listener thread: %s SocketClosed exception from port_agent socket' \
-                    % (self.thread_name) 
-                log.error(errorString)
-                self._invoke_error_callback(self.recovery_attempt, errorString)
-                """
-                This next statement causes the thread to exit.  This 
-                thread is done regardless of which condition exists 
-                above; it is the job of the callbacks to restart the
-                thread
-                """
-                self._done = True
-
-            except socket.error as e:
-                errorString = 'Listener thread: %s Socket error while receiving from port agent: %r' \
-                 % (self.thread_name, e)
-                log.error(errorString)
-                self._invoke_error_callback(self.recovery_attempt, errorString)
-                """
-                This next statement causes the thread to exit.  This 
-                thread is done regardless of which condition exists 
-                above; it is the job of the callbacks to restart the
-                thread
-                """
-                self._done = True
-
-            except Exception as e:
-                self.default_callback_error(e)
+        except (socket.error, select.error) as e:
+            errorString = 'Listener thread: %s Socket error while receiving from port agent: %r' \
+             % (self.thread_name, e)
+            log.error(errorString)
+            self._invoke_error_callback(self.recovery_attempt, errorString)
+            """
+            This next statement causes the thread to exit.  This 
+            thread is done regardless of which condition exists 
+            above; it is the job of the callbacks to restart the
+            thread
+            """
+            self._done = True
 
-        log.info('Port_agent_client thread done listening; going away.')
+        except Exception as e:
+            self.default_callback_error(e)
+
+    def _init_receive_buffer(self, size = None):
+        """
+        Allocate the receive buffer.  _buffer_start is the offset of the first
+        byte not yet handed off in a packet, _buffer_end is the offset after
+        the last byte received.
+        """
+        self._buffer = bytearray(size or self.RECV_BUFFER_SIZE)
+        self._bufview = memoryview(self._buffer)
+        self._buffer_start = 0
+        self._buffer_end = 0
+
+    def _make_room(self):
+        """
+        Make sure there is space at the end of the receive buffer.  Whatever
+        is left unread is a partial packet, so move it to the front of the
+        buffer, and grow the buffer if a single packet won't fit.
+        """
+        pending = self._buffer_end - self._buffer_start
+
+        if self._buffer_start:
+            self._buffer[0:pending] = self._bufview[self._buffer_start:self._buffer_end]
+            self._buffer_start = 0
+            self._buffer_end = pending
+
+        if pending == len(self._buffer):
+            old_view = self._bufview[0:pending]
+            self._init_receive_buffer(2 * len(self._buffer))
+            self._buffer[0:pending] = old_view
+            self._buffer_end = pending
+            log.debug('Receive buffer grown to %d bytes', len(self._buffer))
+
+    def _receive(self, timeout = None):
+        """
+        Wait up to timeout for data, then read as much as is available
+        into the receive buffer.
+        @param timeout seconds to wait in select, None to read without
+        waiting.
+        @retval number of bytes received, 0 if nothing was ready
+        @raise SocketClosed if the port agent closed the connection
+        """
+        if timeout is not None:
+            (readable, writable, errored) = select.select([self.sock], [], [], timeout)
+            if not readable:
+                return 0
+        if self._done:
+            return 0
+
+        self._make_room()
+        timed = metrics.enabled
+        if timed:
+            start = time.time()
+        try:
+            bytesrx = self.sock.recv_into(self._bufview[self._buffer_end:])
+        except socket.error as e:
+            if e.errno == errno.EWOULDBLOCK:
+                return 0
+            raise
+
+        if bytesrx <= 0:
+            raise SocketClosed()
+
+        if timed:
+            metrics.observe('port_agent.recv_time', time.time() - start)
+            metrics.increment('port_agent.bytes', bytesrx)
+        log.trace('RX BYTES %d SOCK %r', bytesrx, self.sock)
+        self._buffer_end += bytesrx
+        return bytesrx
+
+    def _next_packet(self):
+        """
+        Pull the next complete packet out of the receive buffer.  The header
+        and payload are copied straight out of the buffer; nothing else is
+        allocated.
+        @retval a PortAgentPacket, or None if no complete packet is buffered
+        """
+        start = self._buffer_start
+        if self._buffer_end - start < HEADER_SIZE:
+            return None
+
+        (packet_length,) = struct.unpack_from('>H', self._buffer, start + LENGTH_OFFSET)
+        packet_end = start + max(packet_length, HEADER_SIZE)
+        if packet_end > self._buffer_end:
+            return None
+
+        paPacket = PortAgentPacket()
+        paPacket.unpack_header(self._bufview[start:start + HEADER_SIZE].tobytes())
+        paPacket.attach_data(self._bufview[start + HEADER_SIZE:packet_end].tobytes())
+
+        if packet_end == self._buffer_end:
+            self._buffer_start = self._buffer_end = 0
+        else:
+            self._buffer_start = packet_end
+
+        return paPacket
 
     def _invoke_error_callback(self, recovery_attempt, error_string = "No error string passed."):
         """
@@ -889,3 +1049,126 @@ class Listener(threading.Thread):
         else:
             log.debug('port_agent_client listen thread calling user_callback_error.')
             self.user_callback_error(error_string)
+
+class LoopListener(Listener):
+    """
+    A Listener driven by an EventLoop instead of its own thread.  start
+    registers the socket with the loop, which calls read_available when
+    data arrives, and the heartbeat watchdog runs on the same loop.  Recovery
+    can reconnect, so it runs on a short lived thread rather than holding
+    up the loop.
+
+    Given a worker, anything with a submit(callback, *args) method, the
+    loop only reads and splits packets and the data callbacks run on the
+    worker.  Heartbeats are still handled on the loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        Listener.__init__(self, *args, **kwargs)
+        self.loop = None
+        self.metrics = None
+        self.worker = None
+        self._registered = False
+
+    def start(self):
+        self._registered = True
+        self.thread_name = 'event loop'
+        self.loop.add_reader(self.sock, self.read_available)
+        if self.heartbeat:
+            self.loop.call_in_loop(self.start_heartbeat_timer)
+
+    def is_alive(self):
+        return self._registered
+
+    def join(self, timeout = None):
+        pass
+
+    def done(self):
+        """
+        Stop watching the socket and cancel the heartbeat watchdog.
+        """
+        self._done = True
+        if self._registered:
+            self._registered = False
+            self.loop.remove_reader(self.sock)
+        if self.heartbeat_timer:
+            self.heartbeat_timer.cancel()
+
+    def read_available(self, timeout = None):
+        if self._done:
+            return
+        with bound_metrics(self.metrics):
+            Listener.read_available(self, timeout)
+
+    def handle_packet(self, paPacket):
+        if self.worker is None or paPacket.get_header_type() == PortAgentPacket.HEARTBEAT:
+            Listener.handle_packet(self, paPacket)
+        else:
+            self.worker.submit(self._handle_on_worker, paPacket)
+
+    def _handle_on_worker(self, paPacket):
+        """
+        Worker thread: hand off a packet read by the loop, unless the
+        listener has been stopped since.
+        """
+        if self._done:
+            return
+        try:
+            Listener.handle_packet(self, paPacket)
+        except Exception as e:
+            self.default_callback_error(e)
+
+    def _timer_loop(self):
+        return self.loop
+
+    def _heartbeat_missed(self):
+        # _invoke_error_callback already keeps recovery off the loop
+        if not self._done:
+            self.heartbeat_timeout()
+
+    def _invoke_error_callback(self, recovery_attempt, error_string = "No error string passed."):
+        self.done()
+        recovery = threading.Thread(target=Listener._invoke_error_callback,
+                                    args=(self, recovery_attempt, error_string))
+        recovery.daemon = True
+        recovery.start()
+
+class LoopPortAgentClient(PortAgentClient):
+    """
+    A PortAgentClient whose listener runs on a shared EventLoop, so many
+    clients in a process don't need a thread each.  Sockets are closed
+    through the loop so it never polls a closed socket.
+    """
+
+    def __init__(self, loop, host, port, cmd_port, delim=None, metrics=None, worker=None):
+        """
+        @param loop the EventLoop to listen on.
+        @param metrics the Metrics registry data is read under, or None for
+            the process wide one.
+        @param worker where the data callbacks run, see LoopListener; None
+            to run them on the loop.
+        """
+        PortAgentClient.__init__(self, host, port, cmd_port, delim)
+        self.loop = loop
+        self.metrics = metrics
+        self.worker = worker
+
+    def _create_listener(self, listener_class = LoopListener):
+        listener = PortAgentClient._create_listener(self, listener_class)
+        listener.loop = self.loop
+        listener.metrics = self.metrics
+        listener.worker = self.worker
+        return listener
+
+    def _destroy_connection(self):
+        if self.listener_thread:
+            self.listener_thread.done()
+        if self.sock:
+            self.loop.close_socket(self.sock)
+            self.sock = None
+            log.info('Port agent data socket closed.')
+
+    def stop_comms(self):
+        log.info('PortAgentClient shutting down comms.')
+        self._destroy_connection()
+        log.info('Port Agent Client stopped.')
@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.port_agent_replay
+@file mi/core/instrument/port_agent_replay.py
+@brief Replay recorded port agent logs through a driver protocol, for
+repeatable throughput measurements without a port agent or instrument.
+
+    replay = PortAgentReplay(SBE37Driver)
+    result = replay.run(PortAgentLogReader('port_agent_4001.20140101.data'))
+    print format_result(result)
+"""
+
+__license__ = 'Apache 2.0'
+
+import time
+import struct
+
+from mi.core.instrument.port_agent_client import PortAgentPacket
+from mi.core.instrument.port_agent_client import HEADER_SIZE
+from mi.core.instrument.port_agent_client import LENGTH_OFFSET
+from mi.core.instrument.port_agent_client import xor_checksum
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.instrument_driver import DriverProtocolState
+from mi.core.instrument.event_queue import event_kind
+from mi.core.instrument.event_queue import RAW_SAMPLE
+from mi.core.metrics import get_metrics
+from mi.core.log import get_logger ; log = get_logger()
+
+SYNC = '\xa3\x9d\x7a'
+
+# Offset of the 32 bit seconds and fraction NTP timestamp in the header.
+TIMESTAMP_OFFSET = 8
+
+READ_SIZE = 65536
+
+# Packet types that carry data from the instrument and go to got_data as
+# well as got_raw.
+INSTRUMENT_DATA_TYPES = (PortAgentPacket.DATA_FROM_INSTRUMENT,
+                         PortAgentPacket.PICKLED_DATA_FROM_INSTRUMENT)
+
+# Metrics reported as replay stages, with the name used in the result.
+STAGES = [
+    ('chunker', 'chunker.add_time'),
+    ('sieve', 'chunker.sieve_time'),
+    ('chunk', 'protocol.chunk_time'),
+    ('particle_build', 'particle.build_time'),
+    ('serialize', 'particle.serialize_time'),
+]
+
+def packet_time(packet):
+    """
+    @retval the NTP timestamp of a packet read from a log, in seconds.
+    """
+    (seconds, fraction) = struct.unpack_from('>II', packet.get_header(), TIMESTAMP_OFFSET)
+    return seconds + fraction / 4294967296.0
+
+def pack_log_record(data, timestamp, packet_type=PortAgentPacket.DATA_FROM_INSTRUMENT):
+    """
+    Build a port agent log record, header and data, as the port agent
+    writes them.
+    @param data the packet payload.
+    @param timestamp NTP timestamp in seconds.
+    @param packet_type PortAgentPacket type.
+    @retval the record as a string.
+    """
+    seconds = int(timestamp)
+    fraction = int((timestamp - seconds) * 4294967296.0)
+    header = struct.pack('>BBBBHHII', 0xa3, 0x9d, 0x7a, packet_type,
+                         len(data) + HEADER_SIZE, 0, seconds, fraction)
+    checksum = xor_checksum(header[0:6] + header[8:]) ^ xor_checksum(data)
+    return header[0:6] + struct.pack('>H', checksum) + header[8:] + data
+
+def valid_record(record):
+    """
+    @param record a port agent header and its data.
+    @retval True if the record checksum is correct.
+    """
+    packet = PortAgentPacket()
+    packet.unpack_header(record[:HEADER_SIZE])
+    packet.attach_data(record[HEADER_SIZE:])
+    packet.verify_checksum()
+    return packet.is_valid()
+
+def find_packet_boundary(log_file, offset, read_size=READ_SIZE):
+    """
+    Find the first record in a port agent log at or after offset.  The sync
+    bytes can turn up in instrument data, so a candidate only counts if its
+    checksum is good.
+    @param log_file an open binary file.
+    @param offset file position to start looking from.
+    @retval the file position of the record, or None if there isn't one.
+    """
+    log_file.seek(offset)
+    buffer = ''
+    start = 0
+    eof = False
+    while True:
+        index = buffer.find(SYNC, start)
+        if index < 0:
+            start = max(start, len(buffer) - len(SYNC) + 1)
+        elif len(buffer) - index >= HEADER_SIZE:
+            (length,) = struct.unpack_from('>H', buffer, index + LENGTH_OFFSET)
+            if length < HEADER_SIZE:
+                start = index + 1
+                continue
+            if len(buffer) - index >= length:
+                if valid_record(buffer[index:index + length]):
+                    return offset + index
+                start = index + 1
+                continue
+            start = index
+        else:
+            start = index
+
+        if eof:
+            return None
+
+        data = log_file.read(read_size)
+        buffer = buffer[start:] + data
+        offset += start
+        start = 0
+        eof = not data
+
+class PortAgentLogReader(object):
+    """
+    Iterate over the packets in a port agent log file.  Records are found
+    by their sync bytes; anything between records that doesn't parse is
+    skipped and counted in skipped_bytes.
+    """
+
+    def __init__(self, source, read_size=READ_SIZE, start=0, end=None):
+        """
+        @param source a file name or an open binary file.
+        @param read_size bytes read from the file at a time.
+        @param start file position to read from, which should be the start
+        of a record.
+        @param end file position to stop at; records starting at or after
+        it are not returned.  None to read to the end of the file.
+        """
+        self.source = source
+        self.read_size = read_size
+        self.start = start
+        self.end = end
+        self.skipped_bytes = 0
+
+    def __iter__(self):
+        if isinstance(self.source, basestring):
+            with open(self.source, 'rb') as log_file:
+                for packet in self._packets(log_file):
+                    yield packet
+        else:
+            for packet in self._packets(self.source):
+                yield packet
+
+    def _packets(self, log_file):
+        if self.start:
+            log_file.seek(self.start)
+        # file position of buffer[0]
+        offset = self.start
+        end = self.end
+        buffer = ''
+        start = 0
+        eof = False
+        while True:
+            index = buffer.find(SYNC, start)
+            if end is not None:
+                # stop once no record can start before end
+                stop = end - offset
+                if index >= stop or (index < 0 and len(buffer) - len(SYNC) + 1 >= stop):
+                    self.skipped_bytes += max(stop - start, 0)
+                    return
+            if index < 0:
+                keep = max(start, len(buffer) - len(SYNC) + 1)
+                self.skipped_bytes += keep - start
+                start = keep
+            elif len(buffer) - index >= HEADER_SIZE:
+                self.skipped_bytes += index - start
+                (length,) = struct.unpack_from('>H', buffer, index + LENGTH_OFFSET)
+                if length < HEADER_SIZE:
+                    # false sync, look again past it
+                    self.skipped_bytes += 1
+                    start = index + 1
+                    continue
+                if len(buffer) - index >= length:
+                    packet = PortAgentPacket()
+                    packet.unpack_header(buffer[index:index + HEADER_SIZE])
+                    packet.attach_data(buffer[index + HEADER_SIZE:index + length])
+                    start = index + length
+                    yield packet
+                    continue
+                start = index
+            else:
+                self.skipped_bytes += index - start
+                start = index
+
+            if eof:
+                self.skipped_bytes += len(buffer) - start
+                return
+
+            data = log_file.read(self.read_size)
+            buffer = buffer[start:] + data
+            offset += start
+            start = 0
+            eof = not data
+
+class ReplayPortAgent(object):
+    """
+    Stands in for the PortAgentClient of a replayed driver.  Packets are
+    handed to the driver callbacks the same way the port agent listener
+    does, and anything the driver sends is kept in sent.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.callback_data = None
+        self.callback_raw = None
+        self.callback_error = None
+
+    def init_comms(self, callback_data, callback_raw, callback_error, callback_lost=None):
+        self.callback_data = callback_data
+        self.callback_raw = callback_raw
+        self.callback_error = callback_error
+
+    def stop_comms(self):
+        pass
+
+    def send(self, data, *args, **kwargs):
+        self.sent.append(data)
+        return len(data)
+
+    def send_break(self, duration):
+        pass
+
+    def send_config_parameter(self, parameter, value):
+        pass
+
+    def deliver(self, packet, raw=True):
+        """
+        Hand a packet to the driver.
+        @param raw pass packets to got_raw as well as got_data.
+        @retval True if the packet went to got_data.
+        """
+        packet_type = packet.get_header_type()
+        if raw and packet_type != PortAgentPacket.HEARTBEAT:
+            self.callback_raw(packet)
+        if packet_type in INSTRUMENT_DATA_TYPES:
+            self.callback_data(packet)
+            return True
+        return False
+
+class PortAgentReplay(object):
+    """
+    Drive a driver's protocol from recorded port agent packets.  The driver
+    is configured with a ReplayPortAgent, connected and forced into
+    protocol_state, then each packet is delivered as the port agent client
+    would deliver it.  Timing of the chunker, sieve, chunk handling,
+    particle build and particle serialization comes from mi.core.metrics,
+    which is reset and enabled for the length of a run.
+    """
+
+    def __init__(self, driver_class, protocol_state=DriverProtocolState.AUTOSAMPLE, raw=True):
+        """
+        @param driver_class a SingleConnectionInstrumentDriver subclass.
+        @param protocol_state the state to force the protocol into.
+        @param raw pass packets to got_raw as well, publishing raw particles.
+        """
+        self.raw = raw
+        self.events = []
+        self.keep_events = False
+        self._event_counts = {}
+        self.port_agent = ReplayPortAgent()
+        self.driver = driver_class(self._got_event)
+        self.driver.set_test_mode(True)
+        self.driver.configure(config={'mock_port_agent': self.port_agent})
+        self.driver.connect()
+        self.driver.test_force_state(state=protocol_state)
+        self.protocol = self.driver._protocol
+
+    def _got_event(self, evt):
+        kind = event_kind(evt)
+        self._event_counts[kind] = self._event_counts.get(kind, 0) + 1
+        if self.keep_events:
+            self.events.append(evt)
+
+    def _time_chunker(self, metrics):
+        """
+        Time add_chunk on the protocol's chunker, if it has one.
+        """
+        chunker = getattr(self.protocol, '_chunker', None)
+        if chunker is None or 'add_chunk' in chunker.__dict__:
+            return
+
+        add_chunk = chunker.add_chunk
+        def timed_add_chunk(*args, **kwargs):
+            start = time.time()
+            try:
+                return add_chunk(*args, **kwargs)
+            finally:
+                metrics.observe('chunker.add_time', time.time() - start)
+        chunker.add_chunk = timed_add_chunk
+
+    def run(self, packets, speed=None, keep_events=False):
+        """
+        Replay packets through the driver.
+        @param packets iterable of PortAgentPackets, e.g. a PortAgentLogReader.
+        @param speed None to replay as fast as possible, 1.0 for the rate
+        the packets were recorded at, or a multiple of it.
+        @param keep_events keep the driver events in self.events.
+        @retval result dict, see format_result.
+        """
+        metrics = get_metrics()
+        was_enabled = metrics.enabled
+        metrics.reset()
+        metrics.enable()
+        self._time_chunker(metrics)
+        self.keep_events = keep_events
+        self.events = []
+        self._event_counts = {}
+
+        packet_count = 0
+        data_packets = 0
+        byte_count = 0
+        errors = 0
+        waited = 0.0
+        first_time = None
+        start = time.time()
+        try:
+            for packet in packets:
+                if speed:
+                    recorded = packet_time(packet)
+                    if first_time is None:
+                        first_time = recorded
+                    delay = start + (recorded - first_time) / speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                        waited += delay
+
+                packet_count += 1
+                byte_count += packet.get_data_length()
+                try:
+                    if self.port_agent.deliver(packet, self.raw):
+                        data_packets += 1
+                except Exception as e:
+                    errors += 1
+                    log.error("Replay packet %d raised %s: %s", packet_count,
+                              e.__class__.__name__, e)
+            elapsed = time.time() - start
+            snapshot = metrics.snapshot()
+        finally:
+            metrics.enable(was_enabled)
+
+        return self._result(elapsed, waited, packet_count, data_packets, byte_count,
+                            errors, snapshot)
+
+    def _result(self, elapsed, waited, packet_count, data_packets, byte_count, errors, snapshot):
+        def rate(count):
+            return count / elapsed if elapsed > 0 else 0.0
+
+        counts = dict(self._event_counts)
+        raw_particles = counts.pop(RAW_SAMPLE, 0)
+        particles = counts.get(DriverAsyncEvent.SAMPLE, 0)
+        events = sum(counts.values())
+        chunks = snapshot['counters'].get('protocol.chunks', {}).get('count', 0)
+
+        stages = {}
+        for (stage, name) in STAGES:
+            histogram = snapshot['histograms'].get(name)
+            if histogram and histogram['count']:
+                stages[stage] = {'count': histogram['count'],
+                                 'total': histogram['total'],
+                                 'mean': histogram['mean'],
+                                 'max': histogram['max']}
+
+        return {
+            'elapsed': elapsed,
+            'waited': waited,
+            'packets': packet_count,
+            'data_packets': data_packets,
+            'bytes': byte_count,
+            'errors': errors,
+            'chunks': chunks,
+            'particles': particles,
+            'raw_particles': raw_particles,
+            'events': events,
+            'event_types': counts,
+            'rates': {'packets': rate(packet_count),
+                      'bytes': rate(byte_count),
+                      'chunks': rate(chunks),
+                      'particles': rate(particles),
+                      'events': rate(events)},
+            'stages': stages,
+        }
+
+def format_result(result):
+    """
+    @retval a replay result as text for a terminal.
+    """
+    lines = ["%d packets, %d bytes in %.3fs (%.3fs waiting), %d errors" %
+             (result['packets'], result['bytes'], result['elapsed'],
+              result['waited'], result['errors'])]
+    rates = result['rates']
+    for name in ['packets', 'bytes', 'chunks', 'particles', 'events']:
+        lines.append("  %-16s %10d %12.1f/s" % (name, result[name], rates[name]))
+    lines.append("  %-16s %10d" % ('raw_particles', result['raw_particles']))
+
+    for (stage, name) in STAGES:
+        timing = result['stages'].get(stage)
+        if timing:
+            lines.append("  %-16s %10d calls %9.3fs total %9.1fus mean %9.1fus max" %
+                         (stage, timing['count'], timing['total'],
+                          timing['mean'] * 1e6, timing['max'] * 1e6))
+    return "\n".join(lines)
@@ -16,11 +16,13 @@ import ntplib
 import time
 import yaml
 import pkg_resources
+from bisect import bisect_right
 
 from mi.core.common import BaseEnum
 from mi.core.exceptions import InstrumentParameterException
 from mi.core.exceptions import InstrumentParameterExpirationException
 from mi.core.instrument.instrument_dict import InstrumentDict
+from mi.core.util import required_literals
 
 from mi.core.log import get_logger ; log = get_logger()
 
@@ -388,12 +390,20 @@ class ProtocolParameterDict(InstrumentDict):
     """
     Protocol parameter dictionary. Manages, matches and formats device
     parameters.
+
+    Updates are routed through an index of the literal text each regex
+    parameter can't match without, its key, so a line is only searched by
+    the parameters whose key it contains.
     """
+    # (parameter count, names in update order, name : key), built on demand
+    _index = None
+
     def __init__(self):
         """
         Constructor.        
         """
         self._param_dict = {}
+        self._index = None
         
     def add(self,
             name,
@@ -480,6 +490,7 @@ class ProtocolParameterDict(InstrumentDict):
                              value_description=value_description)
 
         self._param_dict[name] = val
+        self._index = None
 
     def add_parameter(self, parameter):
         """
@@ -494,6 +505,7 @@ class ProtocolParameterDict(InstrumentDict):
             raise InstrumentParameterException(
                 "Invalid Parameter added! Attempting to add: %s" % parameter)
         self._param_dict[parameter.name] = parameter
+        self._index = None
         
     def get(self, name, timestamp=None):
         """
@@ -663,27 +675,79 @@ class ProtocolParameterDict(InstrumentDict):
 
         return self._param_dict[name].description.submenu_write
 
-    # RAU Added
-    def multi_match_update(self, input):
+    @staticmethod
+    def _literal_key(val):
         """
-        Update the dictionaray with a line input. Iterate through all objects
-        and attempt to match and update (a) parameter(s).
-        @param input A string to match to a dictionary object.
-        @retval The count of successfully updated parameters, 0 if not updated
+        The longest literal a parameter's regex needs to match, or None if
+        the parameter has to be tried against every input.
+        """
+        if not isinstance(val, RegexParameter) or \
+                getattr(type(val).update, 'im_func', None) is not RegexParameter.update.im_func:
+            return None
+
+        literals = required_literals(val.regex)
+        if not literals:
+            return None
+        return max(literals, key=len)
+
+    def _get_index(self):
+        """
+        Get the literal index, building it if parameters have been added.
+        @retval tuple of the parameter names in update order and a dict of
+        name : key.
+        """
+        if self._index is None or self._index[0] != len(self._param_dict):
+            names = []
+            keys = {}
+            for (name, val) in self._param_dict.iteritems():
+                names.append(name)
+                keys[name] = self._literal_key(val)
+            self._index = (len(self._param_dict), names, keys)
+        return self._index[1:]
+
+    @staticmethod
+    def _as_text(input):
+        """
+        The string a regex parameter will search for an input.
+        """
+        if isinstance(input, basestring):
+            return input
+        return str(input)
+
+    def _multi_match(self, input, names, keys, text):
+        """
+        Multi match update of one input against the given parameters.
+        @retval list of the names updated.
         """
-        hit_count = 0
+        updated = []
         multi_mode = False
-        for (name, val) in self._param_dict.iteritems():
+        for name in names:
+            key = keys[name]
+            if key is not None and key not in text:
+                continue
+            val = self._param_dict[name]
             if multi_mode == True and val.description.multi_match == False:
                 continue
             if val.update(input):
-                hit_count =hit_count +1
+                updated.append(name)
                 if False == val.description.multi_match:
-                    return hit_count
+                    return updated
                 else:
                     multi_mode = True
+        return updated
 
-        if False == multi_mode and input <> "":
+    # RAU Added
+    def multi_match_update(self, input):
+        """
+        Update the dictionaray with a line input. Iterate through all objects
+        and attempt to match and update (a) parameter(s).
+        @param input A string to match to a dictionary object.
+        @retval The count of successfully updated parameters, 0 if not updated
+        """
+        (names, keys) = self._get_index()
+        hit_count = len(self._multi_match(input, names, keys, self._as_text(input)))
+
+        if hit_count == 0 and input <> "":
             log.debug("protocol_param_dict.py UNMATCHCHED ***************************** %s", input)
         return hit_count
 
@@ -694,8 +758,13 @@ class ProtocolParameterDict(InstrumentDict):
         @retval A dict with the names and values that were updated
         """
         result = {}
-        for (name, val) in self._param_dict.iteritems():
-            update_result = val.update(input)
+        (names, keys) = self._get_index()
+        text = self._as_text(input)
+        for name in names:
+            key = keys[name]
+            if key is not None and key not in text:
+                continue
+            update_result = self._param_dict[name].update(input)
             if update_result:
                 result[name] = update_result 
         return result
@@ -716,23 +785,91 @@ class ProtocolParameterDict(InstrumentDict):
         """
         log.debug("update input: %s", input)
         found = False
+        (names, keys) = self._get_index()
 
         if(target_params and isinstance(target_params, str)):
             params = [target_params]
         elif(target_params and isinstance(target_params, list)):
             params = target_params
         elif(target_params == None):
-            params = self._param_dict.keys()
+            params = names
         else:
             raise InstrumentParameterException("invalid target_params, must be name or list")
 
+        text = self._as_text(input)
         for name in params:
-            log.trace("update param dict name: %s", name)
             val = self._param_dict[name]
+            key = keys.get(name)
+            if key is not None and key not in text:
+                continue
+            log.trace("update param dict name: %s", name)
             if val.update(input):
                 found = True
         return found
 
+    def update_lines(self, input, newline=None, multi_match=False):
+        """
+        Update the dictionary from a block of lines, like a status or
+        calibration dump, with the same result as calling update (or
+        multi_match_update) on each line in turn. Each key is looked for
+        once over the whole block and each line is only handed to the
+        parameters whose key starts in it.
+        @param input The block of text.
+        @param newline The line separator, by default any line ending.
+        @param multi_match True to update each line like multi_match_update.
+        @retval A dict with the names that were updated
+        """
+        (names, keys) = self._get_index()
+        text = self._as_text(input)
+
+        if newline is None:
+            lines = text.splitlines()
+            lengths = [len(line) for line in text.splitlines(True)]
+        else:
+            lines = text.split(newline)
+            lengths = [len(line) + len(newline) for line in lines]
+
+        starts = []
+        offset = 0
+        for length in lengths:
+            starts.append(offset)
+            offset += length
+
+        # parameters tried on every line, and those routed by key
+        always = []
+        routed = [[] for line in lines]
+        for (rank, name) in enumerate(names):
+            key = keys[name]
+            if key is None:
+                always.append(rank)
+                continue
+
+            last_line = -1
+            pos = text.find(key)
+            while pos >= 0:
+                line = bisect_right(starts, pos) - 1
+                if line != last_line:
+                    routed[line].append(rank)
+                    last_line = line
+                pos = text.find(key, pos + 1)
+
+        result = {}
+        for (line, ranks) in zip(lines, routed):
+            if always:
+                ranks = sorted(ranks + always)
+            if not ranks:
+                continue
+
+            line_names = [names[rank] for rank in ranks]
+            if multi_match:
+                for name in self._multi_match(line, line_names, keys, line):
+                    result[name] = True
+            else:
+                for name in line_names:
+                    if self._param_dict[name].update(line):
+                        result[name] = True
+        return result
+
     def get_all(self, timestamp=None):
         """
         Retrive the configuration (all settable key values).
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.response_buffer
+@file mi/core/instrument/response_buffer.py
+@brief Bounded receive buffer used by command/response protocols to look
+for prompts and responses.
+"""
+
+__license__ = 'Apache 2.0'
+
+from collections import deque
+
+from mi.core.log import get_logger ; log = get_logger()
+
+DEFAULT_MAX_SIZE = 1048576
+
+class ResponseBuffer(object):
+    """
+    Append only byte buffer with a size cap.  Received data is held as a
+    list of chunks so appending is O(1); the chunks are only joined when the
+    whole contents are asked for.  When the cap is exceeded the oldest bytes
+    are dropped, so a protocol sitting in autosample holds at most max_size
+    bytes no matter how long it runs.
+
+    Positions are absolute offsets into everything ever appended, so a
+    search cursor stays valid while data is trimmed from the front.  When
+    the contents are replaced outright (reset) the generation counter is
+    bumped so cursors know to start over.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        """
+        @param max_size maximum number of bytes to hold, None for no limit
+        """
+        self.max_size = max_size
+        self.generation = 0
+        self._chunks = deque()
+        self._start = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __str__(self):
+        return self.value
+
+    @property
+    def start(self):
+        """
+        Absolute offset of the first byte held.
+        """
+        return self._start
+
+    @property
+    def end(self):
+        """
+        Absolute offset one past the last byte held.
+        """
+        return self._start + self._length
+
+    @property
+    def value(self):
+        """
+        The buffer contents as a single string.
+        """
+        if len(self._chunks) > 1:
+            joined = ''.join(self._chunks)
+            self._chunks.clear()
+            self._chunks.append(joined)
+
+        if self._chunks:
+            return self._chunks[0]
+        return ''
+
+    def append(self, data):
+        """
+        Add data to the end of the buffer, trimming from the front if the
+        cap is exceeded.
+        @param data bytes to add
+        """
+        if not data:
+            return
+
+        self._chunks.append(data)
+        self._length += len(data)
+        self._trim()
+
+    def reset(self, data=''):
+        """
+        Replace the buffer contents.  Used when a protocol assigns its
+        buffer directly.
+        @param data new contents
+        """
+        self._start = self.end
+        self._length = 0
+        self._chunks.clear()
+        self.generation += 1
+        self.append(data)
+
+    def consume(self, index=None):
+        """
+        Drop data from the front of the buffer.
+        @param index absolute offset to drop up to, everything if None
+        """
+        if index is None or index >= self.end:
+            self._start = self.end
+            self._length = 0
+            self._chunks.clear()
+        elif index > self._start:
+            self._drop(index - self._start)
+
+    def get(self, start=None, end=None):
+        """
+        Return the data between two absolute offsets.
+        @param start first offset, defaults to the start of the buffer
+        @param end offset one past the last byte, defaults to the end
+        """
+        if start is None or start < self._start:
+            start = self._start
+        if end is None or end > self.end:
+            end = self.end
+        if start >= end:
+            return ''
+
+        (tail, tail_start) = self._tail(start)
+        return tail[start - tail_start:end - tail_start]
+
+    def find(self, sub, start=None):
+        """
+        Find a substring without joining data that lies before start.
+        @param sub string to look for
+        @param start absolute offset to search from, defaults to the start
+        of the buffer
+        @retval absolute offset of the first occurrence or -1
+        """
+        if start is None or start < self._start:
+            start = self._start
+        if start >= self.end:
+            return -1
+
+        (tail, tail_start) = self._tail(start)
+        index = tail.find(sub, start - tail_start)
+        if index < 0:
+            return -1
+        return tail_start + index
+
+    def search(self, regex, start=None):
+        """
+        Search the buffer with a compiled regex.
+        @param regex compiled pattern
+        @param start absolute offset to search from, defaults to the start
+        of the buffer
+        @retval match object (positions relative to self.start) or None
+        """
+        if start is None or start < self._start:
+            start = self._start
+        return regex.search(self.value, start - self._start)
+
+    def _tail(self, start):
+        """
+        Join only the chunks needed to cover everything from start to the
+        end of the buffer.
+        @retval (string, absolute offset of its first byte)
+        """
+        tail_start = self.end
+        count = 0
+        for chunk in reversed(self._chunks):
+            if tail_start <= start:
+                break
+            tail_start -= len(chunk)
+            count += 1
+
+        if count == len(self._chunks):
+            return (self.value, self._start)
+
+        if count == 1:
+            return (self._chunks[-1], tail_start)
+
+        chunks = list(self._chunks)
+        return (''.join(chunks[-count:]), tail_start)
+
+    def _trim(self):
+        if self.max_size is not None and self._length > self.max_size:
+            log.trace("response buffer over %d bytes, trimming", self.max_size)
+            self._drop(self._length - self.max_size)
+
+    def _drop(self, count):
+        """
+        Remove count bytes from the front of the buffer.
+        """
+        self._start += count
+        self._length -= count
+        while count:
+            chunk = self._chunks[0]
+            if len(chunk) <= count:
+                self._chunks.popleft()
+                count -= len(chunk)
+            else:
+                self._chunks[0] = chunk[count:]
+                count = 0
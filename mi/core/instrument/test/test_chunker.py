@@ -11,7 +11,9 @@ __author__ = 'Steve Foley'
 __license__ = 'Apache 2.0'
 
 import unittest
+import struct
 import re
+import time
 from functools import partial
 from mi.core.unit_test import MiUnitTest, MiUnitTestCase
 from nose.plugins.attrib import attr
@@ -20,6 +22,10 @@ from ooi.logging import log
 
 from mi.core.exceptions import SampleException
 from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import LengthPrefixedFramer
+from mi.core.instrument.chunker import SyncWordFramer
+from mi.core.instrument.chunker import RegexSieve
 
 @attr('UNIT', group='mi')
 class UnitTestStringChunker(MiUnitTestCase):
@@ -331,6 +337,135 @@ class UnitTestStringChunker(MiUnitTestCase):
         self.assertRaises(SampleException,
                           self._chunker.add_chunk, "foobar", self.TIMESTAMP_1)
 
+@attr('UNIT', group='mi')
+class UnitTestStringRingChunker(UnitTestStringChunker):
+    """
+    Run the string chunker tests against the ring buffer chunker
+    """
+    def setUp(self):
+        """ Setup a chunker for use in tests """
+        self._chunker = StringRingChunker(UnitTestStringChunker.sieve_function)
+
+    def test_generate_data_lists(self):
+        """
+        The ring chunker sieves as it goes so there are no lists to generate.
+        Verify the equivalent state after a single add.
+        """
+        sample_string = "Foo%sBar%sBat" % (self.SAMPLE_1, self.SAMPLE_2)
+        self._chunker.add_chunk(sample_string, self.TIMESTAMP_1)
+
+        self.assertEquals(self._chunker.data_chunk_list,
+                          [(3,34, self.TIMESTAMP_1), (37, 68, self.TIMESTAMP_1)])
+        self.assertEquals(self._chunker.nondata_chunk_list,
+                          [(0, 3, self.TIMESTAMP_1), (34, 37, self.TIMESTAMP_1)])
+        self.assertEquals(self._chunker.buffer, sample_string)
+
+    def test_indices_after_consume(self):
+        """
+        Indices are relative to the unconsumed buffer, even though the ring
+        chunker stores them in stream coordinates.
+        """
+        self._chunker.add_chunk(self.MULTI_SAMPLE_1, self.TIMESTAMP_1)
+        (time, result, start, end) = self._chunker.get_next_data_with_index()
+        self.assertEquals((start, end), (0, 31))
+        (time, result, start, end) = self._chunker.get_next_data_with_index()
+        self.assertEquals(result, self.SAMPLE_2)
+        self.assertEquals((start, end), (2, 33))
+        self.assertEquals(self._chunker.buffer, "")
+
+    def test_lookback(self):
+        """
+        With a lookback only the end of a long run of junk is re-sieved, and
+        fragments are still stitched together.
+        """
+        scanned = []
+        def sieve(raw_data):
+            scanned.append(len(raw_data))
+            return UnitTestStringChunker.sieve_function(raw_data)
+
+        self._chunker = StringRingChunker(sieve, lookback=len(self.SAMPLE_1))
+        for i in range(20):
+            self._chunker.add_chunk("Junk" * 10, self.TIMESTAMP_1)
+        self._chunker.add_chunk(self.FRAGMENT_1, self.TIMESTAMP_2)
+        self._chunker.add_chunk(self.FRAGMENT_2, self.TIMESTAMP_3)
+
+        self.assertTrue(max(scanned) <= len(self.SAMPLE_1) + 40)
+        (time, result) = self._chunker.get_next_non_data()
+        self.assertEquals(result, "Junk" * 200)
+        self.assertEquals(time, self.TIMESTAMP_1)
+        (time, result) = self._chunker.get_next_data()
+        self.assertEquals(result, self.FRAGMENT_SAMPLE)
+        self.assertEquals(time, self.TIMESTAMP_2)
+
+    def test_tear_before_data(self):
+        """
+        Tearing up a data block that isn't the last one leaves the same
+        non-data as the StringChunker.
+        """
+        chunks = [("Junk" + self.SAMPLE_1[:10], self.TIMESTAMP_1),
+                  (self.SAMPLE_1[10:] + "JunkJunkJu" + self.SAMPLE_2, self.TIMESTAMP_2)]
+        nondata = []
+        for chunker in [StringChunker(self.sieve_function), self._chunker]:
+            for (data, timestamp) in chunks:
+                chunker.add_chunk(data, timestamp)
+            (time, result) = chunker.get_next_raw()
+            self.assertEquals(result, chunks[0][0])
+            nondata.append(chunker.nondata_chunk_list)
+
+        self.assertEquals(nondata[1], nondata[0])
+        self.assertEquals(nondata[1], [(0, 21, self.TIMESTAMP_1), (21, 31, self.TIMESTAMP_2)])
+
+        (time, result) = self._chunker.get_next_non_data()
+        self.assertEquals(result, self.SAMPLE_1[10:])
+        (time, result) = self._chunker.get_next_non_data()
+        self.assertEquals(result, "JunkJunkJu")
+        (time, result) = self._chunker.get_next_data()
+        self.assertEquals(result, self.SAMPLE_2)
+
+    def test_compact(self):
+        """
+        Consumed data is released from storage as the chunker runs
+        """
+        for i in range(1000):
+            self._chunker.add_chunk(self.SAMPLE_1 + "\r\n", self.TIMESTAMP_1)
+            (time, result) = self._chunker.get_next_data()
+            self.assertEquals(result, self.SAMPLE_1)
+
+        self.assertTrue(len(self._chunker._storage) <= 2 * StringRingChunker.COMPACT_THRESHOLD)
+        self.assertEquals(self._chunker.buffer, "\r\n")
+
+
+@attr('PERF', group='mi')
+class PerfTestChunker(MiUnitTest):
+    """
+    Micro-benchmark of chunker throughput versus backlog size. The backlog is
+    the number of samples left in the chunker before they are drained.
+    """
+    SAMPLE = UnitTestStringChunker.SAMPLE_1 + "\r\n"
+    BACKLOGS = [10, 100, 1000, 5000]
+
+    def _run(self, chunker_class, backlog):
+        chunker = chunker_class(UnitTestStringChunker.sieve_function)
+        start = time.time()
+        for i in range(backlog):
+            chunker.add_chunk(self.SAMPLE, 1.0)
+        count = 0
+        (ts, result) = chunker.get_next_data()
+        while result:
+            count += 1
+            (ts, result) = chunker.get_next_data()
+        elapsed = time.time() - start
+        self.assertEquals(count, backlog)
+        return (backlog * len(self.SAMPLE)) / max(elapsed, 1e-9)
+
+    def test_throughput(self):
+        for backlog in self.BACKLOGS:
+            for chunker_class in [StringChunker, StringRingChunker]:
+                rate = self._run(chunker_class, backlog)
+                log.info("%s backlog %d: %.0f bytes/sec",
+                         chunker_class.__name__, backlog, rate)
+
+
 @unittest.skip("Write this when a binary chunker is needed")
 @attr('UNIT', group='mi')
 class UnitTestBinaryChunker(MiUnitTestCase):
@@ -380,3 +515,350 @@ class UnitTestBinaryChunker(MiUnitTestCase):
         """
         pass
     
+
+
+@attr('UNIT', group='mi')
+class UnitTestLengthPrefixedFramer(MiUnitTest):
+    """
+    Test the sync word and length field framer with a simple record: the
+    sync word, a little endian record size and a one byte sum checksum at
+    the end.
+    """
+    SYNC = '\xaa\x55'
+
+    @staticmethod
+    def record(payload):
+        body = UnitTestLengthPrefixedFramer.SYNC + struct.pack('<H', len(payload) + 5) + payload
+        return body + chr(sum([ord(c) for c in body]) & 0xFF)
+
+    @staticmethod
+    def checksum(raw_data, start, end):
+        record = str(raw_data[start:end])
+        return sum([ord(c) for c in record[:-1]]) & 0xFF == ord(record[-1])
+
+    def setUp(self):
+        self.framer = LengthPrefixedFramer(self.SYNC, 2, '<H', checksum=self.checksum, min_size=5)
+
+    def test_records(self):
+        records = [self.record('one'), self.record(''), self.record('a' * 300)]
+        data = 'noise' + records[0] + records[1] + '\r\n' + records[2] + 'tail'
+        expected = []
+        for record in records:
+            start = data.index(record)
+            expected.append((start, start + len(record)))
+
+        self.assertEqual(self.framer.sieve(data), expected)
+        self.assertEqual(self.framer(data), expected)
+        self.assertEqual(self.framer(bytearray(data)), expected)
+        self.assertEqual(self.framer(''), [])
+        self.assertEqual(self.framer('no sync here'), [])
+
+    def test_sync_in_record(self):
+        """
+        A sync word inside a good record is not a record of its own
+        """
+        inner = self.record('x')
+        outer = self.record('abc' + inner + 'def')
+        self.assertEqual(self.framer(outer), [(0, len(outer))])
+
+    def test_resync(self):
+        """
+        Bad checksums, impossible lengths and truncated records are skipped
+        and the next record is still found
+        """
+        good = self.record('good')
+        bad_checksum = self.record('bad')[:-1] + '\x00'
+        bad_length = self.SYNC + struct.pack('<H', 2) + 'xx'
+        truncated = self.record('z' * 50)[:20]
+        data = bad_checksum + bad_length + truncated + good
+        self.assertEqual(self.framer(data), [(len(data) - len(good), len(data))])
+
+        # a record cut off at the end of the buffer waits for the rest
+        self.assertEqual(self.framer(good + truncated), [(0, len(good))])
+        self.assertEqual(self.framer(good + self.SYNC + '\x01'), [(0, len(good))])
+
+        framer = LengthPrefixedFramer(self.SYNC, 2, '<H', checksum=self.checksum, max_size=10)
+        long_record = self.record('long record')
+        self.assertEqual(framer(long_record + good), [(len(long_record), len(long_record) + len(good))])
+
+    def test_scaled_length(self):
+        """
+        Length fields counting words with extra trailing bytes
+        """
+        framer = LengthPrefixedFramer('\xa5', 2, '<H', length_scale=2, length_extra=1)
+        record = '\xa5\x01' + struct.pack('<H', 3) + 'xx' + '!'
+        self.assertEqual(framer(record + record), [(0, 7), (7, 14)])
+
+    def test_chunker(self):
+        """
+        Records split across adds come out of a chunker whole
+        """
+        records = [self.record(str(i) * i) for i in range(1, 20)]
+        data = 'junk'.join(records)
+        for chunker in [StringChunker(self.framer), StringRingChunker(self.framer)]:
+            for i in range(0, len(data), 7):
+                chunker.add_chunk(data[i:i + 7], 1.0)
+
+            found = []
+            (ts, result) = chunker.get_next_data()
+            while result:
+                found.append(result)
+                (ts, result) = chunker.get_next_data()
+            self.assertEqual(found, records)
+
+
+@attr('UNIT', group='mi')
+class UnitTestSyncWordFramer(MiUnitTest):
+    """
+    Test the fixed length sync string framer with records whose last byte
+    is the sum of the others.
+    """
+    STRUCTURES = [('\xa5\x10', 8), ('\xa5\x11\x03', 12), ('\xa5\x12', 6)]
+
+    @staticmethod
+    def record(sync, length, fill='x'):
+        body = sync + fill * (length - len(sync) - 1)
+        return body + chr(sum([ord(c) for c in body]) & 0xFF)
+
+    def checksum(self, raw_data, start, end):
+        self.checked += 1
+        record = str(raw_data[start:end])
+        return sum([ord(c) for c in record[:-1]]) & 0xFF == ord(record[-1])
+
+    def setUp(self):
+        self.checked = 0
+        self.framer = SyncWordFramer(self.STRUCTURES, checksum=self.checksum)
+
+    def test_all_occurrences(self):
+        records = [self.record(sync, length) for (sync, length) in self.STRUCTURES]
+        records = records + records + [records[0]] * 3
+        data = 'noise' + '\xa5'.join(records) + '\xa5\x10'
+        expected = []
+        start = 0
+        for record in records:
+            start = data.index(record, start)
+            expected.append((start, start + len(record)))
+            start += len(record)
+
+        self.assertEqual(self.framer(data), expected)
+        self.assertEqual(self.framer(bytearray(data)), expected)
+        self.assertEqual(self.framer(''), [])
+
+    def test_longest_sync(self):
+        """
+        Where one sync string starts another the longer one is tried first
+        """
+        framer = SyncWordFramer([('\xa5', 4), ('\xa5\x01', 6)])
+        self.assertEqual(framer('\xa5\x01xxxx\xa5xyz'), [(0, 6), (6, 10)])
+
+    def test_resync(self):
+        good = self.record('\xa5\x12', 6)
+        bad = self.record('\xa5\x11\x03', 12)[:-1] + '\x00'
+        self.assertEqual(self.framer(bad + good), [(len(bad), len(bad) + len(good))])
+
+        # a good record hidden inside a bad one is still found
+        inner = self.record('\xa5\x10', 8)
+        outer = '\xa5\x11\x03' + inner + '\x00'
+        self.assertEqual(self.framer(outer), [(3, 11)])
+
+    def test_cache(self):
+        """
+        Records are only checksummed the first time they are seen
+        """
+        records = [self.record(sync, length, str(i)) for (sync, length) in self.STRUCTURES for i in range(3)]
+        data = ''.join(records)
+        first = self.framer(data)
+        self.assertEqual(len(first), len(records))
+        self.assertEqual(self.checked, len(records))
+
+        self.assertEqual(self.framer(data), first)
+        self.assertEqual(self.framer('junk' + data[len(records[0]):]), [(s + 4 - len(records[0]), e + 4 - len(records[0])) for (s, e) in first[1:]])
+        self.assertEqual(self.checked, len(records))
+
+        # the cache is bounded
+        framer = SyncWordFramer(self.STRUCTURES, checksum=self.checksum, cache_size=2)
+        framer(data)
+        self.assertTrue(len(framer._checked) <= 2)
+        self.assertEqual(framer(data), first)
+
+    def test_chunker(self):
+        records = [self.record(sync, length, chr(65 + i)) for i in range(10) for (sync, length) in self.STRUCTURES]
+        data = '\x00'.join(records)
+        for chunker in [StringChunker(self.framer), StringRingChunker(self.framer)]:
+            for i in range(0, len(data), 5):
+                chunker.add_chunk(data[i:i + 5], 1.0)
+
+            found = []
+            (ts, result) = chunker.get_next_data()
+            while result:
+                found.append(result)
+                (ts, result) = chunker.get_next_data()
+            self.assertEqual(found, records)
+
+
+@attr('PERF', group='mi')
+class PerfTestSyncWordFramer(MiUnitTest):
+    """
+    Sieve rate over a burst of records, the first time and again with the
+    checksums cached
+    """
+    COUNTS = [100, 1000, 10000]
+
+    def test_sieve(self):
+        def checksum(raw_data, start, end):
+            record = str(raw_data[start:end])
+            return sum([ord(c) for c in record[:-1]]) & 0xFF == ord(record[-1])
+
+        records = [UnitTestSyncWordFramer.record(sync, length, chr(65 + i))
+                   for i in range(20) for (sync, length) in UnitTestSyncWordFramer.STRUCTURES]
+
+        for count in self.COUNTS:
+            data = ''.join([records[i % len(records)] for i in range(count)])
+            framer = SyncWordFramer(UnitTestSyncWordFramer.STRUCTURES, checksum=lambda *args: True)
+            start = time.time()
+            self.assertEqual(len(framer(data)), count)
+            unchecked = time.time() - start
+
+            framer = SyncWordFramer(UnitTestSyncWordFramer.STRUCTURES, checksum=checksum)
+            start = time.time()
+            framer(data)
+            first = time.time() - start
+
+            start = time.time()
+            framer(data)
+            repeat = time.time() - start
+
+            log.info("%d records: no checksum %.0f records/sec, first sieve %.0f records/sec, repeat %.0f records/sec",
+                     count, count / unchecked, count / first, count / repeat)
+
+
+# BOTPT style records, one line per sample from each sensor sharing the port
+BOTPT_LINES = ["LILY,2013/06/24 23:36:02,-235.500,  25.930,194.30, 26.04,11.96,N9655\n",
+               "NANO,V,2013/08/22 22:48:36.013,13.888533,26.147947328\n",
+               "IRIS,2013/05/29 00:25:34, -0.0882, -0.7524,28.45,N8642\n",
+               "HEAT,2013/04/19 22:54:11,-001,0001,0025\n",
+               "IRIS,2013/05/29 00:23:34,*9900XYC2\n"]
+BOTPT_STATUS = ("IRIS,2013/06/19 21:26:20,*APPLIED GEOMECHANICS Model MD900-T Firmware V5.2 SN-N3616 ID01\n"
+                "IRIS,2013/06/19 21:26:20,*01: Vbias= 0.0000 0.0000 0.0000 0.0000\n"
+                "NANO,V,2013/06/19 21:26:21.000,13.987252,24.991366335\n"
+                "IRIS,2013/06/19 21:26:21,*01: TR-PASH-OFF E99-ON  SO-NMEA-SIM XY-EP  9600 baud FV-   \n")
+
+# the IRIS driver sieve regexes
+IRIS_REGEX_LIST = [re.compile(r'IRIS,(.*),( -*[.0-9]+),( -*[.0-9]+),(.*),(.*)\n'),
+                   re.compile(r'IRIS,([^\n]*?),\*APPLIED GEOMECHANICS.*?baud FV- *?\n', re.DOTALL),
+                   re.compile(r'IRIS,([^\n]*?),\*01: TBias:.*?BAE Scale Factor: (.*)\(arcseconds/bit\)\n', re.DOTALL),
+                   re.compile(r'IRIS,(.*),\*9900XY(.*)\n')]
+
+def botpt_stream(count, status_every=None):
+    lines = [BOTPT_LINES[i % len(BOTPT_LINES)] for i in range(count)]
+    if status_every:
+        for i in range(status_every, count, status_every):
+            lines[i] = BOTPT_STATUS
+    return ''.join(lines)
+
+def finditer_sieve(raw_data, regex_list):
+    """
+    Each regex run over the whole buffer in turn, as the driver sieves did
+    """
+    return_list = []
+    for matcher in regex_list:
+        for match in matcher.finditer(raw_data):
+            return_list.append((match.start(), match.end()))
+    return sorted(return_list)
+
+
+@attr('UNIT', group='mi')
+class UnitTestRegexSieve(MiUnitTest):
+    """
+    Test the multiple regex sieve
+    """
+    def test_same_as_finditer(self):
+        for data in [botpt_stream(50), '', 'IRIS,', BOTPT_STATUS[:-30]]:
+            self.assertEqual(RegexSieve(IRIS_REGEX_LIST)(data), finditer_sieve(data, IRIS_REGEX_LIST))
+
+        sieve = RegexSieve(['ab+', 'c'])
+        self.assertEqual(sieve('xabbbcxc'), [(1, 5), (5, 6), (7, 8)])
+
+    def test_overlap(self):
+        """
+        Overlapping matches are dropped, the earliest and then the first in
+        the list winning
+        """
+        sieve = RegexSieve(['abc', 'bcd', 'ab'])
+        self.assertEqual(sieve('abcd'), [(0, 3)])
+        self.assertEqual(sieve('xbcdabcab'), [(1, 4), (4, 7), (7, 9)])
+
+        # the status regexes keep their time group to the first line, so
+        # they don't start at the command response before the status
+        data = botpt_stream(5) + BOTPT_STATUS
+        sample = data.index(BOTPT_LINES[2])
+        command = data.index(BOTPT_LINES[4])
+        status = data.index(BOTPT_STATUS)
+        self.assertEqual(RegexSieve(IRIS_REGEX_LIST)(data),
+                         [(sample, sample + len(BOTPT_LINES[2])),
+                          (command, command + len(BOTPT_LINES[4])),
+                          (status, len(data))])
+        self.assertEqual(RegexSieve(IRIS_REGEX_LIST)(data), finditer_sieve(data, IRIS_REGEX_LIST))
+
+        # empty matches still move the walk on
+        self.assertEqual(RegexSieve(['x*', 'y'])('ayb'), [(0, 0), (1, 1), (2, 2), (3, 3)])
+
+    def test_lookback(self):
+        """
+        Already scanned data is skipped but records split over chunks are
+        still found
+        """
+        data = botpt_stream(100)
+        regex_list = [re.compile(r'LILY,.*\n'), re.compile(r'HEAT,.*\n')]
+        expected = [data[s:e] for (s, e) in finditer_sieve(data, regex_list)]
+
+        def feed(chunker, chunk):
+            found = []
+            chunker.add_chunk(chunk, 1.0)
+            (ts, result) = chunker.get_next_data()
+            while result:
+                found.append(result)
+                (ts, result) = chunker.get_next_data()
+            return found
+
+        for size in [1, 7, 100]:
+            chunker = StringRingChunker(RegexSieve(regex_list), lookback=80)
+            found = []
+            for i in range(0, len(data), size):
+                found.extend(feed(chunker, data[i:i + size]))
+            self.assertEqual(found, expected)
+
+        # the sieve keeps no scan state, so chunkers can share one
+        sieve = RegexSieve(regex_list)
+        chunkers = [StringRingChunker(sieve, lookback=80) for i in range(2)]
+        found = [[], []]
+        for i in range(0, len(data), 7):
+            for (n, chunker) in enumerate(chunkers):
+                found[n].extend(feed(chunker, data[i:i + 7]))
+        self.assertEqual(found, [expected, expected])
+
+
+@attr('PERF', group='mi')
+class PerfTestRegexSieve(MiUnitTest):
+    """
+    Sieve time for a BOTPT stream with the IRIS driver regexes run in turn
+    and merged in one walk
+    """
+    COUNTS = [100, 1000, 4000]
+
+    def test_sieve(self):
+        sieve = RegexSieve(IRIS_REGEX_LIST)
+        for count in self.COUNTS:
+            for status_every in [None, 500]:
+                data = botpt_stream(count, status_every)
+
+                start = time.time()
+                result = sieve(data)
+                merged = time.time() - start
+
+                start = time.time()
+                finditer_sieve(data, IRIS_REGEX_LIST)
+                separate = time.time() - start
+
+                log.info("%d lines, status every %s: regexes in turn %.4fs, merged %.4fs",
+                         count, status_every, separate, merged)
@@ -11,18 +11,23 @@ __author__ = 'Steve Foley'
 __license__ = 'Apache 2.0'
 
 
+import gc
+import os
 import json
 import base64
 import time
 import ntplib
+import resource
+import numpy as np
 
 from nose.plugins.attrib import attr
-from mi.core.unit_test import MiUnitTestCase
+from mi.core.unit_test import MiUnitTestCase, MiUnitTest
 
 from mi.core.log import get_logger ; log = get_logger()
 from mi.core.exceptions import SampleException, ReadOnlyException, NotImplementedException, InstrumentParameterException
 from mi.core.instrument.data_particle import DataParticle, DataParticleKey, DataParticleValue
 from mi.core.instrument.data_particle import RawDataParticle, CommonDataParticleType
+from mi.core.instrument.data_particle import DataParticleEncoder
 from mi.core.instrument.port_agent_client import PortAgentPacket
 
 TEST_PARTICLE_VERSION = 1
@@ -283,3 +288,124 @@ class TestUnitDataParticle(MiUnitTestCase):
 
         with self.assertRaises(NotImplementedException):
             particle.data_particle_type()
+
+    def test_generate_batch(self):
+        """
+        A batch serializes to exactly what generate() returns per particle
+        """
+        particles = [self.parsed_test_particle, self.raw_test_particle] * 3
+        for sort_keys in [False, True]:
+            expected = [p.generate(sorted=sort_keys) for p in particles]
+            self.assertEqual(DataParticle.generate_batch(particles, sorted=sort_keys), expected)
+
+    def test_encoder(self):
+        """
+        The encoder produces exactly what json.dumps does
+        """
+        for sort_keys in [False, True]:
+            encoder = DataParticleEncoder(sort_keys=sort_keys)
+            for particle in [self.parsed_test_particle, self.raw_test_particle]:
+                self.assertEqual(encoder.encode(particle),
+                                 json.dumps(particle.generate_dict(), sort_keys=sort_keys))
+
+
+@attr('PERF', group='mi')
+class TestPerfDataParticle(MiUnitTest):
+    """
+    Benchmark particle serialization for a few real particle classes,
+    comparing json.dumps per particle with the batch encoder.
+    """
+    COUNT = 2000
+
+    def _sbe37_particles(self):
+        from mi.instrument.seabird.sbe37smb.ooicore.driver import SBE37DataParticle
+        line = "#  24.0088,  0.00001,   -0.002,   0.0000, 1505.260, 01 Jan 2001, 00:00:00"
+        return [SBE37DataParticle(line, port_timestamp=3555423720.711772)
+                for i in range(self.COUNT)]
+
+    def _adcp_particles(self):
+        from mi.instrument.teledyne.workhorse_monitor_75_khz.particles import ADCP_PD0_PARSED_DataParticle
+        from mi.instrument.teledyne.workhorse_monitor_75_khz.test.test_data import RSN_SAMPLE_RAW_DATA
+        return [ADCP_PD0_PARSED_DataParticle(RSN_SAMPLE_RAW_DATA, port_timestamp=3555423720.711772)
+                for i in range(self.COUNT)]
+
+    def _glider_particles(self):
+        from mi.dataset.parser.glider import GgldrCtdgvDelayedDataParticle, CtdgvParticleKey
+        data = dict([(key, {'Name': key, 'Data': np.float64(i + 0.5)})
+                     for (i, key) in enumerate(CtdgvParticleKey.list())])
+        return [GgldrCtdgvDelayedDataParticle(data, internal_timestamp=3555423720.711772,
+                                              preferred_timestamp=DataParticleKey.INTERNAL_TIMESTAMP)
+                for i in range(self.COUNT)]
+
+    def _rate(self, fn, particles):
+        start = time.time()
+        result = fn(particles)
+        rate = len(particles) / (time.time() - start)
+        return (rate, result)
+
+    def test_serialization_rate(self):
+        for (name, particles) in [('SBE37', self._sbe37_particles()),
+                                  ('ADCP PD0', self._adcp_particles()),
+                                  ('glider', self._glider_particles())]:
+            (dumps_rate, dumps_result) = self._rate(
+                lambda l: [json.dumps(p.generate_dict()) for p in l], particles)
+            (batch_rate, batch_result) = self._rate(DataParticle.generate_batch, particles)
+
+            self.assertEqual(dumps_result, batch_result)
+            log.info("%s: json.dumps %.0f particles/sec, generate_batch %.0f particles/sec",
+                     name, dumps_rate, batch_rate)
+
+
+@attr('PERF', group='mi')
+class TestPerfDataParticleMemory(MiUnitTest):
+    """
+    Report the memory used per particle and per port agent packet for a
+    large backlog, as measured by the growth in resident set size.
+    """
+    COUNT = 100000
+
+    class DictLayoutParticle(object):
+        """
+        The storage layout DataParticle used to have, an instance dictionary
+        plus a contents dictionary, for comparison.
+        """
+        def __init__(self, raw_data, port_timestamp=None):
+            self.contents = {
+                DataParticleKey.PKT_FORMAT_ID: DataParticleValue.JSON_DATA,
+                DataParticleKey.PKT_VERSION: 1,
+                DataParticleKey.PORT_TIMESTAMP: port_timestamp,
+                DataParticleKey.INTERNAL_TIMESTAMP: None,
+                DataParticleKey.DRIVER_TIMESTAMP: ntplib.system_to_ntp_time(time.time()),
+                DataParticleKey.PREFERRED_TIMESTAMP: DataParticleKey.PORT_TIMESTAMP,
+                DataParticleKey.QUALITY_FLAG: DataParticleValue.OK,
+            }
+            self.raw_data = raw_data
+
+    def _rss(self):
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+
+    def _bytes_per_object(self, factory):
+        gc.collect()
+        start = self._rss()
+        backlog = [factory() for i in range(self.COUNT)]
+        used = self._rss() - start
+        del backlog
+        gc.collect()
+        return float(used) / self.COUNT
+
+    def test_backlog_memory(self):
+        if not os.path.exists('/proc/self/statm'):
+            log.info("No /proc/self/statm, skipping memory benchmark")
+            return
+
+        raw = "SATPAR0229,10.01,2206748544,234"
+        before = self._bytes_per_object(
+            lambda: self.DictLayoutParticle(raw, port_timestamp=3555423720.711772))
+        after = self._bytes_per_object(
+            lambda: TestUnitDataParticle.TestDataParticle(raw, port_timestamp=3555423720.711772))
+        packet = self._bytes_per_object(PortAgentPacket)
+
+        log.info("%d particle backlog: %.0f bytes/particle with dictionaries, %.0f with slots",
+                 self.COUNT, before, after)
+        log.info("%d packet backlog: %.0f bytes/packet", self.COUNT, packet)
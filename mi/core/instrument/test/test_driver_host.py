@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_driver_host
+@file mi/core/instrument/test/test_driver_host.py
+@brief Test cases for hosting several drivers in one process
+"""
+
+__license__ = 'Apache 2.0'
+
+import json
+import time
+import socket
+import threading
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.event_loop import EventLoop
+from mi.core.event_loop import get_event_loop
+from mi.core.driver_scheduler import DriverScheduler
+from mi.core.driver_scheduler import DriverSchedulerConfigKey
+from mi.core.driver_scheduler import TriggerType
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.data_particle import CommonDataParticleType
+from mi.core.instrument.port_agent_client import PortAgentPacket
+from mi.core.instrument.port_agent_client import LoopPortAgentClient
+from mi.core.instrument.port_agent_client import LoopListener
+from mi.core.instrument.port_agent_replay import pack_log_record
+from mi.core.instrument.zmq_driver_client import ZmqDriverClient
+from mi.core.instrument.driver_host import DriverHost
+from mi.core.instrument.driver_host import DriverWorker
+from mi.core.instrument.driver_host import DriverHostClient
+from mi.instrument.satlantic.par_ser_600m.driver import PARProtocolState
+
+DRIVER_MODULE = 'mi.instrument.satlantic.par_ser_600m.driver'
+DRIVER_CLASS = 'SatlanticPARInstrumentDriver'
+TIMEOUT = 10
+
+def par_sample(serial, i):
+    return "SATPAR%04d,%d.01,2206748544,234\r\n" % (serial, i + 1)
+
+class FakePortAgent(object):
+    """
+    Accepts one port agent client connection and sends it packets.
+    """
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('localhost', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.connection = None
+        self.accepted = threading.Event()
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+        # commands such as the heartbeat interval are accepted and ignored
+        self.cmd_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.cmd_server.bind(('localhost', 0))
+        self.cmd_server.listen(5)
+        self.cmd_port = self.cmd_server.getsockname()[1]
+        thread = threading.Thread(target=self._accept_commands)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        (self.connection, address) = self.server.accept()
+        self.accepted.set()
+
+    def _accept_commands(self):
+        try:
+            while True:
+                self.cmd_server.accept()[0].close()
+        except socket.error:
+            pass
+
+    def send(self, data, packet_type=PortAgentPacket.DATA_FROM_INSTRUMENT):
+        if not self.accepted.wait(TIMEOUT):
+            raise AssertionError('Port agent client did not connect')
+        self.connection.sendall(pack_log_record(data, time.time(), packet_type))
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+        self.server.close()
+        self.cmd_server.close()
+
+class EventCollector(object):
+    def __init__(self):
+        self.events = []
+        self.condition = threading.Condition()
+
+    def __call__(self, evt):
+        with self.condition:
+            self.events.append(evt)
+            self.condition.notify_all()
+
+    def samples(self):
+        """
+        @retval parsed particles, without the raw ones.
+        """
+        particles = [json.loads(evt['value']) for evt in self.events
+                     if isinstance(evt, dict) and evt.get('type') == DriverAsyncEvent.SAMPLE]
+        return [p for p in particles if p['stream_name'] != CommonDataParticleType.RAW]
+
+    def wait_for_samples(self, count):
+        deadline = time.time() + TIMEOUT
+        with self.condition:
+            while len(self.samples()) < count and time.time() < deadline:
+                self.condition.wait(0.1)
+        return self.samples()
+
+@attr('UNIT', group='mi')
+class UnitTestLoopPortAgentClient(MiUnitTest):
+    """
+    Port agent clients listening on an event loop.
+    """
+    def setUp(self):
+        self.loop = EventLoop()
+        self.loop.start()
+        self.addCleanup(self.loop.join, TIMEOUT)
+        self.addCleanup(self.loop.stop)
+        self.port_agent = FakePortAgent()
+        self.addCleanup(self.port_agent.close)
+
+    def test_listen(self):
+        """
+        Packets are delivered on the loop thread and heartbeats reset a
+        loop timer instead of starting a thread.
+        """
+        packets = []
+        got_data = threading.Event()
+        def callback_data(packet):
+            packets.append((packet.get_data(), self.loop.in_loop_thread()))
+            got_data.set()
+
+        threads = threading.active_count()
+        client = LoopPortAgentClient(self.loop, 'localhost', self.port_agent.port,
+                                     self.port_agent.cmd_port)
+        client.init_comms(callback_data, lambda packet: None, None, None, heartbeat=5)
+        self.assertIsInstance(client.listener_thread, LoopListener)
+        self.assertTrue(client.listener_thread.is_alive())
+
+        for i in range(3):
+            self.port_agent.send('', PortAgentPacket.HEARTBEAT)
+        self.port_agent.send('hello')
+        self.assertTrue(got_data.wait(TIMEOUT))
+        self.assertEqual(packets, [('hello', True)])
+        # the fake port agent's accept thread may have finished
+        self.assertLessEqual(threading.active_count(), threads)
+
+        timer = client.listener_thread.heartbeat_timer
+        client.stop_comms()
+        self.assertTrue(timer.cancelled)
+        self.assertFalse(client.listener_thread.is_alive())
+        self.assertEqual(client.sock, None)
+
+    def test_worker(self):
+        """
+        Given a worker, data is handled on it and heartbeats on the loop.
+        """
+        worker = DriverWorker('test-data')
+        worker.start()
+        self.addCleanup(worker.join, TIMEOUT)
+        self.addCleanup(worker.stop)
+
+        packets = []
+        got_data = threading.Event()
+        def callback_data(packet):
+            packets.append((packet.get_data(), worker.in_worker_thread()))
+            got_data.set()
+
+        client = LoopPortAgentClient(self.loop, 'localhost', self.port_agent.port,
+                                     self.port_agent.cmd_port, worker=worker)
+        client.init_comms(callback_data, lambda packet: None, None, None, heartbeat=5)
+        self.addCleanup(client.stop_comms)
+        # the watchdog is started on the loop
+        deadline = time.time() + TIMEOUT
+        while client.listener_thread.heartbeat_timer is None and time.time() < deadline:
+            time.sleep(0.01)
+        timer = client.listener_thread.heartbeat_timer
+        deadline = timer.deadline
+
+        time.sleep(0.01)
+        self.port_agent.send('', PortAgentPacket.HEARTBEAT)
+        self.port_agent.send('hello')
+        self.assertTrue(got_data.wait(TIMEOUT))
+        self.assertEqual(packets, [('hello', True)])
+        self.assertGreater(timer.deadline, deadline)
+
+@attr('UNIT', group='mi')
+class UnitTestDriverHost(MiUnitTest):
+    """
+    Several drivers in one host, each with its own port agent and client.
+    """
+    def setUp(self):
+        self.host = DriverHost(host_string='tcp://127.0.0.1')
+        self.host.start_messaging()
+        self.addCleanup(self.host.stop_messaging)
+
+        self.host_client = DriverHostClient('localhost', self.host.cmd_port,
+                                            self.host.evt_port, cmd_timeout=TIMEOUT)
+        self.host_client.start_messaging()
+        self.addCleanup(self.host_client.stop_messaging)
+
+    def start_driver(self, driver_id):
+        """
+        Add a PAR driver to the host and put it in autosample on a fake
+        port agent.
+        @retval (client, event collector, port agent)
+        """
+        self.assertEqual(self.host_client.add_driver(driver_id, DRIVER_MODULE, DRIVER_CLASS),
+                         driver_id)
+        port_agent = FakePortAgent()
+        self.addCleanup(port_agent.close)
+
+        collector = EventCollector()
+        client = ZmqDriverClient('localhost', self.host.cmd_port, self.host.evt_port,
+                                 cmd_timeout=TIMEOUT, driver_id=driver_id)
+        client.start_messaging(collector)
+        self.addCleanup(client.stop_messaging)
+
+        client.cmd_dvr('configure', config={'addr': 'localhost', 'port': port_agent.port,
+                                            'cmd_port': None})
+        client.cmd_dvr('connect')
+        client.cmd_dvr('set_test_mode', True)
+        client.cmd_dvr('test_force_state', state=PARProtocolState.AUTOSAMPLE)
+        return (client, collector, port_agent)
+
+    def test_drivers(self):
+        """
+        Commands and events are routed to the right driver, and the port
+        agent connections share the event loop.
+        """
+        drivers = [self.start_driver('par_%d' % serial) for serial in [1, 2]]
+        self.assertEqual(sorted(self.host_client.list_drivers().keys()), ['par_1', 'par_2'])
+
+        for (serial, (client, collector, port_agent)) in zip([1, 2], drivers):
+            for i in range(serial * 3):
+                port_agent.send(par_sample(serial, i))
+
+        for (serial, (client, collector, port_agent)) in zip([1, 2], drivers):
+            samples = collector.wait_for_samples(serial * 3)
+            self.assertEqual(len(samples), serial * 3)
+            serials = set([value['value'] for s in samples for value in s['values']
+                           if value['value_id'] == 'serial_number'])
+            self.assertEqual(serials, set([serial]))
+
+        for (client, collector, port_agent) in drivers:
+            connection = self.host.drivers[client.driver_id].driver._connection
+            self.assertIsInstance(connection, LoopPortAgentClient)
+            self.assertIs(connection.loop, self.host.loop)
+        self.assertIs(self.host.loop, get_event_loop())
+
+        self.assertEqual(self.host_client.remove_driver('par_1'), 'par_1')
+        self.assertEqual(self.host_client.list_drivers().keys(), ['par_2'])
+
+    def test_remove_driver_scheduler(self):
+        """
+        Removing a driver cancels the jobs its protocol scheduled.
+        """
+        self.start_driver('par_1')
+        triggered = []
+        scheduler = DriverScheduler({
+            'tick': {
+                DriverSchedulerConfigKey.TRIGGER: {
+                    DriverSchedulerConfigKey.TRIGGER_TYPE: TriggerType.INTERVAL,
+                    DriverSchedulerConfigKey.SECONDS: 0.2
+                },
+                DriverSchedulerConfigKey.CALLBACK: lambda: triggered.append(time.time())
+            }
+        })
+        self.host.drivers['par_1'].driver._protocol._scheduler = scheduler
+
+        self.assertEqual(self.host_client.remove_driver('par_1'), 'par_1')
+        self.assertEqual(scheduler._scheduler.get_jobs(), [])
+        del triggered[:]
+        time.sleep(0.5)
+        self.assertEqual(triggered, [])
+
+    def test_command_threads(self):
+        """
+        A driver blocked in a command doesn't hold up the others' commands
+        or data.
+        """
+        drivers = [self.start_driver('par_%d' % serial) for serial in range(1, 6)]
+        release = threading.Event()
+        entered = []
+        blocked = []
+        def blocking_command(msg):
+            entered.append(msg['driver_id'])
+            release.wait(TIMEOUT)
+            return 'released'
+
+        for (client, collector, port_agent) in drivers[:4]:
+            self.host.drivers[client.driver_id].cmd_driver = blocking_command
+            thread = threading.Thread(target=lambda c=client: blocked.append(c.cmd_dvr('get_resource_state')))
+            thread.daemon = True
+            thread.start()
+            self.addCleanup(thread.join, TIMEOUT)
+        self.addCleanup(release.set)
+
+        deadline = time.time() + TIMEOUT
+        while len(entered) < 4 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(entered), 4)
+
+        (client, collector, port_agent) = drivers[4]
+        self.assertEqual(client.cmd_dvr('get_resource_state'), PARProtocolState.AUTOSAMPLE)
+        drivers[0][2].send(par_sample(1, 0))
+        self.assertEqual(len(drivers[0][1].wait_for_samples(1)), 1)
+        self.assertEqual(blocked, [])
+
+        release.set()
+        deadline = time.time() + TIMEOUT
+        while len(blocked) < 4 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(blocked, ['released'] * 4)
+
+    def test_metrics(self):
+        """
+        Each hosted driver records, enables and resets its own metrics.
+        """
+        drivers = [self.start_driver('par_%d' % serial) for serial in [1, 2]]
+        (client_1, collector_1, port_agent_1) = drivers[0]
+        (client_2, collector_2, port_agent_2) = drivers[1]
+
+        self.assertTrue(client_1.cmd_dvr('enable_metrics'))
+        port_agent_1.send(par_sample(1, 0))
+        port_agent_2.send(par_sample(2, 0))
+        collector_1.wait_for_samples(1)
+        collector_2.wait_for_samples(1)
+
+        metrics_1 = client_1.cmd_dvr('get_metrics', reset=True)
+        self.assertTrue(metrics_1['enabled'])
+        self.assertEqual(metrics_1['counters']['port_agent.packets']['count'], 1)
+        self.assertEqual(client_2.cmd_dvr('get_metrics'),
+                         {'enabled': False, 'counters': {}, 'histograms': {}})
+        self.assertEqual(client_1.cmd_dvr('get_metrics')['counters']['port_agent.packets']['count'], 0)
+
+        self.assertFalse(client_2.cmd_dvr('enable_metrics', False))
+        self.assertTrue(client_1.cmd_dvr('get_metrics')['enabled'])
+
+    def test_errors(self):
+        """
+        A bad driver, command or id gets an error reply and the other
+        drivers carry on.
+        """
+        (client, collector, port_agent) = self.start_driver('par_1')
+
+        reply = self.host_client.add_driver('broken', 'mi.no.such.driver', 'Driver')
+        self.assertIsInstance(reply, tuple)
+        reply = self.host_client.add_driver('par_1', DRIVER_MODULE, DRIVER_CLASS)
+        self.assertIsInstance(reply, tuple)
+
+        unknown = ZmqDriverClient('localhost', self.host.cmd_port, self.host.evt_port,
+                                  cmd_timeout=TIMEOUT, driver_id='nobody')
+        unknown.start_messaging(encodings=None)
+        self.addCleanup(unknown.stop_messaging)
+        self.assertIsInstance(unknown.cmd_dvr('get_resource_state'), tuple)
+
+        self.assertIsInstance(client.cmd_dvr('no_such_command'), tuple)
+        self.assertIsInstance(client.cmd_dvr('execute_resource', 'NOT_AN_EVENT'), tuple)
+
+        port_agent.send('garbage that is not a sample\r\n')
+        port_agent.send(par_sample(1, 0))
+        self.assertEqual(len(collector.wait_for_samples(1)), 1)
+        self.assertEqual(client.cmd_dvr('get_resource_state'), PARProtocolState.AUTOSAMPLE)
+
+    def test_stop_driver(self):
+        """
+        stop_driver_process sent to a hosted driver removes just that driver.
+        """
+        (client, collector, port_agent) = self.start_driver('par_1')
+        self.assertEqual(client.cmd_dvr('stop_driver_process'), 'stop_driver_process')
+        deadline = time.time() + TIMEOUT
+        while self.host_client.list_drivers() and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.host_client.list_drivers(), {})
+        self.assertTrue(self.host.messaging_started)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_event_queue
+@file mi/core/instrument/test/test_event_queue.py
+@brief Test cases for the bounded driver process event queue
+"""
+
+__license__ = 'Apache 2.0'
+
+import time
+import threading
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.exceptions import InstrumentCommandException
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.data_particle import RawDataParticle
+from mi.core.instrument.driver_process import DriverProcess
+from mi.core.instrument.event_queue import EventQueue
+from mi.core.instrument.event_queue import EventQueuePolicy
+from mi.core.instrument.event_queue import RAW_SAMPLE
+from mi.core.instrument.event_queue import event_kind
+
+RAW_VALUE = RawDataParticle({'raw': 'abc', 'length': 3, 'type': 1, 'checksum': 5},
+                            port_timestamp=3555423720.0).generate()
+
+def raw(n):
+    return {'type': DriverAsyncEvent.SAMPLE, 'value': RAW_VALUE, 'time': n}
+
+def sample(n):
+    return {'type': DriverAsyncEvent.SAMPLE,
+            'value': '{"stream_name": "ctdpf_parsed", "values": []}', 'time': n}
+
+def state(n):
+    return {'type': DriverAsyncEvent.STATE_CHANGE, 'value': 'STATE_%s' % n, 'time': n}
+
+def times(events):
+    return [evt['time'] for evt in events]
+
+
+@attr('UNIT', group='mi')
+class UnitTestEventQueue(MiUnitTest):
+    """
+    Test the overflow policies of the event queue.
+    """
+    def test_event_kind(self):
+        self.assertEqual(event_kind(raw(0)), RAW_SAMPLE)
+        self.assertEqual(event_kind(sample(0)), DriverAsyncEvent.SAMPLE)
+        self.assertEqual(event_kind({'type': DriverAsyncEvent.SAMPLE,
+                                     'value': {'stream_name': 'raw'}}), RAW_SAMPLE)
+        self.assertEqual(event_kind(state(0)), DriverAsyncEvent.STATE_CHANGE)
+        self.assertEqual(event_kind(5), None)
+
+    def test_fifo(self):
+        queue = EventQueue(max_size=None)
+        for i in range(5):
+            self.assertTrue(queue.put(i))
+        self.assertEqual(len(queue), 5)
+        self.assertEqual(queue.get(3), [0, 1, 2])
+        self.assertEqual(queue.get(3), [3, 4])
+        self.assertEqual(queue.stats()['dropped'], {})
+
+    def test_shed_raw(self):
+        """
+        Raw samples are shed, oldest first, to make room for science data.
+        """
+        queue = EventQueue(max_size=3)
+        queue.put(raw(1))
+        queue.put(sample(2))
+        queue.put(raw(3))
+        self.assertTrue(queue.put(sample(4)))
+        self.assertTrue(queue.put(raw(5)))
+        self.assertEqual(len(queue), 3)
+        self.assertEqual(queue.stats()['dropped'], {RAW_SAMPLE: 2})
+        self.assertEqual(times(queue.get(10)), [2, 4, 5])
+
+    def test_drop_raw(self):
+        """
+        A raw sample is dropped when the queue is full of other events.
+        """
+        queue = EventQueue(max_size=2)
+        queue.put(sample(1))
+        queue.put(sample(2))
+        self.assertFalse(queue.put(raw(3)))
+        self.assertEqual(queue.stats()['dropped'], {RAW_SAMPLE: 1})
+        self.assertEqual(times(queue.get(10)), [1, 2])
+
+    def test_coalesce(self):
+        queue = EventQueue(max_size=3)
+        queue.put(state(1))
+        queue.put(sample(2))
+        queue.put(state(3))
+
+        # not full yet when state 3 went in, so nothing was coalesced
+        self.assertEqual(queue.stats()['coalesced'], {})
+
+        self.assertTrue(queue.put(state(4)))
+        self.assertTrue(queue.put(state(5)))
+        stats = queue.stats()
+        self.assertEqual(stats['coalesced'], {DriverAsyncEvent.STATE_CHANGE: 2})
+        self.assertEqual(stats['size'], 3)
+        self.assertEqual(times(queue.get(10)), [1, 2, 5])
+
+    def test_block(self):
+        """
+        Science samples wait for room while the consumer is running and
+        go over the limit when it isn't.
+        """
+        queue = EventQueue(max_size=2)
+        queue.put(sample(1))
+        queue.put(sample(2))
+
+        running = [True]
+        thread = threading.Thread(target=queue.put, args=(sample(3), lambda: running[0]))
+        thread.start()
+        time.sleep(.1)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(times(queue.get(1)), [1])
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(queue.stats()['blocked'], {DriverAsyncEvent.SAMPLE: 1})
+
+        # consumer stopped, a blocked producer is released by wake
+        thread = threading.Thread(target=queue.put, args=(sample(4), lambda: running[0]))
+        thread.start()
+        time.sleep(.1)
+        running[0] = False
+        queue.wake()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+        self.assertTrue(queue.put(sample(5)))
+        self.assertEqual(times(queue.get(10)), [2, 3, 4, 5])
+
+    def test_configure(self):
+        queue = EventQueue(max_size=10)
+        for i in range(3):
+            queue.put(sample(i))
+
+        self.assertRaises(ValueError, queue.configure, policies={DriverAsyncEvent.SAMPLE: 'BOGUS'})
+        queue.configure(max_size=3, policies={DriverAsyncEvent.SAMPLE: EventQueuePolicy.DROP_OLDEST})
+        queue.put(sample(3))
+        self.assertEqual(times(queue.get(10)), [1, 2, 3])
+
+        queue.configure(policies={RAW_SAMPLE: EventQueuePolicy.BLOCK,
+                                  DriverAsyncEvent.SAMPLE: EventQueuePolicy.BLOCK})
+        for i in range(3):
+            queue.put(raw(i))
+        queue.put(raw(3))
+        self.assertEqual(len(queue), 4)
+
+    def test_compact(self):
+        """
+        Shed entries don't pile up while the consumer is stalled.
+        """
+        queue = EventQueue(max_size=10)
+        for i in range(1000):
+            queue.put(raw(i))
+        self.assertEqual(len(queue), 10)
+        self.assertLessEqual(len(queue._entries), 20)
+        self.assertEqual(times(queue.get(100)), range(990, 1000))
+
+    def test_requeue(self):
+        """
+        Events that failed to send go back in front, in order, and are
+        still the oldest when raw data is shed.
+        """
+        queue = EventQueue(max_size=3)
+        queue.put(raw(1))
+        queue.put(sample(2))
+        evts = queue.get(2)
+        queue.put(raw(3))
+        queue.requeue(evts)
+        self.assertEqual(len(queue), 3)
+
+        self.assertTrue(queue.put(sample(4)))
+        self.assertEqual(queue.stats()['dropped'], {RAW_SAMPLE: 1})
+        self.assertEqual(times(queue.get(10)), [2, 3, 4])
+
+    def test_driver_process(self):
+        process = DriverProcess('module', 'class', None)
+        reply = process.cmd_driver({'cmd': 'configure_event_queue', 'args': (),
+                                    'kwargs': {'max_size': 1}})
+        self.assertEqual(reply['max_size'], 1)
+
+        process.send_event(sample(1))
+        process.send_event(raw(2))
+        reply = process.cmd_driver({'cmd': 'get_event_queue_stats', 'args': (), 'kwargs': {}})
+        self.assertEqual(reply['dropped'], {RAW_SAMPLE: 1})
+
+        reply = process.cmd_driver({'cmd': 'configure_event_queue', 'args': (),
+                                    'kwargs': {'policies': {RAW_SAMPLE: 'BOGUS'}}})
+        self.assertIsInstance(reply, InstrumentCommandException)
+
+
+@attr('PERF', group='mi')
+class PerfTestEventQueue(MiUnitTest):
+    """
+    Time queueing events with the consumer keeping up and with a stalled
+    consumer while raw data is shed.
+    """
+    def test_put_get(self):
+        count = 100000
+        events = [raw(i) if i % 2 else sample(i) for i in xrange(count)]
+
+        queue = EventQueue(max_size=1000)
+        start = time.time()
+        for i in xrange(0, count, 100):
+            for evt in events[i:i+100]:
+                queue.put(evt)
+            queue.get(100)
+        elapsed = time.time() - start
+        log.info("pass through: %.2fus per event", elapsed * 1e6 / count)
+
+        queue = EventQueue(max_size=1000)
+        start = time.time()
+        for evt in events:
+            if evt['value'] == RAW_VALUE:
+                queue.put(evt)
+        elapsed = time.time() - start
+        log.info("stalled consumer: %.2fus per raw event, stats %s",
+                 elapsed * 2e6 / count, queue.stats())
+        self.assertEqual(len(queue), 1000)
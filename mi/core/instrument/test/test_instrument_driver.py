@@ -30,6 +30,8 @@ from mi.core.instrument.instrument_driver import DriverParameter
 from mi.core.instrument.instrument_driver import ConfigMetadataKey
 from mi.core.instrument.instrument_protocol import InstrumentProtocol
 from mi.core.instrument.driver_dict import DriverDictKey
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.metrics import get_metrics
 
 @attr('UNIT', group='mi')
 class TestUnitInstrumentDriver(MiUnitTestCase):
@@ -89,6 +91,35 @@ class TestUnitInstrumentDriver(MiUnitTestCase):
         self.driver._protocol._driver_dict.add(DriverDictKey.VENDOR_SW_COMPATIBLE,
                                                True)
                 
+    def test_metrics(self):
+        """
+        Driver events are counted by type once metrics are enabled, and the
+        get_metrics command returns and optionally resets them.
+        """
+        # other tests may have left the counter registered, but at zero
+        get_metrics().reset()
+        self.driver._driver_event(DriverAsyncEvent.SAMPLE, 'sample')
+        counters = self.driver.get_metrics()['counters']
+        self.assertEqual(counters.get('driver.event.%s' % DriverAsyncEvent.SAMPLE,
+                                      {'count': 0})['count'], 0)
+
+        self.assertTrue(self.driver.enable_metrics())
+        try:
+            self.driver._driver_event(DriverAsyncEvent.SAMPLE, 'sample')
+            self.driver._driver_event(DriverAsyncEvent.SAMPLE, 'sample')
+            self.driver._driver_event(DriverAsyncEvent.ERROR, 'error')
+
+            result = self.driver.get_metrics(reset=True)
+            self.assertTrue(result['enabled'])
+            counters = result['counters']
+            self.assertEqual(counters['driver.event.%s' % DriverAsyncEvent.SAMPLE]['count'], 2)
+            self.assertEqual(counters['driver.event.%s' % DriverAsyncEvent.ERROR]['count'], 1)
+
+            counters = self.driver.get_metrics()['counters']
+            self.assertEqual(counters['driver.event.%s' % DriverAsyncEvent.SAMPLE]['count'], 0)
+        finally:
+            self.assertFalse(self.driver.enable_metrics(False))
+
     def test_test_mode(self):
         """
         Test driver test mode.
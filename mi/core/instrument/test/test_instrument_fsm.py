@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_instrument_fsm
+@file mi/core/instrument/test/test_instrument_fsm.py
+@brief Test cases for the instrument state machines
+"""
+
+__license__ = 'Apache 2.0'
+
+import time
+import threading
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.common import BaseEnum
+from mi.core.exceptions import InstrumentStateException
+from mi.core.instrument.instrument_fsm import InstrumentFSM
+from mi.core.instrument.instrument_fsm import ThreadSafeFSM
+
+class States(BaseEnum):
+    IDLE = 'STATE_IDLE'
+    BUSY = 'STATE_BUSY'
+
+class Events(BaseEnum):
+    ENTER = 'EVENT_ENTER'
+    EXIT = 'EVENT_EXIT'
+    GO = 'EVENT_GO'
+    STOP = 'EVENT_STOP'
+    PING = 'EVENT_PING'
+
+class OtherStates(BaseEnum):
+    IDLE = 'STATE_IDLE'
+    OTHER = 'STATE_OTHER'
+
+class OtherEvents(BaseEnum):
+    OTHER = 'EVENT_OTHER'
+
+
+def make_fsm(fsm_class=InstrumentFSM):
+    calls = []
+    fsm = fsm_class(States, Events, Events.ENTER, Events.EXIT)
+    fsm.add_handler(States.IDLE, Events.ENTER, lambda *a: calls.append('enter idle'))
+    fsm.add_handler(States.IDLE, Events.EXIT, lambda *a: calls.append('exit idle'))
+    fsm.add_handler(States.IDLE, Events.GO, lambda *a: (States.BUSY, 'go'))
+    fsm.add_handler(States.IDLE, Events.PING, lambda *a: (None, 'pong'))
+    fsm.add_handler(States.BUSY, Events.ENTER, lambda *a: calls.append('enter busy'))
+    fsm.add_handler(States.BUSY, Events.STOP, lambda *a: (States.IDLE, 'stop'))
+    fsm.add_handler(States.BUSY, Events.PING, lambda *a: (None, 'busy'))
+    return fsm, calls
+
+
+@attr('UNIT', group='mi')
+class UnitTestInstrumentFSM(MiUnitTest):
+    """
+    Test handler registration, dispatch, transitions and event counters.
+    """
+    def test_add_handler(self):
+        fsm, calls = make_fsm()
+        self.assertFalse(fsm.add_handler('STATE_BOGUS', Events.GO, None))
+        self.assertFalse(fsm.add_handler(States.IDLE, 'EVENT_BOGUS', None))
+        self.assertFalse(fsm.start('STATE_BOGUS'))
+        self.assertIsNone(fsm.get_current_state())
+
+    def test_transitions(self):
+        fsm, calls = make_fsm()
+        self.assertTrue(fsm.start(States.IDLE))
+        self.assertEqual(calls, ['enter idle'])
+
+        self.assertEqual(fsm.on_event(Events.PING), 'pong')
+        self.assertEqual(fsm.get_current_state(), States.IDLE)
+
+        self.assertEqual(fsm.on_event(Events.GO), 'go')
+        self.assertEqual(fsm.get_current_state(), States.BUSY)
+        self.assertEqual(fsm.previous_state, States.IDLE)
+        self.assertEqual(calls, ['enter idle', 'exit idle', 'enter busy'])
+
+        self.assertEqual(fsm.on_event(Events.PING), 'busy')
+        self.assertRaises(InstrumentStateException, fsm.on_event, Events.GO)
+        self.assertRaises(InstrumentStateException, fsm.on_event, 'EVENT_BOGUS')
+
+        self.assertEqual(fsm.on_event(Events.STOP), 'stop')
+        self.assertEqual(fsm.get_current_state(), States.IDLE)
+
+    def test_get_events(self):
+        """
+        Event lists are cached per state and rebuilt when a handler is added.
+        """
+        fsm, calls = make_fsm()
+        fsm.start(States.IDLE)
+        self.assertEqual(sorted(fsm.get_events()), [Events.GO, Events.PING])
+        self.assertEqual(sorted(fsm.get_events(current_state=False)),
+                         [Events.GO, Events.PING, Events.STOP])
+
+        # callers get their own copy
+        fsm.get_events().append('EVENT_BOGUS')
+        self.assertEqual(sorted(fsm.get_events()), [Events.GO, Events.PING])
+
+        fsm.add_handler(States.IDLE, Events.STOP, lambda *a: (None, None))
+        self.assertEqual(sorted(fsm.get_events()), [Events.GO, Events.PING, Events.STOP])
+
+        fsm.on_event(Events.GO)
+        self.assertEqual(sorted(fsm.get_events()), [Events.PING, Events.STOP])
+
+    def test_get_events_before_start(self):
+        """
+        Asking for the current state's events before start doesn't hide the
+        full event list.
+        """
+        fsm, calls = make_fsm()
+        self.assertEqual(fsm.get_events(), [])
+        self.assertEqual(sorted(fsm.get_events(current_state=False)),
+                         [Events.GO, Events.PING, Events.STOP])
+
+    def test_replace_enums(self):
+        """
+        Replacing the state or event enum updates the membership checks.
+        """
+        fsm, calls = make_fsm()
+        fsm.states = OtherStates
+        fsm.events = OtherEvents
+        self.assertEqual(fsm.states, OtherStates)
+        self.assertEqual(fsm.events, OtherEvents)
+
+        self.assertFalse(fsm.start(States.BUSY))
+        self.assertTrue(fsm.start(OtherStates.OTHER))
+        self.assertTrue(fsm.add_handler(OtherStates.OTHER, OtherEvents.OTHER,
+                                        lambda *a: (OtherStates.IDLE, 'other')))
+        self.assertRaises(InstrumentStateException, fsm.on_event, Events.PING)
+        self.assertEqual(fsm.on_event(OtherEvents.OTHER), 'other')
+        self.assertEqual(fsm.get_current_state(), OtherStates.IDLE)
+
+    def test_event_stats(self):
+        fsm, calls = make_fsm()
+        fsm.start(States.IDLE)
+        self.assertEqual(fsm.get_event_stats(), {})
+
+        fsm.on_event(Events.PING)
+        fsm.on_event(Events.PING)
+        fsm.on_event(Events.GO)
+
+        def fail(*args):
+            raise ValueError("handler failed")
+        fsm.add_handler(States.BUSY, Events.STOP, fail)
+        self.assertRaises(ValueError, fsm.on_event, Events.STOP)
+
+        stats = fsm.get_event_stats()
+        self.assertEqual(sorted(stats.keys()), [Events.GO, Events.PING, Events.STOP])
+        self.assertEqual(stats[Events.PING][0], 2)
+        self.assertEqual(stats[Events.STOP][0], 1)
+        for (count, total, longest) in stats.values():
+            self.assertTrue(0 <= longest <= total)
+
+        fsm.reset_event_stats()
+        self.assertEqual(fsm.get_event_stats(), {})
+
+    def test_thread_safe(self):
+        """
+        Handlers are serialized, unknown events are refused without waiting
+        for the lock.
+        """
+        fsm, calls = make_fsm(ThreadSafeFSM)
+        fsm.start(States.IDLE)
+
+        started = threading.Event()
+        release = threading.Event()
+        def slow(*args):
+            started.set()
+            release.wait(5)
+            return (None, 'slow')
+        fsm.add_handler(States.IDLE, Events.STOP, slow)
+
+        thread = threading.Thread(target=fsm.on_event, args=(Events.STOP,))
+        thread.start()
+        started.wait(5)
+        try:
+            start = time.time()
+            self.assertRaises(InstrumentStateException, fsm.on_event, 'EVENT_BOGUS')
+            self.assertLess(time.time() - start, 1)
+        finally:
+            release.set()
+            thread.join(5)
+
+        self.assertEqual(fsm.on_event(Events.PING), 'pong')
+        self.assertEqual(fsm.get_event_stats()[Events.STOP][0], 1)
+
+
+@attr('PERF', group='mi')
+class PerfTestInstrumentFSM(MiUnitTest):
+    """
+    Time event dispatch through the thread safe state machine.
+    """
+    def test_dispatch(self):
+        fsm, calls = make_fsm(ThreadSafeFSM)
+        fsm.start(States.IDLE)
+        count = 100000
+
+        start = time.time()
+        for i in xrange(count):
+            fsm.on_event(Events.PING)
+            fsm.get_events()
+        elapsed = time.time() - start
+
+        log.info("%d events dispatched in %.3fs, %.2fus per event",
+                 count, elapsed, elapsed * 1e6 / count)
+        self.assertEqual(fsm.get_event_stats()[Events.PING][0], count)
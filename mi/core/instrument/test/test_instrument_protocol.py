@@ -12,6 +12,8 @@ __license__ = 'Apache 2.0'
 
 import re
 import time
+import socket
+import threading
 import ntplib
 import datetime
 from mock import Mock
@@ -33,6 +35,7 @@ from mi.core.driver_scheduler import DriverScheduler
 from mi.core.instrument.instrument_driver import DriverConfigKey
 from mi.core.driver_scheduler import DriverSchedulerConfigKey
 from mi.core.driver_scheduler import TriggerType
+from mi.core.port_agent_simulator import TCPSimulatorServer
 
 from mi.core.unit_test import MiUnitTestCase
 import unittest
@@ -572,6 +575,167 @@ class TestUnitCommandInstrumentProtocol(MiUnitTestCase):
                           self.TestEvent.TEST, expected_prompt=">", response_regex=regex1)
 
 
+    def _add_later(self, data, delay):
+        """
+        Feed data into the protocol buffers from another thread, the way the
+        port agent listener does.
+        """
+        timer = threading.Timer(delay, self.protocol.add_to_buffer, [data])
+        timer.start()
+        return timer
+
+    def test_get_response_wakes_on_data(self):
+        """
+        Verify a response waiter is released as soon as the prompt arrives
+        rather than on the next polling interval.
+        """
+        self._add_later("some response\r\n>", 0.05)
+        starttime = time.time()
+        (prompt, result) = self.protocol._get_response(timeout=5)
+        elapsed = time.time() - starttime
+
+        self.assertEqual(prompt, ">")
+        self.assertEqual(result, "some response\r\n>")
+        self.assertLess(elapsed, 1)
+
+        # Nothing else arrives, so the wait should time out.
+        self.protocol._promptbuf = ''
+        self.assertRaises(InstrumentTimeoutException,
+                          self.protocol._get_response, timeout=.2)
+
+    def test_get_response_split_prompt(self):
+        """
+        Verify the incremental prompt search finds a prompt that straddles
+        two reads and honors the prompt list order.
+        """
+        self.protocol._promptbuf = ''
+        self.protocol.add_to_buffer("data S")
+        timer = self._add_later(">> more", 0.05)
+        (prompt, result) = self.protocol._get_response(timeout=5,
+                                                       expected_prompt=["S>>", ">"])
+        timer.join()
+        self.assertEqual(prompt, "S>>")
+        self.assertEqual(result, "data S>>")
+
+        # A buffer cleared while waiting is rescanned from the start
+        match = self.protocol._prompt_matcher(["S>>"])
+        self.protocol._promptbuf = "xxxxxxxxxx"
+        self.assertIsNone(match())
+        self.protocol._promptbuf = "S>>"
+        self.assertEqual(match(), ("S>>", "S>>"))
+
+    def test_get_response_regex_wakes_on_data(self):
+        """
+        Verify a regex waiter is released when matching data arrives.
+        """
+        self.protocol._linebuf = ''
+        self._add_later("value = 42\r\n", 0.05)
+        result = self.protocol._get_response(timeout=5,
+                                             response_regex=re.compile(r'value = (\d+)'))
+        self.assertEqual(result, ("42",))
+
+    def test_wakeup_returns_on_prompt(self):
+        """
+        Verify _wakeup returns as soon as the prompt is seen instead of
+        always waiting out the wakeup delay.
+        """
+        starttime = time.time()
+        prompt = self.protocol._wakeup(timeout=10, delay=5)
+        self.assertEqual(prompt, ">")
+        self.assertLess(time.time() - starttime, 1)
+
+
+@attr('PERF', group='mi')
+class TestPerfCommandInstrumentProtocol(MiUnitTestCase):
+    """
+    Latency benchmark for command/response round trips through a TCP
+    connection to a simulated instrument.
+    """
+    COMMAND = "DS"
+    PROMPT = "S>"
+    ITERATIONS = 200
+
+    def setUp(self):
+        """
+        Start an instrument simulator that answers every line with a prompt
+        and a reader thread that feeds the protocol like the port agent
+        listener does.
+        """
+        self.server = TCPSimulatorServer()
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.client.connect(('localhost', self.server.port))
+        self.client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._done = False
+
+        self.protocol = CommandResponseInstrumentProtocol([self.PROMPT],
+                                                          "\r\n",
+                                                          lambda *args: None)
+        self.protocol._add_build_handler(self.COMMAND, lambda cmd: cmd + "\r\n")
+        self.protocol._add_response_handler(self.COMMAND, lambda result, prompt: result)
+        self.protocol._connection = Mock()
+        self.protocol._connection.send = self.client.sendall
+        self.protocol.get_current_state = Mock(return_value=None)
+        self.protocol._send_wakeup = lambda: self.client.sendall("\r\n")
+
+        self.threads = [threading.Thread(target=self._instrument),
+                        threading.Thread(target=self._reader)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def tearDown(self):
+        self._done = True
+        self.client.close()
+        self.server.close()
+        self.server.socket.close()
+
+    def _instrument(self):
+        while not self.server.connection and not self._done:
+            time.sleep(.01)
+        while not self._done:
+            try:
+                data = self.server.connection.recv(1024)
+            except (socket.error, AttributeError):
+                return
+            if not data:
+                return
+            for line in data.split("\r\n")[:-1]:
+                self.server.connection.sendall("%s\r\nsome response\r\n%s" % (line, self.PROMPT))
+
+    def _reader(self):
+        while not self._done:
+            try:
+                data = self.client.recv(1024)
+            except socket.error:
+                return
+            if not data:
+                return
+            self.protocol.add_to_buffer(data)
+
+    def test_cmd_resp_latency(self):
+        """
+        Measure the end to end time of _do_cmd_resp, wakeup included.
+        """
+        # Prime the connection
+        self.protocol._do_cmd_resp(self.COMMAND, timeout=10)
+
+        latencies = []
+        for i in range(self.ITERATIONS):
+            starttime = time.time()
+            result = self.protocol._do_cmd_resp(self.COMMAND, timeout=10)
+            latencies.append(time.time() - starttime)
+            self.assertTrue(result.endswith(self.PROMPT))
+
+        latencies.sort()
+        mean = sum(latencies) / len(latencies)
+        log.info("_do_cmd_resp latency over %d commands: mean %.2f ms, median %.2f ms, max %.2f ms",
+                 self.ITERATIONS, mean * 1000, latencies[len(latencies) / 2] * 1000,
+                 latencies[-1] * 1000)
+
+        # The old 100 ms polling loops cost at least a wakeup delay per command.
+        self.assertLess(mean, .1)
+
+
 @attr('UNIT', group='mi')
 class TestUnitMenuInstrumentProtocol(MiUnitTestCase):
     """
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_pd0
+@file mi/core/instrument/test/test_pd0.py
+@brief Test cases for the shared PD0 decoding functions
+"""
+
+__license__ = 'Apache 2.0'
+
+import re
+import random
+import time
+from struct import pack, unpack, calcsize
+
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.exceptions import SampleException
+from mi.core.instrument import pd0
+
+def random_bytes(rand, count):
+    return ''.join([chr(rand.randrange(256)) for i in range(count)])
+
+def ensemble(payload):
+    """
+    Build a PD0 ensemble around a payload, with a good checksum
+    """
+    data = pd0.SYNC + pack('<HBB', len(payload) + pd0.HEADER_SIZE, 0, 0) + payload
+    return data + pack('<H', sum([ord(c) for c in data]) & 0xFFFF)
+
+def regex_sieve(raw_data):
+    """
+    The per candidate regex sieve the workhorse drivers used before the
+    framer, for comparison
+    """
+    return_list = []
+    for match in re.finditer(r'\x7f\x7f(..)', raw_data, re.DOTALL):
+        length = unpack("H", match.group(1))[0]
+        outer_pos = match.start()
+        matcher = re.compile(r'\x7f\x7f(.{' + str(length) + '})', re.DOTALL)
+        for match in matcher.finditer(raw_data, outer_pos):
+            if outer_pos == match.start():
+                return_list.append((match.start(), match.end()))
+    return return_list
+
+@attr('UNIT', group='mi')
+class UnitTestPd0(MiUnitTest):
+    """
+    The numpy decoders give the same values as the struct based ones
+    """
+    def setUp(self):
+        self.rand = random.Random(0x7f7f)
+
+    def test_checksum(self):
+        for size in [0, 1, 2, 446, 4096]:
+            data = random_bytes(self.rand, size + 2)
+            self.assertEqual(pd0.checksum(data, size), sum([ord(c) for c in data[:size]]) & 65535)
+
+        self.assertEqual(pd0.checksum('\xff' * 1000, 1000), (255 * 1000) & 65535)
+        self.assertRaises(SampleException, pd0.checksum, 'abc', 4)
+
+    def test_record(self):
+        formats = ['!HBBHbBBBHHHBBBBHBBBBhhBBHHBBBBHQHBBIB',
+                   '<HHBBBBBBBBBBHHHhhHhBBBBBBBBBBBBBBBBBBBBLBLBBBBBBBB',
+                   '<HHBBBBBBBBBBHHHhhHhBBBBBBBBBBBBBBBBBBHIII',
+                   '>qiIlLQ']
+        for fmt in formats:
+            names = ['field%d' % i for i in range(len(fmt) - 1)]
+            dtype = pd0.record_dtype(fmt, names)
+            self.assertEqual(dtype.itemsize, calcsize(fmt))
+            for count in range(20):
+                data = random_bytes(self.rand, calcsize(fmt) + 4)
+                self.assertEqual(pd0.unpack_record(dtype, data), unpack(fmt, data[:calcsize(fmt)]))
+                self.assertEqual(pd0.unpack_record(dtype, data, 4), unpack(fmt, data[4:]))
+
+            self.assertRaises(SampleException, pd0.unpack_record, dtype, data[:calcsize(fmt) - 1])
+
+        self.assertRaises(ValueError, pd0.record_dtype, 'HH', ['a', 'b'])
+        self.assertRaises(ValueError, pd0.record_dtype, '<Hf', ['a', 'b'])
+        self.assertRaises(ValueError, pd0.record_dtype, '<HH', ['a'])
+
+    def test_cell_array(self):
+        for (dtype, fmt) in [('>u2', '!HHHH'), ('<i2', '<hhhh'), ('u1', '<BBBB')]:
+            size = calcsize(fmt)
+            for rows in [1, 2, 30]:
+                chunk = random_bytes(self.rand, 2 + size * rows + 3)
+                expected = [[], [], [], []]
+                for row in range(rows):
+                    values = unpack(fmt, chunk[2 + row * size: 2 + (row + 1) * size])
+                    for beam in range(pd0.BEAMS):
+                        expected[beam].append(values[beam])
+
+                self.assertEqual(pd0.cell_array(chunk, dtype, rows), expected)
+
+            self.assertEqual(pd0.cell_array(chunk, dtype, 0), [[], [], [], []])
+            self.assertEqual(pd0.cell_array(chunk, dtype, -1), [[], [], [], []])
+
+    def test_ensemble_framer(self):
+        ensembles = [ensemble(random_bytes(self.rand, size)) for size in [0, 10, 400, 1000]]
+        ensembles.append(ensemble('\x7f\x7f' + pack('<H', 10) + 'x' * 20))
+        data = 'garbage' + '\r\n'.join(ensembles) + ensembles[1][:-1]
+        expected = []
+        for record in ensembles:
+            start = data.index(record)
+            expected.append((start, start + len(record)))
+
+        self.assertEqual(pd0.ENSEMBLE_FRAMER.sieve(data), expected)
+        self.assertTrue(pd0.valid_ensemble(data, *expected[2]))
+
+        # a bad checksum is dropped and the stream resynchronizes
+        bad = ensembles[2][:-1] + chr(ord(ensembles[2][-1]) ^ 1)
+        self.assertFalse(pd0.valid_ensemble(bad, 0, len(bad)))
+        self.assertEqual(pd0.ENSEMBLE_FRAMER.sieve(bad + ensembles[1]),
+                         [(len(bad), len(bad) + len(ensembles[1]))])
+
+
+@attr('PERF', group='mi')
+class PerfTestPd0(MiUnitTest):
+    """
+    Framing rate of the regex sieve the workhorse drivers used and the
+    length prefixed framer, over buffers of many ensembles
+    """
+    COUNTS = [100, 1000, 4000]
+
+    def test_framing(self):
+        rand = random.Random(0x7f7f)
+        ensembles = [ensemble(random_bytes(rand, rand.randrange(200, 800))) for i in range(200)]
+
+        for count in self.COUNTS:
+            data = ''.join([ensembles[i % len(ensembles)] for i in range(count)])
+
+            start = time.time()
+            framed = pd0.ENSEMBLE_FRAMER.sieve(data)
+            framer = time.time() - start
+            self.assertEqual(len(framed), count)
+
+            start = time.time()
+            regex_sieve(data)
+            regex = time.time() - start
+
+            log.info("%d ensembles, %d bytes: regex sieve %.0f ensembles/sec, framer %.0f ensembles/sec",
+                     count, len(data), count / regex, count / framer)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_port_agent_batch
+@file mi/core/instrument/test/test_port_agent_batch.py
+@brief Test cases for parallel reprocessing of port agent logs
+"""
+
+__license__ = 'Apache 2.0'
+
+import os
+import json
+import random
+import shutil
+import tempfile
+from StringIO import StringIO
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.port_agent_replay import PortAgentReplay
+from mi.core.instrument.port_agent_replay import PortAgentLogReader
+from mi.core.instrument.port_agent_replay import find_packet_boundary
+from mi.core.instrument.port_agent_replay import pack_log_record
+from mi.core.instrument.port_agent_batch import PortAgentBatch
+from mi.core.instrument.port_agent_batch import plan_shards
+from mi.core.instrument.port_agent_batch import _threads_patched
+from mi.instrument.satlantic.par_ser_600m.driver import SatlanticPARInstrumentDriver
+
+DRIVER_MODULE = 'mi.instrument.satlantic.par_ser_600m.driver'
+DRIVER_CLASS = 'SatlanticPARInstrumentDriver'
+START_TIME = 3600000000.0
+
+def par_sample(i):
+    return "SATPAR0229,%d.%02d,2206748544,234\r\n" % (i % 100 + 1, i % 97)
+
+def split_log(count, seed=0, start_time=START_TIME, max_length=60):
+    """
+    A port agent log of count PAR samples cut into packets of random
+    length up to max_length, so many samples span two packets.
+    """
+    rand = random.Random(seed)
+    data = ''.join([par_sample(i) for i in xrange(count)])
+    records = []
+    index = 0
+    while index < len(data):
+        length = rand.randint(1, max_length)
+        records.append(pack_log_record(data[index:index + length],
+                                       start_time + len(records) * 0.01))
+        index += length
+    return ''.join(records)
+
+def comparable(particle):
+    """
+    A particle without the time it was generated.
+    """
+    particle = json.loads(particle)
+    particle.pop('driver_timestamp')
+    return particle
+
+@attr('UNIT', group='mi')
+class UnitTestPortAgentBatch(MiUnitTest):
+    """
+    Test splitting port agent logs and reprocessing them in parallel.
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_log(self, name, data):
+        filename = os.path.join(self.temp_dir, name)
+        with open(filename, 'wb') as log_file:
+            log_file.write(data)
+        return filename
+
+    def serial(self, data):
+        """
+        @retval particles from replaying a log through a single driver.
+        """
+        replay = PortAgentReplay(SatlanticPARInstrumentDriver, raw=False)
+        replay.run(PortAgentLogReader(StringIO(data)), keep_events=True)
+        return [evt['value'] for evt in replay.events
+                if evt['type'] == DriverAsyncEvent.SAMPLE]
+
+    def test_find_packet_boundary(self):
+        """
+        A sync sequence in the data, even with a plausible length, isn't a
+        record boundary.
+        """
+        fake = '\xa3\x9d\x7a\x01\x00\x14' + 'x' * 20
+        first = pack_log_record(fake, START_TIME)
+        second = pack_log_record('data', START_TIME)
+        log_file = StringIO(first + second)
+        self.assertEqual(find_packet_boundary(log_file, 0), 0)
+        self.assertEqual(find_packet_boundary(log_file, 1), len(first))
+        self.assertEqual(find_packet_boundary(log_file, 1, read_size=3), len(first))
+        self.assertEqual(find_packet_boundary(log_file, len(first) + 1), None)
+
+    def test_reader_range(self):
+        records = [pack_log_record('%d' % i, START_TIME + i) for i in xrange(4)]
+        data = ''.join(records)
+        start = len(records[0])
+        end = start + len(records[1]) + len(records[2])
+        for read_size in [1, 5, 1000]:
+            reader = PortAgentLogReader(StringIO(data), read_size=read_size,
+                                        start=start, end=end)
+            self.assertEqual([p.get_data() for p in reader], ['1', '2'])
+            self.assertEqual(reader.skipped_bytes, 0)
+
+    def test_plan_shards(self):
+        filename = self.write_log('par.data', split_log(200))
+        size = os.path.getsize(filename)
+        shards = plan_shards([filename], 1000, overlap=300)
+        self.assertEqual(len(shards), (size + 999) // 1000)
+        self.assertEqual(shards[0].start, 0)
+        self.assertEqual(shards[-1].end, None)
+
+        with open(filename, 'rb') as log_file:
+            for (shard, following) in zip(shards, shards[1:]):
+                self.assertEqual(shard.end, following.start)
+                self.assertEqual(find_packet_boundary(log_file, following.start),
+                                 following.start)
+                self.assertLessEqual(following.lead_start, following.start)
+                self.assertGreaterEqual(following.lead_start, following.start - 300)
+
+        # each record is read by exactly one shard
+        total = sum([len(list(PortAgentLogReader(filename, start=s.start, end=s.end)))
+                     for s in shards])
+        self.assertEqual(total, len(list(PortAgentLogReader(filename))))
+
+    def test_run_matches_serial(self):
+        """
+        Samples spanning shard boundaries come out once, and the merged
+        particles are the same as a serial replay.
+        """
+        data = split_log(300)
+        expected = [comparable(p) for p in self.serial(data)]
+        self.assertEqual(len(expected), 300)
+        filename = self.write_log('par.data', data)
+
+        for processes in [1, 2]:
+            batch = PortAgentBatch(DRIVER_MODULE, DRIVER_CLASS, processes=processes,
+                                   shard_size=500, overlap=200)
+            output = StringIO()
+            result = batch.run([filename], output, work_dir=self.temp_dir)
+            particles = [comparable(p) for p in output.getvalue().splitlines()]
+            self.assertGreater(result['shards'], 10)
+            self.assertEqual(result['parallel'], processes > 1 and not _threads_patched())
+            self.assertEqual(result['errors'], 0)
+            self.assertEqual(result['particles'], len(expected))
+            self.assertEqual(particles, expected)
+
+    def test_run_merges_files(self):
+        """
+        Particles from several logs are merged in timestamp order, not the
+        order the files are given in.
+        """
+        early = split_log(20, start_time=START_TIME)
+        late = split_log(20, seed=1, start_time=START_TIME + 100)
+        expected = [comparable(p) for p in self.serial(early) + self.serial(late)]
+        filenames = [self.write_log('late.data', late), self.write_log('early.data', early)]
+        output = os.path.join(self.temp_dir, 'particles.json')
+        result = PortAgentBatch(DRIVER_MODULE, DRIVER_CLASS, processes=2).run(filenames, output)
+
+        with open(output) as particles:
+            self.assertEqual([comparable(p) for p in particles], expected)
+        self.assertEqual(result['shards'], 2)
+
+
+@attr('PERF', group='mi')
+class PerfTestPortAgentBatch(MiUnitTest):
+    """
+    Compare a batch run on every core with one on a single process.
+    """
+    def test_run(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(temp_dir, 'par.data')
+            with open(filename, 'wb') as log_file:
+                log_file.write(split_log(20000, max_length=2000))
+
+            elapsed = {}
+            for processes in [1, None]:
+                batch = PortAgentBatch(DRIVER_MODULE, DRIVER_CLASS, processes=processes,
+                                       shard_size=64 * 1024)
+                result = batch.run([filename], os.path.join(temp_dir, 'particles.json'))
+                self.assertEqual(result['particles'], 20000)
+                elapsed[batch.processes] = result['elapsed']
+            log.info("PAR batch reprocessing, seconds by processes: %s", elapsed)
+        finally:
+            shutil.rmtree(temp_dir)
@@ -17,13 +17,15 @@ import gevent
 import logging
 import unittest
 import re
+import socket
+import threading
 import time
 import datetime
 import array
 import struct
 import ctypes
 from nose.plugins.attrib import attr
-from mock import Mock
+from mock import Mock, patch
 
 from ion.agents.port.port_agent_process import PortAgentProcess
 from ion.agents.port.port_agent_process import PortAgentProcessType
@@ -40,6 +42,7 @@ from mi.idk.unit_test import InstrumentDriverIntegrationTestCase
 
 from mi.core.instrument.port_agent_client import PortAgentClient, PortAgentPacket, Listener
 from mi.core.instrument.port_agent_client import HEADER_SIZE
+from mi.core.instrument.port_agent_client import xor_checksum
 from mi.core.instrument.instrument_driver import DriverConnectionState
 from mi.core.instrument.instrument_driver import DriverProtocolState
 
@@ -408,6 +411,38 @@ class PAClientTestPortAgentPacket(MiUnitTest):
         checksum = self.pap.calculate_checksum()
         self.assertEqual(checksum, 2)
 
+    def test_xor_checksum(self):
+        """
+        The block checksum matches a byte at a time XOR for every length,
+        with and without numpy.
+        """
+        test_data = "".join([chr((i * 37) % 256) for i in range(100)])
+        for length in range(len(test_data)):
+            expected = 0
+            for c in test_data[0:length]:
+                expected ^= ord(c)
+
+            self.assertEqual(xor_checksum(test_data[0:length]), expected)
+            with patch('mi.core.instrument.port_agent_client.np', None):
+                self.assertEqual(xor_checksum(test_data[0:length]), expected)
+
+    def test_verify_checksum_cached(self):
+        """
+        verify_checksum only calculates once until the packet changes
+        """
+        self.pap.attach_data("This tests the checksum cache.")
+        self.pap.pack_header()
+
+        with patch.object(PortAgentPacket, 'calculate_checksum', return_value=self.pap.calculate_checksum()) as calc:
+            self.pap.verify_checksum()
+            self.pap.verify_checksum()
+            self.assertEqual(calc.call_count, 1)
+            self.assertTrue(self.pap.is_valid())
+
+            self.pap.attach_data("This tests the checksum cache!")
+            self.pap.verify_checksum()
+            self.assertEqual(calc.call_count, 2)
+
     def test_unpack_header(self):
         self.pap = PortAgentPacket()
         data_length = 32
@@ -420,6 +455,145 @@ class PAClientTestPortAgentPacket(MiUnitTest):
         #self.assertEqual(got_timestamp, 1105890970.110589)
         self.assertEqual(self.pap.get_header_recv_checksum(), 3729) 
 
+@attr('PERF', group='mi')
+class PAClientPerfTestChecksum(MiUnitTest):
+    """
+    Benchmark the packet checksum over a range of payload sizes
+    """
+    SIZES = [1024, 4096, 16384, 65536]
+    ITERATIONS = 100
+
+    def _byte_checksum(self, data):
+        """ The byte at a time checksum we used to use """
+        checksum = 0
+        for i in range(len(data)):
+            checksum ^= struct.unpack_from('B', data[i])[0]
+        return checksum
+
+    def _time(self, fn, data, iterations):
+        start = time.time()
+        for i in range(iterations):
+            fn(data)
+        return (time.time() - start) / iterations
+
+    def test_checksum_throughput(self):
+        for size in self.SIZES:
+            data = "".join([chr(i % 256) for i in range(size)])
+            byte_time = self._time(self._byte_checksum, data, 5)
+            block_time = self._time(xor_checksum, data, self.ITERATIONS)
+            with patch('mi.core.instrument.port_agent_client.np', None):
+                fallback_time = self._time(xor_checksum, data, self.ITERATIONS)
+
+            log.info("checksum %6d bytes: byte loop %.3f ms, numpy %.3f ms, struct %.3f ms",
+                     size, byte_time * 1000, block_time * 1000, fallback_time * 1000)
+
+
+@attr('UNIT', group='mi')
+class PAClientTestListener(MiUnitTest):
+    """
+    Test the listener receive path over a local socket pair
+    """
+    def setUp(self):
+        (self.local_sock, self.remote_sock) = socket.socketpair()
+        self.local_sock.setblocking(0)
+        self.packets = []
+        self.listener = Listener(self.local_sock, 0, None, 0, 5,
+                                 self.got_data, self.got_raw, None, None, None)
+
+    def tearDown(self):
+        self.listener.done()
+        self.local_sock.close()
+        self.remote_sock.close()
+
+    def got_data(self, paPacket):
+        self.packets.append(paPacket)
+
+    def got_raw(self, paPacket):
+        pass
+
+    def _packet(self, data, packet_type=PortAgentPacket.DATA_FROM_INSTRUMENT):
+        paPacket = PortAgentPacket(packet_type)
+        paPacket.attach_data(data)
+        paPacket.pack_header()
+        return paPacket.get_header() + data
+
+    def _wait_for_packets(self, count, timeout=5):
+        end_time = time.time() + timeout
+        while len(self.packets) < count and time.time() < end_time:
+            time.sleep(.01)
+        self.assertEqual(len(self.packets), count)
+
+    def test_many_packets_in_one_read(self):
+        """
+        Several packets delivered in one block are all handed off
+        """
+        self.listener.start()
+        test_data = ["packet %d" % i for i in range(10)]
+        self.remote_sock.sendall("".join([self._packet(d) for d in test_data]))
+
+        self._wait_for_packets(len(test_data))
+        self.assertEqual([p.get_data() for p in self.packets], test_data)
+
+    def test_split_packets(self):
+        """
+        Packets split across reads are reassembled, including packets that
+        are bigger than the receive buffer.
+        """
+        self.listener.RECV_BUFFER_SIZE = 64
+        self.listener._init_receive_buffer()
+        self.listener.start()
+
+        test_data = ["A" * 10, "B" * 1000, "C" * 30]
+        block = "".join([self._packet(d) for d in test_data])
+        for i in range(0, len(block), 7):
+            self.remote_sock.sendall(block[i:i+7])
+            time.sleep(.001)
+
+        self._wait_for_packets(len(test_data))
+        self.assertEqual([p.get_data() for p in self.packets], test_data)
+
+    def test_heartbeat_reset(self):
+        """
+        A heartbeat pushes the watchdog back without starting a thread
+        """
+        self.listener.set_heartbeat(1)
+        self.listener.start_heartbeat_timer()
+        timer = self.listener.heartbeat_timer
+        threads = threading.active_count()
+
+        heartbeat = PortAgentPacket(PortAgentPacket.HEARTBEAT)
+        heartbeat.attach_data('')
+        heartbeat.pack_header()
+        for i in range(100):
+            deadline = timer.deadline
+            self.listener.handle_packet(heartbeat)
+            self.assertGreaterEqual(timer.deadline, deadline)
+
+        self.assertIs(self.listener.heartbeat_timer, timer)
+        self.assertEqual(threading.active_count(), threads)
+
+        self.listener.done()
+        self.assertTrue(timer.cancelled)
+
+    def test_next_packet(self):
+        """
+        Parse straight out of the receive buffer without a socket
+        """
+        block = self._packet("first") + self._packet("second")
+        self.listener._buffer[0:len(block) - 3] = block[:-3]
+        self.listener._buffer_end = len(block) - 3
+
+        self.assertEqual(self.listener._next_packet().get_data(), "first")
+        self.assertEqual(self.listener._next_packet(), None)
+
+        self.listener._buffer[len(block) - 3:len(block)] = block[-3:]
+        self.listener._buffer_end = len(block)
+        paPacket = self.listener._next_packet()
+        self.assertEqual(paPacket.get_data(), "second")
+        self.assertEqual(paPacket.get_header_type(), PortAgentPacket.DATA_FROM_INSTRUMENT)
+        self.assertEqual(self.listener._buffer_end, 0)
+
+
 @attr('INT', group='mi')
 class PAClientIntTestCase(InstrumentDriverTestCase):
     def initialize(cls, *args, **kwargs):
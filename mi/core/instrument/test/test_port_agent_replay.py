@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_port_agent_replay
+@file mi/core/instrument/test/test_port_agent_replay.py
+@brief Test cases for port agent log replay
+"""
+
+__license__ = 'Apache 2.0'
+
+import time
+import json
+from StringIO import StringIO
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.metrics import get_metrics
+from mi.core.instrument.port_agent_client import PortAgentPacket
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.port_agent_replay import PortAgentLogReader
+from mi.core.instrument.port_agent_replay import PortAgentReplay
+from mi.core.instrument.port_agent_replay import pack_log_record
+from mi.core.instrument.port_agent_replay import packet_time
+from mi.core.instrument.port_agent_replay import format_result
+from mi.instrument.satlantic.par_ser_600m.driver import SatlanticPARInstrumentDriver
+from mi.instrument.satlantic.par_ser_600m.driver import PARProtocolState
+
+VALID_SAMPLE = "SATPAR0229,10.01,2206748544,234\r\n"
+START_TIME = 3600000000.0
+
+def par_log(count, per_packet=1, interval=0.25):
+    """
+    A port agent log of PAR samples, count packets of per_packet samples
+    each, with a heartbeat and a driver command mixed in.
+    """
+    records = [pack_log_record('', START_TIME, PortAgentPacket.HEARTBEAT),
+               pack_log_record('stop\r\n', START_TIME, PortAgentPacket.DATA_FROM_DRIVER)]
+    for i in xrange(count):
+        records.append(pack_log_record(VALID_SAMPLE * per_packet, START_TIME + i * interval))
+    return ''.join(records)
+
+@attr('UNIT', group='mi')
+class UnitTestPortAgentReplay(MiUnitTest):
+    """
+    Test reading port agent logs and replaying them through a driver.
+    """
+    def test_reader(self):
+        data = par_log(3)
+        packets = list(PortAgentLogReader(StringIO(data), read_size=7))
+        self.assertEqual([p.get_header_type() for p in packets],
+                         [PortAgentPacket.HEARTBEAT, PortAgentPacket.DATA_FROM_DRIVER] +
+                         [PortAgentPacket.DATA_FROM_INSTRUMENT] * 3)
+        self.assertEqual(packets[2].get_data(), VALID_SAMPLE)
+        self.assertEqual(packets[1].get_data(), 'stop\r\n')
+        self.assertAlmostEqual(packet_time(packets[3]), START_TIME + 0.25, places=6)
+
+        for packet in packets:
+            packet.verify_checksum()
+            self.assertTrue(packet.is_valid())
+
+    def test_reader_resync(self):
+        """
+        Junk between records, a false sync and a truncated last record are
+        skipped.
+        """
+        record = pack_log_record(VALID_SAMPLE, START_TIME)
+        data = 'junk' + record + '\xa3\x9d\x7a\x01\x00\x02' + 'x' * 20 + record + record[:10]
+        reader = PortAgentLogReader(StringIO(data), read_size=5)
+        packets = list(reader)
+        self.assertEqual([p.get_data() for p in packets], [VALID_SAMPLE, VALID_SAMPLE])
+        self.assertEqual(reader.skipped_bytes, 4 + 26 + 10)
+
+    def test_replay(self):
+        replay = PortAgentReplay(SatlanticPARInstrumentDriver, PARProtocolState.AUTOSAMPLE)
+        result = replay.run(PortAgentLogReader(StringIO(par_log(5, per_packet=2))),
+                            keep_events=True)
+
+        self.assertEqual(result['packets'], 7)
+        self.assertEqual(result['data_packets'], 5)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['chunks'], 10)
+        self.assertEqual(result['particles'], 10)
+        self.assertEqual(result['raw_particles'], 6)
+        self.assertEqual(result['event_types'], {DriverAsyncEvent.SAMPLE: 10})
+        for stage in ['chunker', 'sieve', 'chunk', 'particle_build', 'serialize']:
+            self.assertIn(stage, result['stages'])
+        self.assertEqual(result['stages']['particle_build']['count'], 16)
+        self.assertTrue(format_result(result))
+
+        samples = [json.loads(evt['value']) for evt in replay.events]
+        self.assertEqual(len([s for s in samples if s['stream_name'] == 'raw']), 6)
+
+        # metrics are left the way they were found
+        self.assertFalse(get_metrics().enabled)
+
+    def test_replay_speed(self):
+        """
+        Replaying at 10x the recorded rate takes about a tenth of the
+        recorded time, packets 0.25s apart.
+        """
+        replay = PortAgentReplay(SatlanticPARInstrumentDriver, raw=False)
+        result = replay.run(PortAgentLogReader(StringIO(par_log(5))), speed=10)
+        self.assertGreaterEqual(result['elapsed'], 0.09)
+        self.assertGreater(result['waited'], 0)
+        self.assertEqual(result['particles'], 5)
+        self.assertEqual(result['raw_particles'], 0)
+
+
+@attr('PERF', group='mi')
+class PerfTestPortAgentReplay(MiUnitTest):
+    """
+    Replay a PAR log as fast as possible.
+    """
+    def test_replay(self):
+        data = par_log(2000, per_packet=5)
+        replay = PortAgentReplay(SatlanticPARInstrumentDriver)
+        result = replay.run(PortAgentLogReader(StringIO(data)))
+        log.info("PAR replay:\n%s", format_result(result))
+        self.assertEqual(result['particles'], 10000)
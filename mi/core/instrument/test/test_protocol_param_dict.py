@@ -12,9 +12,11 @@ __license__ = 'Apache 2.0'
 
 import json
 import re
+import time
 
 from ooi.logging import log
 from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
 from mi.core.instrument.test.test_strings import TestUnitStringsDict
 from mi.core.exceptions import InstrumentParameterException
 from mi.core.exceptions import InstrumentParameterExpirationException
@@ -321,6 +323,58 @@ bar=200, baz=300
         with self.assertRaises(InstrumentParameterException):
             self.param_dict.update(sample_input, {'bad': "key_does_not_exist"})
 
+    def test_update_lines(self):
+        """
+        Updating from a block gives the same values as updating line by line
+        """
+        sample_input = "foo=100\r\nbar=200, baz=300\r\nnoise\r\nqux=5"
+        result = self.param_dict.update_lines(sample_input, "\r\n")
+        self.assertEqual(sorted(result.keys()), ["bar", "baz", "dil", "foo", "pho", "qux"])
+        self.assertEqual(self.param_dict.get("foo"), 100)
+        self.assertEqual(self.param_dict.get("baz"), 300)
+        self.assertEqual(self.param_dict.get("dil"), 5)
+
+        # any line ending by default
+        result = self.param_dict.update_lines("foo=1\rbar=2\nbaz=3\r\n")
+        self.assertEqual(sorted(result.keys()), ["bar", "baz", "foo"])
+        self.assertEqual(self.param_dict.get("bar"), 2)
+
+        # a key split over two lines doesn't match
+        self.assertEqual(self.param_dict.update_lines("foo\n=7"), {})
+        self.assertEqual(self.param_dict.get("foo"), 1)
+
+        # multi match stops at the first parameter of a line that isn't one
+        self.setUp()
+        expected = self.param_dict
+        self.setUp()
+        for line in sample_input.split("\r\n"):
+            expected.multi_match_update(line)
+        self.param_dict.update_lines(sample_input, "\r\n", multi_match=True)
+        self.assertEqual(self.param_dict.get_all(), expected.get_all())
+
+    def test_literal_index(self):
+        """
+        Parameters are only skipped when their regex can't match
+        """
+        self.assertFalse(self.param_dict.update("nothing to see"))
+        self.assertTrue(self.param_dict.update(u"foo=42"))
+        self.assertEqual(self.param_dict.get("foo"), 42)
+        text = u"foo=43"
+        self.assertIs(ProtocolParameterDict._as_text(text), text)
+
+        # the index follows new parameters
+        self.param_dict.add("new", r'new=(\d+)', lambda match : int(match.group(1)), str)
+        self.assertTrue(self.param_dict.update("new=3"))
+        self.assertEqual(self.param_dict.get("new"), 3)
+
+        # parameters without a literal are always tried
+        self.param_dict.add("any", r'(?i)ANY=(\d+)', lambda match : int(match.group(1)), str)
+        self.param_dict.add_parameter(FunctionParameter("fn", lambda x : len(x), str))
+        self.assertEqual(sorted(self.param_dict.update_many("any=4")), ["any", "fn"])
+        self.assertEqual(sorted(self.param_dict.update_lines("any=5\nx")), ["any", "fn"])
+        self.assertEqual(self.param_dict.get("fn"), 1)
+        self.assertEqual(self.param_dict.get("any"), 5)
+
     def test_visibility_list(self):
         lst = self.param_dict.get_visibility_list(ParameterDictVisibility.READ_WRITE)
         lst.sort()
@@ -653,3 +707,116 @@ bar=200, baz=300
         self.assertEqual(new_dict["baz"][ParameterDictKey.DISPLAY_NAME], "Baz")
         
         self.assertTrue('extra_param' not in new_dict)
+
+
+# MAVS4 deploy and system configuration menus; the repo has no recorded
+# MAVS4 menus, so these are built to match the driver's parameter regexes.
+MAVS4_DEPLOY_MENU = ("\r\n[03/29/12 11:11:42]\r\n"
+                     " Notes 1| Deployment note one\r\n"
+                     "       2| Deployment note two\r\n"
+                     "       3| Deployment note three\r\n"
+                     " Data  F| Velocity Frame Earth TTag FSec Axes Velocities\r\n"
+                     "       M| Monitor  Yes  Yes  Yes  No\r\n"
+                     "       Q| Query Mode  No\r\n"
+                     "       4| Measurement Frequency  1.00 [Hz]\r\n"
+                     "       5| Measurements/Sample  1 [M/S]\r\n"
+                     "       6| Sample Period  1.00 [sec]\r\n"
+                     "       7| Samples/Burst  10 [S/B]\r\n"
+                     "       8| Burst Interval  0 00:00:10 \r\n"
+                     "G| Go (<CTRL>-<G> skips checks)\r\n\r\n")
+MAVS4_CONFIGURATION_MENU = ("<C> Binary to SI Conversion  0.0010000 \r\n"
+                            "<W> Warm up interval  Fast \r\n"
+                            "<1> 3-Axis Compass  Enabled \r\n"
+                            "<2> Solid State Tilt  Enabled \r\n"
+                            "<3> Thermistor  Enabled \r\n"
+                            "<4> Pressure  Disabled \r\n"
+                            "<5> Auxiliary 1  Disabled \r\n"
+                            "<6> Auxiliary 2  Disabled \r\n"
+                            "<7> Auxiliary 3  Disabled \r\n"
+                            "<O> Sensor Orientation  Vertical/Down\r\n"
+                            "<S> Serial Number  123 \r\n"
+                            "Current path offsets:  f0 f1 f2 f3 \r\n"
+                            "Current compass offsets:  1 -2 3 \r\n"
+                            "Current compass scale factors:  1.000 1.000 1.000 \r\n"
+                            "Current tilt offsets:  500 600 \r\n"
+                            "G| Go (<CTRL>-<G> skips checks)\r\n\r\n")
+
+@attr('PERF', group='mi')
+class TestPerfProtocolParameterDict(MiUnitTest):
+    """
+    Time updating the SBE16, SBE26 and MAVS4 dictionaries from their status
+    and configuration dumps, with every regex searched and with the literal
+    index
+    """
+    REPEAT = 20
+
+    def _time(self, function):
+        start = time.time()
+        for i in range(self.REPEAT):
+            function()
+        return (time.time() - start) / self.REPEAT
+
+    def _assert_update_lines(self, name, protocol_factory, block, newline, multi_match=False):
+        """
+        Update one dictionary a line at a time and another with update_lines,
+        checking they end up with the same values.
+        """
+        lines = block.split(newline)
+        param_dict = protocol_factory()._param_dict
+        params = param_dict._param_dict.values()
+
+        def every_regex():
+            for line in lines:
+                for val in params:
+                    val.update(line)
+
+        update = param_dict.multi_match_update if multi_match else param_dict.update
+        def by_line():
+            for line in lines:
+                update(line)
+
+        routed_dict = protocol_factory()._param_dict
+        param_dict._get_index()
+        routed_dict._get_index()
+        searched = self._time(every_regex)
+        indexed = self._time(by_line)
+        routed = self._time(lambda: routed_dict.update_lines(block, newline, multi_match=multi_match))
+
+        self.assertEqual(routed_dict.get_all(), param_dict.get_all())
+        log.info("%s, %d parameters, %d lines: every regex %.2fms, update by line %.2fms, update_lines %.2fms",
+                 name, len(params), len(lines), searched * 1000, indexed * 1000, routed * 1000)
+
+    def test_sbe16(self):
+        from mock import Mock
+        from mi.instrument.seabird.sbe16plus_v2.driver import SBE16Protocol, Prompt, NEWLINE
+        from mi.instrument.seabird.sbe16plus_v2.test.test_driver import SeaBird16plusMixin
+
+        block = SeaBird16plusMixin.VALID_DS_RESPONSE + SeaBird16plusMixin.VALID_DCAL_QUARTZ
+        self._assert_update_lines("SBE16", lambda: SBE16Protocol(Prompt, NEWLINE, Mock()), block, NEWLINE)
+
+    def test_sbe26(self):
+        from mock import Mock
+        from mi.instrument.seabird.sbe26plus.driver import Protocol, Prompt, NEWLINE
+        from mi.instrument.seabird.sbe26plus.test.sample_data import SAMPLE_DS, SAMPLE_DC
+
+        self._assert_update_lines("SBE26", lambda: Protocol(Prompt, NEWLINE, Mock()),
+                                  SAMPLE_DS + SAMPLE_DC, NEWLINE, multi_match=True)
+
+    def test_mavs4(self):
+        from mock import Mock
+        from mi.instrument.nobska.mavs4.ooicore.driver import mavs4InstrumentProtocol
+        from mi.instrument.nobska.mavs4.ooicore.driver import InstrumentPrompts, INSTRUMENT_NEWLINE
+
+        param_dict = mavs4InstrumentProtocol(InstrumentPrompts, INSTRUMENT_NEWLINE, Mock())._param_dict
+        params = param_dict._param_dict.values()
+        param_dict._get_index()
+
+        updated = set()
+        for (name, menu) in [("deploy", MAVS4_DEPLOY_MENU), ("configuration", MAVS4_CONFIGURATION_MENU)]:
+            searched = self._time(lambda: [val.update(menu) for val in params])
+            indexed = self._time(lambda: param_dict.update_many(menu))
+            updated.update(param_dict.update_many(menu).keys())
+            log.info("MAVS4 %s menu, %d parameters: every regex %.2fms, update_many %.2fms",
+                     name, len(params), searched * 1000, indexed * 1000)
+
+        self.assertEqual(updated, set(param_dict._param_dict.keys()))
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_response_buffer
+@file mi/core/instrument/test/test_response_buffer.py
+@brief Test cases for the bounded protocol response buffer
+"""
+
+__license__ = 'Apache 2.0'
+
+import re
+import time
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from ooi.logging import log
+
+from mi.core.instrument.response_buffer import ResponseBuffer
+from mi.core.instrument.instrument_protocol import CommandResponseInstrumentProtocol
+
+@attr('UNIT', group='mi')
+class UnitTestResponseBuffer(MiUnitTest):
+    """
+    Test the response buffer offsets, trimming and searches.
+    """
+    def test_append(self):
+        buf = ResponseBuffer()
+        self.assertEqual(buf.value, '')
+        self.assertEqual(len(buf), 0)
+
+        buf.append("abc")
+        buf.append("")
+        buf.append("def")
+        self.assertEqual(buf.value, "abcdef")
+        self.assertEqual(str(buf), "abcdef")
+        self.assertEqual((buf.start, buf.end), (0, 6))
+
+    def test_cap(self):
+        """
+        Data past the cap is dropped from the front and absolute offsets
+        keep counting.
+        """
+        buf = ResponseBuffer(max_size=8)
+        for i in range(10):
+            buf.append("%03d" % i)
+
+        self.assertEqual(len(buf), 8)
+        self.assertEqual(buf.value, "07008009")
+        self.assertEqual((buf.start, buf.end), (22, 30))
+
+        buf.append("0123456789ABC")
+        self.assertEqual(buf.value, "56789ABC")
+
+    def test_consume(self):
+        buf = ResponseBuffer()
+        buf.append("abc")
+        buf.append("def")
+        buf.consume(2)
+        self.assertEqual(buf.value, "cdef")
+        self.assertEqual(buf.start, 2)
+
+        # consuming behind the start is a no-op
+        buf.consume(1)
+        self.assertEqual(buf.value, "cdef")
+
+        buf.consume()
+        self.assertEqual(buf.value, "")
+        self.assertEqual((buf.start, buf.end), (6, 6))
+        self.assertEqual(buf.generation, 0)
+
+    def test_reset(self):
+        buf = ResponseBuffer(max_size=4)
+        buf.append("abc")
+        buf.reset("123456")
+        self.assertEqual(buf.value, "3456")
+        self.assertEqual(buf.generation, 1)
+        self.assertEqual((buf.start, buf.end), (5, 9))
+
+    def test_find(self):
+        buf = ResponseBuffer()
+        for chunk in ["some ", "data S", ">", " more S>"]:
+            buf.append(chunk)
+
+        self.assertEqual(buf.find("S>"), 10)
+        self.assertEqual(buf.find("S>", 11), 18)
+        self.assertEqual(buf.find("S>", 19), -1)
+        self.assertEqual(buf.find("S>", 100), -1)
+        self.assertEqual(buf.get(None, 12), "some data S>")
+        self.assertEqual(buf.get(10, 12), "S>")
+        self.assertEqual(buf.get(12, 10), "")
+
+        buf.consume(12)
+        self.assertEqual(buf.find("S>", 0), 18)
+        self.assertEqual(buf.find("some"), -1)
+
+    def test_search(self):
+        buf = ResponseBuffer()
+        buf.append("value = ")
+        buf.append("42\r\n")
+        match = buf.search(re.compile(r"value = (\d+)"))
+        self.assertEqual(match.groups(), ("42",))
+
+        buf.consume(3)
+        self.assertIsNone(buf.search(re.compile(r"value")))
+        self.assertIsNone(buf.search(re.compile(r"\d+"), 100))
+
+    def test_protocol_buffers(self):
+        """
+        The protocol buffers still behave like strings to drivers.
+        """
+        protocol = CommandResponseInstrumentProtocol([">"], "\r\n", None,
+                                                     buffer_size=16)
+        protocol.add_to_buffer("abc")
+        protocol._promptbuf += "def"
+        self.assertEqual(protocol._linebuf, "abc")
+        self.assertEqual(protocol._promptbuf, "abcdef")
+
+        for i in range(100):
+            protocol.add_to_buffer("%03d" % i)
+        self.assertEqual(protocol._linebuf, "3094095096097098099"[-16:])
+        self.assertEqual(len(protocol._promptbuf), 16)
+
+        protocol._linebuf = ''
+        self.assertEqual(protocol._linebuf, '')
+
+
+@attr('PERF', group='mi')
+class PerfTestResponseBuffer(MiUnitTest):
+    """
+    Autosample-style benchmark: many packets with no command issued, then
+    a prompt search.  Buffer size should stay at the cap and prompt search
+    time should not depend on how long the protocol has been running.
+    """
+    PACKET = "SATPAR0229,10.01,2206748111,111\r\n"
+    COUNTS = [1000, 10000, 100000]
+    CAP = 65536
+
+    def test_autosample(self):
+        for count in self.COUNTS:
+            protocol = CommandResponseInstrumentProtocol([">"], "\r\n", None,
+                                                         buffer_size=self.CAP)
+            start = time.time()
+            for i in range(count):
+                protocol.add_to_buffer(self.PACKET)
+            append_time = time.time() - start
+
+            protocol.add_to_buffer(">")
+            start = time.time()
+            (prompt, result) = protocol._get_response(timeout=1)
+            search_time = time.time() - start
+
+            self.assertEqual(prompt, ">")
+            self.assertLessEqual(len(protocol._line_buffer), self.CAP)
+            log.info("%d packets: %.2f us/packet append, %.2f ms prompt search, %d bytes held",
+                     count, append_time / count * 1e6, search_time * 1000,
+                     len(protocol._line_buffer))
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_zmq_transport
+@file mi/core/instrument/test/test_zmq_transport.py
+@brief Test cases for the ZMQ driver event transport.
+"""
+
+__license__ = 'Apache 2.0'
+
+import os
+import time
+import threading
+import multiprocessing
+import cPickle as pickle
+
+import zmq
+import cPickle as pickle
+
+from nose.plugins.attrib import attr
+
+from mi.core.unit_test import MiUnitTest
+from mi.core.exceptions import InstrumentTimeoutException
+from mi.core.exceptions import InstrumentCommandException
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.instrument import zmq_transport
+from mi.core.instrument.zmq_transport import EventEncoding
+from mi.core.instrument.driver_process import DriverProcess
+from mi.core.instrument.zmq_driver_process import ZmqDriverProcess
+from mi.core.instrument.zmq_driver_client import ZmqDriverClient
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+
+SAMPLE_VALUE = '{"stream_name": "ctdpf_parsed", "pkt_format_id": "JSON_Data", ' \
+               '"pkt_version": 1, "preferred_timestamp": "driver_timestamp", ' \
+               '"quality_flag": "ok", "port_timestamp": 3555423720.711772, ' \
+               '"driver_timestamp": 3555423721.711772, "values": [' \
+               '{"value_id": "temp", "value": 22.9304}, ' \
+               '{"value_id": "conductivity", "value": 51.2345}, ' \
+               '{"value_id": "pressure", "value": 532.21}]}'
+
+class TransportTestDriver(object):
+    """
+    Minimal driver for the transport tests.  Publishes sample events
+    stamped with the time they were generated and answers simple commands.
+    """
+    def __init__(self, evt_callback):
+        self._send_event = evt_callback
+
+    def driver_ping(self, msg):
+        return 'driver_ping: ' + msg
+
+    def wait(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    def emit_events(self, count, interval=0):
+        def emit():
+            for i in xrange(count):
+                self._send_event({'type': DriverAsyncEvent.SAMPLE,
+                                  'value': SAMPLE_VALUE,
+                                  'time': time.time()})
+                if interval:
+                    time.sleep(interval)
+        threading.Thread(target=emit).start()
+        return count
+
+def _run_driver_process(cmd_port_fname, evt_port_fname, ppid):
+    # Same as DriverProcess.run without the logging setup and os._exit.
+    process = ZmqDriverProcess(__name__, 'TransportTestDriver',
+                               cmd_port_fname, evt_port_fname, ppid)
+    process.construct_driver()
+    process.start_messaging()
+    while process.messaging_started and process.check_parent():
+        time.sleep(.1)
+    process.stop_messaging()
+
+def _port_fnames():
+    tag = "%d_%d" % (os.getpid(), time.time() * 1000)
+    return ('/tmp/dvr_cmd_port_test_%s.txt' % tag, '/tmp/dvr_evt_port_test_%s.txt' % tag)
+
+def _read_port(fname, timeout=10):
+    endtime = time.time() + timeout
+    while time.time() < endtime:
+        try:
+            port = int(open(fname).read().strip())
+            os.remove(fname)
+            return port
+        except (IOError, ValueError):
+            time.sleep(.05)
+    raise Exception('driver process did not write %s' % fname)
+
+
+@attr('UNIT', group='mi')
+class UnitTestZmqTransport(MiUnitTest):
+    """
+    Test event encoding and the driver process event queue.
+    """
+    EVENT = {'type': DriverAsyncEvent.SAMPLE, 'value': SAMPLE_VALUE,
+             'time': 3555423721.711772}
+
+    def test_encode_decode(self):
+        for encoding in zmq_transport.supported_encodings():
+            frame = zmq_transport.encode(self.EVENT, encoding)
+            self.assertEqual(zmq_transport.decode(frame), self.EVENT)
+
+        # exception triples keep their tuple type with marshal and pickle
+        triple = (500, 'InstrumentException: boom', ['stack'])
+        for encoding in [EventEncoding.MARSHAL, EventEncoding.PICKLE]:
+            self.assertEqual(zmq_transport.decode(zmq_transport.encode(triple, encoding)), triple)
+
+    def test_encode_fallback(self):
+        """
+        Objects the preferred encoding cannot handle go out as pickle.
+        """
+        evt = {'type': DriverAsyncEvent.ERROR, 'value': ValueError('bad')}
+        frame = zmq_transport.encode(evt, EventEncoding.MARSHAL)
+        self.assertEqual(frame[0], 'p')
+        self.assertEqual(zmq_transport.decode(frame)['value'].args, ('bad',))
+
+        self.assertRaises(ValueError, zmq_transport.decode, 'xgarbage')
+
+    def test_untagged(self):
+        """
+        Without a negotiated encoding events are plain pickles, as
+        send_pyobj sends them, and decode reads those too.
+        """
+        frame = zmq_transport.encode(self.EVENT, None)
+        self.assertEqual(pickle.loads(frame), self.EVENT)
+        self.assertEqual(zmq_transport.decode(frame), self.EVENT)
+
+    def test_choose_encoding(self):
+        self.assertEqual(zmq_transport.choose_encoding(['json', EventEncoding.MARSHAL]),
+                         EventEncoding.MARSHAL)
+        self.assertEqual(zmq_transport.choose_encoding(['marshal0', 'json']),
+                         EventEncoding.PICKLE)
+        self.assertEqual(zmq_transport.choose_encoding(None), EventEncoding.PICKLE)
+        self.assertEqual(zmq_transport.DEFAULT_EVENT_ENCODINGS[0], EventEncoding.MARSHAL)
+
+    def test_get_events(self):
+        process = DriverProcess('module', 'class', None)
+        for i in range(5):
+            process.send_event(i)
+        self.assertEqual(process.get_events(3), [0, 1, 2])
+        self.assertEqual(process.get_events(3), [3, 4])
+
+        # A blocked waiter is released by a new event
+        threading.Timer(.05, process.send_event, ['late']).start()
+        self.assertEqual(process.get_events(3), ['late'])
+
+        # and by a stop flag
+        stopped = []
+        threading.Timer(.05, lambda: (stopped.append(True), process.wake_event_waiters())).start()
+        self.assertEqual(process.get_events(3, lambda: bool(stopped)), [])
+
+    def test_process_negotiation(self):
+        process = ZmqDriverProcess('module', 'class', 'cmd', 'evt', None)
+        self.assertEqual(process.event_encoding, None)
+        reply = process.cmd_driver({'cmd': 'negotiate_event_encoding', 'args': (),
+                                    'kwargs': {'encodings': ['json', EventEncoding.MARSHAL]}})
+        self.assertEqual(reply, EventEncoding.MARSHAL)
+        self.assertEqual(process.event_encoding, EventEncoding.MARSHAL)
+
+    def test_negotiation_timeout(self):
+        """
+        A driver process that never answers leaves the client on plain
+        pickles instead of hanging.
+        """
+        context = zmq.Context()
+        sock = context.socket(zmq.ROUTER)
+        port = sock.bind_to_random_port('tcp://127.0.0.1')
+        client = ZmqDriverClient('localhost', port, port)
+        client._connect_cmd_socket()
+        try:
+            starttime = time.time()
+            self.assertEqual(client.negotiate_event_encoding(timeout=.2), None)
+            self.assertLess(time.time() - starttime, 2)
+            self.assertEqual(client.event_encoding, None)
+        finally:
+            client.zmq_cmd_socket.close(linger=0)
+            client.zmq_context.term()
+            sock.close(linger=0)
+            context.term()
+
+    def test_request_frames(self):
+        # REQ style
+        (envelope, request_id, msg) = zmq_transport.split_request(['id', '', pickle.dumps('a')])
+        self.assertEqual((envelope, request_id, msg), (['id', ''], None, 'a'))
+        frames = zmq_transport.reply_frames(envelope, request_id, 'b')
+        self.assertEqual(frames[:2], ['id', ''])
+        self.assertEqual(pickle.loads(frames[2]), 'b')
+
+        # DEALER style
+        (envelope, request_id, msg) = zmq_transport.split_request(['id', '', '7', pickle.dumps('a')])
+        self.assertEqual((envelope, request_id, msg), (['id', ''], '7', 'a'))
+        frames = zmq_transport.reply_frames(envelope, request_id, 'b')
+        self.assertEqual(frames[:3], ['id', '', '7'])
+
+        self.assertRaises(ValueError, zmq_transport.split_request, ['id', 'x'])
+        self.assertRaises(ValueError, zmq_transport.split_request, ['id', '', '1', '2', '3'])
+
+
+@attr('UNIT', group='mi')
+class UnitTestZmqDriverClient(MiUnitTest):
+    """
+    Command round trips against a driver process running in this process.
+    """
+    def setUp(self):
+        (cmd_port_fname, evt_port_fname) = _port_fnames()
+        self.process = ZmqDriverProcess(__name__, 'TransportTestDriver',
+                                        cmd_port_fname, evt_port_fname, None)
+        self.assertTrue(self.process.construct_driver())
+        self.process.start_messaging()
+
+        self.client = ZmqDriverClient('localhost', _read_port(cmd_port_fname),
+                                      _read_port(evt_port_fname), cmd_timeout=10)
+        self.client.start_messaging(None, None)
+
+    def tearDown(self):
+        self.client.cmd_dvr('stop_driver_process')
+        self.client.stop_messaging()
+        self.process.cmd_thread.join(5)
+        self.process.evt_thread.join(5)
+
+    def test_cmd_dvr(self):
+        self.assertEqual(self.client.cmd_dvr('driver_ping', 'foo'), 'driver_ping: foo')
+        self.assertTrue(self.client.cmd_dvr('process_echo').startswith('ping from resource'))
+
+        # Exceptions come back as triples, as before
+        reply = self.client.cmd_dvr('no_such_command')
+        self.assertEqual(reply[1], InstrumentCommandException('Unknown driver command.').get_triple()[1])
+
+    def test_pipeline(self):
+        """
+        Several requests can be outstanding and their replies collected in
+        any order.
+        """
+        first = self.client.send_cmd('driver_ping', 'one')
+        second = self.client.send_cmd('wait', .1)
+        third = self.client.send_cmd('driver_ping', 'three')
+
+        self.assertEqual(self.client.get_reply(third, 5), 'driver_ping: three')
+        self.assertEqual(self.client.get_reply(first, 5), 'driver_ping: one')
+        self.assertEqual(self.client.get_reply(second, 5), .1)
+
+    def test_timeout(self):
+        request_id = self.client.send_cmd('wait', .5)
+        starttime = time.time()
+        self.assertRaises(InstrumentTimeoutException, self.client.get_reply, request_id, .1)
+        self.assertLess(time.time() - starttime, .4)
+
+        # The late reply is dropped and does not confuse the next command
+        self.assertEqual(self.client.cmd_dvr('driver_ping', 'after'), 'driver_ping: after')
+        self.assertEqual(self.client._replies, {})
+
+
+@attr('UNIT', group='mi')
+class UnitTestZmqLegacyClient(MiUnitTest):
+    """
+    A client that predates batching and negotiation, with a REQ command
+    socket and recv_pyobj on its SUB socket, still talks to the process.
+    """
+    def setUp(self):
+        tag = str(os.getpid())
+        cmd_port_fname = '/tmp/dvr_cmd_port_legacy_%s.txt' % tag
+        evt_port_fname = '/tmp/dvr_evt_port_legacy_%s.txt' % tag
+        self.process = multiprocessing.Process(target=_run_driver_process,
+                                               args=(cmd_port_fname, evt_port_fname, os.getpid()))
+        self.process.start()
+
+        self.context = zmq.Context()
+        self.cmd_sock = self.context.socket(zmq.REQ)
+        self.cmd_sock.connect('tcp://localhost:%i' % _read_port(cmd_port_fname))
+        self.evt_sock = self.context.socket(zmq.SUB)
+        self.evt_sock.connect('tcp://localhost:%i' % _read_port(evt_port_fname))
+        self.evt_sock.setsockopt(zmq.SUBSCRIBE, '')
+        self.evt_sock.setsockopt(zmq.RCVTIMEO, 10000)
+        # Let the subscription propagate before publishing.
+        time.sleep(.5)
+
+    def tearDown(self):
+        self._cmd('stop_driver_process')
+        self.cmd_sock.close(linger=0)
+        self.evt_sock.close(linger=0)
+        self.context.term()
+        self.process.join(10)
+
+    def _cmd(self, cmd, *args):
+        self.cmd_sock.send_pyobj({'cmd': cmd, 'args': args, 'kwargs': {}})
+        return self.cmd_sock.recv_pyobj()
+
+    def test_legacy_client(self):
+        self.assertEqual(self._cmd('emit_events', 3), 3)
+        for i in range(3):
+            evt = self.evt_sock.recv_pyobj()
+            self.assertEqual(evt['type'], DriverAsyncEvent.SAMPLE)
+            self.assertFalse(self.evt_sock.getsockopt(zmq.RCVMORE))
+
+
+@attr('PERF', group='mi')
+class PerfTestZmqTransport(MiUnitTest):
+    """
+    Event throughput and latency between a driver process and a client on
+    localhost, for each available encoding.
+    """
+    BURST = 20000
+    PACED = 2000
+    INTERVAL = .001
+
+    def setUp(self):
+        (cmd_port_fname, evt_port_fname) = _port_fnames()
+        self.process = multiprocessing.Process(target=_run_driver_process,
+                                               args=(cmd_port_fname, evt_port_fname, os.getpid()))
+        self.process.start()
+
+        cmd_port = _read_port(cmd_port_fname)
+        evt_port = _read_port(evt_port_fname)
+
+        self.received = []
+        self.client = ZmqDriverClient('localhost', cmd_port, evt_port)
+        self.client.start_messaging(self._event_received)
+        # Let the subscription propagate before publishing.
+        time.sleep(.5)
+
+    def tearDown(self):
+        self.client.cmd_dvr('stop_driver_process')
+        self.client.stop_messaging()
+        self.process.join(10)
+
+    def _event_received(self, evt):
+        self.received.append((time.time(), evt['time']))
+
+    def _run(self, count, interval):
+        self.received = []
+        self.client.cmd_dvr('emit_events', count, interval)
+        endtime = time.time() + 60
+        while len(self.received) < count and time.time() < endtime:
+            time.sleep(.01)
+        self.assertEqual(len(self.received), count)
+
+        latencies = sorted([recv - sent for (recv, sent) in self.received])
+        elapsed = self.received[-1][0] - self.received[0][1]
+        return (count / elapsed, latencies[len(latencies) / 2], latencies[int(len(latencies) * .99)])
+
+    def test_event_transport(self):
+        for encoding in zmq_transport.supported_encodings():
+            self.assertEqual(self.client.negotiate_event_encoding([encoding]), encoding)
+
+            (rate, median, p99) = self._run(self.BURST, 0)
+            log.info("%s burst: %.0f events/sec, median latency %.2f ms, p99 %.2f ms",
+                     encoding, rate, median * 1000, p99 * 1000)
+
+            (rate, median, p99) = self._run(self.PACED, self.INTERVAL)
+            log.info("%s paced: median latency %.2f ms, p99 %.2f ms",
+                     encoding, median * 1000, p99 * 1000)
+
+    def _round_trip(self, count, cmd, *args):
+        latencies = []
+        for i in xrange(count):
+            starttime = time.time()
+            self.client.cmd_dvr(cmd, *args)
+            latencies.append(time.time() - starttime)
+        latencies.sort()
+        return (sum(latencies) / count, latencies[int(count * .99)])
+
+    def test_command_round_trip(self):
+        count = 2000
+        for (cmd, args) in [('driver_ping', ('foo',)), ('process_echo', ())]:
+            (mean, p99) = self._round_trip(count, cmd, *args)
+            log.info("%s round trip: mean %.3f ms, p99 %.3f ms", cmd, mean * 1000, p99 * 1000)
+
+        # Pipelined: send everything, then collect the replies
+        starttime = time.time()
+        request_ids = [self.client.send_cmd('driver_ping', 'foo') for i in xrange(count)]
+        for request_id in request_ids:
+            self.client.get_reply(request_id, 10)
+        elapsed = time.time() - starttime
+        log.info("driver_ping pipelined: %.3f ms per command", elapsed / count * 1000)
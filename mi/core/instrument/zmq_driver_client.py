@@ -20,28 +20,47 @@ c = zdc.ZmqDriverClient('localhost', 5556, 5557)
 import thread
 import logging
 import time
+import itertools
+import cPickle as pickle
 
-# We import "regular" zmq, not the patched version because
-# we handle the nonblocking sockets directly as they need to work
-# with unpatched threads as well.
+# Contexts come from zmq_transport.zmq_module(), which hands back the
+# gevent aware zmq.green when threads are patched so blocking polls yield
+# to the hub, and "regular" zmq for unpatched threads.
 import zmq
 
+from mi.core.exceptions import InstrumentTimeoutException
 from mi.core.instrument.driver_client import DriverClient
+from mi.core.instrument import zmq_transport
+from mi.core.instrument.zmq_transport import DEFAULT_EVENT_ENCODINGS
+from mi.core.instrument.zmq_transport import POLL_TIMEOUT
 from mi.core.log import get_logger ; log = get_logger()
 
+# Seconds start_messaging waits for the driver process to agree on an
+# event encoding before carrying on with plain pickles.
+NEGOTIATE_TIMEOUT = 10
+
  
 class ZmqDriverClient(DriverClient):
     """
     A class for communicating with a ZMQ-based driver process using python
-    thread for catching asynchronous driver events.
+    thread for catching asynchronous driver events.  Commands go out on a
+    DEALER socket tagged with a request id, so several can be in flight at
+    once (send_cmd/get_reply); cmd_dvr is the one-at-a-time form.  The
+    command methods are not thread safe, as with the REQ socket before.
+    A driver in a DriverHost is addressed by its driver_id; commands carry
+    the id and only that driver's events are received.
     """
     
-    def __init__(self, host, cmd_port, event_port):
+    def __init__(self, host, cmd_port, event_port, cmd_timeout=None, driver_id=None):
         """
         Initialize members.
         @param host Host string address of the driver process.
         @param cmd_port Port number for the driver process command port.
         @param event_port Port number for the driver process event port.
+        @param cmd_timeout Seconds cmd_dvr waits for a reply, None to wait
+        forever.
+        @param driver_id Id of the driver in a driver host, None for a
+        driver process.
         """
         DriverClient.__init__(self)
         self.host = host
@@ -49,23 +68,31 @@ class ZmqDriverClient(DriverClient):
         self.event_port = event_port
         self.cmd_host_string = 'tcp://%s:%i' % (self.host, self.cmd_port)
         self.event_host_string = 'tcp://%s:%i' % (self.host, self.event_port)
+        self.cmd_timeout = cmd_timeout
+        self.driver_id = driver_id
         self.zmq_context = None
         self.zmq_cmd_socket = None
+        self.zmq_cmd_poller = None
+        self._request_ids = itertools.count()
+        self._replies = {}
+        self._abandoned = set()
         self.event_thread = None
         self.stop_event_thread = True
+        self.event_encoding = None
         
-    def start_messaging(self, evt_callback=None):
+    def start_messaging(self, evt_callback=None, encodings=DEFAULT_EVENT_ENCODINGS):
         """
         Initialize and start messaging resources for the driver process client.
         Initializes command socket for sending requests,
         and starts event thread that listens for events from the driver
         process independently of command request-reply.
+        @param evt_callback Called with each event received.
+        @param encodings Event serializations this client accepts, in order
+        of preference.  The driver process picks one; None skips the
+        negotiation and leaves the process sending one plain pickle per
+        message.
         """
-        self.zmq_context = zmq.Context()
-        self.zmq_cmd_socket = self.zmq_context.socket(zmq.REQ)
-        self.zmq_cmd_socket.connect(self.cmd_host_string)
-        log.info('Driver client cmd socket connected to %s.' %
-                       self.cmd_host_string)        
+        self._connect_cmd_socket()
         self.evt_callback = evt_callback
         
         def recv_evt_messages(driver_client):
@@ -74,32 +101,96 @@ class ZmqDriverClient(DriverClient):
             driver events. Can be run as a thread or greenlet.
             @param driver_client The client object that launches the thread.
             """
-            context = zmq.Context()
+            zmq_module = zmq_transport.zmq_module()
+            context = zmq_module.Context()
             sock = context.socket(zmq.SUB)
             sock.connect(driver_client.event_host_string)
-            sock.setsockopt(zmq.SUBSCRIBE, '')
+            # A driver host sends each driver's events under its id.
+            topic = driver_client.driver_id
+            sock.setsockopt(zmq.SUBSCRIBE, topic or '')
             log.info('Driver client event thread connected to %s.' %
                   driver_client.event_host_string)
 
+            poller = zmq_module.Poller()
+            poller.register(sock, zmq.POLLIN)
+
             driver_client.stop_event_thread = False
-            #last_time = time.time()
             while not driver_client.stop_event_thread:
+                # Block until events arrive, waking periodically to check
+                # the stop flag.
+                if not poller.poll(POLL_TIMEOUT):
+                    continue
+
                 try:
-                    evt = sock.recv_pyobj(flags=zmq.NOBLOCK)
-                    log.debug('got event: %s' % str(evt))
+                    frames = sock.recv_multipart(flags=zmq.NOBLOCK)
+                except zmq.ZMQError:
+                    continue
+
+                if topic is not None:
+                    # skip other drivers whose ids start with this one
+                    if frames[0] != topic:
+                        continue
+                    frames = frames[1:]
+
+                for frame in frames:
+                    try:
+                        evt = zmq_transport.decode(frame)
+                    except Exception as e:
+                        log.error('Could not decode event: %s', e)
+                        continue
+
+                    log.debug('got event: %s', evt)
                     if driver_client.evt_callback:
                         driver_client.evt_callback(evt)
-                except zmq.ZMQError:
-                    time.sleep(.5)
-                #cur_time = time.time()
-                #if cur_time - last_time > 5:
-                #    log.info('event thread listening')
-                #    last_time = cur_time
             sock.close()
             context.term()
             log.info('Client event socket closed.')
         self.event_thread = thread.start_new_thread(recv_evt_messages, (self,))
+
+        if encodings:
+            self.negotiate_event_encoding(encodings)
         log.info('Driver client messaging started.')
+
+    def _connect_cmd_socket(self):
+        """
+        Create the context and connect the command socket.
+        """
+        zmq_module = zmq_transport.zmq_module()
+        self.zmq_context = zmq_module.Context()
+        self.zmq_cmd_socket = self.zmq_context.socket(zmq.DEALER)
+        self.zmq_cmd_socket.connect(self.cmd_host_string)
+        self.zmq_cmd_poller = zmq_module.Poller()
+        self.zmq_cmd_poller.register(self.zmq_cmd_socket, zmq.POLLIN)
+        self._replies.clear()
+        self._abandoned.clear()
+        log.info('Driver client cmd socket connected to %s.' %
+                       self.cmd_host_string)        
+
+    def negotiate_event_encoding(self, encodings=DEFAULT_EVENT_ENCODINGS,
+                                 timeout=NEGOTIATE_TIMEOUT):
+        """
+        Ask the driver process to publish events with the first of
+        encodings it supports.  A driver process that does not know the
+        command, or does not answer in time, keeps publishing one plain
+        pickle per message.
+        @param encodings Encodings in order of preference.
+        @param timeout Seconds to wait for the answer.
+        @retval The encoding in use, None for plain pickles.
+        """
+        request_id = self.send_cmd('negotiate_event_encoding', encodings=list(encodings))
+        try:
+            reply = self.get_reply(request_id, timeout)
+        except InstrumentTimeoutException:
+            log.warning('Driver process did not answer event encoding negotiation in %s seconds',
+                        timeout)
+            reply = None
+
+        if reply in encodings:
+            self.event_encoding = reply
+        else:
+            self.event_encoding = None
+        log.info('Driver client event encoding: %s', self.event_encoding)
+        return self.event_encoding
         
     def stop_messaging(self):
         """
@@ -109,8 +200,9 @@ class ZmqDriverClient(DriverClient):
         Await event thread completion and return.
         """
         
-        self.zmq_cmd_socket.close()
+        self.zmq_cmd_socket.close(linger=0)
         self.zmq_cmd_socket = None
+        self.zmq_cmd_poller = None
         self.zmq_context.term()
         self.zmq_context = None
         self.stop_event_thread = True                    
@@ -119,50 +211,93 @@ class ZmqDriverClient(DriverClient):
         self.evt_callback = None
         log.info('Driver client messaging closed.')        
     
-    def cmd_dvr(self, cmd, *args, **kwargs):
+    def send_cmd(self, cmd, *args, **kwargs):
         """
-        Command a driver by request-reply messaging. Package command
-        message and send on blocking command socket. Block on same socket
-        to receive the reply. Return the driver reply.
+        Send a driver command without waiting for the reply.
         @param cmd The driver command identifier.
         @param args Positional arguments of the command.
         @param kwargs Keyword arguments of the command.
-        @retval Command result.
+        @retval Request id to pass to get_reply.
         """
         # Package command dictionary.
         msg = {'cmd':cmd,'args':args,'kwargs':kwargs}
-        
-        log.debug('Sending command %s.' % str(msg))
-        while True:
-            try:
-                # Attempt command send. Retry if necessary.
-                self.zmq_cmd_socket.send_pyobj(msg)
-                if msg == 'stop_driver_process':
-                    return 'driver stopping'
-
-                # Command sent, break out and wait for reply.
-                break    
-
-            except zmq.ZMQError:
-                # Socket not ready to accept send. Sleep and retry later.
-                time.sleep(.5)
-            
-        log.debug('Awaiting reply.')
-        while True:
-            try:
-                # Attempt reply recv. Retry if necessary.
-                reply = self.zmq_cmd_socket.recv_pyobj(flags=zmq.NOBLOCK)
-                # Reply recieved, break and return.
-                break
-
-            except zmq.ZMQError:
-                # Socket not ready with the reply. Sleep and retry later.
-                time.sleep(.5)
-                
-        log.debug('Reply: %s.' % str(reply))
-        
+        if self.driver_id is not None:
+            msg['driver_id'] = self.driver_id
+        request_id = str(self._request_ids.next())
+
+        log.debug('Sending command %s (request %s).', msg, request_id)
+        self.zmq_cmd_socket.send_multipart(['', request_id,
+                                            pickle.dumps(msg, pickle.HIGHEST_PROTOCOL)])
+        return request_id
+
+    def get_reply(self, request_id, timeout=None):
+        """
+        Wait for the reply to a command sent with send_cmd.  Replies to
+        other outstanding requests that arrive first are kept for their own
+        get_reply call.
+        @param request_id Id returned by send_cmd.
+        @param timeout Seconds to wait, None to wait forever.
+        @retval Command result.
+        @raises InstrumentTimeoutException if the reply did not arrive in
+        time.  A late reply is discarded.
+        @raises The driver exception if the command raised one.
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while request_id not in self._replies:
+            if deadline is None:
+                poll_timeout = POLL_TIMEOUT
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._abandoned.add(request_id)
+                    raise InstrumentTimeoutException(
+                        'No reply to driver request %s in %s seconds.' % (request_id, timeout))
+                poll_timeout = min(POLL_TIMEOUT, int(remaining * 1000) + 1)
+
+            if self.zmq_cmd_poller.poll(poll_timeout):
+                self._recv_reply()
+
+        reply = self._replies.pop(request_id)
+        log.debug('Reply: %s.', reply)
+
         if isinstance(reply, Exception):
             raise reply
         else:
             return reply
-    
+
+    def _recv_reply(self):
+        """
+        Read one reply off the command socket and file it by request id.
+        """
+        try:
+            frames = self.zmq_cmd_socket.recv_multipart(flags=zmq.NOBLOCK)
+        except zmq.ZMQError:
+            return
+
+        if len(frames) != 3 or frames[0] != '':
+            log.error('Dropping malformed reply: %s', frames)
+            return
+
+        (empty, request_id, payload) = frames
+        if request_id in self._abandoned:
+            self._abandoned.discard(request_id)
+            log.debug('Discarding late reply to request %s.', request_id)
+            return
+
+        self._replies[request_id] = pickle.loads(payload)
+
+    def cmd_dvr(self, cmd, *args, **kwargs):
+        """
+        Command a driver by request-reply messaging. Package command
+        message and send on the command socket. Block until the reply
+        arrives or cmd_timeout passes. Return the driver reply.
+        @param cmd The driver command identifier.
+        @param args Positional arguments of the command.
+        @param kwargs Keyword arguments of the command.
+        @retval Command result.
+        @raises InstrumentTimeoutException if cmd_timeout is set and passes.
+        """
+        return self.get_reply(self.send_cmd(cmd, *args, **kwargs), self.cmd_timeout)
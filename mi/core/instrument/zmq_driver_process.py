@@ -28,27 +28,28 @@ import uuid
 import zmq
 
 from ooi.exception import ApplicationException
-from mi.core.exceptions import InstrumentException, UnexpectedError
 
 import mi.core.instrument.driver_process as driver_process
+from mi.core.instrument import zmq_transport
+from mi.core.instrument.zmq_transport import EVENT_BATCH_SIZE
+from mi.core.instrument.zmq_transport import POLL_TIMEOUT
+from mi.core.instrument.zmq_transport import SEND_RETRY_DELAY
+from mi.core.instrument.zmq_transport import SEND_RETRY_MAX_DELAY
 from mi.core.log import get_logger
 log = get_logger()
-
-def _encode_exception(reply):
-    if isinstance(reply, InstrumentException):
-        # InstrumentExceptions have corresponding IonException error code built-in
-        return reply.get_triple()
-    else:
-        # all others are wrapped to capture stack and appropriate code
-        ex = UnexpectedError("%s('%s')" % (reply.__class__.__name__, reply.message))
-        return ex.get_triple()
+from mi.core.metrics import get_metrics
+metrics = get_metrics()
 
 class ZmqDriverProcess(driver_process.DriverProcess):
     """
     A OS-level driver process that communicates with ZMQ sockets.
-    Command-REP and event-PUB sockets monitor and react to comms
+    Command-ROUTER and event-PUB sockets monitor and react to comms
     needs in separate threads, which can be signaled to end
     by setting boolean flags stop_cmd_thread and stop_evt_thread.
+    Events are published in multipart batches, one encoded event per
+    frame, using the serialization negotiated with the client.  Before any
+    negotiation events are sent one per message as plain pickles, as
+    send_pyobj did.
     """
     
     @classmethod
@@ -122,48 +123,78 @@ class ZmqDriverProcess(driver_process.DriverProcess):
         self.stop_evt_thread = True
         self.cmd_thread = None
         self.stop_cmd_thread = True
-        
+        # Until a client negotiates, events go out one per message as plain
+        # pickles, which clients that predate the negotiation read with
+        # recv_pyobj.
+        self.event_encoding = None
+
+    def cmd_driver(self, msg):
+        """
+        Handle transport messages, pass everything else to the driver.
+        'negotiate_event_encoding' - pick the event serialization from the
+        client's list of supported encodings and reply with the choice.
+        """
+        if msg.get('cmd', None) == 'negotiate_event_encoding':
+            offered = msg.get('kwargs', {}).get('encodings', None)
+            self.event_encoding = zmq_transport.choose_encoding(offered)
+            log.info('Driver process event encoding: %s', self.event_encoding)
+            return self.event_encoding
+
+        return driver_process.DriverProcess.cmd_driver(self, msg)
+
     def start_messaging(self):
         """
         Initialize and start messaging resources for the driver, blocking
         until messaging terminates. This ZMQ implementation starts and
-        joins command and event threads, managing nonblocking send/recv calls
-        on REP and PUB sockets, respectively. Terminate loops and close
+        joins command and event threads, managing send/recv calls
+        on ROUTER and PUB sockets, respectively. Terminate loops and close
         sockets when stop flag is set in driver process.
         """
         def recv_cmd_msg(zmq_driver_process):
             """
-            Await commands on a ZMQ REP socket, forwaring them to the
-            driver for processing and returning the result.
+            Await commands on a ZMQ ROUTER socket, forwarding them to the
+            driver for processing and returning the result.  Both REQ
+            clients and pipelining DEALER clients are served; commands are
+            processed one at a time in arrival order.
             """
-            context = zmq.Context()
-            sock = context.socket(zmq.REP)
+            zmq_module = zmq_transport.zmq_module()
+            context = zmq_module.Context()
+            sock = context.socket(zmq.ROUTER)
             zmq_driver_process.cmd_port = sock.bind_to_random_port(zmq_driver_process.cmd_host_string)
             log.info('Driver process cmd socket bound to %i' %
                            zmq_driver_process.cmd_port)
             file(zmq_driver_process.cmd_port_fname,'w+').write(str(zmq_driver_process.cmd_port)+'\n')
 
+            poller = zmq_module.Poller()
+            poller.register(sock, zmq.POLLIN)
+
             zmq_driver_process.stop_cmd_thread = False
             while not zmq_driver_process.stop_cmd_thread:
+                # Block until a command arrives, waking periodically to
+                # check the stop flag.
+                if not poller.poll(POLL_TIMEOUT):
+                    continue
+
                 try:
-                    msg = sock.recv_pyobj(flags=zmq.NOBLOCK)
-                    log.trace('Processing message %s', msg)
-                    reply = zmq_driver_process.cmd_driver(msg)
-                    # if operation raised exception, encode as triple
-                    if isinstance(reply, Exception):
-                        reply = _encode_exception(reply)
-                    # send, send, and resend
-                    while True:
-                        try:
-                            sock.send_pyobj(reply, flags=zmq.NOBLOCK)
-                            break
-                        except zmq.ZMQError:
-                            time.sleep(.1)
-                            if zmq_driver_process.stop_cmd_thread:
-                                break
+                    frames = sock.recv_multipart(flags=zmq.NOBLOCK)
+                    (envelope, request_id, msg) = zmq_transport.split_request(frames)
                 except zmq.ZMQError:
-                    time.sleep(.1)
-                
+                    continue
+                except Exception as e:
+                    log.error('Dropping malformed command message: %s', e)
+                    continue
+
+                log.trace('Processing message %s', msg)
+                reply = zmq_driver_process.cmd_driver(msg)
+                # if operation raised exception, encode as triple
+                if isinstance(reply, Exception):
+                    reply = zmq_transport.encode_exception(reply)
+
+                try:
+                    sock.send_multipart(zmq_transport.reply_frames(envelope, request_id, reply))
+                except zmq.ZMQError as e:
+                    log.error('Failed to send reply: %s', e)
+
             sock.close()
             context.term()
             log.info('Driver process cmd socket closed.')
@@ -171,32 +202,52 @@ class ZmqDriverProcess(driver_process.DriverProcess):
         def send_evt_msg(zmq_driver_process):
             """
             Await events on the driver process event queue and publish them
-            on a ZMQ PUB socket to the driver process client.
+            on a ZMQ PUB socket to the driver process client.  Everything
+            queued when the thread wakes goes out as one multipart message.
             """
-            context = zmq.Context()
+            context = zmq_transport.zmq_module().Context()
             sock = context.socket(zmq.PUB)
             zmq_driver_process.evt_port = sock.bind_to_random_port(zmq_driver_process.event_host_string)
             log.info('Driver process event socket bound to %i', zmq_driver_process.evt_port)
             file(zmq_driver_process.evt_port_fname,'w+').write(str(zmq_driver_process.evt_port)+'\n')
 
+            stopped = lambda: zmq_driver_process.stop_evt_thread
+            retry_delay = SEND_RETRY_DELAY
             zmq_driver_process.stop_evt_thread = False
             while not zmq_driver_process.stop_evt_thread:
+                encoding = zmq_driver_process.event_encoding
+                evts = zmq_driver_process.get_events(EVENT_BATCH_SIZE if encoding else 1, stopped)
+                if not evts:
+                    continue
+
+                log.trace('Event thread sending %d events', len(evts))
+                frames = []
+                for evt in evts:
+                    if isinstance(evt, Exception):
+                        evt = zmq_transport.encode_exception(evt)
+                    frames.append(zmq_transport.encode(evt, encoding))
+
+                timed = metrics.enabled
+                if timed:
+                    start = time.time()
                 try:
-                    evt = zmq_driver_process.events.pop(0)
-                    log.trace('Event thread sending event %s',evt)
-                    while evt:
-                        try:
-                            if isinstance(evt, Exception):
-                                evt = _encode_exception(evt)
-                            sock.send_pyobj(evt, flags=zmq.NOBLOCK)
-                            evt = None
-                            log.trace('Event sent!')
-                        except zmq.ZMQError:
-                            time.sleep(.1)
-                            if zmq_driver_process.stop_evt_thread:
-                                break
-                except IndexError:
-                    time.sleep(.1)
+                    sock.send_multipart(frames)
+                except zmq.ZMQError as e:
+                    # Put the batch back in front of anything queued since
+                    # and resend it after a pause.
+                    log.error('Event thread failed to send %d events, retrying in %.1f s: %s',
+                              len(evts), retry_delay, e)
+                    zmq_driver_process.requeue_events(evts)
+                    if metrics.enabled:
+                        metrics.increment('driver_process.send_failures')
+                    time.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, SEND_RETRY_MAX_DELAY)
+                    continue
+
+                retry_delay = SEND_RETRY_DELAY
+                if timed:
+                    metrics.observe('driver_process.send_time', time.time() - start)
+                    metrics.increment('driver_process.events_sent', len(frames))
 
             sock.close()
             context.term()
@@ -215,6 +266,7 @@ class ZmqDriverProcess(driver_process.DriverProcess):
         """
         self.stop_cmd_thread = True
         self.stop_evt_thread = True
+        self.wake_event_waiters()
         self.messaging_started = False
     
     def shutdown(self):
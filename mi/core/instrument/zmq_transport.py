@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.zmq_transport
+@file mi/core/instrument/zmq_transport.py
+@brief Framing and serialization shared by the ZMQ driver process and
+client.
+"""
+
+__license__ = 'Apache 2.0'
+
+import sys
+import marshal
+import cPickle as pickle
+
+import zmq
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from mi.core.common import BaseEnum
+from mi.core.exceptions import InstrumentException
+from mi.core.exceptions import UnexpectedError
+from mi.core.log import get_logger ; log = get_logger()
+
+# Maximum number of events packed into one multipart message.
+EVENT_BATCH_SIZE = 100
+
+# Poll timeout in ms used by loops that also watch a stop flag.
+POLL_TIMEOUT = 500
+
+# Seconds to wait before resending events that failed to go out, doubled
+# after each failure up to the maximum.
+SEND_RETRY_DELAY = .1
+SEND_RETRY_MAX_DELAY = 3.2
+
+class EventEncoding(BaseEnum):
+    """
+    Serializations the event channel can use.  The marshal format changes
+    between python versions so its version is part of the name.
+    """
+    MARSHAL = 'marshal%d' % marshal.version
+    MSGPACK = 'msgpack'
+    PICKLE = 'pickle'
+
+def _pickle_dumps(obj):
+    return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+# Each encoded frame starts with a one byte tag naming its serialization,
+# so a frame can always be decoded no matter what was negotiated and an
+# event the preferred encoder cannot handle falls back to pickle.
+_CODECS = {
+    EventEncoding.PICKLE: ('p', _pickle_dumps, pickle.loads),
+    EventEncoding.MARSHAL: ('m', marshal.dumps, marshal.loads),
+}
+if msgpack is not None:
+    _CODECS[EventEncoding.MSGPACK] = ('k', msgpack.packb, msgpack.unpackb)
+
+# Opcode starting every pickle of protocol 2 and up, which send_pyobj
+# uses.  It is never a frame tag.
+_PICKLE_PROTO = '\x80'
+
+_DECODERS = dict([(tag, loads) for (tag, dumps, loads) in _CODECS.values()])
+
+# Preference order offered by clients, fastest first.
+DEFAULT_EVENT_ENCODINGS = [encoding for encoding in
+                           [EventEncoding.MARSHAL, EventEncoding.MSGPACK, EventEncoding.PICKLE]
+                           if encoding in _CODECS]
+
+def supported_encodings():
+    """
+    @retval list of encodings available in this process.
+    """
+    return list(DEFAULT_EVENT_ENCODINGS)
+
+def choose_encoding(offered):
+    """
+    Pick the first offered encoding this side supports.
+    @param offered encodings in the peer's order of preference.
+    @retval encoding name, pickle if nothing matches.
+    """
+    for encoding in offered or []:
+        if encoding in _CODECS:
+            return encoding
+    return EventEncoding.PICKLE
+
+def encode(obj, encoding=EventEncoding.PICKLE):
+    """
+    Serialize an object into a tagged frame.
+    @param obj object to serialize.
+    @param encoding preferred encoding, pickle is used if it cannot
+    represent the object.  None gives the untagged pickle of send_pyobj,
+    which is what clients that predate the negotiation read.
+    @retval frame string.
+    """
+    if encoding is None:
+        return _pickle_dumps(obj)
+
+    (tag, dumps, loads) = _CODECS.get(encoding, _CODECS[EventEncoding.PICKLE])
+    if tag != 'p':
+        try:
+            return tag + dumps(obj)
+        except (ValueError, TypeError):
+            log.trace("%s cannot encode %r, falling back to pickle", encoding, obj)
+
+    return 'p' + _pickle_dumps(obj)
+
+def decode(frame):
+    """
+    Deserialize a tagged frame, or an untagged pickle from a driver
+    process that was never asked to negotiate.
+    @param frame string produced by encode.
+    @retval the decoded object.
+    @raise ValueError if the tag is unknown.
+    """
+    if frame[:1] == _PICKLE_PROTO:
+        return pickle.loads(frame)
+
+    loads = _DECODERS.get(frame[:1])
+    if loads is None:
+        raise ValueError("unknown frame encoding %r" % frame[:1])
+    return loads(frame[1:])
+
+def encode_exception(reply):
+    """
+    Convert an exception raised by a driver into the error triple sent to
+    clients in place of a reply or event.
+    """
+    if isinstance(reply, InstrumentException):
+        # InstrumentExceptions have corresponding IonException error code built-in
+        return reply.get_triple()
+    else:
+        # all others are wrapped to capture stack and appropriate code
+        ex = UnexpectedError("%s('%s')" % (reply.__class__.__name__, reply.message))
+        return ex.get_triple()
+
+def split_request(frames):
+    """
+    Split a request received on a ROUTER socket.  REQ peers send
+    [identity, '', message]; pipelining DEALER peers put a request id in
+    front of the message, [identity, '', request id, message], and get it
+    back on the reply.  Messages are pickled.
+    @param frames list of frames from recv_multipart.
+    @retval (envelope, request id or None, message)
+    @raise ValueError if the frames are not a request.
+    """
+    if '' not in frames:
+        raise ValueError("request has no envelope delimiter")
+
+    index = frames.index('') + 1
+    envelope = frames[:index]
+    body = frames[index:]
+    if len(body) == 1:
+        return (envelope, None, pickle.loads(body[0]))
+    elif len(body) == 2:
+        return (envelope, body[0], pickle.loads(body[1]))
+
+    raise ValueError("request has %d frames after the envelope" % len(body))
+
+def reply_frames(envelope, request_id, reply):
+    """
+    Build the frames answering a request split by split_request.
+    """
+    if request_id is None:
+        return envelope + [_pickle_dumps(reply)]
+    return envelope + [request_id, _pickle_dumps(reply)]
+
+def zmq_module():
+    """
+    The zmq module to create contexts with.  When gevent has patched
+    threads, blocking polls have to yield to the hub so zmq.green is used;
+    otherwise plain zmq.  gevent can only have patched threads if
+    gevent.monkey is loaded, so neither is imported unless it has.
+    """
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey is None:
+        return zmq
+
+    is_patched = getattr(gevent_monkey, 'is_module_patched', None)
+    if is_patched:
+        patched = is_patched('thread')
+    else:
+        patched = 'thread' in getattr(gevent_monkey, 'saved', {})
+
+    if patched:
+        import zmq.green as zmq_green
+        return zmq_green
+    return zmq
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.metrics
+@file mi/core/metrics.py
+@brief Counters and histograms for finding where a driver spends its time.
+
+Components record into the registry returned by get_metrics:
+
+    metrics = get_metrics()
+    ...
+    timed = metrics.enabled
+    if timed:
+        start = time.time()
+    do_work()
+    if timed:
+        metrics.observe('component.work_time', time.time() - start)
+
+Recording is off until enabled, usually with the enable_metrics driver
+command, and the results are read back with get_metrics.  When disabled
+the cost at each instrumented point is a property lookup.
+
+get_metrics records into the registry bound to the calling thread, or the
+process wide registry if none is.  A process hosting several drivers gives
+each one its own Metrics and binds it around that driver's work, so one
+driver's enable_metrics or reset doesn't touch the others:
+
+    with bound_metrics(hosted.metrics):
+        hosted.cmd_driver(msg)
+"""
+
+# mi.core.time would shadow the standard time module
+from __future__ import absolute_import
+
+__license__ = 'Apache 2.0'
+
+import math
+import time
+import threading
+from threading import Lock
+from contextlib import contextmanager
+
+class Counter(object):
+    """
+    Count of things seen since the counter was created or reset.
+    """
+    __slots__ = ('count', 'started')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.started = time.time()
+
+    def increment(self, count=1):
+        self.count += count
+
+    def snapshot(self, now=None):
+        """
+        @retval dict with the count and the average rate per second.
+        """
+        elapsed = (now or time.time()) - self.started
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        return {'count': self.count, 'rate': rate}
+
+class Histogram(object):
+    """
+    Distribution of observed values, usually durations in seconds or
+    sizes.  Values are counted in power of two buckets keyed by the bucket
+    upper bound, which is enough to tell a 1ms sieve from a 100ms one.
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if value > 0:
+            exponent = math.frexp(value)[1]
+        else:
+            exponent = None
+        self.buckets[exponent] = self.buckets.get(exponent, 0) + 1
+
+    def snapshot(self, now=None):
+        """
+        @retval dict with count, total, mean, min, max and the bucket counts.
+        Values of zero or less are counted in the 0 bucket.
+        """
+        buckets = {}
+        for (exponent, count) in self.buckets.items():
+            bound = 0 if exponent is None else math.ldexp(1.0, exponent)
+            buckets[bound] = count
+
+        mean = float(self.total) / self.count if self.count else None
+        return {'count': self.count, 'total': self.total, 'mean': mean,
+                'min': self.min, 'max': self.max, 'buckets': buckets}
+
+class Metrics(object):
+    """
+    Registry of named counters and histograms.  Metrics are created the
+    first time they are recorded.  Updates are not locked; a count may be
+    lost now and then when two threads update the same metric, which is
+    acceptable for diagnostics and keeps recording cheap.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._lock = Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = bool(enabled)
+
+    def counter(self, name):
+        """
+        @retval the Counter called name, created if needed.
+        """
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    def histogram(self, name):
+        """
+        @retval the Histogram called name, created if needed.
+        """
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def increment(self, name, count=1):
+        """
+        Add to a counter if metrics are enabled.
+        """
+        if self.enabled:
+            self.counter(name).increment(count)
+
+    def observe(self, name, value):
+        """
+        Record a value in a histogram if metrics are enabled.
+        """
+        if self.enabled:
+            self.histogram(name).observe(value)
+
+    def snapshot(self):
+        """
+        @retval dict with the enabled flag and a snapshot of each counter
+        and histogram by name.
+        """
+        now = time.time()
+        with self._lock:
+            counters = self._counters.items()
+            histograms = self._histograms.items()
+
+        return {
+            'enabled': self.enabled,
+            'counters': dict([(name, c.snapshot(now)) for (name, c) in counters]),
+            'histograms': dict([(name, h.snapshot(now)) for (name, h) in histograms]),
+        }
+
+    def reset(self):
+        """
+        Zero every metric and restart the rate clocks.
+        """
+        with self._lock:
+            for counter in self._counters.values():
+                counter.reset()
+            for histogram in self._histograms.values():
+                histogram.reset()
+
+_process_metrics = Metrics()
+_bound = threading.local()
+
+def current_metrics():
+    """
+    @retval the Metrics registry bound to the calling thread, or the process
+    wide registry.
+    """
+    return getattr(_bound, 'metrics', _process_metrics)
+
+@contextmanager
+def bound_metrics(metrics):
+    """
+    Record into metrics on the calling thread for the body of the with
+    statement.
+    @param metrics a Metrics registry, or None to leave the binding alone.
+    """
+    if metrics is None:
+        yield current_metrics()
+        return
+
+    previous = getattr(_bound, 'metrics', None)
+    _bound.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        if previous is None:
+            del _bound.metrics
+        else:
+            _bound.metrics = previous
+
+class BoundMetrics(object):
+    """
+    Stands in for the registry bound to whichever thread uses it, so
+    modules can keep the result of get_metrics at import.
+    """
+    @property
+    def enabled(self):
+        return getattr(_bound, 'metrics', _process_metrics).enabled
+
+    def __getattr__(self, name):
+        return getattr(current_metrics(), name)
+
+_metrics = BoundMetrics()
+
+def get_metrics():
+    """
+    @retval the registry of the calling thread, see bound_metrics.
+    """
+    return _metrics
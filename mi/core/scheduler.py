@@ -46,6 +46,9 @@ job = scheduler.add_polled_job(some_callback, test_name, min_interval, max_inter
 
 scheduler.run_polled_job(test_name)
 
+TimerScheduler offers the same jobs without a scheduler thread of its own:
+each job is a timer on the shared event loop, see mi.core.event_loop.
+
 This module extends the Advanced Python Scheduler:
 @see http://packages.python.org/APScheduler
 """
@@ -57,14 +60,21 @@ from datetime import timedelta
 from datetime import datetime
 from math import ceil
 
+import threading
+
 from apscheduler.scheduler import Scheduler
 from apscheduler.scheduler import JobStoreEvent
 from apscheduler.scheduler import EVENT_JOBSTORE_JOB_ADDED
 from apscheduler.job import Job
+from apscheduler.threadpool import ThreadPool
+from apscheduler.triggers import SimpleTrigger
+from apscheduler.triggers import IntervalTrigger
+from apscheduler.triggers import CronTrigger
 
 from apscheduler.util import convert_to_datetime, timedelta_seconds
 
 from mi.core.log import get_logger; log = get_logger()
+from mi.core.event_loop import get_event_loop
 
 class PolledScheduler(Scheduler):
     """
@@ -423,3 +433,234 @@ class PolledIntervalTrigger(object):
 
 
 
+
+class TimerJob(object):
+    """
+    A job on a TimerScheduler: the callable, the trigger deciding when it
+    runs and the loop timer waiting for the next run.
+    """
+    def __init__(self, trigger, func, args, kwargs, name=None):
+        self.trigger = trigger
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name
+        self.next_run_time = None
+        self.runs = 0
+        self.running = False
+        self.timer = None
+
+    def is_polled(self):
+        return isinstance(self.trigger, PolledIntervalTrigger)
+
+    def __repr__(self):
+        return '<%s (name=%s, trigger=%s)>' % (self.__class__.__name__, self.name, repr(self.trigger))
+
+class TimerScheduler(object):
+    """
+    Scheduler with the PolledScheduler job interface whose jobs are timers
+    on the shared event loop, so any number of schedulers share one thread
+    and nothing walks the job list.  Adding, running or polling a job
+    costs one heap operation.  Jobs run on a thread pool, and a job still
+    running when it comes due again is skipped rather than run twice.
+    """
+    interval = staticmethod(PolledScheduler.interval)
+
+    def __init__(self, loop=None):
+        """
+        @param loop EventLoop for the job timers, the shared loop by
+        default.
+        """
+        self._loop = loop or get_event_loop()
+        self._lock = threading.Lock()
+        self._jobs = []
+        self._polled_jobs = {}
+        self._pending_jobs = []
+        self._threadpool = ThreadPool()
+        self.running = False
+
+    def start(self):
+        """
+        Start the timers of the jobs added so far.
+        """
+        with self._lock:
+            self.running = True
+            pending = self._pending_jobs
+            self._pending_jobs = []
+        for job in pending:
+            self._schedule(job, datetime.now())
+
+    def shutdown(self):
+        """
+        Cancel every job and let the running ones finish.
+        """
+        with self._lock:
+            self.running = False
+            for job in self._jobs:
+                self._cancel(job)
+            self._jobs = []
+            self._polled_jobs = {}
+        self._threadpool.shutdown()
+
+    def add_date_job(self, func, date, args=None, kwargs=None):
+        return self._add_job(TimerJob(SimpleTrigger(date), func, args, kwargs))
+
+    def add_interval_job(self, func, weeks=0, days=0, hours=0, minutes=0, seconds=0,
+                         start_date=None, args=None, kwargs=None):
+        interval = timedelta(weeks=weeks, days=days, hours=hours,
+                             minutes=minutes, seconds=seconds)
+        return self._add_job(TimerJob(IntervalTrigger(interval, start_date), func, args, kwargs))
+
+    def add_cron_job(self, func, year=None, month=None, day=None, week=None,
+                     day_of_week=None, hour=None, minute=None, second=None,
+                     start_date=None, args=None, kwargs=None):
+        trigger = CronTrigger(year=year, month=month, day=day, week=week,
+                              day_of_week=day_of_week, hour=hour, minute=minute,
+                              second=second, start_date=start_date)
+        return self._add_job(TimerJob(trigger, func, args, kwargs))
+
+    def add_polled_job(self, func, name, min_interval, max_interval=None,
+                       start_date=None, args=None, kwargs=None):
+        """
+        Add a polled interval job, see PolledScheduler.add_polled_job.
+        @raise ValueError if there is already a polled job with the name.
+        """
+        trigger = PolledIntervalTrigger(min_interval, max_interval, start_date)
+        return self._add_job(TimerJob(trigger, func, args, kwargs, name=name))
+
+    def run_polled_job(self, name):
+        """
+        Run a polled job if its minimum interval has passed, and push its
+        automatic run back to a maximum interval from now.
+        @param name: name of the job
+        @return: True if the job is run, false otherwise
+        @raise LookupError if there is no polled job with the name.
+        """
+        with self._lock:
+            job = self._polled_jobs.get(name)
+            if not job:
+                raise LookupError("no PolledIntervalJob found named '%s'" % name)
+            if not job.trigger.pull_trigger():
+                log.debug("Job '%s' is *NOT* ready to run", name)
+                return False
+            log.debug("Job '%s' is ready to run", name)
+            self._submit(job)
+            if self.running:
+                self._schedule(job, datetime.now())
+            return True
+
+    def get_polled_job(self, name):
+        """
+        @return: the polled job with the name, None if there isn't one.
+        """
+        return self._polled_jobs.get(name)
+
+    def unschedule_func(self, func):
+        """
+        Remove all jobs that would call func.
+        @raise KeyError if there are none.
+        """
+        with self._lock:
+            removed = [job for job in self._jobs if job.func == func]
+            if not removed:
+                raise KeyError('The given function is not scheduled in this scheduler')
+            for job in removed:
+                self._remove(job)
+
+    def get_jobs(self):
+        """
+        @return: the scheduled jobs, not counting ones waiting for start.
+        """
+        return [job for job in self._jobs if job not in self._pending_jobs]
+
+    def _add_job(self, job):
+        """
+        @raise ValueError if the job would never run, or a polled job's name
+        is taken.
+        """
+        now = datetime.now()
+        if not job.is_polled() and not job.trigger.get_next_fire_time(now):
+            raise ValueError('Not adding job since it would never be run')
+
+        with self._lock:
+            if job.is_polled():
+                if job.name in self._polled_jobs:
+                    raise ValueError("Not adding job since a job named '%s' already exists" % job.name)
+                self._polled_jobs[job.name] = job
+            self._jobs.append(job)
+            if self.running:
+                self._schedule(job, now)
+            else:
+                self._pending_jobs.append(job)
+
+        log.info('Added job "%s"', job)
+        return job
+
+    def _schedule(self, job, now):
+        """
+        Point the job's timer at its next run time, if it has one.
+        """
+        job.next_run_time = job.trigger.get_next_fire_time(now)
+        if job.next_run_time is None:
+            if job.timer:
+                job.timer.cancel()
+            return
+        delay = max(0, timedelta_seconds(job.next_run_time - now))
+        if job.timer:
+            job.timer.reset(delay)
+        else:
+            job.timer = self._loop.call_later(delay, self._fire, job)
+
+    def _fire(self, job):
+        """
+        Timer callback, on the event loop: hand the job to the pool and
+        schedule its next run.
+        """
+        with self._lock:
+            if job not in self._jobs:
+                return
+            now = datetime.now()
+            self._submit(job)
+            if job.is_polled():
+                job.trigger.pull_trigger()
+            else:
+                # never the run that just fired, however close the clocks are
+                now = max(now, job.next_run_time) + timedelta(microseconds=1)
+            self._schedule(job, now)
+            if job.next_run_time is None:
+                self._remove(job)
+
+    def _submit(self, job):
+        """
+        Run the job on the pool unless it is still running.  Called with
+        the lock held.
+        """
+        if job.running:
+            log.warning('Job %s is still running; skipping this run', job)
+            return
+        job.running = True
+        job.runs += 1
+        self._threadpool.submit(self._run_job, job)
+
+    def _run_job(self, job):
+        try:
+            job.func(*(job.args or []), **(job.kwargs or {}))
+        except Exception:
+            log.error('Job %s raised', job, exc_info=True)
+        finally:
+            job.running = False
+
+    def _remove(self, job):
+        """
+        Called with the lock held.
+        """
+        self._cancel(job)
+        self._jobs.remove(job)
+        if job.is_polled():
+            self._polled_jobs.pop(job.name, None)
+        if job in self._pending_jobs:
+            self._pending_jobs.remove(job)
+
+    def _cancel(self, job):
+        if job.timer:
+            job.timer.cancel()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.test.test_common
+@file mi/core/test/test_common.py
+@brief Test cases for the common enum base class
+"""
+
+__license__ = 'Apache 2.0'
+
+import time
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.common import BaseEnum
+from mi.core.common import InstErrorCode
+from mi.core.instrument.instrument_driver import DriverEvent
+from mi.core.instrument.instrument_driver import DriverProtocolState
+from mi.core.instrument.data_particle import DataParticleKey
+from mi.dataset.parser.glider import GliderParticleKey
+from mi.dataset.parser.glider import EngineeringParticleKey
+
+def dir_list(cls):
+    """
+    The values of an enum found the way BaseEnum.list used to.
+    """
+    return [getattr(cls,attr) for attr in dir(cls) if\
+            not callable(getattr(cls,attr)) and not attr.startswith('__')]
+
+def dir_dict(cls):
+    result = {}
+    for attr in dir(cls):
+        if not callable(getattr(cls,attr)) and not attr.startswith('__'):
+            result[attr] = getattr(cls,attr)
+    return result
+
+def all_enums(cls=BaseEnum):
+    result = []
+    for subclass in cls.__subclasses__():
+        result.append(subclass)
+        result.extend(all_enums(subclass))
+    return result
+
+class ParentEnum(BaseEnum):
+    ONE = 'one'
+    TWO = 'two'
+    _PRIVATE = 'private'
+
+    @classmethod
+    def helper(cls):
+        return cls.ONE
+
+class ChildEnum(ParentEnum):
+    TWO = 'two again'
+    THREE = 3
+
+
+@attr('UNIT', group='mi')
+class UnitTestBaseEnum(MiUnitTest):
+    """
+    Test the cached enum values against the dir() based lookups.
+    """
+    def assert_same(self, cls):
+        self.assertEqual(cls.list(), dir_list(cls))
+        self.assertEqual(cls.dict(), dir_dict(cls))
+        for value in dir_list(cls):
+            self.assertTrue(cls.has(value))
+
+    def test_inheritance(self):
+        self.assert_same(ParentEnum)
+        self.assert_same(ChildEnum)
+        self.assertEqual(ParentEnum.list(), ['one', 'two', 'private'])
+        self.assertEqual(ChildEnum.dict(), {'ONE': 'one', 'TWO': 'two again',
+                                            'THREE': 3, '_PRIVATE': 'private'})
+        self.assertTrue(ChildEnum.has(3))
+        self.assertFalse(ChildEnum.has('two'))
+        self.assertFalse(ParentEnum.has(3))
+        self.assertFalse(ParentEnum.has(ParentEnum.helper))
+
+    def test_copies(self):
+        """
+        Callers can change the returned list and dict.
+        """
+        ParentEnum.list().append('four')
+        ParentEnum.dict()['FOUR'] = 'four'
+        self.assert_same(ParentEnum)
+        self.assertFalse(ParentEnum.has('four'))
+
+    def test_unhashable(self):
+        self.assert_same(InstErrorCode)
+        self.assertTrue(InstErrorCode.has(['OK']))
+        self.assertTrue(InstErrorCode.has(InstErrorCode.TIMEOUT))
+        self.assertFalse(InstErrorCode.has(['BOGUS']))
+        self.assertFalse(InstErrorCode.has('OK'))
+        self.assertFalse(ParentEnum.has(['one']))
+        self.assertFalse(ParentEnum.has({}))
+
+    def test_set_attribute(self):
+        """
+        Changing a class attribute updates the enum and its subclasses.
+        """
+        class Parent(BaseEnum):
+            A = 'a'
+        class Child(Parent):
+            B = 'b'
+
+        self.assertEqual(Child.list(), ['a', 'b'])
+        Parent.C = 'c'
+        self.assertEqual(Parent.list(), ['a', 'c'])
+        self.assertEqual(Child.list(), ['a', 'b', 'c'])
+        self.assertTrue(Child.has('c'))
+
+        del Parent.A
+        self.assertFalse(Child.has('a'))
+        self.assert_same(Parent)
+        self.assert_same(Child)
+
+    def test_all_enums(self):
+        """
+        Every enum loaded matches the dir() based lookups.
+        """
+        enums = all_enums()
+        self.assertGreater(len(enums), 10)
+        for cls in enums:
+            self.assert_same(cls)
+
+    def test_science_parameter_list(self):
+        params = EngineeringParticleKey.science_parameter_list()
+        self.assertEqual(params, [key for key in dir_list(EngineeringParticleKey)
+                                  if key not in dir_list(GliderParticleKey)])
+
+
+@attr('PERF', group='mi')
+class PerfTestBaseEnum(MiUnitTest):
+    """
+    Time the enum lookups used in the state machine and particle hot paths.
+    """
+    def test_lookups(self):
+        count = 20000
+        enums = [DriverEvent, DriverProtocolState, DataParticleKey]
+
+        start = time.time()
+        for i in xrange(count):
+            for cls in enums:
+                dir_list(cls)
+                DriverEvent.CONFIGURE in dir_list(cls)
+        legacy = time.time() - start
+
+        start = time.time()
+        for i in xrange(count):
+            for cls in enums:
+                cls.list()
+                cls.has(DriverEvent.CONFIGURE)
+        cached = time.time() - start
+
+        log.info("%d list/has lookups: dir() %.3fs, cached %.3fs",
+                 count * len(enums), legacy, cached)
+        self.assertLess(cached, legacy)
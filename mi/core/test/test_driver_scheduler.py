@@ -115,6 +115,27 @@ class TestDriverScheduler(MiUnitTest):
             return
         self.fail("a non-existent job was erroneous removed")
         
+    def test_shutdown(self):
+        """
+        Test that shutdown cancels the scheduled jobs
+        """
+        config = {
+            'interval_job': {
+                DriverSchedulerConfigKey.TRIGGER: {
+                    DriverSchedulerConfigKey.TRIGGER_TYPE: TriggerType.INTERVAL,
+                    DriverSchedulerConfigKey.SECONDS: 1
+                },
+                DriverSchedulerConfigKey.CALLBACK: self._callback
+            }
+        }
+        self._scheduler.add_config(config)
+        self.assert_event_triggered()
+
+        self._scheduler.shutdown()
+        self._triggered = []
+        time.sleep(2)
+        self.assertEqual(len(self._triggered), 0)
+
     ###
     #   Positive Testing For All Job Types
     ###
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.test.test_event_loop
+@file mi/core/test/test_event_loop.py
+@brief Test cases for the socket and timer event loop
+"""
+
+__license__ = 'Apache 2.0'
+
+import sys
+import time
+import socket
+import threading
+import subprocess
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.event_loop import EventLoop
+from mi.core.event_loop import get_event_loop
+
+TIMEOUT = 5
+
+@attr('UNIT', group='mi')
+class UnitTestEventLoop(MiUnitTest):
+    """
+    Test the event loop.
+    """
+    def setUp(self):
+        self.loop = EventLoop()
+        self.loop.start()
+        self.addCleanup(self.loop.join, TIMEOUT)
+        self.addCleanup(self.loop.stop)
+
+    def wait_in_loop(self):
+        """
+        Wait for everything handed to the loop so far to run.
+        """
+        done = threading.Event()
+        self.loop.call_soon(done.set)
+        self.assertTrue(done.wait(TIMEOUT))
+
+    def test_call_soon(self):
+        calls = []
+        threads = []
+        def record(value):
+            calls.append(value)
+            threads.append(self.loop.in_loop_thread())
+
+        for i in range(10):
+            self.loop.call_soon(record, i)
+        self.wait_in_loop()
+        self.assertEqual(calls, range(10))
+        self.assertEqual(threads, [True] * 10)
+        self.assertFalse(self.loop.in_loop_thread())
+
+    def test_call_later(self):
+        calls = []
+        done = threading.Event()
+        self.loop.call_later(0.2, done.set)
+        self.loop.call_later(0.1, calls.append, 'second')
+        self.loop.call_later(0.05, calls.append, 'first')
+        cancelled = self.loop.call_later(0.01, calls.append, 'cancelled')
+        cancelled.cancel()
+
+        self.assertTrue(done.wait(TIMEOUT))
+        self.assertEqual(calls, ['first', 'second'])
+
+    def test_reset(self):
+        """
+        A timer can be moved later or earlier, and reset after it has fired
+        or been cancelled.
+        """
+        calls = []
+        fired = threading.Event()
+        def record(value):
+            calls.append(value)
+            fired.set()
+
+        later = self.loop.call_later(0.05, record, 'later')
+        for i in range(10):
+            later.reset(0.3)
+        earlier = self.loop.call_later(5, record, 'earlier')
+        earlier.reset(0.1)
+
+        self.assertTrue(fired.wait(TIMEOUT))
+        fired.clear()
+        self.assertEqual(calls, ['earlier'])
+        self.assertTrue(fired.wait(TIMEOUT))
+        fired.clear()
+        self.assertEqual(calls, ['earlier', 'later'])
+
+        # the stale heap entry for 'earlier' doesn't fire it again
+        later.reset(0)
+        self.assertTrue(fired.wait(TIMEOUT))
+        fired.clear()
+        earlier.cancel()
+        earlier.reset(0.05)
+        self.assertTrue(fired.wait(TIMEOUT))
+        time.sleep(0.1)
+        self.wait_in_loop()
+        self.assertEqual(calls, ['earlier', 'later', 'later', 'earlier'])
+
+    def test_shared_loop(self):
+        loop = get_event_loop()
+        self.assertIs(get_event_loop(), loop)
+        self.assertTrue(loop.running)
+
+    def test_no_gevent(self):
+        """
+        Importing the loop, or the messaging modules that use it, doesn't
+        load gevent.
+        """
+        for module in ['mi.core.instrument.port_agent_client',
+                       'mi.core.instrument.zmq_driver_client',
+                       'mi.core.instrument.driver_host']:
+            script = ("import sys; import %s; "
+                      "print [m for m in ('gevent.monkey', 'zmq.green') if m in sys.modules]" % module)
+            output = subprocess.check_output([sys.executable, '-c', script])
+            self.assertEqual(output.splitlines()[-1], '[]', module)
+
+    def test_reader(self):
+        (left, right) = socket.socketpair()
+        self.addCleanup(right.close)
+        received = []
+        got_data = threading.Event()
+        def readable():
+            received.append(left.recv(100))
+            got_data.set()
+
+        self.loop.add_reader(left, readable)
+        right.sendall('hello')
+        self.assertTrue(got_data.wait(TIMEOUT))
+        self.assertEqual(received, ['hello'])
+
+        self.loop.remove_reader(left)
+        self.wait_in_loop()
+        right.sendall('ignored')
+        self.wait_in_loop()
+        self.assertEqual(received, ['hello'])
+
+        self.loop.close_socket(left)
+        self.wait_in_loop()
+        with self.assertRaises(socket.error):
+            left.recv(1)
+
+    def test_callback_error(self):
+        """
+        A callback that raises doesn't stop the loop.
+        """
+        def fail():
+            raise ValueError('expected')
+        self.loop.call_soon(fail)
+        self.loop.call_later(0, fail)
+        self.wait_in_loop()
+        self.assertTrue(self.loop.running)
+
+    def test_stop(self):
+        """
+        Calls handed over before stop still run.
+        """
+        calls = []
+        for i in range(100):
+            self.loop.call_soon(calls.append, i)
+        self.loop.stop()
+        self.loop.join(TIMEOUT)
+        self.assertFalse(self.loop.running)
+        self.assertEqual(calls, range(100))
+
+
+@attr('PERF', group='mi')
+class PerfTestEventLoop(MiUnitTest):
+    """
+    Time timer operations on a busy heap.
+    """
+    def test_timers(self):
+        loop = EventLoop()
+        loop.start()
+        try:
+            count = 20000
+            start = time.time()
+            timers = [loop.call_later(3600 + i, lambda: None) for i in xrange(count)]
+            scheduled = time.time() - start
+
+            start = time.time()
+            for timer in timers:
+                timer.reset(7200)
+            reset = time.time() - start
+
+            log.info("%d timers: scheduled in %.3f s, reset in %.3f s", count, scheduled, reset)
+        finally:
+            loop.stop()
+            loop.join(TIMEOUT)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.test.test_metrics
+@file mi/core/test/test_metrics.py
+@brief Test cases for the driver metrics registry
+"""
+
+__license__ = 'Apache 2.0'
+
+import re
+import time
+import threading
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.core.metrics import Metrics
+from mi.core.metrics import Histogram
+from mi.core.metrics import get_metrics
+from mi.core.metrics import current_metrics
+from mi.core.metrics import bound_metrics
+from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import RegexSieve
+
+@attr('UNIT', group='mi')
+class UnitTestMetrics(MiUnitTest):
+    """
+    Test counters, histograms and the registry.
+    """
+    def test_disabled(self):
+        metrics = Metrics()
+        self.assertFalse(metrics.enabled)
+        metrics.increment('count')
+        metrics.observe('time', 1.0)
+        self.assertEqual(metrics.snapshot(),
+                         {'enabled': False, 'counters': {}, 'histograms': {}})
+
+    def test_counter(self):
+        metrics = Metrics(enabled=True)
+        metrics.increment('bytes', 10)
+        metrics.increment('bytes', 5)
+        metrics.increment('packets')
+
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['bytes']['count'], 15)
+        self.assertEqual(counters['packets']['count'], 1)
+        self.assertGreater(counters['bytes']['rate'], 0)
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()['counters']['bytes']['count'], 0)
+
+    def test_histogram(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.snapshot()['mean'], None)
+
+        for value in [0, 0.75, 1, 3, 3.5, 100]:
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 6)
+        self.assertEqual(snapshot['total'], 108.25)
+        self.assertEqual(snapshot['min'], 0)
+        self.assertEqual(snapshot['max'], 100)
+        self.assertAlmostEqual(snapshot['mean'], 108.25 / 6)
+        self.assertEqual(snapshot['buckets'], {0: 1, 1.0: 1, 2.0: 1, 4.0: 2, 128.0: 1})
+
+        histogram.reset()
+        self.assertEqual(histogram.snapshot()['count'], 0)
+        self.assertEqual(histogram.snapshot()['buckets'], {})
+
+    def test_enable(self):
+        metrics = Metrics()
+        metrics.enable()
+        metrics.observe('time', 0.5)
+        metrics.enable(False)
+        metrics.observe('time', 0.5)
+        self.assertEqual(metrics.snapshot()['histograms']['time']['count'], 1)
+
+    def test_bound(self):
+        """
+        get_metrics records into the registry bound to the thread.
+        """
+        metrics = get_metrics()
+        process = current_metrics()
+        driver_1 = Metrics(enabled=True)
+        driver_2 = Metrics()
+
+        with bound_metrics(driver_1):
+            self.assertIs(current_metrics(), driver_1)
+            self.assertTrue(metrics.enabled)
+            metrics.increment('count')
+            with bound_metrics(driver_2):
+                self.assertFalse(metrics.enabled)
+                metrics.enable()
+                metrics.increment('count', 2)
+            with bound_metrics(None):
+                self.assertIs(current_metrics(), driver_1)
+            metrics.reset()
+        self.assertIs(current_metrics(), process)
+
+        self.assertFalse(process.enabled)
+        self.assertEqual(driver_1.snapshot()['counters']['count']['count'], 0)
+        self.assertEqual(driver_2.snapshot()['counters']['count']['count'], 2)
+
+        # other threads keep the process registry
+        seen = []
+        with bound_metrics(driver_1):
+            thread = threading.Thread(target=lambda: seen.append(current_metrics()))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [process])
+
+    def test_chunker(self):
+        """
+        The chunker records sieve time and buffer depth when enabled.
+        """
+        metrics = get_metrics()
+        chunker = StringChunker(RegexSieve([r'\d+\n']))
+        metrics.reset()
+        metrics.enable()
+        try:
+            chunker.add_chunk("12\nab", 1.0)
+            chunker.add_chunk("34\n", 2.0)
+        finally:
+            metrics.enable(False)
+
+        histograms = metrics.snapshot()['histograms']
+        self.assertEqual(histograms['chunker.sieve_time']['count'], 2)
+        self.assertEqual(histograms['chunker.depth']['max'], 8)
+
+        chunker.add_chunk("56\n", 3.0)
+        histograms = metrics.snapshot()['histograms']
+        self.assertEqual(histograms['chunker.sieve_time']['count'], 2)
+        metrics.reset()
+
+
+@attr('PERF', group='mi')
+class PerfTestMetrics(MiUnitTest):
+    """
+    Time recording with metrics enabled and disabled.
+    """
+    def test_record(self):
+        count = 100000
+        for enabled in (False, True):
+            metrics = Metrics(enabled)
+            start = time.time()
+            for i in xrange(count):
+                timed = metrics.enabled
+                if timed:
+                    begin = time.time()
+                if timed:
+                    metrics.increment('count')
+                    metrics.observe('time', time.time() - begin)
+            elapsed = time.time() - start
+            log.info("metrics enabled %s: %.2fus per recording point",
+                     enabled, elapsed * 1e6 / count)
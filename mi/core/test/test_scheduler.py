@@ -20,8 +20,10 @@ from nose.plugins.attrib import attr
 
 from mi.core.unit_test import MiUnitTest
 from mi.core.scheduler import PolledScheduler
+from mi.core.scheduler import TimerScheduler
 from mi.core.scheduler import PolledIntervalTrigger
 from mi.core.scheduler import PolledIntervalJob
+from mi.core.event_loop import get_event_loop
 from apscheduler.util import timedelta_seconds
 
 @attr('UNIT', group='mi')
@@ -29,6 +31,8 @@ class TestScheduler(MiUnitTest):
     """
     Test the scheduler
     """    
+    scheduler_class = PolledScheduler
+
     def setUp(self):
         """
         Setup the test case
@@ -191,7 +195,7 @@ class TestScheduler(MiUnitTest):
         test_name = 'test_job'
         min_interval = PolledScheduler.interval(seconds=1)
 
-        self._scheduler = PolledScheduler()
+        self._scheduler = self.scheduler_class()
         self.assertFalse(self._scheduler.running)
 
         # Verify that triggered events work.
@@ -367,3 +371,58 @@ class TestScheduler(MiUnitTest):
         self.assertFalse(job.ready_to_run())
         self.assert_datetime_close(next_time, now + max_interval)
 
+
+
+@attr('UNIT', group='mi')
+class TestTimerScheduler(TestScheduler):
+    """
+    Run the scheduler tests against the event loop scheduler, plus what
+    is particular to it.
+    """
+    scheduler_class = TimerScheduler
+
+    def setUp(self):
+        self._scheduler = TimerScheduler()
+        self._scheduler.start()
+        self._triggered = []
+
+    def test_shared_loop(self):
+        """
+        Jobs of every scheduler are timers on the one shared loop, and
+        polling a job moves its timer rather than making a new one.
+        """
+        other = TimerScheduler()
+        other.start()
+        min_interval = TimerScheduler.interval(seconds=1)
+        max_interval = TimerScheduler.interval(seconds=30)
+        job = self._scheduler.add_polled_job(self._callback, 'test_job', min_interval, max_interval)
+        other_job = other.add_interval_job(self._callback, seconds=30)
+        self.assertIs(job.timer.loop, get_event_loop())
+        self.assertIs(other_job.timer.loop, get_event_loop())
+
+        timer = job.timer
+        deadline = timer.deadline
+        time.sleep(0.1)
+        self.assertTrue(self._scheduler.run_polled_job('test_job'))
+        self.assertIs(job.timer, timer)
+        self.assertGreater(timer.deadline, deadline)
+        self.assert_event_triggered()
+
+        other.unschedule_func(self._callback)
+        self.assertTrue(other_job.timer.cancelled)
+        with self.assertRaises(KeyError):
+            other.unschedule_func(self._callback)
+
+    def test_job_still_running(self):
+        """
+        A job that is still running when it comes due again is skipped.
+        """
+        calls = []
+        def slow():
+            calls.append(datetime.datetime.now())
+            time.sleep(2.5)
+
+        self._scheduler.add_interval_job(slow, seconds=1)
+        time.sleep(4.2)
+        self._scheduler.shutdown()
+        self.assertEqual(len(calls), 2)
@@ -5,7 +5,10 @@ __license__ = 'Apache 2.0'
 
 from mi.core.log import get_logger ; log = get_logger()
 
+import re
+
 from mi.core.util import dict_equal
+from mi.core.util import required_literals
 from nose.plugins.attrib import attr
 from mi.core.unit_test import MiUnitTest
 
@@ -34,3 +37,12 @@ class TestUtil(MiUnitTest):
         self.assertTrue(dict_equal({a:1, b:b}, {a:1, b:1}, b))
         self.assertFalse(dict_equal({a:1, b:b}, {a:1, b:1}, 'c'))
 
+    def test_required_literals(self):
+        """
+        Test the required_literals function
+        """
+        self.assertEqual(required_literals(re.compile(r'IRIS,([^\n]*?),\*APPLIED GEOMECHANICS.*?baud FV- *?\n', re.DOTALL)),
+                         ['IRIS,', ',*APPLIED GEOMECHANICS', 'baud FV-', '\n'])
+        self.assertEqual(required_literals(re.compile('(ab)?c|d')), [])
+        self.assertEqual(required_literals(re.compile('abc', re.IGNORECASE)), [])
+        self.assertEqual(required_literals(re.compile(u'abc')), [])
@@ -10,6 +10,10 @@
 __author__ = 'Bill French'
 __license__ = 'Apache 2.0'
 
+import re
+import sre_parse
+import sre_constants
+
 from mi.core.log import get_logger ; log = get_logger()
 
 def dict_equal(ldict, rdict, ignore_keys=[]):
@@ -35,4 +39,26 @@ def dict_equal(ldict, rdict, ignore_keys=[]):
 
     return True
 
+def required_literals(regex):
+    """
+    The literal strings any match of a regex must contain, in order.
+    Only the top level of the pattern is looked at, anything optional,
+    repeated or in a branch is skipped over.
+    @param regex: compiled regex
+    @return: list of strings, empty if nothing is known
+    """
+    if not isinstance(regex.pattern, str) or regex.flags & re.IGNORECASE:
+        return []
 
+    literals = []
+    current = []
+    for (op, av) in sre_parse.parse(regex.pattern, regex.flags):
+        if op == sre_constants.LITERAL:
+            current.append(chr(av))
+        else:
+            if current:
+                literals.append(''.join(current))
+            current = []
+    if current:
+        literals.append(''.join(current))
+    return literals
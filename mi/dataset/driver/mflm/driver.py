@@ -19,6 +19,7 @@ from mi.core.log import get_logger ; log = get_logger()
 from mi.dataset.dataset_driver import SimpleDataSetDriver
 from mi.dataset.parser.mflm import StateKey
 from mi.dataset.harvester import SingleFileChangeHarvester, FileChangeHarvesterMementoKey
+from mi.dataset.harvester import hash_file_range
 
 
 class MflmDataSetDriver(SimpleDataSetDriver):
@@ -60,9 +61,9 @@ class MflmDataSetDriver(SimpleDataSetDriver):
     def _got_file(self, file_tuple):
         """
         We have a file that we want to parse.  Stand up the parser and do some work.
-        @param file_tuple: (file_handle, file_size) tuple returned by the harvester
+        @param file_tuple: (file_handle, file_size, checksum) tuple returned by the harvester
         """
-        handle, size = file_tuple
+        handle, size, checksum = file_tuple
         log.info("Detected new file, handle: %r, size: %d", handle, size)
         count = 1
         delay = None
@@ -78,10 +79,12 @@ class MflmDataSetDriver(SimpleDataSetDriver):
         # handle is closed.  Haven't had a chance to investigate, but this hack
         # re-opens the file.
         handle = open(handle.name, handle.mode)
-        data = handle.read()
-        checksum = hashlib.md5(data).hexdigest()
-        # reset position after reading data to calculate checksum
-        handle.seek(0)
+        if checksum is None:
+            md5 = hashlib.md5()
+            hash_file_range(handle, 0, size, md5)
+            checksum = md5.hexdigest()
+            # reset position after reading data to calculate checksum
+            handle.seek(0)
         # need to check if the file has grown larger, if it has update the last
         # unprocessed data index
         log.debug('About to check parser state %s', self._parser_state)
@@ -105,14 +108,19 @@ class MflmDataSetDriver(SimpleDataSetDriver):
 
         parser = self._build_parser(self._parser_state, handle)
 
-        while(True):
-            result = parser.get_records(count)
-            if result:
-                log.trace("Record parsed: %r delay: %f", result, delay)
-                if delay:
-                    gevent.sleep(delay)
-            else:
-                break
+        try:
+            while(True):
+                result = parser.get_records(count)
+                if result:
+                    log.trace("Record parsed: %r delay: %f", result, delay)
+                    if delay:
+                        gevent.sleep(delay)
+                else:
+                    break
+        finally:
+            # release the parser's memory map and the re-opened handle
+            parser.close()
+            handle.close()
 
         # Once we have successfully imported the file reset the parser state
         # and store the harvester state.
@@ -130,17 +138,19 @@ class MflmDataSetDriver(SimpleDataSetDriver):
         self._harvester_state = state
         self._save_driver_state()
 
-    def _new_file_callback(self, file_handle, file_size):
+    def _new_file_callback(self, file_handle, file_size, checksum=None):
         """
         Callback used by the harvester called when a new file is detected.  Store the
         file handle and filename in a queue.
         @param file_handle: file handle to the new found file.
-        @param file_name: file name of the found file.
+        @param file_size: size of the file when it was found.
+        @param checksum: md5 of the file up to file_size, calculated when
+            the file is parsed if None
         """
         index = len(self._new_file_queue)
 
         log.trace("Add new file to the new file queue: handle: %r, size: %d", file_handle, file_size)
-        self._new_file_queue.append((file_handle, file_size))
+        self._new_file_queue.append((file_handle, file_size, checksum))
 
         count = len(self._new_file_queue)
         log.trace("Current new file queue length: %d", count)
@@ -20,6 +20,26 @@ from mi.core.log import get_logger ; log = get_logger()
 from mi.core.poller import DirectoryPoller, ConditionPoller
 from mi.core.common import BaseEnum
 
+# Size of the blocks FileChangePoller reads when hashing and comparing files
+FILE_BLOCK_SIZE = 65536
+
+def hash_file_range(filehandle, start, end, md5):
+    """
+    Add a range of a file to a hash, reading it a block at a time
+    @param filehandle open file
+    @param start first byte of the range
+    @param end byte after the range
+    @param md5 hashlib object to update
+    """
+    filehandle.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = filehandle.read(min(FILE_BLOCK_SIZE, remaining))
+        if not data:
+            break
+        md5.update(data)
+        remaining -= len(data)
+
 class Harvester(object):
     """ abstract class to show API needed for plugin poller objects """
     def __init__(self, config, memento, data_callback, exception_callback):  
@@ -176,6 +196,11 @@ class FileChangePoller(ConditionPoller):
             self._file = directory + '/' + filename
             self._last_size = last_size
             self._last_checksum = last_checksum
+            # md5 of the file up to _last_size, kept so data appended to the
+            # file can be added to the checksum without reading it all again
+            self._md5 = None
+            # (offset, digest) of sample blocks of the file up to _last_size
+            self._samples = None
             super(FileChangePoller,self).__init__(self._check_for_data,
                                                   callback, exception_callback,
                                                   interval)
@@ -188,6 +213,12 @@ class FileChangePoller(ConditionPoller):
         If it is less than the current file size, return the file.  Also
         compare the file checksums, if it is different than the previous
         checksum return the file.
+
+        The whole file is only read the first time through or when data that
+        was already read has changed.  Otherwise a few sample blocks of the
+        old data are compared and only appended data is read, so a poll
+        costs about as much as the new data.  Changes to old data that miss
+        every sample block and leave the size alone are not seen.
         """
         if not os.path.isfile(self._file):
             # file does not exist yet
@@ -199,10 +230,24 @@ class FileChangePoller(ConditionPoller):
         if filesize == 0:
             # file is empty
             return None
-        # calculate the checksum
-        with open(self._file) as filehandle:
-            data = filehandle.read()
-            md5_checksum = hashlib.md5(data).hexdigest()
+
+        with open(self._file, 'rb') as filehandle:
+            if self._md5 is not None and filesize >= self._last_size and \
+            self._samples == self._sample_blocks(filehandle, self._last_size):
+                if filesize == self._last_size:
+                    # no change
+                    return None
+                # data has been appended, add just that to the checksum
+                md5 = self._md5
+                hash_file_range(filehandle, self._last_size, filesize, md5)
+            else:
+                # calculate the checksum
+                md5 = hashlib.md5()
+                hash_file_range(filehandle, 0, filesize, md5)
+            self._md5 = md5
+            self._samples = self._sample_blocks(filehandle, filesize)
+
+        md5_checksum = md5.hexdigest()
         if self._last_size and filesize and \
         filesize==self._last_size and \
         self._last_checksum is not None and \
@@ -214,6 +259,23 @@ class FileChangePoller(ConditionPoller):
         self._last_size = filesize
         return self._file
 
+    @staticmethod
+    def _sample_blocks(filehandle, size):
+        """
+        Hash the first, middle and last blocks of the first size bytes of
+        the file.
+        @retval list of (offset, digest)
+        """
+        offsets = sorted(set([0,
+                              max(0, size / 2 - FILE_BLOCK_SIZE / 2),
+                              max(0, size - FILE_BLOCK_SIZE)]))
+        samples = []
+        for offset in offsets:
+            filehandle.seek(offset)
+            data = filehandle.read(min(FILE_BLOCK_SIZE, size - offset))
+            samples.append((offset, hashlib.md5(data).digest()))
+        return samples
+
 class SingleFileChangeHarvester(FileChangePoller, Harvester):
     """
     Poll a single file to determine if data has been appended to the file,
@@ -255,9 +317,10 @@ class SingleFileChangeHarvester(FileChangePoller, Harvester):
         offset if there is one
         """
         if fullfile:
-            filesize = os.path.getsize(fullfile)
+            # pass on the size and checksum the poller found, the file may
+            # have grown since
             with open(fullfile, 'rb') as f:
-                self.callback(f, filesize)
+                self.callback(f, self._last_size, self._last_checksum)
 
 class SortingDirectoryPoller(ConditionPoller):
     """
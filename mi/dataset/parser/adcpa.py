@@ -31,6 +31,7 @@ from mi.core.log import get_logger
 from mi.core.common import BaseEnum
 from mi.core.exceptions import SampleException, DatasetParserException
 from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument import pd0
 from mi.core.instrument.data_particle import DataParticle, DataParticleKey
 from mi.dataset.dataset_parser import BufferLoadingParser
 
@@ -272,6 +273,34 @@ class ADCPA_PD0_PARSED_KEY(BaseEnum):
     CHECKSUM = 'checksum'
 
 
+# Leader layouts, in the order the fields are unpacked below.
+FIXED_LEADER = pd0.record_dtype('<HBBHBBBBHHHBBBBHBBBBhhBBHHBBBBHQHBBI', [
+    'fixed_leader_id', 'firmware_version', 'firmware_revision',
+    'sysconfig_frequency', 'data_flag', 'lag_length', 'num_beams', 'num_cells',
+    'pings_per_ensemble', 'depth_cell_length', 'blank_after_transmit',
+    'signal_processing_mode', 'low_corr_threshold', 'num_code_repetitions',
+    'percent_good_min', 'error_vel_threshold', 'time_per_ping_minutes',
+    'time_per_ping_seconds', 'time_per_ping_hundredths', 'coord_transform_type',
+    'heading_alignment', 'heading_bias', 'sensor_source', 'sensor_available',
+    'bin_1_distance', 'transmit_pulse_length', 'reference_layer_start',
+    'reference_layer_stop', 'false_target_threshold', 'spare1',
+    'transmit_lag_distance', 'spare2', 'system_bandwidth',
+    'spare3', 'spare4', 'serial_number'])
+
+VARIABLE_LEADER = pd0.record_dtype('<HHBBBBBBBBBBHHHhhHhBBBBBBBBBBBBBBBBBBHIII', [
+    'variable_leader_id', 'ensemble_number', 'rtc_year', 'rtc_month',
+    'rtc_day', 'rtc_hour', 'rtc_minute', 'rtc_second',
+    'rtc_hundredths', 'ensemble_number_increment', 'error_bit_field',
+    'reserved_error_bit_field', 'speed_of_sound', 'transducer_depth', 'heading',
+    'pitch', 'roll', 'salinity', 'temperature', 'mpt_minutes', 'mpt_seconds_component',
+    'mpt_hundredths_component', 'heading_stdev', 'pitch_stdev', 'roll_stdev',
+    'adc_transmit_current', 'adc_transmit_voltage', 'adc_ambient_temp',
+    'adc_pressure_plus', 'adc_pressure_minus', 'adc_attitude_temp',
+    'adc_attitiude', 'adc_contamination_sensor', 'error_status_word_1',
+    'error_status_word_2', 'error_status_word_3', 'error_status_word_4',
+    'spare1', 'pressure', 'pressure_variance', 'spare2'])
+
+
 class ADCPA_PD0_PARSED_DataParticle(DataParticle):
     _data_particle_type = DataParticleType.CGLDR_ADCPA_PD0_PARSED
 
@@ -282,14 +311,9 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         self.final_result = []
 
         length = unpack("<H", self.raw_data[2:4])[0]
-        data = str(self.raw_data)
 
         # Calculate the checksum
-        total = int(0)
-        for i in range(0, length):
-            total += int(ord(data[i]))
-
-        checksum = total & 65535    # bitwise and with 65535 or mod vs 65536
+        checksum = pd0.checksum(str(self.raw_data), length)
 
         if checksum != unpack("<H", self.raw_data[length: length+2])[0]:
             log.debug("Checksum mismatch " + str(checksum) + " != "
@@ -398,7 +422,7 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
          reference_layer_stop, false_target_threshold, SPARE1,
          transmit_lag_distance, SPARE2, system_bandwidth,
          SPARE3, SPARE4, serial_number) = \
-            unpack('<HBBHBBBBHHHBBBBHBBBBhhBBHHBBBBHQHBBI', chunk)
+            pd0.unpack_record(FIXED_LEADER, chunk)
 
         if 0 != fixed_leader_id:
             raise SampleException("fixed_leader_id was not equal to 0")
@@ -540,7 +564,7 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
          adc_attitiude, adc_contamination_sensor, error_status_word_1,
          error_status_word_2, error_status_word_3, error_status_word_4,
          SPARE1, pressure, pressure_variance, SPARE2) = \
-            unpack('<HHBBBBBBBBBBHHHhhHhBBBBBBBBBBBBBBBBBBHIII', chunk)
+            pd0.unpack_record(VARIABLE_LEADER, chunk)
 
         if 128 != variable_leader_id:
             raise SampleException("variable_leader_id was not equal to 128")
@@ -667,7 +691,6 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         @throws SampleException If there is a problem with sample creation
         """
         N = (len(chunk) - 2) / 2 / 4
-        offset = 0
 
         velocity_data_id = unpack("<H", chunk[0:2])[0]
         if 256 != velocity_data_id:
@@ -676,17 +699,8 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.VELOCITY_DATA_ID,
                                   DataParticleKey.VALUE: velocity_data_id})
 
-        water_velocity_east = []
-        water_velocity_north = []
-        water_velocity_up = []
-        error_velocity = []
-        for row in range(0, N):
-            (a, b, c, d) = unpack('<hhhh', chunk[offset + 2: offset + 10])
-            water_velocity_east.append(a)
-            water_velocity_north.append(b)
-            water_velocity_up.append(c)
-            error_velocity.append(d)
-            offset += 4 * 2
+        (water_velocity_east, water_velocity_north,
+         water_velocity_up, error_velocity) = pd0.cell_array(chunk, '<i2', N)
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.WATER_VELOCITY_EAST,
                                   DataParticleKey.VALUE: water_velocity_east})
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.WATER_VELOCITY_NORTH,
@@ -703,7 +717,6 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         @throws SampleException If there is a problem with sample creation
         """
         N = (len(chunk) - 2) / 4
-        offset = 0
 
         correlation_magnitude_id = unpack("<H", chunk[0:2])[0]
         if 512 != correlation_magnitude_id:
@@ -712,17 +725,8 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.CORRELATION_MAGNITUDE_ID,
                                   DataParticleKey.VALUE: correlation_magnitude_id})
 
-        correlation_magnitude_beam1 = []
-        correlation_magnitude_beam2 = []
-        correlation_magnitude_beam3 = []
-        correlation_magnitude_beam4 = []
-        for row in range(0, N):
-            (a, b, c, d) = unpack('<BBBB', chunk[offset + 2: offset + 6])
-            correlation_magnitude_beam1.append(a)
-            correlation_magnitude_beam2.append(b)
-            correlation_magnitude_beam3.append(c)
-            correlation_magnitude_beam4.append(d)
-            offset += 4
+        (correlation_magnitude_beam1, correlation_magnitude_beam2,
+         correlation_magnitude_beam3, correlation_magnitude_beam4) = pd0.cell_array(chunk, 'u1', N)
 
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.CORRELATION_MAGNITUDE_BEAM1,
                                   DataParticleKey.VALUE: correlation_magnitude_beam1})
@@ -740,7 +744,6 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         @throws SampleException If there is a problem with sample creation
         """
         N = (len(chunk) - 2) / 4
-        offset = 0
 
         echo_intensity_id = unpack("<H", chunk[0:2])[0]
         if 768 != echo_intensity_id:
@@ -748,17 +751,8 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.ECHO_INTENSITY_ID,
                                   DataParticleKey.VALUE: echo_intensity_id})
 
-        echo_intesity_beam1 = []
-        echo_intesity_beam2 = []
-        echo_intesity_beam3 = []
-        echo_intesity_beam4 = []
-        for row in range(0, N):
-            (a, b, c, d) = unpack('<BBBB', chunk[offset + 2: offset + 6])
-            echo_intesity_beam1.append(a)
-            echo_intesity_beam2.append(b)
-            echo_intesity_beam3.append(c)
-            echo_intesity_beam4.append(d)
-            offset += 4
+        (echo_intesity_beam1, echo_intesity_beam2,
+         echo_intesity_beam3, echo_intesity_beam4) = pd0.cell_array(chunk, 'u1', N)
 
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.ECHO_INTENSITY_BEAM1,
                                   DataParticleKey.VALUE: echo_intesity_beam1})
@@ -776,7 +770,6 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         @throws SampleException If there is a problem with sample creation
         """
         N = (len(chunk) - 2) / 4
-        offset = 0
 
         percent_good_id = unpack("<H", chunk[0:2])[0]
         if 1024 != percent_good_id:
@@ -785,17 +778,8 @@ class ADCPA_PD0_PARSED_DataParticle(DataParticle):
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.PERCENT_GOOD_ID,
                                   DataParticleKey.VALUE: percent_good_id})
 
-        percent_good_3beam = []
-        percent_transforms_reject = []
-        percent_bad_beams = []
-        percent_good_4beam = []
-        for row in range(0, N):
-            (a, b, c, d) = unpack('<BBBB', chunk[offset + 2: offset + 6])
-            percent_good_3beam.append(a)
-            percent_transforms_reject.append(b)
-            percent_bad_beams.append(c)
-            percent_good_4beam.append(d)
-            offset += 4
+        (percent_good_3beam, percent_transforms_reject,
+         percent_bad_beams, percent_good_4beam) = pd0.cell_array(chunk, 'u1', N)
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.PERCENT_GOOD_3BEAM,
                                   DataParticleKey.VALUE: percent_good_3beam})
         self.final_result.append({DataParticleKey.VALUE_ID: ADCPA_PD0_PARSED_KEY.PERCENT_TRANSFORMS_REJECT,
@@ -17,6 +17,7 @@ import pdb
 
 from math import copysign
 from functools import partial
+from collections import Mapping
 
 from mi.core.log import get_logger
 from mi.core.common import BaseEnum
@@ -87,7 +88,7 @@ class GliderParticleKey(BaseEnum):
         """
         result = []
         for key in cls.list():
-            if key not in GliderParticleKey.list():
+            if not GliderParticleKey.has(key):
                 result.append(key)
 
         return result
@@ -110,7 +111,7 @@ class GliderParticle(DataParticle):
 
     def _parsed_values(self, key_list):
         log.debug("Build a particle with keys: %s", key_list)
-        if not isinstance(self.raw_data, dict):
+        if not isinstance(self.raw_data, Mapping):
             raise SampleException(
                 "%s: Object Instance is not a Glider Parsed Data \
                 dictionary" % self._data_particle_type)
@@ -295,7 +296,7 @@ class EngineeringParticleKey(BaseEnum):
         """
         result = []
         for key in cls.list():
-            if key not in GliderParticleKey.list():
+            if not GliderParticleKey.has(key):
                 result.append(key)
 
         return result
@@ -713,4 +714,172 @@ class GliderParser(BufferLoadingParser):
 
         return ddegrees
 
+# Bytes of rows GliderBatchParser reads at a time.
+BATCH_SIZE = 1048576
+
+class GliderRecord(Mapping):
+    """
+    One data row of a batch parsed by GliderBatchParser.  It looks like the
+    data dictionary built by GliderParser._read_data, but the
+    {'Name', 'Data'} cells are only built for the keys a particle asks for.
+    """
+    def __init__(self, columns, int_columns, row):
+        """
+        @param columns dict of column label to index
+        @param int_columns set of column indexes holding integers
+        @param row numpy row of values
+        """
+        self._columns = columns
+        self._int_columns = int_columns
+        self._row = row
+
+    def __getitem__(self, key):
+        index = self._columns[key]
+        value = float(self._row[index])
+        if index in self._int_columns and not np.isnan(value):
+            value = int(value)
+        return {'Name': key, 'Data': value}
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+class GliderBatchParser(GliderParser):
+    """
+    GliderParser that parses rows in batches with numpy.  Each batch of
+    lines is tokenized into one array with a column per sensor, then the
+    lat/lon conversion and the science data check are done a column at a
+    time over the whole batch.  Particles are built from the array rows
+    when they are handed out rather than when they are parsed.
+
+    Unlike GliderParser, the state published with each particle is the
+    file position just past its row, even when rows without science data
+    came before it.
+    """
+    def __init__(self,
+                 config,
+                 state,
+                 stream_handle,
+                 state_callback,
+                 publish_callback,
+                 *args, **kwargs):
+        self._batch_size = kwargs.pop('batch_size', BATCH_SIZE)
+
+        super(GliderBatchParser, self).__init__(config,
+                                                state,
+                                                stream_handle,
+                                                state_callback,
+                                                publish_callback,
+                                                *args,
+                                                **kwargs)
+
+        labels = self._header_dict['labels']
+        self._columns = dict([(label, index) for (index, label) in enumerate(labels)])
+        self._int_columns = frozenset([index for (index, size) in
+                                       enumerate(self._header_dict['num_of_bytes'])
+                                       if size in (1, 2)])
+        self._latlon_columns = [index for (index, label) in enumerate(labels)
+                                if '_lat' in label or '_lon' in label]
+
+        science_parameters = []
+        if hasattr(self, '_particle_class'):
+            science_parameters = self._particle_class.science_parameters
+        self._science_columns = [self._columns[key] for key in science_parameters
+                                 if key in self._columns]
+
+    def _load_particle_buffer(self):
+        """
+        Parse the next batch of rows into the record buffer.
+        @throws EOFError when the end of the file is reached
+        """
+        position = self._stream_handle.tell()
+        lines = self._stream_handle.readlines(self._batch_size)
+        if not lines:
+            raise EOFError
+
+        self._record_buffer.extend(self._parse_batch(lines, position))
+
+    def _parse_batch(self, lines, position):
+        """
+        Parse a list of rows.
+        @param lines data rows read from the file
+        @param position file position of the first row
+        @retval list of (GliderRecord, state) tuples for the rows with science
+            data
+        @throws SampleException if a row does not match the sample pattern
+        """
+        ends = position + np.cumsum([len(line) for line in lines])
+        self._read_state = {StateKey.POSITION: int(ends[-1])}
+
+        rows = [index for (index, line) in enumerate(lines) if not line.isspace()]
+        if len(rows) != len(lines):
+            log.debug("Ignoring %d whitespace records", len(lines) - len(rows))
+            lines = [lines[index] for index in rows]
+            ends = ends[rows]
+        if not lines:
+            return []
+
+        num_columns = self._header_dict['sensors_per_cycle']
+        values = np.fromstring(''.join(lines), sep=' ')
+        if values.size != len(lines) * num_columns:
+            for line in lines:
+                if not self._sample_regex.match(line):
+                    log.error("Data record did not match data pattern.  Failed parsing: '%s'", line)
+                    break
+            raise SampleException("data record does not match sample pattern")
+        values = values.reshape(len(lines), num_columns)
+
+        if GliderParticleKey.M_PRESENT_TIME not in self._columns:
+            raise SampleException("unable to find timestamp in data")
+
+        if self._latlon_columns:
+            positions = values[:, self._latlon_columns]
+            ddegrees = self._to_ddegrees(positions)
+            # A zero is only invalid when it is written as a bare "0", so
+            # the few zero positions are converted from their text the way
+            # GliderParser does.
+            for (row, column) in zip(*np.nonzero(positions == 0)):
+                pos_str = lines[row].split()[self._latlon_columns[column]]
+                ddegrees[row, column] = self._string_to_ddegrees(pos_str)
+            values[:, self._latlon_columns] = ddegrees
+
+        if self._science_columns:
+            has_science = ~np.isnan(values[:, self._science_columns]).all(axis=1)
+        else:
+            has_science = np.zeros(len(lines), dtype=bool)
+        log.debug("%d of %d records have science data", has_science.sum(), len(lines))
+
+        return [(GliderRecord(self._columns, self._int_columns, values[index]),
+                 {StateKey.POSITION: int(ends[index])})
+                for index in np.flatnonzero(has_science)]
+
+    def _yank_particles(self, num_records):
+        """
+        Build particles for the records about to be handed out, then hand
+        them out.
+        """
+        for index in range(min(num_records, len(self._record_buffer))):
+            (record, state) = self._record_buffer[index]
+            timestamp = ntplib.system_to_ntp_time(record[GliderParticleKey.M_PRESENT_TIME]['Data'])
+            particle = self._extract_sample(self._particle_class, None, record, timestamp)
+            self._record_buffer[index] = (particle, state)
+
+        return super(GliderBatchParser, self)._yank_particles(num_records)
+
+    @staticmethod
+    def _to_ddegrees(positions):
+        """
+        Array version of _string_to_ddegrees.  Positions are in DDMM.MMMM or
+        DDDMM.MMMM form, the sign giving the hemisphere.  NaN stays NaN.
+        Zeros are converted to 0.0; whether a zero was written as the
+        invalid bare "0" can only be told from the text.
+        @param positions array of positions
+        @retval array of positions in decimal degrees
+        """
+        magnitude = np.abs(positions)
+        degrees = np.floor(magnitude / 100.)
+        return np.copysign(degrees + (magnitude - degrees * 100.) / 60., positions)
+
 # End of glider.py
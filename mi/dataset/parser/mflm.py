@@ -11,10 +11,17 @@ from the common MFLM control file.
 __author__ = 'Emily Hahn'
 __license__ = 'Apache 2.0'
 
+import os
 import re
-import struct
+import mmap
 import binascii
 
+try:
+    import crcmod
+    import crcmod.crcmod
+except ImportError:
+    crcmod = None
+
 from mi.core.common import BaseEnum
 from mi.core.log import get_logger; log = get_logger()
 from mi.core.instrument.chunker import StringChunker
@@ -30,6 +37,45 @@ SIO_HEADER_REGEX = b'\x01(CT|AD|FL|DO|PH|PS|CS)[0-9]{7}_([0-9A-Fa-f]{4})[a-z]' \
                '([0-9A-Fa-f]{8})_([0-9A-Fa-f]{2})_([0-9A-Fa-f]{4})\x02'
 SIO_HEADER_MATCHER = re.compile(SIO_HEADER_REGEX)
 
+# Number of validated packets the sieve remembers before starting over
+VALID_PACKET_CACHE_SIZE = 1000
+
+def _make_crc_table():
+    """
+    Build the byte table for the SIO checksum, a reflected CRC-16 with
+    polynomial 0x8408 (CRC-16/X-25).
+    """
+    table = []
+    for byte in range(256):
+        crc = byte
+        for i in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0x8408
+            else:
+                crc >>= 1
+        table.append(crc)
+    return table
+
+SIO_CRC_TABLE = _make_crc_table()
+
+def _table_checksum(data):
+    """
+    Calculate the SIO checksum a byte at a time from SIO_CRC_TABLE
+    @param data string to checksum
+    @retval checksum as an int
+    """
+    crc = 0xFFFF
+    table = SIO_CRC_TABLE
+    for char in data:
+        crc = (crc >> 8) ^ table[(crc ^ ord(char)) & 0xFF]
+    return crc ^ 0xFFFF
+
+# crcmod is only faster than the table when its C extension is available
+if crcmod is not None and crcmod.crcmod._usingExtension:
+    sio_checksum = crcmod.mkCrcFun(0x11021, initCrc=0, rev=True, xorOut=0xFFFF)
+else:
+    sio_checksum = _table_checksum
+
 # blocks can be uniquely identified a combination of block number and timestamp,
 # since block numbers roll over after 255
 # each block may contain multiple data samples
@@ -40,6 +86,69 @@ class StateKey(BaseEnum):
         # the number of samples in that packet, how many packets have been pulled out currently
         # being processed, and if this packet is a new sequence or not
 
+class MappedFile(object):
+    """
+    Read only file-like view of a memory mapped file.  Reads copy just the
+    requested bytes out of the map, so reading a range of a large file
+    does not pull the rest of it through the file object.  The map is
+    released by close, or on leaving a with block; the file it was made
+    from is left open.
+    """
+    def __init__(self, fileno, size):
+        self._map = mmap.mmap(fileno, size, access=mmap.ACCESS_READ)
+        self._size = size
+        self._position = 0
+
+    @staticmethod
+    def wrap(stream_handle):
+        """
+        Map the file behind a stream handle
+        @param stream_handle open file-like object
+        @retval a MappedFile, or stream_handle itself if it is not a
+        non-empty real file
+        """
+        try:
+            fileno = stream_handle.fileno()
+            size = os.fstat(fileno).st_size
+        except (AttributeError, IOError, OSError, ValueError):
+            return stream_handle
+        if size == 0:
+            return stream_handle
+        return MappedFile(fileno, size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise IOError("Invalid seek offset %d" % offset)
+        self._position = offset
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            end = self._size
+        else:
+            end = min(self._position + size, self._size)
+        if end <= self._position:
+            return ''
+        data = self._map[self._position:end]
+        self._position = end
+        return data
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
 class MflmParser(Parser):
 
     def __init__(self, config, stream_handle, state, sieve_fn,
@@ -74,10 +183,13 @@ class MflmParser(Parser):
         self._timestamp = 0.0
         self._position = [0,0] # store both the start and end point for this read of data within the file
         self._record_buffer = [] # holds list of records
+        self._valid_packets = set() # packets the sieve has already checked
+        # read real files through a memory map so only the unprocessed
+        # ranges that are parsed are ever read
+        self._stream_handle = MappedFile.wrap(stream_handle)
         # determine the EOF index
-        self._stream_handle.seek(0)
-        all_data = self._stream_handle.read()
-        EOF = len(all_data)
+        self._stream_handle.seek(0, os.SEEK_END)
+        EOF = self._stream_handle.tell()
         self._stream_handle.seek(0)
         self._new_seq_flag = True # always start a new sequence on init
         self._chunk_sample_count = []
@@ -104,7 +216,6 @@ class MflmParser(Parser):
 
         for match in SIO_HEADER_MATCHER.finditer(raw_data):
             data_len = int(match.group(2), 16)
-            checksum = match.group(5)
             end_packet_idx = match.end(0) + data_len
             if end_packet_idx < len(raw_data):
                 end_packet = raw_data[end_packet_idx]
@@ -112,9 +223,23 @@ class MflmParser(Parser):
                           match.group(0)[1:32], match.end(0), end_packet_idx,
                           match.start(0), data_len)
                 if end_packet == '\x03':
-                    packet_data = raw_data[match.end(0):end_packet_idx]
-                    chksum = self.calc_checksum(packet_data)
-                    if chksum == checksum:
+                    # the chunker sieves data more than once, only check the
+                    # checksum the first time a packet is seen
+                    packet = raw_data[match.start(0):end_packet_idx+1]
+                    if packet in self._valid_packets:
+                        valid = True
+                    else:
+                        checksum = int(match.group(5), 16)
+                        chksum = self.calc_checksum(packet[len(match.group(0)):-1])
+                        valid = chksum == checksum
+                        if valid:
+                            if len(self._valid_packets) >= VALID_PACKET_CACHE_SIZE:
+                                self._valid_packets.clear()
+                            self._valid_packets.add(packet)
+                        else:
+                            log.debug("Calculated checksum %04X != received checksum %04X for header %s and packet %d to %d",
+                                      chksum, checksum, match.group(0)[1:32], match.end(0), end_packet_idx)
+                    if valid:
                         # even if this is not the right instrument, keep track that
                         # this packet was processed
                         if not self.packet_exists(match.start(0), end_packet_idx+1):
@@ -122,9 +247,6 @@ class MflmParser(Parser):
                                                                                end_packet_idx+1,
                                                                                None, 0, 0])
                         return_list.append((match.start(0), end_packet_idx+1))
-                    else:
-                        log.debug("Calculated checksum %s != received checksum %s for header %s and packet %d to %d",
-                                  chksum, checksum, match.group(0)[1:32], match.end(0), end_packet_idx)
                 else:
                     log.debug('End packet at %d is not x03 for header %s',
                               end_packet_idx, match.group(0)[1:32])
@@ -134,35 +256,21 @@ class MflmParser(Parser):
     def calc_checksum(data):
         """
         Calculate SIO header checksum of data
+        @param data packet data between the header and the end of packet byte
+        @retval checksum as an int
         """
-        crc = 65535
-        if len(data) == 0:
-            return '0000'
-        for iData in range(0,len(data)):
-            short = struct.unpack('H', data[iData] + '\x00')
-            point = 255 & short[0]
-            crc = crc ^ point
-            for i in range(7, -1, -1):
-                if crc & 1:
-                    crc = (crc >> 1) ^ 33800
-                else:
-                    crc >>= 1
-        crc = ~crc
-        # convert to unsigned
-        if crc < 0:
-            crc += 65536
-        # get rid of the '0x' from the hex string
-        crc = "%s" % hex(crc)[2:].upper()
-        # make sure we have the right format for comparing, must be 4 hex digits
-        if len(crc) == 3:
-            crc = '0' + crc
-        elif len(crc) == 2:
-            crc = '00' + crc
-        elif len(crc) == 1:
-            crc = '000' + crc
-        log.trace("calculated checksum %s", crc)
+        crc = sio_checksum(data)
+        log.trace("calculated checksum %04X", crc)
         return crc
 
+    def close(self):
+        """
+        Release the memory map of the file, if the parser made one.  The
+        stream handle the parser was given is left for the caller to close.
+        """
+        if isinstance(self._stream_handle, MappedFile):
+            self._stream_handle.close()
+
     def packet_exists(self, start, end):
         """
         Determine if this packet is already in the in process data
@@ -9,9 +9,11 @@ would lead to different subclasses of the test suites
 """
 
 import collections
+import glob
 import gevent
 import numpy as np
 import os
+import time
 from nose.plugins.attrib import attr
 
 from mi.core.log import get_logger
@@ -393,3 +395,37 @@ class AdcpaParserUnitTestCase(ParserUnitTestCase):
         particles = self.parser.get_records(5)
         self.parse_particles(particles)
         self.assert_result(self.test04, self.parsed_data, particles)
+
+
+@attr('PERF', group='mi')
+class AdcpaParserPerfTestCase(ParserUnitTestCase):
+    """
+    Ensemble decoding rate over the multi-ensemble glider PD0 files
+    """
+    RESOURCE_DIR = os.path.join('mi', 'dataset', 'driver', 'moas', 'gl', 'adcpa', 'resource')
+
+    def test_ensembles_per_second(self):
+        config = {
+            DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.adcpa',
+            DataSetDriverConfigKeys.PARTICLE_CLASS: 'ADCPA_PD0_PARSED_DataParticle'
+        }
+
+        for filename in sorted(glob.glob(os.path.join(self.RESOURCE_DIR, '*.PD0'))):
+            with open(filename, 'rb') as stream_handle:
+                parser = AdcpaParser(config, {StateKey.POSITION: 0}, stream_handle,
+                                     lambda state: None, lambda particles: None)
+                start = time.time()
+                particles = []
+                records = parser.get_records(100)
+                while records:
+                    particles.extend(records)
+                    records = parser.get_records(100)
+                sieved = time.time()
+
+                for particle in particles:
+                    particle.generate_dict()
+                end = time.time()
+
+            log.info("%s: %d ensembles, decode %.0f ensembles/sec, with sieve %.0f ensembles/sec",
+                     os.path.basename(filename), len(particles),
+                     len(particles) / (end - sieved), len(particles) / (end - start))
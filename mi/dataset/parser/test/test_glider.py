@@ -10,6 +10,7 @@
 from StringIO import StringIO
 import gevent
 import os
+import time
 import numpy as np
 import ntplib
 import unittest
@@ -22,7 +23,7 @@ from nose.plugins.attrib import attr
 from mi.core.exceptions import SampleException
 from mi.dataset.test.test_parser import ParserUnitTestCase
 from mi.dataset.dataset_driver import DataSetDriverConfigKeys
-from mi.dataset.parser.glider import GliderParser, StateKey
+from mi.dataset.parser.glider import GliderParser, GliderBatchParser, StateKey
 from mi.dataset.parser.glider import GgldrCtdgvDelayedDataParticle, CtdgvParticleKey
 from mi.dataset.parser.glider import GgldrDostaDelayedDataParticle
 from mi.dataset.parser.glider import GgldrFlordDelayedDataParticle
@@ -403,3 +404,176 @@ class ENGGliderTest(GliderParserUnitTestCase):
         self.reset_parser({StateKey.POSITION: 1186})
         self.assert_generate_particle(GgldrEngDelayedDataParticle, record_2, 1335)
         self.assert_no_more_data()
+
+
+RESOURCE_PATH = os.path.join('mi', 'dataset', 'driver', 'moas', 'gl')
+
+def parse_all(parser_class, config, data):
+    """
+    Parse a whole data string.
+    @retval list of particle values
+    """
+    parser = parser_class(config, {}, StringIO(data), lambda state: None, lambda particles: None)
+    result = []
+    records = parser.get_records(10)
+    while records:
+        for particle in records:
+            result.append(particle.generate_dict()['values'])
+        records = parser.get_records(10)
+    return result
+
+@attr('UNIT', group='mi')
+class GliderBatchParserTest(GliderParserUnitTestCase):
+    """
+    Test cases for the numpy batch parser.  Results are checked against
+    GliderParser.
+    """
+    config = {
+        DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.glider',
+        DataSetDriverConfigKeys.PARTICLE_CLASS: 'GgldrEngDelayedDataParticle',
+    }
+
+    def reset_parser(self, state = {}, batch_size = 64):
+        self.state_callback_values = []
+        self.publish_callback_values = []
+        self.parser = GliderBatchParser(self.config, state, self.test_data,
+                                        self.state_callback, self.pub_callback,
+                                        batch_size=batch_size)
+
+    def assert_same_values(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for (expected_values, actual_values) in zip(expected, actual):
+            self.assertEqual([value['value_id'] for value in expected_values],
+                             [value['value_id'] for value in actual_values])
+            for (expected_value, actual_value) in zip(expected_values, actual_values):
+                if isinstance(expected_value['value'], float):
+                    self.assertAlmostEqual(expected_value['value'], actual_value['value'], places=9)
+                else:
+                    self.assertEqual(expected_value['value'], actual_value['value'])
+
+    def test_eng_particle(self):
+        """
+        Same particles and states as GliderParser, except that the state after
+        an unterminated last row is the end of the file rather than one past
+        it.
+        """
+        self.set_data(HEADER, ENG_RECORD)
+        self.reset_parser()
+
+        record_1 = {EngineeringParticleKey.M_BATTPOS: 0.335}
+        record_2 = {EngineeringParticleKey.M_HEADING: 1.23569}
+
+        self.assert_generate_particle(GgldrEngDelayedDataParticle, record_1, 1186)
+        self.assert_generate_particle(GgldrEngDelayedDataParticle, record_2, 1334)
+        self.assert_no_more_data()
+
+        self.set_data(HEADER, ENG_RECORD)
+        self.reset_parser({StateKey.POSITION: 1186})
+        self.assert_generate_particle(GgldrEngDelayedDataParticle, record_2, 1334)
+        self.assert_no_more_data()
+
+    def test_skipped_rows(self):
+        """
+        States count the rows without science data that were skipped.
+        """
+        self.config = {
+            DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.glider',
+            DataSetDriverConfigKeys.PARTICLE_CLASS: 'GgldrDostaDelayedDataParticle',
+        }
+        empty_record = "\n" + " ".join(["NaN"] * 29)
+        self.set_data(HEADER, empty_record, DOSTA_RECORD)
+        self.reset_parser()
+        self.assert_generate_particle(GgldrDostaDelayedDataParticle, None,
+                                      1003 + len(empty_record) + 156)
+
+    def test_gps(self):
+        self.set_data(HEADER, ZERO_GPS_VALUE)
+        self.reset_parser()
+        self.assertEqual(self.parser.get_records(1), [])
+
+        positions = np.array([5011.2933, -14433.6369, 0, np.nan, 4400.0])
+        ddegrees = GliderBatchParser._to_ddegrees(positions)
+        self.assertAlmostEqual(ddegrees[0], self.parser._string_to_ddegrees("5011.2933"), places=12)
+        self.assertAlmostEqual(ddegrees[1], self.parser._string_to_ddegrees("-14433.6369"), places=12)
+        self.assertEqual(ddegrees[2], 0.0)
+        self.assertTrue(np.isnan(ddegrees[3]))
+        self.assertEqual(ddegrees[4], 44.0)
+
+    def test_zero_positions(self):
+        """
+        A bare "0" position is invalid and a zero in DDMM.MMMM form is 0.0,
+        as in GliderParser.
+        """
+        row = ENG_RECORD.split("\n")[1].split()
+        (row[1], row[2]) = ('-0000.0000', '00000.0000')
+        (row[8], row[9], row[11], row[12]) = ('0', '0', '0000.0000', '0')
+        data = HEADER + "\n" + " ".join(row) + "\n"
+
+        expected = parse_all(GliderParser, self.config, data)
+        actual = parse_all(GliderBatchParser, self.config, data)
+        self.assertEqual(len(expected), 1)
+        self.assert_same_values(expected, actual)
+
+        values = dict([(value['value_id'], value['value']) for value in actual[0]])
+        self.assertEqual(values[EngineeringParticleKey.M_LAT], 0.0)
+        self.assertEqual(values[EngineeringParticleKey.C_WPT_LON], 0.0)
+        self.assertEqual(values[EngineeringParticleKey.M_LON], None)
+        self.assertEqual(values[EngineeringParticleKey.M_GPS_LAT], None)
+
+    def test_bad_record(self):
+        self.set_data(HEADER, CTDGR_RECORD, "\nNaN NaN 1.0\n")
+        self.reset_parser()
+        with self.assertRaises(SampleException):
+            self.parser.get_records(10)
+
+    def test_resource_files(self):
+        """
+        Parse the glider driver resource files with both parsers and compare.
+        """
+        for (instrument, particle_class) in [('ctdgv', 'GgldrCtdgvDelayedDataParticle'),
+                                             ('dosta', 'GgldrDostaDelayedDataParticle'),
+                                             ('flord', 'GgldrFlordDelayedDataParticle'),
+                                             ('engineering', 'GgldrEngDelayedDataParticle')]:
+            config = {
+                DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.glider',
+                DataSetDriverConfigKeys.PARTICLE_CLASS: particle_class,
+            }
+            resource = os.path.join(RESOURCE_PATH, instrument, 'resource')
+            for filename in sorted(os.listdir(resource)):
+                if not filename.endswith('.mrg'):
+                    continue
+                data = open(os.path.join(resource, filename)).read()
+                log.debug("Comparing parsers on %s %s", instrument, filename)
+                expected = parse_all(GliderParser, config, data)
+                actual = parse_all(GliderBatchParser, config, data)
+                self.assertGreater(len(expected), 0)
+                self.assert_same_values(expected, actual)
+
+
+@attr('PERF', group='mi')
+class GliderBatchParserPerfTest(ParserUnitTestCase):
+    """
+    Compare GliderParser and GliderBatchParser rows/sec on a multi MB file
+    built from a driver resource file.
+    """
+    REPEAT = 40
+    config = {
+        DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.glider',
+        DataSetDriverConfigKeys.PARTICLE_CLASS: 'GgldrEngDelayedDataParticle',
+    }
+
+    def test_rows_per_second(self):
+        data = open(os.path.join(RESOURCE_PATH, 'engineering', 'resource',
+                                 'unit_363_2013_245_6_6.mrg')).read()
+        lines = data.splitlines(True)
+        header = ''.join(lines[:17])
+        rows = lines[17:] * self.REPEAT
+        data = header + ''.join(rows)
+
+        for parser_class in [GliderParser, GliderBatchParser]:
+            start = time.time()
+            result = parse_all(parser_class, self.config, data)
+            elapsed = time.time() - start
+            log.info("%s: %d bytes, %d rows, %d particles, %.0f rows/sec",
+                     parser_class.__name__, len(data), len(rows), len(result),
+                     len(rows) / elapsed)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+"""
+@package mi.dataset.parser.test.test_mflm
+@file mi/dataset/parser/test/test_mflm.py
+@brief Test code for the SIO checksum and sieve shared by the MFLM parsers
+"""
+
+__license__ = 'Apache 2.0'
+
+import os
+import copy
+import glob
+import random
+import tempfile
+import time
+from StringIO import StringIO
+from nose.plugins.attrib import attr
+
+from mi.core.log import get_logger ; log = get_logger()
+
+from mi.dataset.test.test_parser import ParserUnitTestCase
+from mi.dataset.parser import mflm
+from mi.dataset.parser.mflm import MflmParser, MappedFile, StateKey, SIO_HEADER_MATCHER
+from mi.dataset.parser.ctdmo import CtdmoParser
+from mi.dataset.dataset_driver import DataSetDriverConfigKeys
+
+RESOURCE_PATH = os.path.join('mi', 'dataset', 'driver', 'mflm')
+
+def bitwise_checksum(data):
+    """
+    The original bit at a time SIO checksum, as an int
+    """
+    crc = 65535
+    for char in data:
+        crc = crc ^ ord(char)
+        for i in range(7, -1, -1):
+            if crc & 1:
+                crc = (crc >> 1) ^ 33800
+            else:
+                crc >>= 1
+    return ~crc & 0xFFFF
+
+def resource_files():
+    return sorted(glob.glob(os.path.join(RESOURCE_PATH, '*', 'resource', 'node59p1_*.dat')))
+
+def make_parser(data):
+    return MflmParser({}, StringIO(data), None, None,
+                      lambda state: None, lambda particles: None, 'CT')
+
+@attr('UNIT', group='mi')
+class MflmChecksumUnitTestCase(ParserUnitTestCase):
+    """
+    Checksum and sieve tests
+    """
+    def test_checksum(self):
+        """
+        The table and crcmod checksums match the original bitwise one
+        """
+        rand = random.Random(59)
+        samples = ['', '\x00', '\xff', 'CT1237100_0014uD', 'x' * 1000]
+        samples += [''.join([chr(rand.randrange(256)) for i in range(rand.randrange(1, 600))])
+                    for count in range(50)]
+
+        for data in samples:
+            expected = bitwise_checksum(data)
+            self.assertEqual(mflm._table_checksum(data), expected)
+            self.assertEqual(mflm.sio_checksum(data), expected)
+            self.assertEqual(MflmParser.calc_checksum(data), expected)
+
+    def test_resource_checksums(self):
+        """
+        Every terminated packet in the resource files has the checksum in
+        its header
+        """
+        checked = 0
+        for filename in resource_files():
+            data = open(filename, 'rb').read()
+            for match in SIO_HEADER_MATCHER.finditer(data):
+                end = match.end(0) + int(match.group(2), 16)
+                if end < len(data) and data[end] == '\x03':
+                    packet = data[match.end(0):end]
+                    if bitwise_checksum(packet) == int(match.group(5), 16):
+                        self.assertEqual(MflmParser.calc_checksum(packet), int(match.group(5), 16))
+                        checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_sieve_cache(self):
+        """
+        The sieve gives the same answer when packets come from its cache and
+        still rejects bad packets
+        """
+        data = open(os.path.join(RESOURCE_PATH, 'ctd', 'resource', 'node59p1_step1.dat'), 'rb').read()
+        parser = make_parser(data)
+
+        first = parser.sieve_function(data)
+        self.assertGreater(len(first), 0)
+        self.assertEqual(len(parser._valid_packets), len(first))
+        self.assertEqual(parser.sieve_function(data), first)
+
+        # corrupt the last byte of the first packet's data
+        (start, end) = first[0]
+        bad = data[:end - 2] + chr(ord(data[end - 2]) ^ 1) + data[end - 1:]
+        parser = make_parser(bad)
+        self.assertEqual(parser.sieve_function(bad), first[1:])
+        self.assertEqual(parser.sieve_function(bad), first[1:])
+
+
+@attr('UNIT', group='mi')
+class MflmMappedFileUnitTestCase(ParserUnitTestCase):
+    """
+    Memory mapped parser input
+    """
+    def test_mapped_file(self):
+        data = open(os.path.join(RESOURCE_PATH, 'ctd', 'resource', 'node59p1_step2.dat'), 'rb').read()
+        with tempfile.NamedTemporaryFile() as temp:
+            temp.write(data)
+            temp.flush()
+
+            mapped = MappedFile.wrap(temp)
+            self.assertIsInstance(mapped, MappedFile)
+            self.assertEqual(mapped.read(10), data[:10])
+            self.assertEqual(mapped.tell(), 10)
+            mapped.seek(100)
+            self.assertEqual(mapped.read(50), data[100:150])
+            mapped.seek(-20, os.SEEK_END)
+            self.assertEqual(mapped.read(), data[-20:])
+            self.assertEqual(mapped.read(5), '')
+            mapped.seek(len(data) + 100)
+            self.assertEqual(mapped.read(5), '')
+            mapped.close()
+            mapped.seek(0)
+            self.assertRaises(ValueError, mapped.read, 5)
+
+            # closed on leaving a with block, leaving the file open
+            with MappedFile.wrap(temp) as mapped:
+                self.assertEqual(mapped.read(10), data[:10])
+            mapped.seek(0)
+            self.assertRaises(ValueError, mapped.read, 5)
+            self.assertFalse(temp.closed)
+
+        # things that can't be mapped are used as they are
+        stream = StringIO(data)
+        self.assertIs(MappedFile.wrap(stream), stream)
+        with tempfile.TemporaryFile() as temp:
+            self.assertIs(MappedFile.wrap(temp), temp)
+
+    def test_mapped_parser(self):
+        """
+        A parser reading a real file gets the same records and states as one
+        reading a StringIO
+        """
+        config = {
+            DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.ctdmo',
+            DataSetDriverConfigKeys.PARTICLE_CLASS: 'CtdmoParserDataParticle'
+        }
+        filename = os.path.join(RESOURCE_PATH, 'ctd', 'resource', 'node59p1_step4.dat')
+        data = open(filename, 'rb').read()
+        state = {StateKey.UNPROCESSED_DATA: [[0, 500], [4000, len(data)]],
+                 StateKey.IN_PROCESS_DATA: [], StateKey.TIMESTAMP: 0.0}
+
+        results = []
+        for stream in [StringIO(data), open(filename, 'rb')]:
+            states = []
+            parser = CtdmoParser(config, copy.deepcopy(state), stream,
+                                 lambda state: states.append(copy.deepcopy(state)),
+                                 lambda particles: None)
+            particles = []
+            records = parser.get_records(3)
+            while records:
+                particles.extend([particle.raw_data for particle in records])
+                records = parser.get_records(3)
+            parser.close()
+            results.append((particles, states))
+
+        self.assertIsInstance(parser._stream_handle, MappedFile)
+        parser._stream_handle.seek(0)
+        self.assertRaises(ValueError, parser._stream_handle.read, 5)
+        self.assertFalse(stream.closed)
+        stream.close()
+        self.assertGreater(len(results[0][0]), 0)
+        self.assertEqual(results[0], results[1])
+
+
+@attr('PERF', group='mi')
+class MflmChecksumPerfTestCase(ParserUnitTestCase):
+    """
+    Checksum and sieve throughput over the node59p1 resource files
+    """
+    REPEAT = 20
+
+    def test_checksum_throughput(self):
+        packets = []
+        for filename in resource_files():
+            data = open(filename, 'rb').read()
+            for match in SIO_HEADER_MATCHER.finditer(data):
+                end = match.end(0) + int(match.group(2), 16)
+                packets.append(data[match.end(0):end])
+        total = sum([len(packet) for packet in packets])
+
+        backends = [('bitwise', bitwise_checksum), ('table', mflm._table_checksum)]
+        if mflm.sio_checksum is not mflm._table_checksum:
+            backends.append(('crcmod', mflm.sio_checksum))
+
+        for (name, function) in backends:
+            start = time.time()
+            for packet in packets:
+                function(packet)
+            elapsed = time.time() - start
+            log.info("%s checksum: %d packets, %d bytes, %.2f MB/s",
+                     name, len(packets), total, total / elapsed / 1e6)
+
+    def test_sieve_throughput(self):
+        for filename in resource_files():
+            data = open(filename, 'rb').read()
+            parser = make_parser(data)
+
+            start = time.time()
+            parser.sieve_function(data)
+            cold = time.time() - start
+
+            start = time.time()
+            for i in range(self.REPEAT):
+                parser.sieve_function(data)
+            warm = (time.time() - start) / self.REPEAT
+
+            log.info("%s: %d bytes, first sieve %.2f MB/s, repeat sieve %.2f MB/s",
+                     filename, len(data), len(data) / cold / 1e6, len(data) / warm / 1e6)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""
+@package mi.dataset.test.test_file_change_poller
+@file mi/dataset/test/test_file_change_poller.py
+@brief Test code for the incremental file change checks in FileChangePoller
+"""
+
+__license__ = 'Apache 2.0'
+
+import os
+import shutil
+import hashlib
+import tempfile
+import time
+
+from mi.core.log import get_logger ; log = get_logger()
+from nose.plugins.attrib import attr
+from mi.core.unit_test import MiUnitTest
+from mi.dataset import harvester
+from mi.dataset.harvester import FileChangePoller, FILE_BLOCK_SIZE
+
+FILENAME = 'node59p1.dat'
+
+class FileChangePollerTestCase(MiUnitTest):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file = os.path.join(self.directory, FILENAME)
+        self.hashed = []
+
+        # record how many bytes get hashed
+        hash_file_range = harvester.hash_file_range
+        def record_hash_file_range(filehandle, start, end, md5):
+            self.hashed.append(end - start)
+            hash_file_range(filehandle, start, end, md5)
+        harvester.hash_file_range = record_hash_file_range
+        self.addCleanup(setattr, harvester, 'hash_file_range', hash_file_range)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data, mode='wb'):
+        with open(self.file, mode) as f:
+            f.write(data)
+
+    def poller(self, last_size=None, last_checksum=None):
+        return FileChangePoller(self.directory, FILENAME, last_size, last_checksum, None)
+
+    def assert_found(self, poller, data):
+        self.assertEqual(poller._check_for_data(), self.file)
+        self.assertEqual(poller._last_size, len(data))
+        self.assertEqual(poller._last_checksum, hashlib.md5(data).hexdigest())
+
+
+@attr('UNIT', group='mi')
+class FileChangePollerUnitTestCase(FileChangePollerTestCase):
+    def test_append(self):
+        poller = self.poller()
+        self.assertIsNone(poller._check_for_data())
+
+        self.write('')
+        self.assertIsNone(poller._check_for_data())
+
+        data = 'a' * (3 * FILE_BLOCK_SIZE)
+        self.write(data)
+        self.assert_found(poller, data)
+        self.assertIsNone(poller._check_for_data())
+
+        self.hashed = []
+        self.write('b' * 100, 'ab')
+        data += 'b' * 100
+        self.assert_found(poller, data)
+        self.assertEqual(self.hashed, [100])
+        self.assertIsNone(poller._check_for_data())
+
+    def test_change(self):
+        """
+        Changes to sampled blocks and truncation re-read the whole file
+        """
+        data = 'a' * (3 * FILE_BLOCK_SIZE)
+        self.write(data)
+        poller = self.poller()
+        self.assert_found(poller, data)
+
+        for offset in [0, len(data) / 2, len(data) - 1]:
+            data = data[:offset] + 'x' + data[offset + 1:]
+            self.write(data)
+            self.hashed = []
+            self.assert_found(poller, data)
+            self.assertEqual(self.hashed, [len(data)])
+
+        data = data[:1000]
+        self.write(data)
+        self.assert_found(poller, data)
+
+    def test_memento(self):
+        """
+        A poller started with the size and checksum of the current file
+        does not report it
+        """
+        data = 'a' * 1000
+        self.write(data)
+        poller = self.poller(len(data), hashlib.md5(data).hexdigest())
+        self.assertIsNone(poller._check_for_data())
+
+        self.write('b', 'ab')
+        self.hashed = []
+        self.assert_found(poller, data + 'b')
+        self.assertEqual(self.hashed, [1])
+
+        poller = self.poller(len(data), 'not the checksum')
+        self.write(data)
+        self.assert_found(poller, data)
+
+
+@attr('PERF', group='mi')
+class FileChangePollerPerfTestCase(FileChangePollerTestCase):
+    """
+    Poll time for a small append to a large file
+    """
+    SIZES = [1048576, 16777216, 134217728]
+    APPEND = 'x' * 1024
+
+    def test_poll_append(self):
+        for size in self.SIZES:
+            self.write('a' * size)
+            poller = self.poller()
+            start = time.time()
+            poller._check_for_data()
+            first = time.time() - start
+
+            self.write(self.APPEND, 'ab')
+            start = time.time()
+            self.assertEqual(poller._check_for_data(), self.file)
+            append = time.time() - start
+
+            start = time.time()
+            self.assertIsNone(poller._check_for_data())
+            unchanged = time.time() - start
+
+            log.info("%d byte file: first poll %.2f ms, %d byte append %.2f ms, no change %.2f ms",
+                     size, first * 1000, len(self.APPEND), append * 1000, unchanged * 1000)
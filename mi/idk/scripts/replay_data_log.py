@@ -0,0 +1,51 @@
+"""
+@file mi/idk/scripts/replay_data_log.py
+@brief Replay port agent log files through a driver and report throughput
+"""
+
+__license__ = 'Apache 2.0'
+
+import sys
+import argparse
+import importlib
+
+from mi.core.instrument.instrument_driver import DriverProtocolState
+from mi.core.instrument.port_agent_replay import PortAgentReplay
+from mi.core.instrument.port_agent_replay import PortAgentLogReader
+from mi.core.instrument.port_agent_replay import format_result
+
+def run():
+    opts = parseArgs()
+
+    module = importlib.import_module(opts.driver_module)
+    driver_class = getattr(module, opts.driver_class)
+    replay = PortAgentReplay(driver_class, protocol_state=opts.state, raw=not opts.no_raw)
+
+    for filename in opts.files:
+        reader = PortAgentLogReader(filename)
+        result = replay.run(reader, speed=opts.speed)
+        sys.stdout.write("%s:\n%s\n" % (filename, format_result(result)))
+        if reader.skipped_bytes:
+            sys.stdout.write("  skipped %d bytes that were not port agent records\n" %
+                             reader.skipped_bytes)
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Replay port agent logs through a driver")
+    parser.add_argument("driver_module",
+                        help="driver module, e.g. mi.instrument.seabird.sbe37smb.ooicore.driver")
+    parser.add_argument("files", nargs='+', help="port agent log files")
+    parser.add_argument("-c", "--class", dest='driver_class', default='InstrumentDriver',
+                        help="driver class in the module (default InstrumentDriver)")
+    parser.add_argument("-s", "--speed", type=float, default=None,
+                        help="replay at this multiple of the recorded rate, 1 for wire speed "
+                             "(default as fast as possible)")
+    parser.add_argument("--state", default=DriverProtocolState.AUTOSAMPLE,
+                        help="protocol state to force the driver into (default %s)" %
+                             DriverProtocolState.AUTOSAMPLE)
+    parser.add_argument("--no-raw", dest='no_raw', action="store_true",
+                        help="don't pass packets to got_raw")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    run()
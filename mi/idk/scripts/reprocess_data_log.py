@@ -0,0 +1,55 @@
+"""
+@file mi/idk/scripts/reprocess_data_log.py
+@brief Regenerate particles from port agent log files using a process pool
+"""
+
+__license__ = 'Apache 2.0'
+
+import sys
+import argparse
+
+from mi.core.instrument.instrument_driver import DriverProtocolState
+from mi.core.instrument.port_agent_batch import PortAgentBatch
+from mi.core.instrument.port_agent_batch import DEFAULT_OVERLAP
+
+def run():
+    opts = parseArgs()
+
+    batch = PortAgentBatch(opts.driver_module, opts.driver_class,
+                           protocol_state=opts.state, raw=opts.raw,
+                           processes=opts.processes, shard_size=opts.shard_size,
+                           overlap=opts.overlap)
+    result = batch.run(opts.files, opts.output, work_dir=opts.work_dir)
+
+    sys.stderr.write("%d particles from %d packets in %d shards, %d errors, %.3fs "
+                     "(%.3fs of shard processing)\n" %
+                     (result['particles'], result['packets'], result['shards'],
+                      result['errors'], result['elapsed'], result['shard_time']))
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Regenerate particles from port agent logs")
+    parser.add_argument("driver_module",
+                        help="driver module, e.g. mi.instrument.seabird.sbe37smb.ooicore.driver")
+    parser.add_argument("files", nargs='+', help="port agent log files")
+    parser.add_argument("-o", "--output", required=True,
+                        help="file to write the particles to, one per line")
+    parser.add_argument("-c", "--class", dest='driver_class', default='InstrumentDriver',
+                        help="driver class in the module (default InstrumentDriver)")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="number of worker processes (default one per core)")
+    parser.add_argument("--shard-size", dest='shard_size', type=int, default=None,
+                        help="bytes of log per shard")
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP,
+                        help="bytes replayed before each shard to catch chunks that "
+                             "span shards (default %d)" % DEFAULT_OVERLAP)
+    parser.add_argument("--state", default=DriverProtocolState.AUTOSAMPLE,
+                        help="protocol state to force the driver into (default %s)" %
+                             DriverProtocolState.AUTOSAMPLE)
+    parser.add_argument("--raw", action="store_true", help="produce raw particles as well")
+    parser.add_argument("-w", "--work-dir", dest='work_dir', default=None,
+                        help="directory for intermediate shard files")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    run()
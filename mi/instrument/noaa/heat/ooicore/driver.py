@@ -35,7 +35,8 @@ from mi.core.instrument.protocol_param_dict import ParameterDictType
 from mi.core.instrument.data_particle import DataParticle
 from mi.core.instrument.data_particle import DataParticleKey
 from mi.core.instrument.data_particle import CommonDataParticleType
-from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import RegexSieve
 
 from mi.core.exceptions import InstrumentProtocolException
 from mi.core.exceptions import InstrumentTimeoutException
@@ -372,28 +373,25 @@ class Protocol(CommandResponseInstrumentProtocol):
         self._sent_cmds = []
 
         #
-        self._chunker = StringChunker(Protocol.sieve_function)
+        self._chunker = StringRingChunker(Protocol.sieve_function,
+                                          lookback=Protocol._sieve_lookback)
 
         self._heat_duration = DEFAULT_HEAT_DURATION
 
 
+    # Longest record the sieve matches, with room to spare.  The chunker only
+    # rescans this much of the data it has already sieved.
+    _sieve_lookback = 1024
+
+    _sieve = RegexSieve([HEATDataParticle.regex_compiled(),
+                         HEATCommandResponse.regex_compiled()])
+
     @staticmethod
     def sieve_function(raw_data):
         """
         The method that splits samples
         """
-
-        matchers = []
-        return_list = []
-
-        matchers.append(HEATDataParticle.regex_compiled())
-        matchers.append(HEATCommandResponse.regex_compiled())
-
-        for matcher in matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return Protocol._sieve(raw_data)
 
     def _build_cmd_dict(self):
         """
@@ -35,7 +35,8 @@ from mi.core.instrument.protocol_param_dict import ParameterDictType
 from mi.core.instrument.data_particle import DataParticle
 from mi.core.instrument.data_particle import DataParticleKey
 from mi.core.instrument.data_particle import CommonDataParticleType
-from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import RegexSieve
 
 # DHE: Might need this if we use multiline regex
 #from mi.instrument.noaa.driver import BOTPTParticle
@@ -382,7 +383,7 @@ class IRISStatus_01_Particle(DataParticle):
         
         
         pattern = r'IRIS,' # pattern starts with IRIS '
-        pattern += r'(.*?),' # group 1: time
+        pattern += r'([^\n]*?),' # group 1: time, on the first line
         pattern += r'\*APPLIED GEOMECHANICS'
         pattern += r'.*?' # non-greedy match of all the junk between
         pattern += r'baud FV- *?' + NEWLINE
@@ -448,7 +449,7 @@ class IRISStatus_02_Particle(DataParticle):
         IRIS,2013/06/12 18:04:02,*01: BAE Scale Factor:  2.88388 (arcseconds/bit)
         """
         pattern = r'IRIS,' # pattern starts with IRIS '
-        pattern += r'(.*?),' # group 1: time
+        pattern += r'([^\n]*?),' # group 1: time, on the first line
         pattern += r'\*01: TBias:' # unique identifier for status
         pattern += r'.*?' # non-greedy match of all the junk between
         pattern += r'BAE Scale Factor: (.*)\(arcseconds/bit\)' + NEWLINE
@@ -585,7 +586,8 @@ class Protocol(CommandResponseInstrumentProtocol):
         self._sent_cmds = []
 
         #
-        self._chunker = StringChunker(Protocol.sieve_function)
+        self._chunker = StringRingChunker(Protocol.sieve_function,
+                                          lookback=Protocol._sieve_lookback)
 
         # set up the regexes now so we don't have to do it repeatedly
         self.data_regex = IRISDataParticle.regex_compiled()
@@ -595,40 +597,21 @@ class Protocol(CommandResponseInstrumentProtocol):
         self.status_02_regex = IRISStatus_02_Particle.regex_compiled()
 
 
+    # Longest record the sieve matches, with room to spare.  The chunker only
+    # rescans this much of the data it has already sieved.
+    _sieve_lookback = 4096
+
+    _sieve = RegexSieve([IRISDataParticle.regex_compiled(),
+                         IRISStatus_01_Particle.regex_compiled(),
+                         IRISStatus_02_Particle.regex_compiled(),
+                         IRISCommandResponse.regex_compiled()])
+
     @staticmethod
     def sieve_function(raw_data):
         """
         The method that splits samples
         """
-
-        matchers = []
-        return_list = []
-
-        """
-        would be nice to be able to do this.
-        matchers.append(self.data_regex)
-        matchers.append(self.signon_regex)
-        matchers.append(self.status_01_regex)
-        matchers.append(self.status_02_regex)
-        matchers.append(self.cmd_rsp_regex)
-        """
-        
-        """
-        Not a good idea to be compiling these for every invocation of this
-        method; they don't change.
-        """
- 
-        matchers.append(IRISDataParticle.regex_compiled())
-        #matchers.append(IRISStatusSignOnParticle.regex_compiled())
-        matchers.append(IRISStatus_01_Particle.regex_compiled())
-        matchers.append(IRISStatus_02_Particle.regex_compiled())
-        matchers.append(IRISCommandResponse.regex_compiled())
-
-        for matcher in matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return Protocol._sieve(raw_data)
 
     def _filter_capabilities(self, events):
         """
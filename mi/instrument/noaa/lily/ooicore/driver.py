@@ -39,7 +39,8 @@ from mi.core.instrument.protocol_param_dict import ParameterDictType
 from mi.core.instrument.data_particle import DataParticle
 from mi.core.instrument.data_particle import DataParticleKey
 from mi.core.instrument.data_particle import CommonDataParticleType
-from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import RegexSieve
 from mi.core.driver_scheduler import DriverScheduler
 from mi.core.instrument.instrument_driver import DriverConfigKey
 from mi.core.driver_scheduler import DriverSchedulerConfigKey
@@ -518,7 +519,7 @@ class LILYStatus_01_Particle(DataParticle):
         
         
         pattern = r'LILY,' # pattern starts with LILY '
-        pattern += r'(.*?),' # group 1: time
+        pattern += r'([^\n]*?),' # group 1: time, on the first line
         pattern += r'\*APPLIED GEOMECHANICS'
         pattern += r'.*?' # non-greedy match of all the junk between
         pattern += r'baud FV- *?' + NEWLINE
@@ -585,7 +586,7 @@ class LILYStatus_02_Particle(DataParticle):
         LILY,2013/06/24 23:36:06,*01: Advanced Memory Mode: Off, Delete with XY-MEMD: No
         """
         pattern = r'LILY,' # pattern starts with LILY '
-        pattern += r'(.*?),' # group 1: time
+        pattern += r'([^\n]*?),' # group 1: time, on the first line
         pattern += r'\*01: TBias:' # unique identifier for status
         pattern += r'.*?' # non-greedy match of all the junk between
         pattern += r'\*01: Advanced Memory Mode: Off, Delete with XY-MEMD: No' + NEWLINE
@@ -780,9 +781,12 @@ class Protocol(CommandResponseInstrumentProtocol):
         # Set up the chunkers: this driver uses the chunker in a hierarchical way.  The coarse
         # chunker filters the LILY messages from the BOTPT firehose, and the other chunkers
         # work with what the coarse chunker matches.
-        self._coarse_chunker = StringChunker(Protocol.coarse_sieve_function)
-        self._command_autosample_chunker = StringChunker(Protocol.command_autosample_sieve_function)
-        self._leveling_chunker = StringChunker(Protocol.leveling_sieve_function)
+        self._coarse_chunker = StringRingChunker(Protocol.coarse_sieve_function,
+                                                 lookback=Protocol._sieve_lookback)
+        self._command_autosample_chunker = StringRingChunker(Protocol.command_autosample_sieve_function,
+                                                             lookback=Protocol._sieve_lookback)
+        self._leveling_chunker = StringRingChunker(Protocol.leveling_sieve_function,
+                                                   lookback=Protocol._sieve_lookback)
 
         # set up the regexes now so we don't have to do it repeatedly
         self.data_regex = LILYDataParticle.regex_compiled()
@@ -801,83 +805,40 @@ class Protocol(CommandResponseInstrumentProtocol):
         # Initialize the AsyncEventSender object with the protocol_fsm
         AsyncEventSender.__my_init__(self._protocol_fsm)
 
+    # Longest record the sieves match, with room to spare.  The chunkers only
+    # rescan this much of the data they have already sieved.
+    _sieve_lookback = 4096
+
+    _coarse_sieve = RegexSieve([LILYCoarseChunk.regex_compiled()])
+
     @staticmethod
     def coarse_sieve_function(raw_data):
         """
         The method that filters LILY coarse chunks
         """
+        return Protocol._coarse_sieve(raw_data)
 
-        matchers = []
-        return_list = []
-
-        """
-        Not a good idea to be compiling these for every invocation of this
-        method; they don't change.
-        """
-        matchers.append(LILYCoarseChunk.regex_compiled())
-
-        for matcher in matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+    _leveling_sieve = RegexSieve([LILYCommandResponse.regex_compiled(),
+                                  LILYLevelingParticle.regex_compiled()])
 
     @staticmethod
     def leveling_sieve_function(raw_data):
         """
-        The method that splits samples
-        """
-
-        matchers = []
-        return_list = []
-
-        """
-        would be nice to be able to do this.
-        matchers.append(self.leveling_regex)
-        matchers.append(self.cmd_rsp_regex)
-        """
-        
-        """
-        This is a way to label the chunks.  However, the chunker needs 
-        to change because it is dependent upon the return list.  
-        
-        Maybe do this:  (label, result) = self.sieve(self.buffer[start_index:])
-        (see code in the chunker)
+        The method that splits leveling samples and command responses
         """
-        
-        match_tuple = ("CMD", LILYCommandResponse.regex_compiled())
-        matchers.append(match_tuple)
-        #matchers.append(LILYCommandResponse.regex_compiled())
-        match_tuple = ("LVL", LILYLevelingParticle.regex_compiled())
-        matchers.append(match_tuple)
-        #matchers.append(LILYLevelingParticle.regex_compiled())
-
-        for matcher in matchers:
-            for match in matcher[1].finditer(raw_data):
-                log.debug("Found %s chunk.", matcher[0])
-                return_list.append((match.start(), match.end()))
+        return Protocol._leveling_sieve(raw_data)
 
-        return return_list
+    _command_autosample_sieve = RegexSieve([LILYDataParticle.regex_compiled(),
+                                            LILYCommandResponse.regex_compiled(),
+                                            LILYStatus_01_Particle.regex_compiled(),
+                                            LILYStatus_02_Particle.regex_compiled()])
 
     @staticmethod
     def command_autosample_sieve_function(raw_data):
         """
         The method that splits samples
         """
-
-        matchers = []
-        return_list = []
-
-        matchers.append(LILYDataParticle.regex_compiled())
-        matchers.append(LILYCommandResponse.regex_compiled())
-        matchers.append(LILYStatus_01_Particle.regex_compiled())
-        matchers.append(LILYStatus_02_Particle.regex_compiled())
-        
-        for matcher in matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return Protocol._command_autosample_sieve(raw_data)
 
     def _filter_capabilities(self, events):
         """
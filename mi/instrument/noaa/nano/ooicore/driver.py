@@ -35,7 +35,8 @@ from mi.core.instrument.protocol_param_dict import ParameterDictType
 from mi.core.instrument.data_particle import DataParticle
 from mi.core.instrument.data_particle import DataParticleKey
 from mi.core.instrument.data_particle import CommonDataParticleType
-from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import RegexSieve
 
 # DHE: Might need this if we use multiline regex
 #from mi.instrument.noaa.driver import BOTPTParticle
@@ -472,7 +473,8 @@ class Protocol(CommandResponseInstrumentProtocol):
         self._sent_cmds = []
 
         #
-        self._chunker = StringChunker(Protocol.sieve_function)
+        self._chunker = StringRingChunker(Protocol.sieve_function,
+                                          lookback=Protocol._sieve_lookback)
 
         # set up the regexes now so we don't have to do it repeatedly
         self.data_regex = NANODataParticle.regex_compiled()
@@ -480,36 +482,20 @@ class Protocol(CommandResponseInstrumentProtocol):
         self.status_01_regex = NANOStatus_01_Particle.regex_compiled()
 
 
+    # Longest record the sieve matches, with room to spare.  The chunker only
+    # rescans this much of the data it has already sieved.
+    _sieve_lookback = 4096
+
+    _sieve = RegexSieve([NANODataParticle.regex_compiled(),
+                         NANOStatus_01_Particle.regex_compiled(),
+                         NANOCommandResponse.regex_compiled()])
+
     @staticmethod
     def sieve_function(raw_data):
         """
         The method that splits samples
         """
-
-        matchers = []
-        return_list = []
-
-        """
-        would be nice to be able to do this.
-        matchers.append(self.data_regex)
-        matchers.append(self.status_01_regex)
-        matchers.append(self.cmd_rsp_regex)
-        """
-        
-        """
-        Not a good idea to be compiling these for every invocation of this
-        method; they don't change.
-        """
- 
-        matchers.append(NANODataParticle.regex_compiled())
-        matchers.append(NANOStatus_01_Particle.regex_compiled())
-        matchers.append(NANOCommandResponse.regex_compiled())
-
-        for matcher in matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return Protocol._sieve(raw_data)
 
     def _filter_capabilities(self, events):
         """
@@ -38,6 +38,7 @@ from mi.core.instrument.protocol_param_dict import ParameterDictVisibility
 from mi.core.instrument.protocol_param_dict import ParameterValue
 from mi.core.instrument.protocol_param_dict import ProtocolParameterDict
 from mi.core.instrument.chunker import StringChunker
+from mi.instrument.nortek.driver import structure_sieve, word_sum
 from mi.core.instrument.data_particle import DataParticle, DataParticleKey, DataParticleValue, CommonDataParticleType
 
 
@@ -506,12 +507,8 @@ class BinaryProtocolParameterDict(ProtocolParameterDict):
     @staticmethod
     def calculate_checksum(input, length):
         #log.debug("calculate_checksum: input=%s, length=%d", input.encode('hex'), length)
-        calculated_checksum = CHECK_SUM_SEED
-        for word_index in range(0, length-2, 2):
-            word_value = BinaryProtocolParameterDict.convert_word_to_int(input[word_index:word_index+2])
-            calculated_checksum = (calculated_checksum + word_value) % 0x10000
-            #log.debug('w_i=%d, c_c=%d' %(word_index, calculated_checksum))
-        return calculated_checksum
+        # every word before the two checksum bytes
+        return (CHECK_SUM_SEED + word_sum(input, (length - 1) / 2)) % 0x10000
 
     @staticmethod
     def convert_time(response):
@@ -995,20 +992,7 @@ class Protocol(CommandResponseInstrumentProtocol):
     def chunker_sieve_function(raw_data):
         """ The method that detects data sample structures from instrument
         """
-        return_list = []
-        
-        for structure_sync, structure_len in sample_structures:
-            start = raw_data.find(structure_sync)
-            if start != -1:    # found a sync pattern
-                if start+structure_len <= len(raw_data):    # only check the CRC if all of the structure has arrived
-                    calculated_checksum = BinaryProtocolParameterDict.calculate_checksum(raw_data[start:start+structure_len], structure_len)
-                    #log.debug('chunker_sieve_function: calculated checksum = %s' % calculated_checksum)
-                    sent_checksum = BinaryProtocolParameterDict.convert_word_to_int(raw_data[start+structure_len-2:start+structure_len])
-                    if sent_checksum == calculated_checksum:
-                        return_list.append((start, start+structure_len))        
-                        #log.debug("chunker_sieve_function: found %s", raw_data[start:start+structure_len].encode('hex'))
-                
-        return return_list
+        return structure_sieve(sample_structures).sieve(raw_data)
     
     def _filter_capabilities(self, events):
         """
@@ -13,6 +13,9 @@ import re
 import time
 import copy
 import base64
+from struct import unpack_from
+
+import numpy as np
 
 from mi.core.log import get_logger ; log = get_logger()
 
@@ -26,6 +29,7 @@ from mi.core.instrument.protocol_cmd_dict import ProtocolCommandDict
 from mi.core.instrument.protocol_param_dict import ParameterDictVisibility
 from mi.core.instrument.protocol_param_dict import ProtocolParameterDict
 from mi.core.instrument.protocol_param_dict import RegexParameter
+from mi.core.instrument.chunker import SyncWordFramer
 
 from mi.core.instrument.instrument_driver import DriverEvent
 from mi.core.instrument.instrument_driver import DriverConfigKey
@@ -77,6 +81,39 @@ NORTEK_COMMON_SAMPLE_STRUCTS = [[USER_CONFIG_SYNC_BYTES, USER_CONFIG_LEN],
                                 [HW_CONFIG_SYNC_BYTES, HW_CONFIG_LEN],
                                 [HEAD_CONFIG_SYNC_BYTES, HEAD_CONFIG_LEN]]
 
+def word_sum(data, count, offset=0):
+    """
+    Sum of count little endian words in data, as a python int
+    """
+    if count <= 0:
+        return 0
+    if len(data) < offset + 2 * count:
+        raise SampleException("Found %d bytes, expected %d words" % (len(data) - offset, count))
+    return int(np.frombuffer(data, '<u2', count=count, offset=offset).sum())
+
+def valid_structure(raw_data, start, end):
+    """
+    Sieve checksum test for the structure in raw_data[start:end], the seeded
+    sum of its words must match the word at the end.
+    """
+    calculated_checksum = (CHECK_SUM_SEED + word_sum(raw_data, (end - start - 1) / 2, start)) % 0x10000
+    return calculated_checksum == unpack_from('<H', raw_data, end - 2)[0]
+
+# sieves by structure list, kept so their checksum caches live between calls
+_structure_sieves = {}
+
+def structure_sieve(structs):
+    """
+    @param structs list of [sync bytes, structure length] pairs
+    @retval SyncWordFramer for the structures
+    """
+    key = tuple([tuple(structure) for structure in structs])
+    sieve = _structure_sieves.get(key)
+    if sieve is None:
+        sieve = SyncWordFramer(structs, checksum=valid_structure)
+        _structure_sieves[key] = sieve
+    return sieve
+
 class ScheduledJob(BaseEnum):
     CLOCK_SYNC = 'clock_sync'
     
@@ -1185,14 +1222,10 @@ class NortekProtocolParameterDict(ProtocolParameterDict):
     @staticmethod
     def calculate_checksum(input, length=None):
         #log.debug("calculate_checksum: input=%s, length=%d", input.encode('hex'), length)
-        calculated_checksum = CHECK_SUM_SEED
         if length == None:
             length = len(input)
-        for word_index in range(0, length-2, 2):
-            word_value = NortekProtocolParameterDict.convert_word_to_int(input[word_index:word_index+2])
-            calculated_checksum = (calculated_checksum + word_value) % 0x10000
-            #log.trace('w_i=%d, c_c=%d', word_index, calculated_checksum)
-        return calculated_checksum
+        # every word before the two checksum bytes
+        return (CHECK_SUM_SEED + word_sum(input, (length - 1) / 2)) % 0x10000
 
     @staticmethod
     def convert_bytes_to_string(bytes_in):
@@ -1351,20 +1384,7 @@ class NortekInstrumentProtocol(CommandResponseInstrumentProtocol):
         @param structs Additional structures to include in the structure search.
         Should be in the format [[structure_sync_bytes, structure_len]*]
         """
-        return_list = []
-        structs = add_structs + NORTEK_COMMON_SAMPLE_STRUCTS
-        for structure_sync, structure_len in structs:
-            start = raw_data.find(structure_sync)
-            if start != -1:    # found a sync pattern
-                if start+structure_len <= len(raw_data):    # only check the CRC if all of the structure has arrived
-                    calculated_checksum = NortekProtocolParameterDict.calculate_checksum(raw_data[start:start+structure_len], structure_len)
-                    log.debug('chunker_sieve_function: calculated checksum = %s' % calculated_checksum)
-                    sent_checksum = NortekProtocolParameterDict.convert_word_to_int(raw_data[start+structure_len-2:start+structure_len])
-                    if sent_checksum == calculated_checksum:
-                        return_list.append((start, start+structure_len))        
-                        log.debug("chunker_sieve_function: found %s", raw_data[start:start+structure_len].encode('hex'))
-                
-        return return_list
+        return structure_sieve(add_structs + NORTEK_COMMON_SAMPLE_STRUCTS).sieve(raw_data)
 
     ########################################################################
     # overridden superclass methods
@@ -38,6 +38,8 @@ from mi.core.instrument.protocol_cmd_dict import CommandDictKey
 from mi.core.instrument.protocol_param_dict import ParameterDictKey
 
 from mi.instrument.nortek.driver import NortekProtocolParameterDict
+from mi.instrument.nortek.driver import CHECK_SUM_SEED
+from mi.instrument.nortek.driver import valid_structure
 from mi.instrument.nortek.driver import NortekHardwareConfigDataParticleKey
 from mi.instrument.nortek.driver import NortekHeadConfigDataParticleKey
 from mi.instrument.nortek.driver import NortekUserConfigDataParticleKey
@@ -554,6 +556,36 @@ class NortekUnitTest(InstrumentDriverUnitTestCase):
         self.assert_chunker_sample_with_noise(chunker, head_config_sample())
         self.assert_chunker_sample_with_noise(chunker, user_config_sample())
 
+    def test_core_chunker_burst(self):
+        """
+        Every structure in a burst comes out of the chunker, including
+        repeats of the same type
+        """
+        chunker = StringChunker(NortekInstrumentProtocol.chunker_sieve_function)
+        samples = [hw_config_sample(), head_config_sample(), hw_config_sample(),
+                   user_config_sample(), hw_config_sample()]
+        chunker.add_chunk(''.join(samples), self.get_ntp_timestamp())
+
+        for sample in samples:
+            (timestamp, result) = chunker.get_next_data()
+            self.assertEqual(result, sample)
+
+        (timestamp, result) = chunker.get_next_data()
+        self.assertEqual(result, None)
+
+    def test_core_checksum(self):
+        """
+        The word sum checksum matches a byte at a time sum
+        """
+        for sample in [hw_config_sample(), head_config_sample(), user_config_sample()]:
+            expected = CHECK_SUM_SEED
+            for index in range(0, len(sample) - 2, 2):
+                expected = (expected + ord(sample[index]) + 0x100 * ord(sample[index + 1])) % 0x10000
+            self.assertEqual(NortekProtocolParameterDict.calculate_checksum(sample), expected)
+            self.assertEqual(NortekProtocolParameterDict.calculate_checksum(sample + 'xx', len(sample)), expected)
+            self.assertTrue(valid_structure('xx' + sample, 2, len(sample) + 2))
+            self.assertFalse(valid_structure(sample[:-1] + chr(ord(sample[-1]) ^ 1), 0, len(sample)))
+
     def test_core_corrupt_data_structures(self):
         # garbage should yield a checksum failure
         particle = NortekHardwareConfigDataParticle(hw_config_sample().replace(chr(0), chr(1), 1),
@@ -26,6 +26,8 @@ from mi.core.exceptions import InstrumentProtocolException
 
 from mi.core.common import BaseEnum
 
+from mi.core.instrument.chunker import RegexSieve
+
 from mi.core.exceptions import SampleException, \
                                InstrumentProtocolException
 
@@ -753,29 +755,21 @@ class SBE16_NO_Protocol(sbe16plus_driver.SBE16Protocol):
         self._add_response_handler(Command.GETCD, self._validate_GetCD_response)  
         self._add_response_handler(Command.GETCC, self._validate_GetCC_response)  
         
+    # The calibration and hardware XML replies are several KB long.
+    _sieve_lookback = 8192
+
+    _sieve = RegexSieve([SBE16NoDataParticle.regex_compiled(),
+                         SBE16HardwareDataParticle.regex_compiled(),
+                         SBE16CalibrationDataParticle.regex_compiled(),
+                         SBE16StatusDataParticle.regex_compiled(),
+                         SBE16ConfigurationDataParticle.regex_compiled()])
+
     @staticmethod
     def sieve_function(raw_data):
         """ The method that splits samples
         Over-ride sieve function to handle additional particles.
         """
-        matchers = []
-        return_list = []
-
-        """
-        matchers.append(SBE16StatusParticle.regex_compiled())
-        matchers.append(SBE16CalibrationParticle.regex_compiled())
-        """
-        matchers.append(SBE16NoDataParticle.regex_compiled())
-        matchers.append(SBE16HardwareDataParticle.regex_compiled())
-        matchers.append(SBE16CalibrationDataParticle.regex_compiled())
-        matchers.append(SBE16StatusDataParticle.regex_compiled())
-        matchers.append(SBE16ConfigurationDataParticle.regex_compiled())
-
-        for matcher in matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return SBE16_NO_Protocol._sieve(raw_data)
 
     def _got_chunk(self, chunk, timestamp):
         """
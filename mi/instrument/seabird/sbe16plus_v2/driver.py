@@ -30,7 +30,8 @@ from mi.core.instrument.instrument_driver import DriverParameter
 from mi.core.instrument.instrument_driver import ResourceAgentState
 from mi.core.instrument.instrument_driver import ResourceAgentEvent
 from mi.core.instrument.data_particle import DataParticleKey, CommonDataParticleType
-from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import RegexSieve
 from mi.core.exceptions import InstrumentParameterException
 from mi.core.exceptions import SampleException
 from mi.core.exceptions import InstrumentProtocolException
@@ -797,28 +798,26 @@ class SBE16Protocol(SeaBirdProtocol):
         # State state machine in UNKNOWN state. 
         self._protocol_fsm.start(ProtocolState.UNKNOWN)
         
-        self._chunker = StringChunker(self.sieve_function)
+        self._chunker = StringRingChunker(self.sieve_function,
+                                          lookback=self._sieve_lookback)
 
         self._add_scheduler_event(ScheduledJob.ACQUIRE_STATUS, ProtocolEvent.ACQUIRE_STATUS)
         self._add_scheduler_event(ScheduledJob.CONFIGURATION_DATA, ProtocolEvent.GET_CONFIGURATION)
         self._add_scheduler_event(ScheduledJob.CLOCK_SYNC, ProtocolEvent.SCHEDULED_CLOCK_SYNC)
 
+    # Longest record the sieve matches, with room to spare.  The chunker only
+    # rescans this much of the data it has already sieved.
+    _sieve_lookback = 4096
+
+    _sieve = RegexSieve([SBE16DataParticle.regex_compiled(),
+                         SBE16StatusParticle.regex_compiled(),
+                         SBE16CalibrationParticle.regex_compiled()])
+
     @staticmethod
     def sieve_function(raw_data):
         """ The method that splits samples
         """
-        matchers = []
-        return_list = []
-
-        matchers.append(SBE16DataParticle.regex_compiled())
-        matchers.append(SBE16StatusParticle.regex_compiled())
-        matchers.append(SBE16CalibrationParticle.regex_compiled())
-
-        for matcher in matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return SBE16Protocol._sieve(raw_data)
 
     def _filter_capabilities(self, events):
         """
@@ -1548,8 +1547,7 @@ class SBE16Protocol(SeaBirdProtocol):
         if prompt not in [Prompt.COMMAND, Prompt.EXECUTED]: 
             raise InstrumentProtocolException('dsdc command not recognized: %s.' % response)
 
-        for line in response.split(NEWLINE):
-            self._param_dict.update(line)
+        self._param_dict.update_lines(response, NEWLINE)
 
         return response
 
@@ -1563,8 +1561,7 @@ class SBE16Protocol(SeaBirdProtocol):
         if prompt not in [Prompt.COMMAND, Prompt.EXECUTED]:
             raise InstrumentProtocolException('dcal command not recognized: %s.' % response)
             
-        for line in response.split(NEWLINE):
-            self._param_dict.update(line)
+        self._param_dict.update_lines(response, NEWLINE)
 
         return response
         
@@ -34,6 +34,7 @@ from mi.core.instrument.data_particle import DataParticle, DataParticleKey, Comm
 from mi.core.instrument.protocol_param_dict import ParameterDictType
 from mi.core.instrument.driver_dict import DriverDictKey
 from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import RegexSieve
 from mi.core.exceptions import InstrumentParameterException
 from mi.core.exceptions import SampleException
 from mi.core.exceptions import InstrumentStateException
@@ -1131,32 +1132,28 @@ class Protocol(SeaBirdProtocol):
         # commands sent sent to device to be filtered in responses for telnet DA
         self._sent_cmds = []
 
+        # WAVE_REGEX spans a whole wave burst, which has no fixed length, so
+        # there is no safe lookback bound; keep rescanning the whole buffer.
         self._chunker = StringChunker(Protocol.sieve_function)
 
         self._add_scheduler_event(ScheduledJob.ACQUIRE_STATUS, ProtocolEvent.ACQUIRE_STATUS)
         self._add_scheduler_event(ScheduledJob.CALIBRATION_COEFFICIENTS, ProtocolEvent.ACQUIRE_CONFIGURATION)
         self._add_scheduler_event(ScheduledJob.CLOCK_SYNC, ProtocolEvent.SCHEDULED_CLOCK_SYNC)
 
+    _sieve = RegexSieve([TS_REGEX_MATCHER,
+                         TIDE_REGEX_MATCHER,
+                         WAVE_REGEX_MATCHER,
+                         STATS_REGEX_MATCHER,
+                         DS_REGEX_MATCHER,
+                         DC_REGEX_MATCHER])
+
     @staticmethod
     def sieve_function(raw_data):
         """
         Chunker sieve method to help the chunker identify chunks.
         @returns a list of chunks identified, if any.  The chunks are all the same type.
         """
-        sieve_matchers = [TS_REGEX_MATCHER,
-                          TIDE_REGEX_MATCHER,
-                          WAVE_REGEX_MATCHER,
-                          STATS_REGEX_MATCHER,
-                          DS_REGEX_MATCHER,
-                          DC_REGEX_MATCHER]
-
-        return_list = []
-
-        for matcher in sieve_matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return Protocol._sieve(raw_data)
 
     def _filter_capabilities(self, events):
         """
@@ -2554,9 +2551,8 @@ class Protocol(SeaBirdProtocol):
         if prompt != Prompt.COMMAND:
             raise InstrumentProtocolException('ds command not recognized: %s.' % response)
 
-        for line in response.split(NEWLINE):
-            hit_count = self._param_dict.multi_match_update(line)
-            log.debug(str(hit_count) + "_parse_ds_response -- " + line )
+        updated = self._param_dict.update_lines(response, NEWLINE, multi_match=True)
+        log.debug("_parse_ds_response updated %s", updated.keys())
 
         # return the Ds as text
         match = DS_REGEX_MATCHER.search(response)
@@ -35,7 +35,8 @@ from mi.core.instrument.instrument_driver import ResourceAgentState
 from mi.core.instrument.instrument_driver import ResourceAgentEvent
 from mi.core.instrument.data_particle import DataParticle, DataParticleKey, CommonDataParticleType
 from mi.core.instrument.driver_dict import DriverDictKey
-from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import RegexSieve
 from mi.core.exceptions import InstrumentTimeoutException
 from mi.core.exceptions import InstrumentParameterException
 from mi.core.exceptions import SampleException
@@ -746,26 +747,25 @@ class SBE37Protocol(CommandResponseInstrumentProtocol):
         # commands sent sent to device to be filtered in responses for telnet DA
         self._sent_cmds = []
 
-        self._chunker = StringChunker(self.sieve_function)
+        self._chunker = StringRingChunker(self.sieve_function,
+                                          lookback=self._sieve_lookback)
 
 
+    # Longest record the sieve matches, with room to spare.  The chunker only
+    # rescans this much of the data it has already sieved.
+    _sieve_lookback = 2048
+
+    _sieve = RegexSieve([SAMPLE_PATTERN_MATCHER,
+                         STATUS_DATA_REGEX_MATCHER,
+                         CALIBRATION_DATA_REGEX_MATCHER])
+
     @staticmethod
     def sieve_function(raw_data):
         """
         Chunker sieve method to help the chunker identify chunks.
         @returns a list of chunks identified, if any.  The chunks are all the same type.
         """
-        sieve_matchers = [SAMPLE_PATTERN_MATCHER,
-                          STATUS_DATA_REGEX_MATCHER,
-                          CALIBRATION_DATA_REGEX_MATCHER]
-
-        return_list = []
-
-        for matcher in sieve_matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return SBE37Protocol._sieve(raw_data)
     def _filter_capabilities(self, events):
         """
         """ 
@@ -38,7 +38,8 @@ from mi.core.exceptions import InstrumentProtocolException
 from mi.core.exceptions import InstrumentParameterExpirationException
 
 from mi.core.instrument.data_particle import DataParticle, DataParticleKey, CommonDataParticleType
-from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import RegexSieve
 
 from mi.instrument.seabird.driver import SeaBirdInstrumentDriver
 from mi.instrument.seabird.driver import SeaBirdProtocol
@@ -1185,27 +1186,26 @@ class Protocol(SeaBirdProtocol):
         # commands sent sent to device to be filtered in responses for telnet DA
         self._sent_cmds = []
 
-        self._chunker = StringChunker(Protocol.sieve_function)
+        self._chunker = StringRingChunker(Protocol.sieve_function,
+                                          lookback=Protocol._sieve_lookback)
+
+    # Longest record the sieve matches, with room to spare.  The chunker only
+    # rescans this much of the data it has already sieved.
+    _sieve_lookback = 8192
+
+    _sieve = RegexSieve([STATUS_DATA_REGEX_MATCHER,
+                         CONFIGURATION_DATA_REGEX_MATCHER,
+                         EVENT_COUNTER_DATA_REGEX_MATCHER,
+                         HARDWARE_DATA_REGEX_MATCHER,
+                         SAMPLE_DATA_REGEX_MATCHER,
+                         ENGINEERING_DATA_MATCHER])
 
     @staticmethod
     def sieve_function(raw_data):
         """
         The method that splits samples
         """
-        return_list = []
-
-        sieve_matchers = [ STATUS_DATA_REGEX_MATCHER,
-                           CONFIGURATION_DATA_REGEX_MATCHER,
-                           EVENT_COUNTER_DATA_REGEX_MATCHER,
-                           HARDWARE_DATA_REGEX_MATCHER,
-                           SAMPLE_DATA_REGEX_MATCHER,
-                           ENGINEERING_DATA_MATCHER ]
-
-        for matcher in sieve_matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return Protocol._sieve(raw_data)
 
     def _filter_capabilities(self, events):
         """
@@ -2010,14 +2010,12 @@ class Protocol(SeaBirdProtocol):
 
         log.debug("Run status command: %s" % InstrumentCmds.GET_STATUS_DATA)
         response = self._do_cmd_resp(InstrumentCmds.GET_STATUS_DATA, timeout=timeout)
-        for line in response.split(NEWLINE):
-            self._param_dict.update(line)
+        self._param_dict.update_lines(response, NEWLINE)
         log.debug("status command response: %s" % response)
 
         log.debug("Run configure command: %s" % InstrumentCmds.GET_CONFIGURATION_DATA)
         response = self._do_cmd_resp(InstrumentCmds.GET_CONFIGURATION_DATA, timeout=timeout)
-        for line in response.split(NEWLINE):
-            self._param_dict.update(line)
+        self._param_dict.update_lines(response, NEWLINE)
         log.debug("configure command response: %s" % response)
 
         # Get new param dict config. If it differs from the old config,
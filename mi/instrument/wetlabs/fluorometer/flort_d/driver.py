@@ -32,7 +32,8 @@ from mi.core.instrument.data_particle import DataParticle
 from mi.core.instrument.data_particle import DataParticleKey
 from mi.core.instrument.data_particle import CommonDataParticleType
 
-from mi.core.instrument.chunker import StringChunker
+from mi.core.instrument.chunker import StringRingChunker
+from mi.core.instrument.chunker import RegexSieve
 
 from mi.core.instrument.protocol_param_dict import ParameterDictVisibility
 from mi.core.instrument.protocol_param_dict import ParameterDictType
@@ -916,28 +917,26 @@ class Protocol(CommandResponseInstrumentProtocol):
         self._sent_cmds = []
 
         #
-        self._chunker = StringChunker(Protocol.sieve_function)
+        self._chunker = StringRingChunker(Protocol.sieve_function,
+                                          lookback=Protocol._sieve_lookback)
 
 
+    # Longest record the sieve matches, with room to spare.  The chunker only
+    # rescans this much of the data it has already sieved.
+    _sieve_lookback = 2048
+
+    _sieve = RegexSieve([MNU_REGEX_MATCHER,
+                         RUN_REGEX_MATCHER,
+                         MET_REGEX_MATCHER,
+                         DUMP_MEMORY_REGEX_MATCHER,
+                         SAMPLE_REGEX_MATCHER])
+
     @staticmethod
     def sieve_function(raw_data):
         """
         The method that splits samples
         """
-
-        return_list = []
-
-        sieve_matchers = [ MNU_REGEX_MATCHER,
-                           RUN_REGEX_MATCHER,
-                           MET_REGEX_MATCHER,
-                           DUMP_MEMORY_REGEX_MATCHER,
-                           SAMPLE_REGEX_MATCHER ]
-
-        for matcher in sieve_matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-
-        return return_list
+        return Protocol._sieve(raw_data)
 
     def _filter_capabilities(self, events):
         """
@@ -44,4 +44,8 @@ setup(  name = 'marine-integrations',
             'apscheduler==2.1.0',
             #'utilities',
         ],
+        extras_require = {
+            # optional C checksum for the SIO parsers in mi.dataset.parser.mflm
+            'crc': ['crcmod>=1.7'],
+        },
      )